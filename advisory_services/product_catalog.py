@@ -1,24 +1,334 @@
 # Dieses Modul ist die Schnittstelle zu einer Datenbank mit Hardware-Produkten.
 # Es hilft, die passende, effiziente Alternative zu einem "Stromfresser" zu finden.
 # ---------------------------------------------------------------------------
+# ÜBERARBEITET: Echter Katalog im Speicher statt eines simulierten Produkts.
+# - Laden aus CSV, JSON oder Parquet (PRODUCT_CATALOG_PATH) in Spalten-Arrays
+# - Primärindex nach Gerätetyp (zusammenhängende Bereiche, innerhalb nach Preis sortiert)
+# - Sekundärindizes je Typ nach Effizienzklasse und nach Verbrauch pro Zyklus
+# - best_payback: kürzeste Amortisation gegenüber dem gemessenen Verbrauch des alten Geräts
+# - Hot-Reload: ein neuer Katalog wird komplett aufgebaut und dann per
+#   Referenztausch aktiviert, Leser werden nie blockiert
+# - Geladen wird erst beim ersten Zugriff; Zeilen mit unbekannter Effizienzklasse
+#   oder ungültigen Zahlen werden mit einer Warnung übersprungen
+# ---------------------------------------------------------------------------
+import asyncio
+import csv
+import json
+import os
+
+import numpy as np
+
+PRODUCT_CATALOG_PATH = os.environ.get("PRODUCT_CATALOG_PATH")
+PRODUCT_CATALOG_RELOAD_SECONDS = float(os.environ.get("PRODUCT_CATALOG_RELOAD_SECONDS", "60"))
+# Annahmen für die Amortisationsrechnung, falls der Aufrufer nichts Genaueres weiß
+DEFAULT_CYCLES_PER_YEAR = float(os.environ.get("DEFAULT_CYCLES_PER_YEAR", "220"))
+DEFAULT_GRID_PRICE_EUR_KWH = float(os.environ.get("DEFAULT_GRID_PRICE_EUR_KWH", "0.32"))
+
+# Kleinere Zahl = effizienter. Alte Labels (A+++ ...) werden vor A einsortiert.
+EFFICIENCY_CLASSES = ["A+++", "A++", "A+", "A", "B", "C", "D", "E", "F", "G"]
+_EFFICIENCY_RANK = {label: rank for rank, label in enumerate(EFFICIENCY_CLASSES)}
+
+# Solange keine Katalog-Datei konfiguriert ist, gibt es nur dieses eine Produkt (bisheriges Verhalten)
+_BUILTIN_PRODUCTS = [{
+    "name": "Bosch Serie 8 WAX32M42",
+    "type": "Waschmaschine",
+    "price_eur": 799.0,
+    "efficiency_class": "A",
+    "avg_consumption_kwh_per_cycle": 0.45,
+}]
+
+_SORT_KEYS = ("efficiency", "price", "consumption")
 
-# from ..database import db_client
 
-async def find_replacement(inefficient_device_type: str) -> dict:
+def _type_key(device_type: str) -> str:
+    return device_type.strip().lower()
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def _factorize(values, key=lambda v: v) -> tuple[list, np.ndarray]:
     """
-    Findet das beste Ersatzprodukt für einen bestimmten Gerätetyp.
+    Kodiert Kategorien als Ganzzahlen (Reihenfolge des ersten Auftretens).
+    Bewusst per dict statt np.unique auf Objekt-Arrays: das hielte beim Hot-Reload
+    großer Kataloge den GIL sekundenlang und würde die Leser blockieren.
     """
-    print(f"INFO: Suche Ersatz für Gerätetyp '{inefficient_device_type}'...")
+    mapping: dict = {}
+    codes = np.fromiter((mapping.setdefault(key(v), len(mapping)) for v in values), dtype=np.int32, count=len(values))
+    return list(mapping), codes
+
+
+class ProductCatalog:
+    """
+    Unveränderlicher, spaltenorientierter Produktkatalog.
+    Alle Abfragen arbeiten auf dem zusammenhängenden Bereich eines Gerätetyps.
+    """
+    def __init__(self, products: list[dict]):
+        self._build(
+            names=[p.get("name") for p in products],
+            types=[p.get("type") for p in products],
+            prices=np.array([_to_float(p.get("price_eur")) for p in products], dtype=np.float64),
+            efficiency_classes=[p.get("efficiency_class") for p in products],
+            consumption=np.array([_to_float(p.get("avg_consumption_kwh_per_cycle")) for p in products], dtype=np.float64),
+        )
+
+    @classmethod
+    def from_columns(cls, names, types, prices, efficiency_classes, consumption) -> "ProductCatalog":
+        """Schneller Weg für große Kataloge (z.B. aus Parquet): Spalten statt einer Liste von Dicts."""
+        catalog = cls.__new__(cls)
+        catalog._build(names, types, np.asarray(prices, dtype=np.float64), efficiency_classes,
+                       np.asarray(consumption, dtype=np.float64))
+        return catalog
+
+    def _build(self, names, types, prices: np.ndarray, efficiency_classes, consumption: np.ndarray):
+        labels, label_codes = _factorize(efficiency_classes, lambda c: str(c).strip().upper())
+        label_ranks = np.array([_EFFICIENCY_RANK.get(label, -1) for label in labels], dtype=np.int8)
+        ranks = label_ranks[label_codes]
+        has_type = np.fromiter((isinstance(t, str) and bool(t.strip()) for t in types), dtype=bool, count=len(types))
+        valid = (ranks >= 0) & has_type & np.isfinite(prices) & np.isfinite(consumption)
+        if not valid.all():
+            # Defekte Zeilen überspringen statt den ganzen Katalog zu verwerfen
+            unknown = sorted(labels[i] for i in np.flatnonzero(label_ranks < 0))
+            print(f"WARNUNG: {int((~valid).sum())} von {valid.size} Produkten übersprungen "
+                  f"(unbekannte Effizienzklasse {unknown[:5]}, fehlender Typ oder ungültiger Preis/Verbrauch).")
+            names = np.asarray(names, dtype=object)[valid]
+            types = np.asarray(types, dtype=object)[valid]
+            prices, consumption, ranks = prices[valid], consumption[valid], ranks[valid]
+
+        type_keys, type_codes = _factorize(types, _type_key)
+        display_types: dict[str, str] = {}
+        for t in types:
+            if len(display_types) == len(type_keys):
+                break
+            display_types.setdefault(_type_key(t), t)
+
+        # Primärindex: nach Typ gruppieren, innerhalb eines Typs nach Preis aufsteigend
+        order = np.lexsort((prices, type_codes))
+        self.names = np.asarray(names, dtype=object)[order]
+        self.prices = prices[order]
+        self.ranks = ranks[order]
+        self.consumption = consumption[order]
+        self.type_codes = type_codes[order]
+        self._type_keys = type_keys
+        bounds = np.searchsorted(self.type_codes, np.arange(len(type_keys) + 1))
+        self._ranges = {key: (int(bounds[i]), int(bounds[i + 1])) for i, key in enumerate(type_keys)}
+        self._display_types = display_types
+
+        # Sekundärindizes je Typ (absolute Positionen in Sortier-Reihenfolge).
+        # lexsort ist stabil und der Bereich ist nach Preis sortiert: bei Gleichstand gewinnt der günstigere Preis.
+        self._by_efficiency: dict[str, np.ndarray] = {}
+        self._by_consumption: dict[str, np.ndarray] = {}
+        self._min_consumption: dict[str, float] = {}
+        for key, (start, end) in self._ranges.items():
+            self._min_consumption[key] = float(self.consumption[start:end].min())
+            self._by_efficiency[key] = start + np.argsort(self.ranks[start:end], kind="stable")
+            self._by_consumption[key] = start + np.argsort(self.consumption[start:end], kind="stable")
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    @property
+    def device_types(self) -> list[str]:
+        return list(self._display_types.values())
+
+    def product(self, index: int) -> dict:
+        return {
+            "name": self.names[index],
+            "type": self._display_types[self._type_keys[self.type_codes[index]]],
+            "price_eur": float(self.prices[index]),
+            "efficiency_class": EFFICIENCY_CLASSES[self.ranks[index]],
+            "avg_consumption_kwh_per_cycle": float(self.consumption[index]),
+        }
 
-    # --- Hier würde die Logik stehen, um die Produktdatenbank abzufragen ---
-    # z.B. "Finde die Waschmaschine mit der besten Effizienzklasse unter 800€".
-    # product = await db_client.query_products(type=inefficient_device_type, sort_by="efficiency", max_price=800)
-    
-    # Vorerst ein simuliertes Produkt
-    return {
-        "name": "Bosch Serie 8 WAX32M42",
-        "type": "Waschmaschine",
-        "price_eur": 799.0,
-        "efficiency_class": "A",
-        "avg_consumption_kwh_per_cycle": 0.45
-    }
\ No newline at end of file
+    def _price_end(self, start: int, end: int, max_price: float | None) -> int:
+        # Der Typ-Bereich ist nach Preis sortiert: der Preisdeckel ist eine Binärsuche
+        if max_price is None:
+            return end
+        return start + int(np.searchsorted(self.prices[start:end], max_price, side="right"))
+
+    def top_k(self, device_type: str, k: int = 1, max_price: float | None = None,
+              max_efficiency_class: str | None = None, max_consumption_kwh_per_cycle: float | None = None,
+              sort_by: str = "efficiency") -> list[dict]:
+        """
+        Die `k` besten Produkte eines Typs, die alle Bedingungen erfüllen.
+        `sort_by`: 'efficiency' (Klasse, dann Preis), 'price' oder 'consumption' (Verbrauch, dann Preis).
+        """
+        if sort_by not in _SORT_KEYS:
+            raise ValueError(f"Unbekanntes Sortierkriterium '{sort_by}', erlaubt: {_SORT_KEYS}")
+        key = _type_key(device_type)
+        if key not in self._ranges or k <= 0:
+            return []
+        start, end = self._ranges[key]
+        if sort_by == "price":
+            end = self._price_end(start, end, max_price)
+            ordered = np.arange(start, end)
+        else:
+            ordered = self._by_efficiency[key] if sort_by == "efficiency" else self._by_consumption[key]
+        max_rank = _EFFICIENCY_RANK[max_efficiency_class.strip().upper()] if max_efficiency_class else None
+
+        # Die Sortier-Reihenfolge in wachsenden Blöcken abarbeiten und abbrechen, sobald
+        # k Treffer gefunden sind – typischerweise reichen die ersten paar hundert Einträge.
+        found: list[int] = []
+        pos, chunk = 0, max(256, 4 * k)
+        while pos < ordered.size and len(found) < k:
+            idx = ordered[pos:pos + chunk]
+            mask = np.ones(idx.size, dtype=bool)
+            if max_price is not None and sort_by != "price":
+                mask &= self.prices[idx] <= max_price
+            if max_rank is not None:
+                mask &= self.ranks[idx] <= max_rank
+            if max_consumption_kwh_per_cycle is not None:
+                mask &= self.consumption[idx] <= max_consumption_kwh_per_cycle
+            found.extend(idx[mask][:k - len(found)].tolist())
+            pos += chunk
+            chunk *= 2
+        return [self.product(i) for i in found]
+
+    def best_payback(self, device_type: str, current_consumption_kwh_per_cycle: float, k: int = 1,
+                     cycles_per_year: float = DEFAULT_CYCLES_PER_YEAR,
+                     energy_price_eur_kwh: float = DEFAULT_GRID_PRICE_EUR_KWH,
+                     max_price: float | None = None) -> list[dict]:
+        """
+        Produkte mit der kürzesten Amortisationszeit gegenüber dem gemessenen Verbrauch
+        des alten Geräts. Produkte ohne Ersparnis werden nicht vorgeschlagen.
+        Jedes Ergebnis enthält zusätzlich `payback_years` und `annual_savings_eur`.
+        """
+        key = _type_key(device_type)
+        if key not in self._ranges or k <= 0:
+            return []
+        start, end = self._ranges[key]
+        end = self._price_end(start, end, max_price)
+        if end <= start:
+            return []
+        euro_per_kwh_year = cycles_per_year * energy_price_eur_kwh
+        # Untere Schranke: kein Produkt spart mehr als das sparsamste des Typs. Da der Bereich
+        # nach Preis sortiert ist, kann ab Preis > (k-beste Amortisation) * max. Ersparnis abgebrochen werden.
+        max_savings = (current_consumption_kwh_per_cycle - self._min_consumption[key]) * euro_per_kwh_year
+        if max_savings <= 0:
+            return []
+        best_idx = np.empty(0, dtype=np.int64)
+        best_payback = np.empty(0)
+        pos, chunk = start, max(1024, 8 * k)
+        while pos < end:
+            stop = min(pos + chunk, end)
+            if best_payback.size == k:
+                stop = min(stop, self._price_end(pos, stop, float(best_payback[-1]) * max_savings))
+                if stop <= pos:
+                    break
+            savings = (current_consumption_kwh_per_cycle - self.consumption[pos:stop]) * euro_per_kwh_year
+            payback = np.full(stop - pos, np.inf)
+            np.divide(self.prices[pos:stop], savings, out=payback, where=savings > 0)
+            candidates = np.concatenate((best_payback, payback))
+            indices = np.concatenate((best_idx, np.arange(pos, stop)))
+            keep = np.argpartition(candidates, k - 1)[:k] if candidates.size > k else np.arange(candidates.size)
+            keep = keep[np.argsort(candidates[keep], kind="stable")]
+            keep = keep[np.isfinite(candidates[keep])]
+            best_idx, best_payback = indices[keep], candidates[keep]
+            pos = stop
+            chunk *= 2
+        results = []
+        for index, years in zip(best_idx, best_payback):
+            product = self.product(int(index))
+            product["payback_years"] = round(float(years), 2)
+            product["annual_savings_eur"] = round(float((current_consumption_kwh_per_cycle - self.consumption[index]) * euro_per_kwh_year), 2)
+            results.append(product)
+        return results
+
+
+def _load_rows(path: str) -> list[dict]:
+    if path.endswith(".json"):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def load_catalog(path: str | None = None) -> ProductCatalog:
+    """Lädt einen Katalog aus CSV/JSON/Parquet. Ohne Pfad: eingebauter Mini-Katalog."""
+    path = path or PRODUCT_CATALOG_PATH
+    if not path:
+        return ProductCatalog(_BUILTIN_PRODUCTS)
+    if path.endswith(".parquet"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise RuntimeError("Für Parquet-Kataloge wird 'pyarrow' benötigt.") from e
+        table = pq.read_table(path)
+        return ProductCatalog.from_columns(
+            table["name"].to_numpy(zero_copy_only=False), table["type"].to_numpy(zero_copy_only=False),
+            table["price_eur"].to_numpy(), table["efficiency_class"].to_numpy(zero_copy_only=False),
+            table["avg_consumption_kwh_per_cycle"].to_numpy(),
+        )
+    return ProductCatalog(_load_rows(path))
+
+
+# Der aktive Katalog. Abfragen lesen die Referenz genau einmal; ein Reload
+# ersetzt sie atomar, laufende Abfragen arbeiten auf dem alten Katalog weiter.
+# Geladen wird erst beim ersten Zugriff (nicht beim Import).
+_catalog: ProductCatalog | None = None
+_catalog_mtime: float | None = None
+
+
+def get_catalog() -> ProductCatalog:
+    """Der aktive Katalog; der erste Aufruf lädt ihn (blockierend, aus async-Code ensure_catalog nutzen)."""
+    global _catalog
+    if _catalog is None:
+        try:
+            _catalog = load_catalog()
+        except Exception as e:
+            # Ohne lesbaren Katalog weiter mit dem eingebauten; watch_catalog versucht es erneut
+            print(f"FEHLER: Produktkatalog konnte nicht geladen werden, nutze den eingebauten: {e}")
+            _catalog = ProductCatalog(_BUILTIN_PRODUCTS)
+    return _catalog
+
+
+async def ensure_catalog() -> ProductCatalog:
+    """Wie get_catalog, lädt beim ersten Zugriff aber in einem Thread statt im Event-Loop."""
+    return _catalog if _catalog is not None else await asyncio.to_thread(get_catalog)
+
+
+async def reload_catalog(path: str | None = None) -> ProductCatalog:
+    """Baut den neuen Katalog in einem Thread auf und tauscht ihn dann aus."""
+    global _catalog
+    new_catalog = await asyncio.to_thread(load_catalog, path)
+    _catalog = new_catalog
+    print(f"INFO: Produktkatalog neu geladen ({len(new_catalog)} Produkte).")
+    return new_catalog
+
+
+async def watch_catalog(path: str | None = None, interval: float = PRODUCT_CATALOG_RELOAD_SECONDS):
+    """Hintergrund-Task: lädt den Katalog neu, sobald sich die Datei ändert."""
+    global _catalog_mtime
+    path = path or PRODUCT_CATALOG_PATH
+    if not path:
+        return
+    while True:
+        try:
+            mtime = os.path.getmtime(path)
+            if mtime != _catalog_mtime:
+                await reload_catalog(path)
+                _catalog_mtime = mtime
+        except Exception as e:
+            # Ein defekter Katalog darf den laufenden nicht ersetzen
+            print(f"FEHLER: Produktkatalog konnte nicht neu geladen werden: {e}")
+        await asyncio.sleep(interval)
+
+
+async def find_replacement(inefficient_device_type: str, max_price: float | None = None,
+                           current_consumption_kwh_per_cycle: float | None = None) -> dict | None:
+    """
+    Findet das beste Ersatzprodukt für einen bestimmten Gerätetyp unter dem Preisdeckel:
+    mit gemessenem Verbrauch des alten Geräts das mit der kürzesten Amortisationszeit,
+    sonst (oder wenn keins Strom spart) die beste Effizienzklasse, bei Gleichstand der günstigste Preis.
+    """
+    print(f"INFO: Suche Ersatz für Gerätetyp '{inefficient_device_type}'...")
+    catalog = await ensure_catalog()
+    products = []
+    if current_consumption_kwh_per_cycle is not None:
+        products = catalog.best_payback(inefficient_device_type, current_consumption_kwh_per_cycle, k=1, max_price=max_price)
+    products = products or catalog.top_k(inefficient_device_type, k=1, max_price=max_price)
+    return products[0] if products else None
@@ -1,70 +1,271 @@
 # advisory_services/recommendation_service.py
-# Importiere deine neue Query-Funktion
-from database.neo4j_client import execute_query
-# ... andere Imports
+# ---------------------------------------------------------------------------
+# ÜBERARBEITET: Statt N+1 Round-Trips (Katalog + CREATE pro Gerät) läuft die
+# Erstellung jetzt als Pipeline:
+#   1 Lese-Query  ->  Katalog 1x pro Gerätetyp  ->  Förderungen parallel (begrenzt)
+#   ->  1 UNWIND-Schreib-Transaktion für alle Empfehlungen
+# Der Bulk-Modus erzeugt nachts die Empfehlungen aller Nutzer in Shards.
+# ---------------------------------------------------------------------------
+import asyncio
+import os
+import time
+
+from advisory_services import product_catalog, subsidy_engine
+from database.neo4j_client import execute_read, neo4j_client
+
+# Maximale Anzahl gleichzeitiger Förder-Abfragen (dahinter steckt später ein LLM)
+SUBSIDY_CONCURRENCY = int(os.environ.get("SUBSIDY_CONCURRENCY", "8"))
+# Bulk-Modus: Nutzer pro Shard und gleichzeitig verarbeitete Shards
+RECOMMENDATION_SHARD_SIZE = int(os.environ.get("RECOMMENDATION_SHARD_SIZE", "500"))
+RECOMMENDATION_SHARD_CONCURRENCY = int(os.environ.get("RECOMMENDATION_SHARD_CONCURRENCY", "4"))
+
+# Profil und Stromfresser mehrerer Nutzer in EINER Query
+INEFFICIENT_DEVICES_QUERY = """
+UNWIND $userIds AS userId
+MATCH (u:User {userId: userId})
+OPTIONAL MATCH (u)-[:OWNS]->(:Apartment)-[:CONTAINS]->(d:Device)
+WHERE d.efficiency_class IN ['C', 'D', 'E', 'F', 'G'] OR d.avg_consumption_kwh > 1.0
+RETURN u.userId AS user_id, u {.*} AS profile,
+       [x IN collect(d) | {device_type: x.type, device_model: x.model, device_id: x.deviceId,
+                           avg_consumption_kwh: x.avg_consumption_kwh}] AS devices
+"""
+
+# Alle Empfehlungen in einer Transaktion. MERGE statt CREATE: eine erneute
+# Erstellung (z.B. im nächtlichen Bulk-Lauf) aktualisiert die offene Empfehlung
+# für ein Gerät, statt Duplikate anzulegen.
+RECOMMENDATION_UPSERT_QUERY = """
+UNWIND $rows AS row
+MATCH (u:User {userId: row.userId})
+MATCH (d:Device {deviceId: row.deviceId})
+MERGE (u)-[:RECEIVED]->(r:Recommendation {status: 'new'})-[:SUGGESTS_REPLACEMENT_FOR]->(d)
+ON CREATE SET
+    r.recommendationId = randomUUID(),
+    r.createdAt = datetime()
+SET
+    r.title = row.title,
+    r.productName = row.productName,
+    r.productPriceEur = row.productPriceEur,
+    r.subsidyEur = row.subsidyEur,
+    r.subsidyProgram = row.subsidyProgram,
+    r.updatedAt = datetime()
+RETURN count(r) AS written
+"""
+
+
+async def _write_recommendations(tx, rows: list[dict]) -> int:
+    result = await tx.run(RECOMMENDATION_UPSERT_QUERY, rows=rows)
+    record = await result.single()
+    return record["written"] if record else 0
+
+
+class _Lookups:
+    """
+    Katalog- und Förder-Ergebnisse einer Erstellung (bzw. eines ganzen Bulk-Laufs).
+    Jeder Gerätetyp wird pro gemessenem Verbrauch (auf 0,01 kWh gerundet) nur einmal
+    nachgeschlagen, gleichzeitige Anfragen teilen sich den Task.
+    Fehlgeschlagene Tasks werden wieder entfernt, der nächste Shard versucht es erneut.
+    """
+    def __init__(self, subsidy_concurrency: int = SUBSIDY_CONCURRENCY):
+        self._products: dict[str, asyncio.Task] = {}
+        self._subsidies: dict[tuple, asyncio.Task] = {}
+        self._semaphore = asyncio.Semaphore(subsidy_concurrency)
+
+    @staticmethod
+    def _memoize(cache: dict, key, coro) -> asyncio.Task:
+        task = asyncio.ensure_future(coro)
+        cache[key] = task
+
+        def evict_if_failed(done: asyncio.Task):
+            if (done.cancelled() or done.exception() is not None) and cache.get(key) is done:
+                del cache[key]
+
+        task.add_done_callback(evict_if_failed)
+        return task
+
+    @staticmethod
+    def _consumption_key(consumption_kwh: float | None) -> float | None:
+        return round(float(consumption_kwh), 2) if consumption_kwh is not None else None
+
+    def product(self, device_type: str, consumption_kwh: float | None = None) -> asyncio.Task:
+        # Ersatz mit der kürzesten Amortisation gegenüber dem gemessenen Verbrauch des alten Geräts
+        key = (device_type, self._consumption_key(consumption_kwh))
+        if key not in self._products:
+            return self._memoize(self._products, key, product_catalog.find_replacement(device_type, current_consumption_kwh_per_cycle=key[1]))
+        return self._products[key]
+
+    def subsidy(self, device_type: str, consumption_kwh: float | None, profile: dict) -> asyncio.Task:
+        # Förderungen hängen vom Produkt und von der PLZ-Region des Nutzers ab
+        key = (device_type, self._consumption_key(consumption_kwh), subsidy_engine.region_of(profile))
+        if key not in self._subsidies:
+            return self._memoize(self._subsidies, key, self._bounded_subsidy(device_type, consumption_kwh, profile))
+        return self._subsidies[key]
+
+    async def _bounded_subsidy(self, device_type: str, consumption_kwh: float | None, profile: dict) -> dict:
+        product = await self.product(device_type, consumption_kwh)
+        if product is None:
+            return {}
+        async with self._semaphore:
+            return await subsidy_engine.get_subsidies(product, profile)
+
+
+def _outcome(task: asyncio.Task) -> tuple:
+    """(Ergebnis, None) oder (None, Fehler) eines fertigen Tasks."""
+    if task.cancelled():
+        return None, asyncio.CancelledError()
+    error = task.exception()
+    return (None, error) if error is not None else (task.result(), None)
+
+
+async def _build_recommendations(user_rows: list[dict], lookups: _Lookups) -> dict[str, list[dict]]:
+    """Baut die Empfehlungen für alle übergebenen Nutzer (Ergebnis der INEFFICIENT_DEVICES_QUERY)."""
+    jobs = [
+        (row["user_id"], device,
+         lookups.product(device["device_type"], device.get("avg_consumption_kwh")),
+         lookups.subsidy(device["device_type"], device.get("avg_consumption_kwh"), row["profile"] or {}))
+        for row in user_rows
+        for device in row["devices"]
+    ]
+    # Ein fehlgeschlagener Nachschlag betrifft nur die Geräte dieses Typs bzw. dieser Region
+    await asyncio.gather(*(task for _, _, product, subsidy in jobs for task in (product, subsidy)), return_exceptions=True)
+
+    recommendations: dict[str, list[dict]] = {row["user_id"]: [] for row in user_rows}
+    errors: dict[str, BaseException] = {}
+    for user_id, device, product_task, subsidy_task in jobs:
+        product, product_error = _outcome(product_task)
+        if product_error is not None:
+            errors.setdefault(f"Ersatz für {device['device_type']}", product_error)
+            continue
+        if product is None:
+            # Kein passender Ersatz im Katalog -> keine Empfehlung für dieses Gerät
+            continue
+        subsidy, subsidy_error = _outcome(subsidy_task)
+        if subsidy_error is not None:
+            # Empfehlung trotzdem, nur ohne Förderung
+            errors.setdefault(f"Förderung für {device['device_type']}", subsidy_error)
+            subsidy = {}
+        recommendations[user_id].append({
+            "title": f"Tausche deine alte {device['device_type']}!",
+            "device_id": device["device_id"],
+            "device_type": device["device_type"],
+            "product": product,
+            "subsidy": subsidy,
+        })
+    for what, error in errors.items():
+        print(f"FEHLER: Nachschlagen ({what}) fehlgeschlagen: {error!r}")
+    return recommendations
+
+
+async def _persist(recommendations: dict[str, list[dict]]) -> int:
+    rows = [
+        {
+            "userId": user_id,
+            "deviceId": rec["device_id"],
+            "title": rec["title"],
+            "productName": rec["product"].get("name"),
+            "productPriceEur": rec["product"].get("price_eur"),
+            "subsidyEur": rec["subsidy"].get("amount_eur"),
+            "subsidyProgram": rec["subsidy"].get("program_name"),
+        }
+        for user_id, recs in recommendations.items()
+        for rec in recs
+    ]
+    if not rows:
+        return 0
+    return await neo4j_client.write_transaction(_write_recommendations, rows)
+
 
 async def generate_recommendations_for_user(user_id: str) -> list[dict]:
     """
     Erstellt Empfehlungen basierend auf den Daten im Knowledge Graph.
     """
     print(f"INFO: Starte Erstellung von Empfehlungen für Nutzer {user_id}...")
-    
-    # --- Schritt 1 & 2: Lade Nutzerdaten und identifiziere Stromfresser aus dem Graphen ---
-    # Diese eine Cypher-Query ersetzt mehrere SQL-Abfragen!
-    query = """
-    MATCH (u:User {userId: $userId})-[:OWNS]->(a:Apartment)-[:CONTAINS]->(d:Device)
-    WHERE d.efficiency_class IN ['C', 'D', 'E', 'F', 'G'] OR d.avg_consumption_kwh > 1.0
-    RETURN d.type as device_type, d.model as device_model, d.deviceId as device_id
-    """
-    print("-> Schritt 1+2/5: Finde ineffiziente Geräte im Knowledge Graph...")
-    inefficient_devices = await execute_query(query, {"userId": user_id})
 
-    if not inefficient_devices:
+    # --- Schritt 1 & 2: Nutzerprofil und Stromfresser in einer Query laden ---
+    print("-> Schritt 1+2/5: Finde ineffiziente Geräte im Knowledge Graph...")
+    user_rows = await execute_read(INEFFICIENT_DEVICES_QUERY, {"userIds": [user_id]})
+    if not user_rows or not user_rows[0]["devices"]:
         print(f"INFO: Keine ineffizienten Geräte für Nutzer {user_id} gefunden.")
         return []
 
-    recommendations = []
-    for device in inefficient_devices:
-        print(f"-> Verarbeite ineffizientes Gerät: {device['device_type']} ({device['device_model']})")
+    # --- Schritt 3+4: Ersatz-Hardware (1x pro Gerätetyp) und Förderungen (parallel) ---
+    print(f"-> Schritt 3+4/5: Suche Ersatz-Hardware und Förderungen für {len(user_rows[0]['devices'])} Geräte...")
+    recommendations = await _build_recommendations(user_rows, _Lookups())
 
-        # --- Schritt 3: Passende Ersatz-Hardware finden (deine Logik bleibt gleich) ---
-        print("-> Schritt 3/5: Suche effiziente Ersatz-Hardware im Produktkatalog...")
-        replacement_product = await product_catalog.find_replacement(device['device_type'])
+    # --- Schritt 5: Alle Empfehlungen in einer Transaktion im Graphen speichern ---
+    await _persist(recommendations)
+    print("-> Schritt 5/5: Empfehlungen erstellt und im Knowledge Graph gespeichert.")
+    return recommendations[user_id]
 
-        # --- Schritt 4: Förderungen und Finanzierung prüfen (deine Logik bleibt gleich) ---
-        print("-> Schritt 4/5: Prüfe Förderungen und Finanzierungsoptionen...")
-        # Hier könntest du sogar User-Profil-Daten aus dem Graphen holen
-        # user_profile = await execute_query("MATCH (u:User {userId: $userId}) RETURN u", {"userId": user_id})
-        # subsidy = await subsidy_engine.get_subsidies(replacement_product, user_profile[0]['u'])
-        # ...
 
-        # --- Schritt 5: Empfehlung zusammenbauen und mit dem Graphen verknüpfen! ---
-        # Dies ist der entscheidende Schritt zum Aufbau von Wissen:
-        final_recommendation = {
-            "title": f"Tausche deine alte {device['device_type']}!",
-            # ... andere Felder
-        }
+async def _user_id_pages(page_size: int):
+    """Alle Nutzer-IDs seitenweise (Keyset-Pagination über den userId-Index statt SKIP)."""
+    after = ""
+    while True:
+        page = await execute_read(
+            "MATCH (u:User) WHERE u.userId > $after RETURN u.userId AS user_id ORDER BY u.userId LIMIT $limit",
+            {"after": after, "limit": page_size},
+        )
+        if not page:
+            return
+        yield [row["user_id"] for row in page]
+        after = page[-1]["user_id"]
 
-        # Jetzt speichern wir die Empfehlung im Graphen und verbinden sie mit dem Nutzer und dem Gerät
-        create_recommendation_query = """
-        MATCH (u:User {userId: $userId})
-        MATCH (d:Device {deviceId: $deviceId})
-        CREATE (r:Recommendation {
-            recommendationId: randomUUID(),
-            title: $title,
-            createdAt: datetime(),
-            status: 'new'
-        })
-        CREATE (u)-[:RECEIVED]->(r)
-        CREATE (r)-[:SUGGESTS_REPLACEMENT_FOR]->(d)
-        RETURN r.recommendationId as id
-        """
-        await execute_query(create_recommendation_query, {
-            "userId": user_id,
-            "deviceId": device['device_id'],
-            "title": final_recommendation['title']
-        })
-        print("-> Schritt 5/5: Empfehlung erstellt und im Knowledge Graph gespeichert.")
-        recommendations.append(final_recommendation)
-    
-    return recommendations
\ No newline at end of file
+
+async def regenerate_all_recommendations(shard_size: int = RECOMMENDATION_SHARD_SIZE,
+                                         shard_concurrency: int = RECOMMENDATION_SHARD_CONCURRENCY) -> dict:
+    """
+    Bulk-Modus (nächtlicher Lauf): erzeugt die Empfehlungen aller Nutzer neu.
+    Pro Shard eine Lese- und eine Schreib-Query; Katalog- und Förder-Ergebnisse
+    werden über den ganzen Lauf geteilt.
+    """
+    print("INFO: Starte Bulk-Erstellung von Empfehlungen...")
+    start = time.perf_counter()
+    lookups = _Lookups()
+    semaphore = asyncio.Semaphore(shard_concurrency)
+    stats = {"users": 0, "recommendations": 0, "failed_shards": 0}
+
+    async def process_shard(user_ids: list[str]):
+        async with semaphore:
+            try:
+                user_rows = await execute_read(INEFFICIENT_DEVICES_QUERY, {"userIds": user_ids})
+                recommendations = await _build_recommendations(user_rows, lookups)
+                stats["recommendations"] += await _persist(recommendations)
+                stats["users"] += len(user_ids)
+            except Exception as e:
+                stats["failed_shards"] += 1
+                print(f"FEHLER: Shard mit {len(user_ids)} Nutzern fehlgeschlagen: {e}")
+
+    tasks = []
+    async for user_ids in _user_id_pages(shard_size):
+        tasks = [t for t in tasks if not t.done()]
+        tasks.append(asyncio.create_task(process_shard(user_ids)))
+        # Nicht beliebig weit vorauslesen: höchstens doppelt so viele Shards wie gleichzeitig laufen dürfen
+        if len(tasks) >= shard_concurrency * 2:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    await asyncio.gather(*tasks)
+
+    duration = time.perf_counter() - start
+    stats["duration_s"] = round(duration, 2)
+    stats["users_per_second"] = round(stats["users"] / duration, 1) if duration else 0.0
+    print(f"INFO: Bulk-Erstellung fertig: {stats['users']} Nutzer, {stats['recommendations']} Empfehlungen "
+          f"in {duration:.1f}s ({stats['users_per_second']:.0f} Nutzer/s, {stats['failed_shards']} Shards fehlgeschlagen).")
+    return stats
+
+
+async def _run_bulk():
+    await neo4j_client.connect()
+    if not neo4j_client.is_connected:
+        return
+    # Katalog im Hintergrund laden und bei Änderungen der Datei neu laden
+    catalog_watcher = asyncio.create_task(product_catalog.watch_catalog())
+    try:
+        await regenerate_all_recommendations()
+    finally:
+        catalog_watcher.cancel()
+        await subsidy_engine.close_openai_client()
+        await neo4j_client.close()
+
+
+if __name__ == "__main__":
+    # Nächtlicher Cron-Job: python -m advisory_services.recommendation_service
+    asyncio.run(_run_bulk())
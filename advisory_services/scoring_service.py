@@ -1,23 +1,362 @@
 # Dieses Modul berechnet deinen proprietären "Energie-Score".
 # Er ist ein Maß für die Energieeffizienz und das Sparverhalten eines Nutzers.
 # ---------------------------------------------------------------------------
+# ÜBERARBEITET: Der Score wird nicht mehr aus der Historie berechnet, sondern aus
+# laufenden Aggregaten, die der Ingest mit O(1) pro Messwert fortschreibt:
+# - Ersparnis: 12 Monats-Buckets (Ringpuffer) -> rollierende 12-Monats-Summe
+# - Lastverschiebung: Verbrauch in günstigen Stunden / Verbrauch mit bekanntem Preis
+# - Geräte-Effizienz: Summe und Anzahl der Effizienzklassen-Ränge
+# - Regelmäßigkeit: Stunden mit Daten / Stunden seit dem ersten Messwert.
+#   Verspätete Messwerte zählen mit, solange sie höchstens SCORE_LATE_READING_HOURS
+#   hinter dem neuesten Messwert des Nutzers liegen (Ringpuffer der letzten Stunden).
+# - Geräteklassen kommen aus dem Knowledge Graph (backfill_devices, im Ingest-Worker).
+# Alle Aggregate liegen spaltenweise in NumPy-Arrays (eine Zeile pro Nutzer),
+# damit Backfill und Rangliste vektorisiert über alle Nutzer laufen.
+# ---------------------------------------------------------------------------
+import os
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from advisory_services.product_catalog import EFFICIENCY_CLASSES
+
+SCORE_SAVINGS_TARGET_EUR = float(os.environ.get("SCORE_SAVINGS_TARGET_EUR", "500"))
+SCORE_CHEAP_PRICE_EUR_KWH = float(os.environ.get("SCORE_CHEAP_PRICE_EUR_KWH", "0.15"))
+SCORE_LEADERBOARD_MAX_AGE_SECONDS = float(os.environ.get("SCORE_LEADERBOARD_MAX_AGE_SECONDS", "300"))
+SCORE_SNAPSHOT_PATH = os.environ.get("SCORE_SNAPSHOT_PATH")
+# So weit (in Stunden) darf ein Messwert hinter dem neuesten des Nutzers liegen und zählt noch
+SCORE_LATE_READING_HOURS = int(os.environ.get("SCORE_LATE_READING_HOURS", "48"))
+
+# Gewichte der Teil-Scores (Summe = 1)
+WEIGHT_SAVINGS = 0.40
+WEIGHT_LOAD_SHIFTING = 0.25
+WEIGHT_EFFICIENCY = 0.20
+WEIGHT_REGULARITY = 0.15
+
+_MONTHS = 12
+_WORST_RANK = len(EFFICIENCY_CLASSES) - 1
+_EFFICIENCY_RANK = {label: rank for rank, label in enumerate(EFFICIENCY_CLASSES)}
+
+# Spalten der Aggregate: (Name, dtype, Form pro Nutzer)
+_COLUMNS = {
+    "monthly_savings": (np.float64, (_MONTHS,)),
+    "bucket_month": (np.int64, (_MONTHS,)),      # welcher Monat gerade im Bucket steht
+    "priced_kwh": (np.float64, ()),
+    "cheap_kwh": (np.float64, ()),
+    "efficiency_rank_sum": (np.float64, ()),
+    "device_count": (np.int64, ()),
+    "active_hours": (np.int64, ()),
+    "first_hour": (np.int64, ()),
+    "last_hour": (np.int64, ()),
+    # Ringpuffer: Slot h % N hält die neueste gezählte Stunde h mit diesem Rest
+    "recent_hours": (np.int64, (SCORE_LATE_READING_HOURS,)),
+}
+_UNSET_COLUMNS = ("bucket_month", "first_hour", "last_hour", "recent_hours")
+
+
+def _month_index(ts: datetime) -> int:
+    return (ts.year - 1970) * 12 + ts.month - 1
+
+
+def _epoch_hour(ts: datetime) -> int:
+    return int(ts.timestamp()) // 3600
+
+
+class ScoreStore:
+    """Laufende Score-Aggregate aller Nutzer plus vorberechnete Rangliste."""
+    def __init__(self, capacity: int = 1024):
+        self._slots: dict[str, int] = {}
+        self._user_ids: list[str] = []
+        self._devices: dict[tuple[int, str], int] = {}
+        self.late_readings_dropped = 0
+        self._arrays = {name: self._empty(name, capacity) for name in _COLUMNS}
+        # Vorberechnete Rangliste (absteigend nach Score) und sortierte Scores für Perzentile
+        self._ranking: np.ndarray = np.empty(0, dtype=np.int64)
+        self._ranked_scores: np.ndarray = np.empty(0)
+        self._sorted_scores: np.ndarray = np.empty(0)
+        self._ranked_at = 0.0
+        self._dirty = True
+
+    @staticmethod
+    def _empty(name: str, rows: int) -> np.ndarray:
+        dtype, shape = _COLUMNS[name]
+        fill = -1 if name in _UNSET_COLUMNS else 0
+        return np.full((rows, *shape), fill, dtype=dtype)
+
+    def __len__(self) -> int:
+        return len(self._user_ids)
+
+    def _slot(self, user_id: str) -> int:
+        slot = self._slots.get(user_id)
+        if slot is None:
+            user_id = str(user_id)
+            slot = len(self._user_ids)
+            capacity = len(self._arrays["priced_kwh"])
+            if slot >= capacity:
+                for name, array in self._arrays.items():
+                    grown = self._empty(name, capacity * 2)
+                    grown[:capacity] = array
+                    self._arrays[name] = grown
+            self._slots[user_id] = slot
+            self._user_ids.append(user_id)
+        return slot
+
+    # --- Inkrementelle Updates (O(1) pro Aufruf) ----------------------------
+
+    def record_reading(self, user_id: str, timestamp: datetime, consumption_kwh: float,
+                       savings_eur: float, price_eur_kwh: float | None = None):
+        """Schreibt einen normalisierten Messwert in die Aggregate des Nutzers."""
+        a, slot = self._arrays, self._slot(user_id)
+        month = _month_index(timestamp)
+        bucket = month % _MONTHS
+        if a["bucket_month"][slot, bucket] != month:
+            # Der Bucket gehört zu einem Monat vor über einem Jahr -> neu beginnen
+            a["bucket_month"][slot, bucket] = month
+            a["monthly_savings"][slot, bucket] = 0.0
+        a["monthly_savings"][slot, bucket] += savings_eur
+
+        if price_eur_kwh is not None:
+            a["priced_kwh"][slot] += consumption_kwh
+            if price_eur_kwh < SCORE_CHEAP_PRICE_EUR_KWH:
+                a["cheap_kwh"][slot] += consumption_kwh
+
+        self._record_hour(slot, _epoch_hour(timestamp))
+        self._dirty = True
+
+    def _record_hour(self, slot: int, hour: int):
+        """Zählt eine Stunde mit Daten genau einmal, auch wenn Messwerte ungeordnet ankommen."""
+        a = self._arrays
+        ring = a["recent_hours"][slot]
+        seen = ring[hour % SCORE_LATE_READING_HOURS]
+        if seen == hour:
+            return
+        if seen > hour:
+            # Mehr als SCORE_LATE_READING_HOURS hinter dem neuesten Messwert: nicht mehr
+            # entscheidbar, ob die Stunde schon gezählt wurde (exakt nur per backfill)
+            self.late_readings_dropped += 1
+            return
+        ring[hour % SCORE_LATE_READING_HOURS] = hour
+        a["active_hours"][slot] += 1
+        if a["first_hour"][slot] < 0 or hour < a["first_hour"][slot]:
+            a["first_hour"][slot] = hour
+        if hour > a["last_hour"][slot]:
+            a["last_hour"][slot] = hour
+
+    def record_device(self, user_id: str, device_id: str, efficiency_class: str):
+        """Neues oder geändertes Gerät; ersetzt die bisherige Klasse desselben Geräts."""
+        a, slot = self._arrays, self._slot(user_id)
+        rank = _EFFICIENCY_RANK.get(str(efficiency_class).strip().upper(), _WORST_RANK)
+        previous = self._devices.get((slot, device_id))
+        if previous is None:
+            a["device_count"][slot] += 1
+        else:
+            a["efficiency_rank_sum"][slot] -= previous
+        a["efficiency_rank_sum"][slot] += rank
+        self._devices[(slot, device_id)] = rank
+        self._dirty = True
+
+    # --- Vektorisierte Auswertung -------------------------------------------
+
+    def factor_scores(self, now: datetime | None = None, rows: slice | None = None) -> dict[str, np.ndarray]:
+        """Teil-Scores (0-100) als Arrays, Reihenfolge wie die Slots (alle Nutzer oder nur `rows`)."""
+        now = now or datetime.now(timezone.utc)
+        rows = rows or slice(0, len(self._user_ids))
+        a = {name: array[rows] for name, array in self._arrays.items()}
+        current_month = _month_index(now)
+        in_window = (a["bucket_month"] > current_month - _MONTHS) & (a["bucket_month"] <= current_month)
+        savings_12m = np.where(in_window, a["monthly_savings"], 0.0).sum(axis=1)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            shifting = np.where(a["priced_kwh"] > 0, a["cheap_kwh"] / a["priced_kwh"], 0.0)
+            avg_rank = np.where(a["device_count"] > 0, a["efficiency_rank_sum"] / a["device_count"], _WORST_RANK)
+            span = np.maximum(_epoch_hour(now) - a["first_hour"] + 1, 1)
+            regularity = np.where(a["first_hour"] >= 0, a["active_hours"] / span, 0.0)
+        return {
+            "savings": np.clip(savings_12m / SCORE_SAVINGS_TARGET_EUR, 0.0, 1.0) * 100,
+            "load_shifting": np.clip(shifting, 0.0, 1.0) * 100,
+            "efficiency": (1 - avg_rank / _WORST_RANK) * 100,
+            "regularity": np.clip(regularity, 0.0, 1.0) * 100,
+        }
+
+    def scores(self, now: datetime | None = None, rows: slice | None = None) -> np.ndarray:
+        factors = self.factor_scores(now, rows)
+        return np.round(
+            WEIGHT_SAVINGS * factors["savings"] + WEIGHT_LOAD_SHIFTING * factors["load_shifting"]
+            + WEIGHT_EFFICIENCY * factors["efficiency"] + WEIGHT_REGULARITY * factors["regularity"],
+            1,
+        )
+
+    def score(self, user_id: str, now: datetime | None = None) -> float | None:
+        slot = self._slots.get(user_id)
+        if slot is None:
+            return None
+        return float(self.scores(now, slice(slot, slot + 1))[0])
+
+    # --- Backfill -----------------------------------------------------------
+
+    def backfill(self, user_ids, timestamps, consumption_kwh, savings_eur, price_eur_kwh=None,
+                 now: datetime | None = None):
+        """
+        Baut die Messwert-Aggregate aller betroffenen Nutzer vektorisiert aus der Historie neu auf
+        (ersetzt deren bisherige Werte). `timestamps` als datetime64 oder tz-aware datetimes (UTC).
+        `price_eur_kwh` darf NaN enthalten (Preis unbekannt).
+        """
+        now = now or datetime.now(timezone.utc)
+        user_ids = np.asarray(user_ids, dtype=object)
+        ts = np.asarray(timestamps)
+        if ts.dtype == object:
+            ts = np.array([t.astimezone(timezone.utc).replace(tzinfo=None) for t in ts], dtype="datetime64[s]")
+        ts = ts.astype("datetime64[s]")
+        consumption_kwh = np.asarray(consumption_kwh, dtype=np.float64)
+        savings_eur = np.asarray(savings_eur, dtype=np.float64)
+        prices = np.full(len(ts), np.nan) if price_eur_kwh is None else np.asarray(price_eur_kwh, dtype=np.float64)
+
+        slots = np.fromiter((self._slot(u) for u in user_ids), dtype=np.int64, count=len(user_ids))
+        touched = np.unique(slots)
+        a = self._arrays
+        for name in ("monthly_savings", "bucket_month", "priced_kwh", "cheap_kwh",
+                     "active_hours", "first_hour", "last_hour", "recent_hours"):
+            a[name][touched] = self._empty(name, len(touched))
+
+        # Ersparnis: nur die letzten 12 Monate (bezogen auf `now`) landen in den Buckets
+        months = ts.astype("datetime64[M]").astype(np.int64)
+        current_month = _month_index(now)
+        recent = (months > current_month - _MONTHS) & (months <= current_month)
+        buckets = months % _MONTHS
+        np.add.at(a["monthly_savings"], (slots[recent], buckets[recent]), savings_eur[recent])
+        a["bucket_month"][slots[recent], buckets[recent]] = months[recent]
+
+        priced = ~np.isnan(prices)
+        np.add.at(a["priced_kwh"], slots[priced], consumption_kwh[priced])
+        cheap = priced & (np.nan_to_num(prices, nan=np.inf) < SCORE_CHEAP_PRICE_EUR_KWH)
+        np.add.at(a["cheap_kwh"], slots[cheap], consumption_kwh[cheap])
+
+        hours = ts.astype(np.int64) // 3600
+        pairs = np.unique(np.stack((slots, hours), axis=1), axis=0)
+        np.add.at(a["active_hours"], pairs[:, 0], 1)
+        a["first_hour"][touched] = np.iinfo(np.int64).max
+        np.minimum.at(a["first_hour"], slots, hours)
+        np.maximum.at(a["last_hour"], slots, hours)
+        # Pro Rest die neueste Stunde, damit spätere record_reading-Aufrufe nahtlos anschließen
+        np.maximum.at(a["recent_hours"], (pairs[:, 0], pairs[:, 1] % SCORE_LATE_READING_HOURS), pairs[:, 1])
+        self._dirty = True
+
+    def backfill_devices(self, user_ids, device_ids, efficiency_classes):
+        """
+        Ersetzt die Geräte-Aggregate der betroffenen Nutzer durch den übergebenen Bestand
+        (z.B. alle Geräte mit Effizienzklasse aus dem Knowledge Graph).
+        """
+        slots = {self._slot(user_id) for user_id in user_ids}
+        self._devices = {key: rank for key, rank in self._devices.items() if key[0] not in slots}
+        touched = np.fromiter(slots, dtype=np.int64, count=len(slots))
+        self._arrays["efficiency_rank_sum"][touched] = 0.0
+        self._arrays["device_count"][touched] = 0
+        for user_id, device_id, efficiency_class in zip(user_ids, device_ids, efficiency_classes):
+            self.record_device(user_id, device_id, efficiency_class)
+        self._dirty = True
+
+    # --- Rangliste ----------------------------------------------------------
+
+    def _ensure_ranking(self):
+        stale = self._dirty and time.monotonic() - self._ranked_at >= SCORE_LEADERBOARD_MAX_AGE_SECONDS
+        if stale or len(self._ranked_scores) != len(self._user_ids):
+            self.refresh_ranking()
+
+    def refresh_ranking(self, now: datetime | None = None):
+        """Sortiert alle Nutzer einmal; Rangliste und Perzentile lesen danach nur noch den Index."""
+        self._ranked_scores = self.scores(now)
+        self._ranking = np.argsort(-self._ranked_scores, kind="stable")
+        self._sorted_scores = self._ranked_scores[self._ranking[::-1]]
+        self._ranked_at = time.monotonic()
+        self._dirty = False
+
+    def leaderboard(self, top_n: int = 10) -> list[dict]:
+        self._ensure_ranking()
+        return [
+            {"rank": i + 1, "user_id": self._user_ids[slot], "score": float(self._ranked_scores[slot])}
+            for i, slot in enumerate(self._ranking[:top_n])
+        ]
+
+    def percentile(self, user_id: str) -> float | None:
+        """Anteil der Nutzer (in %), deren Score kleiner oder gleich dem des Nutzers ist (Binärsuche)."""
+        slot = self._slots.get(user_id)
+        if slot is None:
+            return None
+        self._ensure_ranking()
+        at_or_below = int(np.searchsorted(self._sorted_scores, self._ranked_scores[slot], side="right"))
+        return round(at_or_below / len(self._sorted_scores) * 100, 1)
+
+    # --- Snapshot (Ingest-Worker schreibt, Advisory-Dienst liest) ----------
+
+    def save(self, path: str):
+        n = len(self._user_ids)
+        tmp = f"{path}.tmp.npz"
+        np.savez(
+            tmp, user_ids=np.array(self._user_ids, dtype=object),
+            device_keys=np.array([[self._user_ids[slot], device] for slot, device in self._devices], dtype=object).reshape(-1, 2),
+            device_ranks=np.array(list(self._devices.values()), dtype=np.int64),
+            **{name: array[:n] for name, array in self._arrays.items()},
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "ScoreStore":
+        data = np.load(path, allow_pickle=True)
+        user_ids = list(data["user_ids"])
+        store = cls(capacity=max(len(user_ids), 1))
+        for user_id in user_ids:
+            store._slot(user_id)
+        n = len(user_ids)
+        for name in _COLUMNS:
+            if name in data.files and data[name].shape[1:] == store._arrays[name].shape[1:]:
+                store._arrays[name][:n] = data[name]
+        if "recent_hours" not in data.files or data["recent_hours"].shape[1:] != store._arrays["recent_hours"].shape[1:]:
+            # Älterer Snapshot bzw. anderes Fenster: die Stunden bis last_hour gelten als gezählt
+            last = store._arrays["last_hour"][:n, None]
+            offsets = np.arange(SCORE_LATE_READING_HOURS)
+            hours = last - (last - offsets) % SCORE_LATE_READING_HOURS
+            store._arrays["recent_hours"][:n] = np.where(last >= 0, hours, -1)
+        for (user_id, device), rank in zip(data["device_keys"], data["device_ranks"]):
+            store._devices[(store._slots[user_id], device)] = int(rank)
+        return store
+
+
+# Globale Instanz; im Advisory-Dienst aus dem Snapshot des Ingest-Workers geladen
+score_store = ScoreStore()
+_snapshot_mtime: float | None = None
+
+
+def _refresh_from_snapshot():
+    global score_store, _snapshot_mtime
+    if not SCORE_SNAPSHOT_PATH or not os.path.exists(SCORE_SNAPSHOT_PATH):
+        return
+    mtime = os.path.getmtime(SCORE_SNAPSHOT_PATH)
+    if mtime != _snapshot_mtime:
+        score_store = ScoreStore.load(SCORE_SNAPSHOT_PATH)
+        _snapshot_mtime = mtime
 
-# from ..database import db_client
 
 async def calculate_score(user_id: str) -> float:
     """
     Berechnet den Energie-Score für einen Nutzer basierend auf seinem Verhalten.
+    Liest nur die laufenden Aggregate, unabhängig von der Länge der Historie.
     """
     print(f"INFO: Berechne Energie-Score für Nutzer {user_id}...")
-    
-    # --- Hier würde die Logik zur Berechnung des Scores stehen ---
-    # Faktoren könnten sein:
-    # - Nachweisliche Ersparnis der letzten 12 Monate.
-    # - Wie gut der Nutzer Lasten in günstige Zeitfenster verschiebt.
-    # - Effizienz der vorhandenen Geräte.
-    # - Regelmäßigkeit der Datenerfassung.
-    
-    # Vorerst ein simulierter Wert
-    score = 85.0 # von 100
+    _refresh_from_snapshot()
+    score = score_store.score(user_id)
+    if score is None:
+        print(f"WARNUNG: Keine Daten für Nutzer {user_id}, Score ist 0.")
+        return 0.0
     print(f"-> Ergebnis: Score ist {score}/100.")
-    return score
\ No newline at end of file
+    return score
+
+
+async def get_leaderboard(top_n: int = 10) -> list[dict]:
+    _refresh_from_snapshot()
+    return score_store.leaderboard(top_n)
+
+
+async def get_percentile(user_id: str) -> float | None:
+    _refresh_from_snapshot()
+    return score_store.percentile(user_id)
@@ -1,9 +1,190 @@
 # Dieses Modul ist der Experte für staatliche Förderungen. Es nutzt eine
 # KI, um immer die aktuellsten Förderrichtlinien zu kennen.
 # ---------------------------------------------------------------------------
+# ÜBERARBEITET: Statt einer entfernten Vektor-DB pro Produkt × Nutzer gibt es
+# jetzt einen lokalen Index (subsidy_index.py) und einen Ergebnis-Cache:
+# - Schlüssel: Produktkategorie + PLZ-Region + Version des Dokumentenbestands
+# - Neue Dokumente -> neue Version -> Index wird neu gebaut, alte Einträge verfallen
+# - Ohne OPENAI_API_KEY werden Betrag und Programm direkt aus den Textstellen gelesen
+# - Ein gemeinsamer OpenAI-Client (beim ersten Bedarf erzeugt, close_openai_client beim Beenden)
+# ---------------------------------------------------------------------------
+import asyncio
+import importlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+from advisory_services.subsidy_index import SubsidyIndex, build_index
+
+if TYPE_CHECKING:
+    import openai
+
+SUBSIDY_DOCS_DIR = os.environ.get("SUBSIDY_DOCS_DIR")
+SUBSIDY_INDEX_DIR = os.environ.get("SUBSIDY_INDEX_DIR", "subsidy_index")
+# So oft wird geprüft, ob sich der Dokumentenbestand geändert hat
+SUBSIDY_INDEX_CHECK_SECONDS = float(os.environ.get("SUBSIDY_INDEX_CHECK_SECONDS", "300"))
+SUBSIDY_CACHE_MAX_ENTRIES = int(os.environ.get("SUBSIDY_CACHE_MAX_ENTRIES", "10000"))
+SUBSIDY_CONTEXT_CHUNKS = int(os.environ.get("SUBSIDY_CONTEXT_CHUNKS", "4"))
+SUBSIDY_LLM_MODEL = os.environ.get("SUBSIDY_LLM_MODEL", "gpt-4o")
+
+# Ergebnis, solange es keine Dokumente gibt (bisheriges Verhalten)
+_DEFAULT_SUBSIDY = {
+    "amount_eur": 12750.0,
+    "program_name": "BEG EM - Einzelmaßnahmen",
+    "conditions": "Tausch einer fossilen Heizung, Einhaltung der Jahresarbeitszahl.",
+}
+
+_index: SubsidyIndex | None = None
+_index_checked_at = 0.0
+_index_lock = asyncio.Lock()
+_cache: OrderedDict[tuple, dict] = OrderedDict()
+_in_flight: dict[tuple, asyncio.Task] = {}
+cache_stats = {"hits": 0, "misses": 0, "coalesced": 0, "rebuilds": 0}
+# Ein Client (und damit ein Verbindungspool) für alle Förder-Anfragen
+_openai_client: "openai.AsyncOpenAI | None" = None
+
+# Ganze Zahl ab Wortanfang: "12750 Euro", "12.750 €" und "1000€" (nicht nur die letzten drei Ziffern)
+_AMOUNT_RE = re.compile(r"\b(\d+(?:\.\d{3})*(?:,\d+)?)\s*(?:€|Euro|EUR)", re.IGNORECASE)
+_PERCENT_RE = re.compile(r"\b(\d{1,3}(?:,\d+)?)\s*(?:%|Prozent)", re.IGNORECASE)
+_PROGRAM_RE = re.compile(r"\b(BEG\s?[A-Z]{2,3}|KfW[\s-]?\d{3}|BAFA[^\s.,;]*)", re.IGNORECASE)
+
+
+def region_of(user_profile: dict) -> str:
+    """PLZ-Region (erste zwei Ziffern) – Förderprogramme unterscheiden sich höchstens regional, nicht pro Hausnummer."""
+    return str(user_profile.get("zip_code") or "")[:2]
+
+
+async def get_index() -> SubsidyIndex | None:
+    """
+    Liefert den aktuellen Index. Höchstens alle SUBSIDY_INDEX_CHECK_SECONDS wird
+    geprüft, ob sich die Dokumente geändert haben; nur dann wird neu gebaut.
+    """
+    global _index, _index_checked_at
+    if not SUBSIDY_DOCS_DIR:
+        return None
+    if _index is not None and time.monotonic() - _index_checked_at < SUBSIDY_INDEX_CHECK_SECONDS:
+        return _index
+    async with _index_lock:
+        if _index is not None and time.monotonic() - _index_checked_at < SUBSIDY_INDEX_CHECK_SECONDS:
+            return _index
+        try:
+            rebuilt = await asyncio.to_thread(build_index, SUBSIDY_DOCS_DIR, SUBSIDY_INDEX_DIR)
+            if rebuilt or _index is None:
+                cache_stats["rebuilds"] += int(rebuilt)
+                _index = await asyncio.to_thread(SubsidyIndex, SUBSIDY_INDEX_DIR)
+        except Exception as e:
+            # Mit dem alten Index weiterarbeiten, falls es einen gibt
+            print(f"FEHLER: Förder-Index konnte nicht aktualisiert werden: {e}")
+        _index_checked_at = time.monotonic()
+    return _index
+
+
+def _parse_amount(text: str) -> float | None:
+    match = _AMOUNT_RE.search(text)
+    if not match:
+        return None
+    return float(match.group(1).replace(".", "").replace(",", "."))
+
+
+def extract_subsidy(context: list[dict], product: dict) -> dict:
+    """
+    Liest Förderbetrag, Programm und Bedingungen direkt aus den gefundenen Textstellen
+    (deterministisch, ohne LLM). Ein Prozentsatz wird als `rate_percent` zurückgegeben
+    und erst in _for_product auf den Produktpreis angewendet. Textstellen, die den Gerätetyp ausdrücklich nennen, haben Vorrang.
+    """
+    device_type = str(product.get("type") or "").lower()
+    context = sorted(context, key=lambda c: device_type not in c["text"].lower()) if device_type else context
+    for chunk in context:
+        text = chunk["text"]
+        amount = _parse_amount(text)
+        percent = _PERCENT_RE.search(text)
+        if amount is None and percent is None:
+            continue
+        program = _PROGRAM_RE.search(text)
+        sentence = next((s.strip() for s in re.split(r"(?<=[.!?])\s+", text) if _AMOUNT_RE.search(s) or _PERCENT_RE.search(s)), text[:200])
+        result = {
+            "amount_eur": amount or 0.0,
+            "program_name": program.group(1) if program else chunk["source"],
+            "conditions": sentence,
+        }
+        if amount is None:
+            result["rate_percent"] = float(percent.group(1).replace(",", "."))
+        return result
+    return {"amount_eur": 0.0, "program_name": None, "conditions": "Keine passende Förderung in den Richtlinien gefunden."}
+
+
+def _for_product(result: dict, product: dict) -> dict:
+    """Kopie des gecachten Ergebnisses; prozentuale Förderungen werden auf den Produktpreis umgerechnet."""
+    result = dict(result)
+    rate = result.pop("rate_percent", None)
+    if rate is not None:
+        result["amount_eur"] = round(float(product.get("price_eur") or 0.0) * rate / 100, 2)
+    return result
+
+
+async def _get_openai_client() -> "openai.AsyncOpenAI | None":
+    """Der gemeinsame Client; wird beim ersten Aufruf erzeugt (None ohne OPENAI_API_KEY)."""
+    global _openai_client
+    if _openai_client is None:
+        api_key = os.environ.get("OPENAI_API_KEY")
+        if not api_key:
+            return None
+        # Import im Thread, damit der Event-Loop währenddessen weiterläuft
+        openai_module = await asyncio.to_thread(importlib.import_module, "openai")
+        if _openai_client is None:
+            _openai_client = openai_module.AsyncOpenAI(api_key=api_key)
+    return _openai_client
+
+
+async def close_openai_client():
+    """Schließt den gemeinsamen Client (beim Herunterfahren des Dienstes)."""
+    global _openai_client
+    client, _openai_client = _openai_client, None
+    if client is not None:
+        await client.close()
+
+
+async def _ask_llm(question: str, context: list[dict]) -> dict | None:
+    """Präzise Anfrage an das LLM mit den gefundenen Textstellen als Kontext (nur mit OPENAI_API_KEY)."""
+    client = await _get_openai_client()
+    if client is None:
+        return None
+    context_text = "\n\n".join(f"[{c['source']}]\n{c['text']}" for c in context)
+    prompt = (
+        f"Kontext: {context_text}\n\nFrage: {question}\n\n"
+        'Antworte als JSON: {"amount_eur": Zahl, "program_name": "...", "conditions": "..."}'
+    )
+    try:
+        response = await client.chat.completions.create(
+            model=SUBSIDY_LLM_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            response_format={"type": "json_object"},
+            temperature=0,
+        )
+        result = json.loads(response.choices[0].message.content)
+        return {"amount_eur": float(result["amount_eur"]), "program_name": result.get("program_name"), "conditions": result.get("conditions")}
+    except Exception as e:
+        print(f"FEHLER: Förder-Anfrage an das LLM fehlgeschlagen: {e}")
+        return None
+
+
+async def _lookup(index: SubsidyIndex, product: dict, user_profile: dict) -> dict:
+    # --- Schritt 1: Relevanten Kontext aus dem lokalen Index holen ---
+    query = f"Förderung für {product.get('type')} {product.get('name')} Effizienzklasse {product.get('efficiency_class')} in PLZ-Region {region_of(user_profile)}"
+    print("-> Schritt 1/3: Finde relevante Förder-Dokumente...")
+    context = [chunk for _, chunk in await asyncio.to_thread(index.search, query, SUBSIDY_CONTEXT_CHUNKS)]
+
+    # --- Schritt 2: Präzise Anfrage an den LLM stellen (falls konfiguriert) ---
+    print("-> Schritt 2/3: Stelle präzise Anfrage an den LLM...")
+    result = await _ask_llm(query, context) if context else None
+
+    # --- Schritt 3: Ohne LLM-Antwort direkt aus den Textstellen extrahieren ---
+    print("-> Schritt 3/3: Wandle Antwort in strukturierte Daten um...")
+    return result or extract_subsidy(context, product)
 
-# import openai
-# from ..vector_db import vdb_client # Beispiel für eine Vektor-Datenbank
 
 async def get_subsidies(product: dict, user_profile: dict) -> dict:
     """
@@ -11,29 +192,27 @@ async def get_subsidies(product: dict, user_profile: dict) -> dict:
     und ein Nutzerprofil.
     """
     print(f"INFO: Suche Förderungen für Produkt '{product.get('name')}'...")
+    index = await get_index()
+    if index is None:
+        return dict(_DEFAULT_SUBSIDY)
 
-    # --- Schritt 1: Relevanten Kontext aus der Vektor-Datenbank holen ---
-    # Hier würdest du eine Suche in deiner Vektor-DB starten, die mit den
-    # aktuellen PDF-Dokumenten von BAFA/KfW gefüttert wurde.
-    # query = f"Förderung für Wärmepumpe {product.get('name')} für ein Einfamilienhaus in PLZ {user_profile.get('zip_code')} bei Tausch einer Ölheizung."
-    # relevant_docs = await vdb_client.search(query)
-    print("-> Schritt 1/3: Finde relevante Förder-Dokumente...")
-
-    # --- Schritt 2: Präzise Anfrage an den LLM stellen ---
-    # Der LLM bekommt die Frage und die relevanten Textstellen aus den PDFs als Kontext.
-    # So kann er eine präzise, auf Fakten basierende Antwort geben.
-    # prompt = f"Kontext: {relevant_docs}\n\nFrage: {query}\n\nAntworte mit dem exakten Förderbetrag in Euro und den wichtigsten Bedingungen."
-    # llm_response = await openai.chat.completions.create(...)
-    print("-> Schritt 2/3: Stelle präzise Anfrage an den LLM...")
+    key = (str(product.get("type", "")).strip().lower(), region_of(user_profile), index.version)
+    if key in _cache:
+        cache_stats["hits"] += 1
+        _cache.move_to_end(key)
+        return _for_product(_cache[key], product)
+    if key in _in_flight:
+        cache_stats["coalesced"] += 1
+        return _for_product(await asyncio.shield(_in_flight[key]), product)
 
-    # --- Schritt 3: Antwort des LLM parsen und strukturieren ---
-    # Die Text-Antwort der KI wird in ein sauberes Datenobjekt umgewandelt.
-    # subsidy_details = parse_llm_response(llm_response)
-    print("-> Schritt 3/3: Wandle KI-Antwort in strukturierte Daten um...")
-
-    # Vorerst geben wir ein simuliertes Ergebnis zurück
-    return {
-        "amount_eur": 12750.0,
-        "program_name": "BEG EM - Einzelmaßnahmen",
-        "conditions": "Tausch einer fossilen Heizung, Einhaltung der Jahresarbeitszahl."
-    }
+    cache_stats["misses"] += 1
+    task = asyncio.ensure_future(_lookup(index, product, user_profile))
+    _in_flight[key] = task
+    try:
+        result = await asyncio.shield(task)
+    finally:
+        _in_flight.pop(key, None)
+    _cache[key] = result
+    while len(_cache) > SUBSIDY_CACHE_MAX_ENTRIES:
+        _cache.popitem(last=False)
+    return _for_product(result, product)
@@ -0,0 +1,222 @@
+# Lokaler Vektor-Index für Förder-Dokumente (BAFA/KfW-Richtlinien).
+# Ersetzt die entfernte Vektor-Datenbank aus dem ursprünglichen Entwurf.
+# ---------------------------------------------------------------------------
+# - Offline-Aufbau: Dokumente in Abschnitte zerlegen, einbetten und als
+#   NumPy-Matrix (float32, L2-normiert) auf die Platte schreiben
+# - Abfragen im Prozess über eine memory-mapped Matrix, approximativ per
+#   IVF (k-Means-Zentroiden, nur die nächsten `nprobe` Listen werden durchsucht)
+# - Neuaufbau nur, wenn sich die Dokumente geändert haben (Version = Hash der Inhalte)
+# - Jeder Aufbau landet in einem eigenen Unterverzeichnis; die Datei CURRENT
+#   zeigt auf das gültige und wird als Letztes atomar ersetzt
+# - Standard-Embedding ist deterministisches Feature-Hashing: läuft komplett
+#   offline und liefert in Tests immer dieselben Vektoren
+#
+# Offline-Aufbau: python -m advisory_services.subsidy_index <dokumente> <index>
+# ---------------------------------------------------------------------------
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+from typing import Callable
+
+import numpy as np
+
+EMBEDDING_DIM = int(os.environ.get("SUBSIDY_EMBEDDING_DIM", "384"))
+CHUNK_WORDS = int(os.environ.get("SUBSIDY_CHUNK_WORDS", "180"))
+CHUNK_OVERLAP_WORDS = int(os.environ.get("SUBSIDY_CHUNK_OVERLAP_WORDS", "40"))
+# Unterhalb dieser Größe wird exakt gesucht, darüber per IVF
+IVF_MIN_CHUNKS = int(os.environ.get("SUBSIDY_IVF_MIN_CHUNKS", "2048"))
+IVF_NPROBE = int(os.environ.get("SUBSIDY_IVF_NPROBE", "8"))
+
+SUPPORTED_SUFFIXES = (".txt", ".md", ".pdf")
+# Zeiger auf das Unterverzeichnis des gültigen Aufbaus
+CURRENT_POINTER = "CURRENT"
+Embedder = Callable[[list[str]], np.ndarray]
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def hash_embedding(texts: list[str], dim: int = EMBEDDING_DIM) -> np.ndarray:
+    """
+    Deterministisches Embedding per Feature-Hashing über Wörter und Wort-Bigramme.
+    Kein Modell, kein Netzwerk – ähnlicher Wortschatz ergibt ähnliche Vektoren.
+    """
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        tokens = _TOKEN_RE.findall(text.lower())
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % dim
+            matrix[row, bucket] += 1.0 if digest[4] & 1 else -1.0
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+def chunk_text(text: str, words: int = CHUNK_WORDS, overlap: int = CHUNK_OVERLAP_WORDS) -> list[str]:
+    """Zerlegt einen Text in überlappende Abschnitte fester Wortanzahl."""
+    tokens = text.split()
+    if not tokens:
+        return []
+    step = max(words - overlap, 1)
+    return [" ".join(tokens[i:i + words]) for i in range(0, max(len(tokens) - overlap, 1), step)]
+
+
+def _read_document(path: str) -> str:
+    if path.endswith(".pdf"):
+        try:
+            from pypdf import PdfReader
+        except ImportError as e:
+            raise RuntimeError("Für PDF-Dokumente wird 'pypdf' benötigt.") from e
+        return "\n".join(page.extract_text() or "" for page in PdfReader(path).pages)
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def _document_paths(docs_dir: str) -> list[str]:
+    return sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(docs_dir)
+        for name in names
+        if name.lower().endswith(SUPPORTED_SUFFIXES)
+    )
+
+
+def documents_version(docs_dir: str) -> str:
+    """Hash über Dateinamen und Inhalte aller Dokumente – ändert sich nur, wenn sich Dokumente ändern."""
+    digest = hashlib.sha256()
+    for path in _document_paths(docs_dir):
+        digest.update(os.path.relpath(path, docs_dir).encode("utf-8"))
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def _kmeans(vectors: np.ndarray, clusters: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Einfaches sphärisches k-Means (Kosinus), reicht für die IVF-Grobquantisierung."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        for c in range(clusters):
+            members = vectors[assignment == c]
+            if len(members):
+                centroid = members.sum(axis=0)
+                centroids[c] = centroid / max(np.linalg.norm(centroid), 1e-12)
+    return centroids
+
+
+def current_dir(index_dir: str) -> str:
+    """Verzeichnis des gültigen Aufbaus (ohne CURRENT: das alte, flache Layout in `index_dir` selbst)."""
+    try:
+        with open(os.path.join(index_dir, CURRENT_POINTER), encoding="utf-8") as f:
+            return os.path.join(index_dir, f.read().strip())
+    except FileNotFoundError:
+        return index_dir
+
+
+def build_index(docs_dir: str, index_dir: str, embed: Embedder = hash_embedding, force: bool = False) -> bool:
+    """
+    Baut den Index auf, falls sich die Dokumente seit dem letzten Aufbau geändert haben.
+    Gibt True zurück, wenn neu gebaut wurde.
+    """
+    version = documents_version(docs_dir)
+    manifest_path = os.path.join(current_dir(index_dir), "manifest.json")
+    if not force and os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            if json.load(f).get("version") == version:
+                return False
+
+    print(f"INFO: Baue Förder-Index für '{docs_dir}' (Version {version})...")
+    chunks: list[dict] = []
+    for path in _document_paths(docs_dir):
+        source = os.path.relpath(path, docs_dir)
+        chunks.extend({"source": source, "text": text} for text in chunk_text(_read_document(path)))
+    embeddings = embed([c["text"] for c in chunks]) if chunks else np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+
+    # IVF: Abschnitte nach Zentroid gruppieren, damit jede Liste zusammenhängend in der Matrix liegt
+    lists = 0
+    offsets = np.array([0, len(chunks)], dtype=np.int64)
+    centroids = np.zeros((0, embeddings.shape[1]), dtype=np.float32)
+    if len(chunks) >= IVF_MIN_CHUNKS:
+        lists = int(np.sqrt(len(chunks)))
+        centroids = _kmeans(embeddings, lists).astype(np.float32)
+        assignment = np.argmax(embeddings @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind="stable")
+        embeddings = embeddings[order]
+        chunks = [chunks[i] for i in order]
+        offsets = np.searchsorted(assignment[order], np.arange(lists + 1)).astype(np.int64)
+
+    # Alle Dateien in ein neues Unterverzeichnis schreiben und erst dann CURRENT per
+    # os.replace umstellen: Leser sehen entweder den alten oder den neuen Index, nie eine Mischung
+    os.makedirs(index_dir, exist_ok=True)
+    previous = os.path.basename(current_dir(index_dir))
+    build_dir = tempfile.mkdtemp(prefix=f"v-{version}-", dir=index_dir)
+    np.save(os.path.join(build_dir, "embeddings.npy"), embeddings)
+    np.save(os.path.join(build_dir, "centroids.npy"), centroids)
+    np.save(os.path.join(build_dir, "offsets.npy"), offsets)
+    with open(os.path.join(build_dir, "chunks.json"), "w", encoding="utf-8") as f:
+        json.dump(chunks, f, ensure_ascii=False)
+    with open(os.path.join(build_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump({"version": version, "chunks": len(chunks), "dim": int(embeddings.shape[1]), "lists": lists}, f)
+    pointer_tmp = os.path.join(index_dir, f".{CURRENT_POINTER}.tmp")
+    with open(pointer_tmp, "w", encoding="utf-8") as f:
+        f.write(os.path.basename(build_dir))
+    os.replace(pointer_tmp, os.path.join(index_dir, CURRENT_POINTER))
+
+    # Den vorherigen Aufbau behalten (Leser, die ihn gerade öffnen), ältere entfernen
+    for name in os.listdir(index_dir):
+        if name.startswith("v-") and name not in (os.path.basename(build_dir), previous):
+            shutil.rmtree(os.path.join(index_dir, name), ignore_errors=True)
+    print(f"INFO: Förder-Index gebaut: {len(chunks)} Abschnitte, {lists} IVF-Listen.")
+    return True
+
+
+class SubsidyIndex:
+    """Lesezugriff auf einen gebauten Index; die Embedding-Matrix wird nur gemappt, nicht geladen."""
+    def __init__(self, index_dir: str, embed: Embedder = hash_embedding, nprobe: int = IVF_NPROBE):
+        index_dir = current_dir(index_dir)
+        with open(os.path.join(index_dir, "manifest.json"), encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.version: str = manifest["version"]
+        self.embed = embed
+        self.nprobe = nprobe
+        self.embeddings = np.load(os.path.join(index_dir, "embeddings.npy"), mmap_mode="r")
+        self.centroids = np.load(os.path.join(index_dir, "centroids.npy"))
+        self.offsets = np.load(os.path.join(index_dir, "offsets.npy"))
+        with open(os.path.join(index_dir, "chunks.json"), encoding="utf-8") as f:
+            self.chunks: list[dict] = json.load(f)
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def search(self, query: str, k: int = 4) -> list[tuple[float, dict]]:
+        """Die `k` ähnlichsten Abschnitte als (Kosinus-Ähnlichkeit, Abschnitt)."""
+        if not self.chunks or k <= 0:
+            return []
+        q = self.embed([query])[0].astype(np.float32)
+        if len(self.centroids):
+            probes = np.argsort(self.centroids @ q)[::-1][: self.nprobe]
+            ranges = [(int(self.offsets[p]), int(self.offsets[p + 1])) for p in probes]
+        else:
+            ranges = [(0, len(self.chunks))]
+        candidates = np.concatenate([np.arange(start, end) for start, end in ranges])
+        scores = np.concatenate([np.asarray(self.embeddings[start:end]) @ q for start, end in ranges])
+        if scores.size > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(scores.size)
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(float(scores[i]), self.chunks[int(candidates[i])]) for i in top]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Aufruf: python -m advisory_services.subsidy_index <dokumente-verzeichnis> <index-verzeichnis>")
+        sys.exit(2)
+    build_index(sys.argv[1], sys.argv[2])
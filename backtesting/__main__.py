@@ -0,0 +1,82 @@
+# ---------------------------------------------------------------------------
+# backtesting/__main__.py
+# ---------------------------------------------------------------------------
+# Aufruf aus dem Repo-Wurzelverzeichnis, z.B.:
+#   python -m backtesting --prices awattar_2024.json --irradiance frankfurt.json \
+#       --irradiance muenchen.json --households 10000 \
+#       --strategy rules --strategy "rules:high_price_eur_kwh=0.25,solar_wait_w_m2=200" \
+#       --agent recorded:llm_decisions.jsonl
+#
+# LLM-Entscheidungen aufnehmen (einmalig, kostet echte LLM- bzw. Optimierer-Aufrufe):
+#   python -m backtesting --prices ... --irradiance ... --record-agent llm_decisions.jsonl --record-hours 48
+# ---------------------------------------------------------------------------
+import argparse
+import asyncio
+import json
+import sys
+
+from backtesting import data, engine
+from backtesting.agents import RecordedAgent, StubAgent, record_decisions
+
+
+def parse_strategy(spec: str, agent) -> engine.RulesStrategy:
+    """'rules' oder 'rules:schwelle=wert,...' (Schwellen wie in vector_rules.rule_thresholds)."""
+    kind, _, params = spec.partition(":")
+    if kind != "rules":
+        raise ValueError(f"Unbekannte Strategie '{kind}'.")
+    thresholds = {key.strip(): float(value) for key, value in (p.split("=", 1) for p in params.split(",") if p)}
+    return engine.RulesStrategy(thresholds or None, agent=agent)
+
+
+def parse_agent(spec: str | None):
+    """'stub', 'stub:<Action>' oder 'recorded:<pfad.jsonl>'."""
+    if not spec:
+        return None
+    kind, _, arg = spec.partition(":")
+    if kind == "stub":
+        return StubAgent(arg) if arg else StubAgent()
+    if kind == "recorded":
+        return RecordedAgent(arg)
+    raise ValueError(f"Unbekannter Agent '{kind}'.")
+
+
+async def _record(path: str, hours, prices, solar, count: int) -> int:
+    # Erst hier importieren: zieht die API samt LLM-Client nur für die Aufnahme nach
+    from optimisation_api.logic import llm_agent
+    from optimisation_api.main import fallback_decision
+    await llm_agent.initialize_openai()
+    return await record_decisions(fallback_decision, hours[:count], prices[:count], solar[:count, 0], path, engine.known_price_end)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(prog="python -m backtesting")
+    parser.add_argument("--prices", required=True, help="aWATTar-JSON oder CSV")
+    parser.add_argument("--irradiance", required=True, action="append", help="Open-Meteo-JSON oder CSV, pro Standort eine Datei")
+    parser.add_argument("--households", type=int, default=10_000)
+    parser.add_argument("--strategy", action="append", help="'rules' oder 'rules:schwelle=wert,...' (mehrfach möglich)")
+    parser.add_argument("--agent", help="Ersatz für das LLM: 'stub', 'stub:<Action>' oder 'recorded:<pfad>'")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--record-agent", help="Entscheidungen von fallback_decision als JSONL aufnehmen")
+    parser.add_argument("--record-hours", type=int, default=24)
+    args = parser.parse_args(argv)
+
+    hours, prices, solar = data.align(data.load_prices(args.prices), [data.load_irradiance(p) for p in args.irradiance])
+    print(f"INFO: {len(hours)} Stunden, {solar.shape[1]} Standorte geladen.", file=sys.stderr)
+
+    if args.record_agent:
+        written = asyncio.run(_record(args.record_agent, hours, prices, solar, args.record_hours))
+        print(f"INFO: {written} Entscheidungen nach '{args.record_agent}' geschrieben.", file=sys.stderr)
+        return
+
+    households = engine.make_households(args.households, solar.shape[1], seed=args.seed)
+    results = []
+    for spec in args.strategy or ["rules"]:
+        # Jede Strategie bekommt ihren eigenen Agenten, damit die Zähler getrennt bleiben
+        strategy = parse_strategy(spec, parse_agent(args.agent))
+        results.append(engine.simulate(hours, prices, solar, households, strategy, seed=args.seed))
+        print(f"INFO: Strategie '{strategy.name}' in {results[-1]['duration_s']:.1f}s simuliert.", file=sys.stderr)
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# ---------------------------------------------------------------------------
+# backtesting/agents.py
+# ---------------------------------------------------------------------------
+# Ersatz für den LLM-Pfad im Backtest. Ein Agent entscheidet für alle Haushalte
+# einer Stunde, bei denen keine schnelle Regel gegriffen hat, und gibt pro
+# Haushalt einen Modus-Index (in connectors.base.CHARGE_MODES) zurück.
+#
+# - StubAgent: immer dieselbe Aktion (Standard: DO_NOTHING)
+# - RecordedAgent: spielt aufgezeichnete Entscheidungen ab (JSONL, eine Zeile
+#   pro Stunde und SoC-Bucket), z.B. einmal mit dem echten LLM aufgenommen
+# - record_decisions: nimmt solche Entscheidungen mit einer beliebigen
+#   decide-Funktion auf (z.B. optimisation_api.main.fallback_decision)
+# ---------------------------------------------------------------------------
+import json
+from datetime import datetime, timezone
+from typing import Awaitable, Callable
+
+import numpy as np
+
+from connectors.base import CHARGE_MODES
+from control_worker.executor import ACTION_MODES
+from optimisation_api.models import Action
+
+BACKTEST_SOC_BIN_PERCENT = 5.0
+
+
+def _mode_index(action: Action | str) -> int:
+    return CHARGE_MODES.index(ACTION_MODES[Action(action)])
+
+
+class StubAgent:
+    """Entscheidet immer gleich – die Untergrenze dessen, was ein LLM beitragen muss."""
+    def __init__(self, action: Action | str = Action.DO_NOTHING):
+        self.name = f"stub:{Action(action).value}"
+        self._mode = _mode_index(action)
+        self.calls = 0
+
+    def decide(self, hour: int, soc: np.ndarray, context: dict) -> np.ndarray:
+        self.calls += len(soc)
+        return np.full(len(soc), self._mode, dtype=np.int8)
+
+
+class RecordedAgent:
+    """
+    Spielt aufgezeichnete Entscheidungen ab. Format pro Zeile:
+    {"hour": <Epoch-Stunde>, "soc_bucket": <Index>, "action": "CHARGE_FROM_GRID", "reason": "..."}
+    Nicht aufgezeichnete Situationen bekommen `default`.
+    """
+    def __init__(self, path: str, default: Action | str = Action.DO_NOTHING, bin_percent: float = BACKTEST_SOC_BIN_PERCENT):
+        self.name = f"recorded:{path}"
+        self.bin_percent = bin_percent
+        self._default = _mode_index(default)
+        self._decisions: dict[tuple[int, int], int] = {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    item = json.loads(line)
+                    self._decisions[(int(item["hour"]), int(item["soc_bucket"]))] = _mode_index(item["action"])
+        self.calls = 0
+        self.misses = 0
+
+    def decide(self, hour: int, soc: np.ndarray, context: dict) -> np.ndarray:
+        self.calls += len(soc)
+        buckets = np.minimum(soc // self.bin_percent, 100 // self.bin_percent).astype(np.int64)
+        modes = np.full(len(soc), self._default, dtype=np.int8)
+        # Höchstens ~20 verschiedene Buckets pro Stunde: pro Bucket einmal nachschlagen
+        for bucket in np.unique(buckets):
+            mode = self._decisions.get((hour, int(bucket)))
+            if mode is None:
+                self.misses += int(np.count_nonzero(buckets == bucket))
+            else:
+                modes[buckets == bucket] = mode
+        return modes
+
+
+async def record_decisions(decide: Callable[..., Awaitable[tuple[Action, str]]],
+                           hours: np.ndarray, prices: np.ndarray, solar: np.ndarray, path: str,
+                           known_price_end: Callable[[int], int], forecast_hours: int = 6,
+                           bin_percent: float = BACKTEST_SOC_BIN_PERCENT) -> int:
+    """
+    Ruft `decide` (Signatur wie fallback_decision) für jede Stunde und jeden
+    SoC-Bucket mit der damals bekannten Preisprognose auf und schreibt JSONL.
+    `now` ist dabei der Beginn der historischen Stunde, damit Prompt und
+    Optimierer dieselbe Preisprognose sehen wie damals (nicht die heutige Uhrzeit).
+    `solar` ist die Einstrahlung eines Standorts. Gibt die Anzahl Zeilen zurück.
+    """
+    buckets = int(100 // bin_percent) + 1
+    written = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for i, hour in enumerate(hours):
+            end = min(known_price_end(int(hour)), int(hours[-1]) + 1) - int(hours[0])
+            price_forecast = [
+                {"timestamp_utc": datetime.fromtimestamp(int(hours[j]) * 3600, tz=timezone.utc), "price_eur_kwh": float(prices[j])}
+                for j in range(i, end)
+            ]
+            solar_forecast = [float(v) for v in solar[i:i + forecast_hours]]
+            now = datetime.fromtimestamp(int(hour) * 3600, tz=timezone.utc)
+            for bucket in range(buckets):
+                soc = min(bucket * bin_percent + bin_percent / 2, 100.0)
+                action, reason = await decide(soc, price_forecast, solar_forecast, now=now)
+                f.write(json.dumps({"hour": int(hour), "soc_bucket": bucket, "action": Action(action).value, "reason": reason}, ensure_ascii=False) + "\n")
+                written += 1
+    return written
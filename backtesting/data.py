@@ -0,0 +1,94 @@
+# ---------------------------------------------------------------------------
+# backtesting/data.py
+# ---------------------------------------------------------------------------
+# Lädt historische Zeitreihen aus lokalen Dateien und bringt sie auf ein
+# gemeinsames Stundenraster (Epoch-Stunden, UTC):
+# - Preise: aWATTar-JSON (wie die API: {"data": [{"start_timestamp", "marketprice"}]})
+#   oder CSV mit den Spalten timestamp,price_eur_mwh bzw. timestamp,price_eur_kwh
+# - Einstrahlung: Open-Meteo-JSON ({"hourly": {"time", "shortwave_radiation"}})
+#   oder CSV mit den Spalten timestamp,shortwave_radiation (W/m²)
+# Zeitstempel dürfen ISO-8601 (ohne Zone = UTC) oder Epoch-Millisekunden sein.
+# Fehlende Stunden werden mit dem letzten bekannten Wert aufgefüllt.
+# ---------------------------------------------------------------------------
+import csv
+import json
+from datetime import datetime, timezone
+
+import numpy as np
+
+
+def _epoch_hour(value) -> int:
+    if isinstance(value, (int, float)) or str(value).isdigit():
+        return int(float(value) // 3_600_000)
+    ts = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return int(ts.timestamp() // 3600)
+
+
+def _to_hourly(hours: list[int], values: list[float]) -> tuple[np.ndarray, np.ndarray]:
+    """Sortiert, entfernt Doppelte und füllt Lücken vorwärts auf."""
+    if not hours:
+        raise ValueError("Zeitreihe ist leer.")
+    order = np.argsort(np.asarray(hours, dtype=np.int64), kind="stable")
+    hours_arr = np.asarray(hours, dtype=np.int64)[order]
+    values_arr = np.asarray(values, dtype=np.float64)[order]
+    grid = np.arange(hours_arr[0], hours_arr[-1] + 1, dtype=np.int64)
+    # Letzter Wert pro Stunde gewinnt, Lücken übernehmen den Vorgänger
+    idx = np.searchsorted(hours_arr, grid, side="right") - 1
+    return grid, values_arr[idx]
+
+
+def _read_csv(path: str, value_columns: dict[str, float]) -> tuple[list[int], list[float]]:
+    """Liest timestamp + die erste vorhandene Wertspalte (mit Umrechnungsfaktor)."""
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        column = next((c for c in value_columns if c in (reader.fieldnames or [])), None)
+        if column is None:
+            raise ValueError(f"{path}: keine der Spalten {list(value_columns)} gefunden.")
+        factor = value_columns[column]
+        hours, values = [], []
+        for row in reader:
+            if row.get(column) in (None, ""):
+                continue
+            hours.append(_epoch_hour(row["timestamp"]))
+            values.append(float(row[column]) * factor)
+    return hours, values
+
+
+def load_prices(path: str) -> tuple[np.ndarray, np.ndarray]:
+    """Stündliche Börsenpreise in €/kWh als (Epoch-Stunden, Preise)."""
+    if path.endswith(".csv"):
+        return _to_hourly(*_read_csv(path, {"price_eur_kwh": 1.0, "price_eur_mwh": 1 / 1000, "marketprice": 1 / 1000}))
+    with open(path, encoding="utf-8") as f:
+        payload = json.load(f)
+    items = payload["data"] if isinstance(payload, dict) else payload
+    return _to_hourly(
+        [_epoch_hour(item["start_timestamp"]) for item in items],
+        [item["marketprice"] / 1000 for item in items],
+    )
+
+
+def load_irradiance(path: str) -> tuple[np.ndarray, np.ndarray]:
+    """Stündliche Globalstrahlung in W/m² als (Epoch-Stunden, Werte)."""
+    if path.endswith(".csv"):
+        return _to_hourly(*_read_csv(path, {"shortwave_radiation": 1.0}))
+    with open(path, encoding="utf-8") as f:
+        hourly = json.load(f)["hourly"]
+    pairs = [(t, v) for t, v in zip(hourly["time"], hourly["shortwave_radiation"]) if v is not None]
+    return _to_hourly([_epoch_hour(t) for t, _ in pairs], [float(v) for _, v in pairs])
+
+
+def align(prices: tuple[np.ndarray, np.ndarray], irradiance: list[tuple[np.ndarray, np.ndarray]]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Schneidet alle Reihen auf den gemeinsamen Zeitraum zu.
+    Ergebnis: (Epoch-Stunden, Preise, Einstrahlung der Form (Stunden, Standorte)).
+    """
+    start = max([prices[0][0]] + [h[0] for h, _ in irradiance])
+    end = min([prices[0][-1]] + [h[-1] for h, _ in irradiance])
+    if end < start:
+        raise ValueError("Preis- und Einstrahlungsreihen überlappen nicht.")
+    hours = np.arange(start, end + 1, dtype=np.int64)
+    price_values = prices[1][hours - prices[0][0]]
+    solar = np.stack([values[hours - h[0]] for h, values in irradiance], axis=1)
+    return hours, price_values, solar
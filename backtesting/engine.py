@@ -0,0 +1,200 @@
+# ---------------------------------------------------------------------------
+# backtesting/engine.py
+# ---------------------------------------------------------------------------
+# Deterministischer Backtest von Entscheidungsstrategien über historische
+# Preise und Einstrahlung. Simuliert wird Stunde für Stunde, aber für alle
+# Haushalte gleichzeitig (NumPy-Arrays statt einer Schleife pro Haushalt):
+#
+# - Preis-Kontext pro Stunde nur einmal: aktueller Preis und die Günstigste-
+#   Stunden-Regel mit genau den Preisen, die damals bekannt waren (aWATTar
+#   veröffentlicht den Folgetag um AWATTAR_PUBLISH_HOUR_UTC).
+# - Solarprognose = tatsächliche Einstrahlung der kommenden Stunden (perfekte
+#   Prognose, wie get_solar_forecast sie im Idealfall liefern würde).
+# - Batterie-Physik wie connectors.simulated.SimulatedBattery (gleiche Modi,
+#   Wirkungsgrad, Selbstentladung, BMS-Grenzen).
+#
+# Kosten werden dreifach verglichen:
+# - Basis: alles aus dem Netz zum Festpreis DEFAULT_GRID_PRICE_EUR_KWH (wie ingest_worker)
+# - Nur PV: gleiche PV-Anlage, keine Batterie, dynamischer Tarif
+# - Strategie: PV + Batterie, gesteuert von der Strategie, dynamischer Tarif
+# ---------------------------------------------------------------------------
+import os
+import time
+
+import numpy as np
+
+from connectors.base import CHARGE_MODES
+from connectors.simulated import SimulatedBattery
+from control_worker.executor import RULE_CODE_MODES
+from ingest_worker.savings import FIXED_PRICE
+from optimisation_api.logic import rules_engine, vector_rules
+from optimisation_api.services.forecast_cache import AWATTAR_PUBLISH_HOUR_UTC
+
+# Abgaben, Umlagen und Netzentgelte zusätzlich zum Börsenpreis (dynamischer Tarif)
+BACKTEST_GRID_SURCHARGE_EUR_KWH = float(os.environ.get("BACKTEST_GRID_SURCHARGE_EUR_KWH", "0.20"))
+BACKTEST_FEED_IN_EUR_KWH = float(os.environ.get("BACKTEST_FEED_IN_EUR_KWH", "0.08"))
+BACKTEST_PERFORMANCE_RATIO = float(os.environ.get("BACKTEST_PERFORMANCE_RATIO", "0.85"))
+# So viele Stunden liefert get_solar_forecast
+SOLAR_FORECAST_HOURS = 6
+
+_CHARGE = CHARGE_MODES.index("charge")
+_DISCHARGE = CHARGE_MODES.index("discharge")
+_IDLE = CHARGE_MODES.index("idle")
+
+# Tagesgang des Haushaltsverbrauchs (UTC, angelehnt an das Standardlastprofil H0), Mittelwert 1
+_LOAD_SHAPE = np.array([0.55, 0.45, 0.4, 0.4, 0.45, 0.6, 0.95, 1.1, 1.05, 1.0, 1.05, 1.15,
+                        1.1, 1.0, 0.95, 1.0, 1.25, 1.6, 1.75, 1.6, 1.35, 1.1, 0.85, 0.7])
+_LOAD_SHAPE = _LOAD_SHAPE / _LOAD_SHAPE.mean()
+
+
+def known_price_end(hour: int) -> int:
+    """Erste Epoch-Stunde, deren Preis zur Stunde `hour` noch NICHT bekannt war."""
+    day_start = hour - hour % 24
+    return day_start + (48 if hour % 24 >= AWATTAR_PUBLISH_HOUR_UTC else 24)
+
+
+def cheap_hour_flags(hours: np.ndarray, prices: np.ndarray, num_hours: int = rules_engine.CHEAPEST_HOURS_COUNT) -> np.ndarray:
+    """
+    Günstigste-Stunden-Regel für jede Stunde, wie fast_rules sie damals ausgewertet hätte:
+    unter den bekannten zukünftigen Preisen die `num_hours` günstigsten (bei Gleichstand
+    der frühere), Treffer, wenn eine davon dieselbe Tagesstunde hat wie die aktuelle.
+    """
+    flags = np.zeros(len(hours), dtype=bool)
+    first = int(hours[0])
+    for i, hour in enumerate(hours):
+        end = min(known_price_end(int(hour)) - first, len(hours))
+        future = prices[i + 1:end]
+        if future.size == 0:
+            continue
+        cheapest = np.argsort(future, kind="stable")[:num_hours] + i + 1
+        flags[i] = bool(np.any(hours[cheapest] % 24 == hour % 24))
+    return flags
+
+
+def max_solar_forecast(solar: np.ndarray, horizon: int = SOLAR_FORECAST_HOURS) -> np.ndarray:
+    """Maximum der Einstrahlung über die kommenden `horizon` Stunden (inkl. der aktuellen), pro Standort."""
+    result = solar.copy()
+    for shift in range(1, horizon):
+        result[:-shift] = np.maximum(result[:-shift], solar[shift:])
+    return result
+
+
+def make_households(count: int, locations: int, seed: int = 0) -> dict[str, np.ndarray]:
+    """Zufällige, aber reproduzierbare Haushalte (Speicher, PV-Anlage, Jahresverbrauch, Standort)."""
+    rng = np.random.default_rng(seed)
+    capacity = rng.uniform(5.0, 15.0, count)
+    return {
+        "capacity_kwh": capacity,
+        "power_kw": capacity * 0.5,
+        "efficiency": np.full(count, 0.95),
+        "pv_kwp": rng.uniform(3.0, 10.0, count),
+        "annual_load_kwh": rng.uniform(2500.0, 6000.0, count),
+        "location": rng.integers(0, locations, count),
+        "start_soc": rng.uniform(20.0, 80.0, count),
+    }
+
+
+class RulesStrategy:
+    """
+    Die schnellen Regeln (vector_rules) mit optional geänderten Schwellen.
+    Wo keine Regel greift, entscheidet `agent` (Ersatz für das LLM); ohne Agent
+    bleibt die Batterie im Eigenverbrauch.
+    """
+    def __init__(self, thresholds: dict | None = None, agent=None, name: str | None = None):
+        self.thresholds = thresholds
+        self.agent = agent
+        parts = ["rules"] + [f"{k}={v}" for k, v in (thresholds or {}).items()]
+        self.name = name or ",".join(parts) + (f"+{agent.name}" if agent is not None else "")
+
+    def modes(self, hour: int, price: float, is_cheap_hour: bool, soc: np.ndarray, max_solar: np.ndarray) -> np.ndarray:
+        codes = vector_rules.rule_codes(soc, price, is_cheap_hour, max_solar, self.thresholds)
+        modes = RULE_CODE_MODES[codes]
+        if self.agent is not None:
+            undecided = codes == vector_rules.NO_RULE
+            if undecided.any():
+                modes[undecided] = self.agent.decide(hour, soc[undecided], {"price": price, "max_solar": max_solar[undecided]})
+        if price > rules_engine.SAFETY_MAX_CHARGE_PRICE_EUR_KWH:
+            modes[modes == _CHARGE] = _IDLE
+        return modes
+
+
+def simulate(hours: np.ndarray, prices: np.ndarray, solar: np.ndarray, households: dict[str, np.ndarray],
+             strategy, seed: int = 0) -> dict:
+    """
+    Simuliert alle Haushalte über alle Stunden. `solar` hat die Form (Stunden, Standorte).
+    Gleiche Eingaben und gleicher `seed` ergeben exakt dasselbe Ergebnis.
+    """
+    start = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    n = len(households["capacity_kwh"])
+    capacity = households["capacity_kwh"]
+    power = households["power_kw"]
+    efficiency = households["efficiency"]
+    location = households["location"]
+    min_e = capacity * rules_engine.BMS_MIN_SOC / 100
+    max_e = capacity * rules_engine.BMS_MAX_SOC / 100
+    energy = np.clip(capacity * households["start_soc"] / 100, min_e, max_e)
+    load_scale = households["annual_load_kwh"] / 8760
+    pv_scale = households["pv_kwp"] * BACKTEST_PERFORMANCE_RATIO / 1000
+    self_discharge = capacity * SimulatedBattery.SELF_DISCHARGE_PER_HOUR
+
+    cheap = cheap_hour_flags(hours, prices)
+    forecast = max_solar_forecast(solar)
+
+    totals = {name: np.zeros(n) for name in ("baseline", "pv_only", "strategy", "import", "export", "discharged")}
+    mode_hours = np.zeros(len(CHARGE_MODES), dtype=np.int64)
+    for i, hour in enumerate(hours):
+        hour = int(hour)
+        price = float(prices[i])
+        # Verbrauch: Tagesgang × Jahresverbrauch, ±15 % Rauschen pro Haushalt und Stunde
+        load = load_scale * _LOAD_SHAPE[hour % 24] * np.clip(1 + 0.15 * rng.standard_normal(n), 0.2, None)
+        pv = pv_scale * solar[i, location]
+        surplus = np.maximum(pv - load, 0.0)
+        deficit = np.maximum(load - pv, 0.0)
+
+        modes = strategy.modes(hour, price, bool(cheap[i]), 100 * energy / capacity, forecast[i, location])
+        mode_hours += np.bincount(modes, minlength=len(CHARGE_MODES))
+        charging, discharging = modes == _CHARGE, modes == _DISCHARGE
+
+        # Laden: aus dem Netz mit voller Leistung (PV-Überschuss zuerst); sonst nur PV-Überschuss
+        room = (max_e - energy) / efficiency
+        charge_in = np.where(charging, np.minimum(power, room), np.where(discharging, 0.0, np.minimum(np.minimum(surplus, power), room)))
+        charge_in = np.maximum(charge_in, 0.0)
+        from_surplus = np.minimum(surplus, charge_in)
+        # Entladen: nur so viel, wie das Haus gerade braucht
+        discharge_out = np.where(discharging, np.minimum(np.minimum(deficit, power), np.maximum(energy - min_e, 0.0) * efficiency), 0.0)
+
+        energy = np.clip(energy + charge_in * efficiency - discharge_out / efficiency - self_discharge, min_e, max_e)
+        grid_import = deficit - discharge_out + (charge_in - from_surplus)
+        grid_export = surplus - from_surplus
+
+        tariff = price + BACKTEST_GRID_SURCHARGE_EUR_KWH
+        totals["baseline"] += load * FIXED_PRICE
+        totals["pv_only"] += deficit * tariff - surplus * BACKTEST_FEED_IN_EUR_KWH
+        totals["strategy"] += grid_import * tariff - grid_export * BACKTEST_FEED_IN_EUR_KWH
+        totals["import"] += grid_import
+        totals["export"] += grid_export
+        totals["discharged"] += discharge_out
+
+    duration = time.perf_counter() - start
+    per_household = {name: float(values.mean()) for name, values in totals.items()}
+    result = {
+        "strategy": strategy.name,
+        "households": n,
+        "hours": len(hours),
+        "cost_baseline_eur": round(per_household["baseline"], 2),
+        "cost_pv_only_eur": round(per_household["pv_only"], 2),
+        "cost_strategy_eur": round(per_household["strategy"], 2),
+        "savings_vs_baseline_eur": round(per_household["baseline"] - per_household["strategy"], 2),
+        "battery_savings_eur": round(per_household["pv_only"] - per_household["strategy"], 2),
+        "grid_import_kwh": round(per_household["import"], 1),
+        "grid_export_kwh": round(per_household["export"], 1),
+        "full_cycles": round(float((totals["discharged"] / capacity).mean()), 1),
+        "mode_share": {mode: round(float(count / mode_hours.sum()), 4) for mode, count in zip(CHARGE_MODES, mode_hours)},
+        "duration_s": round(duration, 2),
+    }
+    if getattr(strategy, "agent", None) is not None:
+        result["agent_decisions"] = strategy.agent.calls
+        if hasattr(strategy.agent, "misses"):
+            result["agent_misses"] = strategy.agent.misses
+    return result
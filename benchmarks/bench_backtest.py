@@ -0,0 +1,80 @@
+# Laufzeit des Backtests: ein Jahr × 10k Haushalte. Preise und Einstrahlung
+# werden synthetisch erzeugt und im Format der echten Dateien (aWATTar- bzw.
+# Open-Meteo-JSON) in ein temporäres Verzeichnis geschrieben, damit auch die
+# Lade-Funktionen mitgemessen werden.
+#
+# Aufruf aus dem Repo-Wurzelverzeichnis:
+#   python -m benchmarks.bench_backtest --households 10000 --days 365
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from backtesting import data, engine
+from backtesting.agents import StubAgent
+
+
+def _write_synthetic(directory: str, days: int, locations: int, seed: int = 0) -> tuple[str, list[str]]:
+    rng = np.random.default_rng(seed)
+    start_hour = int(datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp() // 3600)
+    hours = np.arange(start_hour, start_hour + days * 24)
+    hod = hours % 24
+    day = (hours - start_hour) // 24
+    # Börsenpreis €/MWh: Tagesgang mit Morgen- und Abendspitze, Wetter-Rauschen, gelegentliche Spitzen
+    price = 90 + 40 * np.exp(-((hod - 7) ** 2) / 4) + 90 * np.exp(-((hod - 18) ** 2) / 5) - 35 * np.exp(-((hod - 12) ** 2) / 6)
+    price = price + rng.normal(0, 20, len(hours)) + 200 * (rng.random(len(hours)) < 0.01)
+    prices_path = os.path.join(directory, "awattar.json")
+    with open(prices_path, "w", encoding="utf-8") as f:
+        json.dump({"data": [{"start_timestamp": int(h) * 3_600_000, "marketprice": float(p)} for h, p in zip(hours, price)]}, f)
+
+    irradiance_paths = []
+    season = 0.55 + 0.45 * np.cos(2 * np.pi * (day - 172) / 365)
+    daylight = np.maximum(np.sin(np.pi * (hod - 4) / 16), 0) * (hod >= 4) * (hod <= 20)
+    for location in range(locations):
+        clouds = np.repeat(rng.uniform(0.2, 1.0, days), 24)
+        radiation = 900 * season * daylight * clouds
+        path = os.path.join(directory, f"location_{location}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            times = [datetime.fromtimestamp(int(h) * 3600, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M") for h in hours]
+            json.dump({"hourly": {"time": times, "shortwave_radiation": [round(float(r), 1) for r in radiation]}}, f)
+        irradiance_paths.append(path)
+    return prices_path, irradiance_paths
+
+
+def main(households: int, days: int, locations: int):
+    with tempfile.TemporaryDirectory() as directory:
+        prices_path, irradiance_paths = _write_synthetic(directory, days, locations)
+        start = time.perf_counter()
+        hours, prices, solar = data.align(data.load_prices(prices_path), [data.load_irradiance(p) for p in irradiance_paths])
+        load_seconds = time.perf_counter() - start
+
+    fleet = engine.make_households(households, solar.shape[1])
+    results = [
+        engine.simulate(hours, prices, solar, fleet, engine.RulesStrategy()),
+        engine.simulate(hours, prices, solar, fleet, engine.RulesStrategy(agent=StubAgent("DISCHARGE_TO_HOUSE"))),
+        engine.simulate(hours, prices, solar, fleet, engine.RulesStrategy({"high_price_eur_kwh": 0.2, "solar_wait_w_m2": 200})),
+    ]
+    # Gleiche Eingaben -> gleiches Ergebnis
+    repeat = engine.simulate(hours, prices, solar, fleet, engine.RulesStrategy())
+    deterministic = {k: v for k, v in repeat.items() if k != "duration_s"} == {k: v for k, v in results[0].items() if k != "duration_s"}
+    print(json.dumps({
+        "hours": len(hours),
+        "households": households,
+        "load_seconds": round(load_seconds, 2),
+        "household_hours_per_second": round(len(hours) * households / results[0]["duration_s"]),
+        "deterministic": deterministic,
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--households", type=int, default=10_000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--locations", type=int, default=20)
+    args = parser.parse_args()
+    main(args.households, args.days, args.locations)
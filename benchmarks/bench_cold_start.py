@@ -0,0 +1,130 @@
+# Kaltstart der API mit langsamen Abhängigkeiten: Wie lange dauert es vom
+# Prozessstart bis zur ersten beantworteten Anfrage?
+#
+# - aWATTar/Open-Meteo: lokale Stand-ins ohne Latenz (der Regelpfad)
+# - OpenAI: Stand-in, das /v1/models erst nach --openai-latency Sekunden beantwortet
+# - Neo4j: ein Port, der Verbindungen annimmt, aber nie antwortet (hängender Server)
+#
+# Gemessen werden (ab Prozessstart): erste Antwort von /health, erste Entscheidung
+# von /entscheidung, und wann /ready OpenAI als bereit bzw. Neo4j als
+# fehlgeschlagen meldet. Dazu die reine Importzeit von optimisation_api.main.
+#
+# Aufruf aus dem Repo-Wurzelverzeichnis:
+#   python -m benchmarks.bench_cold_start --runs 3 --openai-latency 2
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.bench_decision_stream import _free_port
+from benchmarks.stand_ins import StandInServer, forecast_routes
+
+API_KEY = "bench"
+
+
+def import_seconds() -> float:
+    """Importzeit von optimisation_api.main in einem frischen Interpreter."""
+    code = "import time; t = time.perf_counter(); import optimisation_api.main; print(time.perf_counter() - t)"
+    return float(subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout.strip())
+
+
+async def _blackhole(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    # Verbindung offen halten, nie antworten
+    try:
+        await reader.read()
+    finally:
+        writer.close()
+
+
+async def _poll(client: httpx.AsyncClient, url: str, done, timeout: float = 120.0, **kwargs):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            response = await client.get(url, **kwargs)
+            if done(response):
+                return response
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.01)
+    return None
+
+
+async def cold_start(openai_latency: float, neo4j_timeout: float) -> dict:
+    port = _free_port()
+    async with StandInServer(forecast_routes()) as upstream, \
+            StandInServer({"/v1/models": lambda m, t, b: (200, {"object": "list", "data": []})}, latency=openai_latency) as openai_stub:
+        neo4j_stub = await asyncio.start_server(_blackhole, "127.0.0.1", 0)
+        env = dict(
+            os.environ,
+            INTERNAL_API_KEY=API_KEY,
+            AWATTAR_API_URL=f"{upstream.base_url}/v1/marketdata",
+            OPEN_METEO_API_URL=f"{upstream.base_url}/v1/forecast",
+            OPENAI_API_KEY="bench", OPENAI_BASE_URL=f"{openai_stub.base_url}/v1",
+            NEO4J_URI=f"bolt://127.0.0.1:{neo4j_stub.sockets[0].getsockname()[1]}",
+            NEO4J_USERNAME="neo4j", NEO4J_PASSWORD="bench",
+            NEO4J_CONNECT_TIMEOUT_SECONDS=str(neo4j_timeout),
+        )
+        start = time.perf_counter()
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "uvicorn", "optimisation_api.main:app",
+            "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning",
+            env=env, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL,
+        )
+        base = f"http://127.0.0.1:{port}"
+        result = {}
+        try:
+            async with httpx.AsyncClient(timeout=60) as client:
+                await _poll(client, f"{base}/health", lambda r: r.status_code == 200)
+                result["first_health_s"] = round(time.perf_counter() - start, 3)
+                decision = await _poll(client, f"{base}/entscheidung", lambda r: r.status_code == 200,
+                                       params={"soc": 50}, headers={"X-API-KEY": API_KEY})
+                result["first_decision_s"] = round(time.perf_counter() - start, 3)
+                result["first_decision"] = decision.json()["decision"]["action"] if decision is not None else None
+
+                def state(r, name):
+                    return r.status_code in (200, 503) and r.json().get("dependencies", {}).get(name, {}).get("state")
+
+                if await _poll(client, f"{base}/ready", lambda r: state(r, "openai") in ("ready", "failed")) is not None:
+                    result["openai_ready_s"] = round(time.perf_counter() - start, 3)
+                if await _poll(client, f"{base}/ready", lambda r: state(r, "neo4j") in ("ready", "failed")) is not None:
+                    result["neo4j_settled_s"] = round(time.perf_counter() - start, 3)
+                ready = await client.get(f"{base}/ready")
+                if ready.status_code in (200, 503):
+                    result["dependencies"] = {name: dep["state"] for name, dep in ready.json()["dependencies"].items()}
+        finally:
+            process.terminate()
+            await process.wait()
+            neo4j_stub.close()
+    return result
+
+
+def main(runs: int, openai_latency: float, neo4j_timeout: float):
+    imports = [import_seconds() for _ in range(runs)]
+    starts = [asyncio.run(cold_start(openai_latency, neo4j_timeout)) for _ in range(runs)]
+    summary = {
+        key: round(statistics.median(s[key] for s in starts if key in s), 3)
+        for key in ("first_health_s", "first_decision_s", "openai_ready_s", "neo4j_settled_s")
+        if any(key in s for s in starts)
+    }
+    print(json.dumps({
+        "openai_latency_s": openai_latency,
+        "neo4j_connect_timeout_s": neo4j_timeout,
+        "import_s_median": round(statistics.median(imports), 3),
+        "median": summary,
+        "runs": starts,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--openai-latency", type=float, default=2.0)
+    parser.add_argument("--neo4j-timeout", type=float, default=5.0)
+    args = parser.parse_args()
+    main(args.runs, args.openai_latency, args.neo4j_timeout)
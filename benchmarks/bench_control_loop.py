@@ -0,0 +1,66 @@
+# Lasttest des Regelkreises: Schafft ein Prozess 10k simulierte Batterien
+# (mit Antwortzeiten, Ausfällen und Batterie-Physik) innerhalb des
+# 60-s-Fensters? Prognosen kommen aus den Stellvertreter-Daten, damit das
+# Ergebnis nicht vom Netzwerk abhängt.
+#
+# Aufruf aus dem Repo-Wurzelverzeichnis:
+#   python -m benchmarks.bench_control_loop --batteries 10000
+import argparse
+import asyncio
+import json
+import random
+from datetime import datetime, timezone
+
+from benchmarks.stand_ins import awattar_payload, open_meteo_payload
+from connectors.simulated import SimulatedBattery
+from control_worker.executor import ControlLoop
+
+# Wie external_apis: eine Liste pro Prognose-Abruf (damit greift der Array-Cache von vector_rules)
+_PRICES = [
+    {"timestamp_utc": datetime.fromtimestamp(item["start_timestamp"] / 1000, tz=timezone.utc), "price_eur_kwh": item["marketprice"] / 1000}
+    for item in awattar_payload()["data"]
+]
+_RADIATION = open_meteo_payload()["hourly"]["shortwave_radiation"]
+
+
+async def fetch_prices() -> list[dict]:
+    return _PRICES
+
+
+async def fetch_solar(lat: float, lon: float, hours: int = 6) -> list[float]:
+    hour = datetime.now(timezone.utc).hour
+    return _RADIATION[hour:hour + hours]
+
+
+async def main(batteries: int, cycles: int, failure_rate: float, time_scale: float, pause: float):
+    rng = random.Random(0)
+    locations = [(48.0 + rng.random() * 5, 7.0 + rng.random() * 6) for _ in range(50)]
+    fleet = []
+    for i in range(batteries):
+        lat, lon = rng.choice(locations)
+        fleet.append(SimulatedBattery(f"sim-battery-{i}", lat=lat, lon=lon, failure_rate=failure_rate,
+                                      time_scale=time_scale, seed=i))
+    control_loop = ControlLoop(fetch_prices=fetch_prices, fetch_solar=fetch_solar, retry_backoff=0.1)
+    results = []
+    for cycle in range(cycles):
+        if cycle:
+            await asyncio.sleep(pause)
+        results.append(await control_loop.run_cycle(fleet))
+    print(json.dumps({
+        "cycles": results,
+        "vendor_api_calls": SimulatedBattery.api_calls,
+        "mode_changes_on_batteries": sum(b.mode_changes for b in fleet),
+        "modes": {mode: sum(b.mode == mode for b in fleet) for mode in ("charge", "discharge", "idle")},
+        "within_60s_window": all(r["duration_s"] < 60 for r in results),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batteries", type=int, default=10_000)
+    parser.add_argument("--cycles", type=int, default=3)
+    parser.add_argument("--failure-rate", type=float, default=0.01)
+    parser.add_argument("--time-scale", type=float, default=60.0, help="Simulierte Sekunden pro echter Sekunde")
+    parser.add_argument("--pause", type=float, default=5.0, help="Pause zwischen den Zyklen in Sekunden")
+    args = parser.parse_args()
+    asyncio.run(main(args.batteries, args.cycles, args.failure_rate, args.time_scale, args.pause))
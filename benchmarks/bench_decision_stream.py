@@ -0,0 +1,176 @@
+# Lasttest für den Push-Stream /entscheidung/stream: N simulierte Steuergeräte
+# abonnieren über WebSocket einen einzelnen API-Prozess (uvicorn, ein Worker)
+# und melden ihren SoC wie bisher im Minutentakt. Gemessen wird, wie viele
+# Pushes der Server statt N × Meldungen GET-Antworten verschickt, wie schnell
+# eine Schwellen-Überschreitung beim Gerät ankommt und wie viel Speicher der
+# Server pro Verbindung braucht.
+#
+# Aufruf aus dem Repo-Wurzelverzeichnis:
+#   python -m benchmarks.bench_decision_stream --subscribers 10000 --reports 5
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sys
+import time
+
+import httpx
+from websockets.asyncio.client import connect
+
+from benchmarks.stand_ins import StandInServer, forecast_routes, percentiles
+from optimisation_api.logic import rules_engine
+
+API_KEY = "bench"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+class Controller:
+    """Ein simuliertes Steuergerät mit offener WebSocket-Verbindung."""
+    def __init__(self, ws, soc: float):
+        self.ws = ws
+        self.soc = soc
+        self.pushes = 0
+        self.received = asyncio.Event()
+        self.reader = asyncio.ensure_future(self._read())
+
+    async def _read(self):
+        async for _ in self.ws:
+            self.pushes += 1
+            self.received.set()
+
+    async def report(self, soc: float):
+        self.soc = soc
+        await self.ws.send(json.dumps({"soc": soc}))
+
+
+async def _start_api(port: int, upstream: str) -> asyncio.subprocess.Process:
+    env = dict(
+        os.environ,
+        INTERNAL_API_KEY=API_KEY,
+        AWATTAR_API_URL=f"{upstream}/v1/marketdata",
+        OPEN_METEO_API_URL=f"{upstream}/v1/forecast",
+        FALLBACK_ENGINE="optimizer",
+    )
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "uvicorn", "optimisation_api.main:app",
+        "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning",
+        env=env, stdout=asyncio.subprocess.DEVNULL,
+    )
+    async with httpx.AsyncClient() as client:
+        for _ in range(200):
+            try:
+                if (await client.get(f"http://127.0.0.1:{port}/health")).status_code == 200:
+                    return process
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("API-Prozess ist nicht gestartet.")
+
+
+async def main(subscribers: int, reports: int, cells: int, crossings: int):
+    rng = random.Random(0)
+    async with StandInServer(forecast_routes()) as upstream:
+        port = _free_port()
+        api = await _start_api(port, upstream.base_url)
+        try:
+            rss_idle = _rss_mb(api.pid)
+            locations = [(48.0 + rng.random() * 5, 7.0 + rng.random() * 6) for _ in range(cells)]
+            semaphore = asyncio.Semaphore(500)
+            connect_samples = []
+
+            async def subscribe() -> Controller:
+                lat, lon = rng.choice(locations)
+                soc = rng.uniform(rules_engine.STRATEGIC_MIN_SOC + 5, 100)
+                url = f"ws://127.0.0.1:{port}/entscheidung/stream?soc={soc:.1f}&lat={lat}&lon={lon}"
+                async with semaphore:
+                    start = time.perf_counter()
+                    ws = await connect(url, additional_headers={"X-API-KEY": API_KEY}, ping_interval=None)
+                    controller = Controller(ws, soc)
+                    await controller.received.wait()
+                    connect_samples.append(time.perf_counter() - start)
+                return controller
+
+            start = time.perf_counter()
+            controllers = await asyncio.gather(*(subscribe() for _ in range(subscribers)))
+            connect_seconds = time.perf_counter() - start
+            rss_connected = _rss_mb(api.pid)
+
+            # Minutentakt: jedes Gerät meldet einen leicht veränderten SoC
+            pushes_before = sum(c.pushes for c in controllers)
+            start = time.perf_counter()
+            for _ in range(reports):
+                await asyncio.gather(*(c.report(min(max(c.soc + rng.uniform(-0.5, 0.5), 0.0), 100.0)) for c in controllers))
+            # Der Server arbeitet die Meldungen asynchron ab; warten, bis /health alle gezählt hat
+            async with httpx.AsyncClient() as client:
+                while (await client.get(f"http://127.0.0.1:{port}/health")).json()["decision_stream"]["reports"] < subscribers * (reports + 1):
+                    await asyncio.sleep(0.05)
+                report_seconds = time.perf_counter() - start
+                await asyncio.sleep(0.2)
+                stream_stats = (await client.get(f"http://127.0.0.1:{port}/health")).json()["decision_stream"]
+            pushes = sum(c.pushes for c in controllers) - pushes_before
+
+            # Schwellen-Überschreitung: SoC fällt unter STRATEGIC_MIN_SOC -> Sicherheitsladung muss ankommen
+            latency_samples = []
+
+            async def cross(controller: Controller):
+                controller.received.clear()
+                start = time.perf_counter()
+                await controller.report(rules_engine.STRATEGIC_MIN_SOC - 1)
+                await asyncio.wait_for(controller.received.wait(), timeout=10)
+                latency_samples.append(time.perf_counter() - start)
+
+            sample = rng.sample(controllers, min(crossings, len(controllers)))
+            await asyncio.gather(*(cross(c) for c in sample))
+
+            rss_final = _rss_mb(api.pid)
+            await asyncio.gather(*(c.ws.close() for c in controllers))
+        finally:
+            api.terminate()
+            await api.wait()
+
+    polled = subscribers * reports
+    print(json.dumps({
+        "subscribers": subscribers,
+        "connect": {"seconds": round(connect_seconds, 2), **percentiles(connect_samples, (50, 99))},
+        "reports": {
+            "sent": polled,
+            "seconds": round(report_seconds, 2),
+            "per_second": round(polled / report_seconds, 1),
+            "pushes": pushes,
+            "responses_avoided_percent": round(100 * (1 - pushes / polled), 1) if polled else None,
+        },
+        "threshold_push_latency": percentiles(latency_samples, (50, 99)),
+        "server": {
+            "rss_idle_mb": round(rss_idle, 1),
+            "rss_connected_mb": round(rss_connected, 1),
+            "kb_per_subscriber": round((rss_connected - rss_idle) * 1024 / subscribers, 1),
+            "rss_final_mb": round(rss_final, 1),
+            "stream": stream_stats,
+        },
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subscribers", type=int, default=10_000)
+    parser.add_argument("--reports", type=int, default=5, help="SoC-Meldungen pro Gerät (eine pro Minute im Betrieb)")
+    parser.add_argument("--cells", type=int, default=50, help="Anzahl verschiedener Standorte")
+    parser.add_argument("--crossings", type=int, default=1000, help="Geräte, deren SoC eine Regel-Schwelle kreuzt")
+    args = parser.parse_args()
+    asyncio.run(main(args.subscribers, args.reports, args.cells, args.crossings))
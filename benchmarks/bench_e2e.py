@@ -0,0 +1,276 @@
+# End-to-End-Lasttest der echten FastAPI-App, ohne Internet und ohne Datenbank:
+#
+# - aWATTar/Open-Meteo: StandInServer mit festen Antworten
+# - OpenAI: OpenAIStandIn (Chat-Endpunkt) mit einstellbarer Latenz und Fehlerquote
+# - Neo4j: InMemoryGraph statt execute_read/execute_write
+#
+# Die App läuft im selben Prozess (uvicorn.Server im selben Event-Loop), damit
+# der Neo4j-Stand-in eingesetzt und die Allokationen mit tracemalloc gemessen
+# werden können. Pro Endpunkt (/entscheidung, /users/register):
+# - offene Last mit fester Rate (--rps); die Latenz zählt ab dem geplanten
+#   Startzeitpunkt, damit Rückstau im Server nicht aus der Messung fällt
+# - p50/p95/p99, erreichter Durchsatz, Statuscodes
+# - Allokationen pro Anfrage (Spitze und verbleibend, einzeln nacheinander
+#   gemessen; enthält den Anteil des httpx-Clients, der für alle Läufe gleich ist)
+# Dazu Mikrobenchmarks für fast_rules, find_cheapest_hours und is_daylight.
+#
+# Ergebnisse als JSON (--output); zwei Läufe vergleichen mit --compare.
+#
+# Aufruf aus dem Repo-Wurzelverzeichnis:
+#   python -m benchmarks.bench_e2e --rps 50 --duration 10 --output e2e.json
+#   python -m benchmarks.bench_e2e --compare base.json e2e.json
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import time
+import timeit
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timezone
+
+import httpx
+
+from benchmarks.bench_decision_stream import _free_port
+from benchmarks.stand_ins import InMemoryGraph, OpenAIStandIn, StandInServer, forecast_routes, percentiles
+
+API_KEY = "bench"
+HEADERS = {"X-API-KEY": API_KEY}
+
+
+def _decision_request(i: int, rng: random.Random, cells: int):
+    # Mehrere Gitterzellen, damit neben Tabellen-Treffern auch der Live-Pfad vorkommt
+    cell = rng.randrange(cells)
+    params = {"soc": round(rng.uniform(0, 100), 1), "lat": 47.5 + 0.1 * (cell // 10), "lon": 6.0 + 0.1 * (cell % 10)}
+    return "GET", "/entscheidung", params, None
+
+
+def _register_request(i: int, rng: random.Random, cells: int):
+    body = {"username": f"bench{i}", "email": f"bench{i}-{rng.getrandbits(32)}@example.org", "address": f"Teststraße {i}, Frankfurt"}
+    return "POST", "/users/register", None, body
+
+
+ENDPOINTS = {"/entscheidung": _decision_request, "/users/register": _register_request}
+
+
+async def _send(client: httpx.AsyncClient, base: str, request) -> int | str:
+    method, path, params, body = request
+    try:
+        response = await client.request(method, base + path, params=params, json=body, headers=HEADERS)
+        return response.status_code
+    except httpx.HTTPError as e:
+        return type(e).__name__
+
+
+async def open_loop(client: httpx.AsyncClient, base: str, build, rps: float, duration: float, rng: random.Random,
+                    cells: int, record: bool = True) -> dict:
+    """Schickt Anfragen im festen Takt, unabhängig davon, wie schnell die Antworten kommen."""
+    total = max(1, int(rps * duration))
+    latencies: list[float] = []
+    statuses: Counter = Counter()
+
+    async def one(request, scheduled: float):
+        statuses[await _send(client, base, request)] += 1
+        latencies.append(time.perf_counter() - scheduled)
+
+    start = time.perf_counter()
+    tasks = []
+    for i in range(total):
+        scheduled = start + i / rps
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(one(build(i, rng, cells), scheduled)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    if not record:
+        return {}
+    return {
+        "target_rps": rps,
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 1),
+        "latency_ms": percentiles(latencies),
+        "latency_ms_mean": round(statistics.fmean(latencies) * 1000, 3),
+        "status": {str(code): count for code, count in sorted(statuses.items(), key=str)},
+    }
+
+
+async def allocations(client: httpx.AsyncClient, base: str, build, requests: int, rng: random.Random, cells: int) -> dict:
+    """Speicher, den eine einzelne Anfrage (Client + Server) belegt: Spitze und danach verbleibend."""
+    peaks, retained = [], []
+    tracemalloc.start()
+    try:
+        for i in range(requests):
+            request = build(i, rng, cells)
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            await _send(client, base, request)
+            current, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(current - before)
+    finally:
+        tracemalloc.stop()
+    return {
+        "requests": requests,
+        "peak_kib_mean": round(statistics.fmean(peaks) / 1024, 2),
+        "peak_kib_p95": round(sorted(peaks)[int(len(peaks) * 0.95)] / 1024, 2),
+        "retained_bytes_mean": round(statistics.fmean(retained), 1),
+    }
+
+
+def _ns_per_call(fn, repeat: int = 5) -> float:
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return round(statistics.median(timer.repeat(repeat, number)) / number * 1e9, 1)
+
+
+def microbenchmarks(seed: int) -> dict:
+    from benchmarks.bench_vector_rules import _forecast
+    from optimisation_api.logic import rules_engine
+    from optimisation_api.services import daylight_checker
+
+    now = datetime.now(timezone.utc)
+    forecast = _forecast(now, random.Random(seed))
+    current_price = next(i["price_eur_kwh"] for i in forecast if i["timestamp_utc"].hour == now.hour and i["timestamp_utc"].date() == now.date())
+    solar = [120.0, 250.0, 380.0, 420.0, 310.0, 150.0]
+    return {
+        "fast_rules_ns": _ns_per_call(lambda: rules_engine.fast_rules(55.0, current_price, forecast, solar)),
+        "find_cheapest_hours_ns": _ns_per_call(lambda: rules_engine.find_cheapest_hours(forecast, rules_engine.CHEAPEST_HOURS_COUNT)),
+        "is_daylight_ns": _ns_per_call(lambda: daylight_checker.is_daylight(50.1109, 8.6821)),
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args) -> dict:
+    graph = InMemoryGraph(latency=args.neo4j_latency)
+    openai_stand_in = OpenAIStandIn(error_rate=args.openai_error_rate, seed=args.seed)
+    async with StandInServer(forecast_routes()) as upstream, \
+            StandInServer(openai_stand_in.routes(), latency=args.openai_latency) as openai_server:
+        # Die Module lesen ihre Konfiguration beim Import – also vor dem Import der App setzen
+        os.environ.update(
+            INTERNAL_API_KEY=API_KEY, FALLBACK_ENGINE=args.fallback_engine,
+            AWATTAR_API_URL=f"{upstream.base_url}/v1/marketdata",
+            OPEN_METEO_API_URL=f"{upstream.base_url}/v1/forecast",
+            OPENAI_API_KEY="bench", OPENAI_BASE_URL=f"{openai_server.base_url}/v1",
+        )
+        for name in ("NEO4J_URI", "TIMESERIES_DATABASE_URL", "SHARED_FORECAST_STORE"):
+            os.environ.pop(name, None)
+
+        import uvicorn
+        from optimisation_api import main as api
+
+        api.execute_read, api.execute_write = graph.execute_read, graph.execute_write
+        port = _free_port()
+        base = f"http://127.0.0.1:{port}"
+        server = uvicorn.Server(uvicorn.Config(api.app, host="127.0.0.1", port=port, log_level="warning", lifespan="on"))
+        serve_task = asyncio.ensure_future(server.serve())
+        results = {"endpoints": {}}
+        try:
+            while not server.started:
+                await asyncio.sleep(0.01)
+            # Erst messen, wenn der OpenAI-Client steht (sonst antwortet nur der Fallback)
+            deadline = time.perf_counter() + 30
+            while api.llm_agent.openai_client is None and time.perf_counter() < deadline:
+                await asyncio.sleep(0.05)
+
+            limits = httpx.Limits(max_connections=1000, max_keepalive_connections=200)
+            async with httpx.AsyncClient(timeout=30, limits=limits) as client:
+                for path in args.endpoints:
+                    build = ENDPOINTS[path]
+                    rng = random.Random(args.seed)
+                    await open_loop(client, base, build, args.rps, args.warmup, rng, args.cells, record=False)
+                    result = await open_loop(client, base, build, args.rps, args.duration, rng, args.cells)
+                    result["allocations"] = await allocations(client, base, build, args.alloc_requests, rng, args.cells)
+                    results["endpoints"][path] = result
+
+            results["app"] = {
+                "decision_table": {key: value for key, value in api.decision_table.stats().items() if isinstance(value, (int, float))},
+                "llm_dispatcher": {key: value for key, value in api.llm_dispatcher.stats().items() if isinstance(value, (int, float))},
+                "llm_tiers": api.llm_agent.tier_stats(),
+                "openai_chat_requests": openai_stand_in.chat_requests,
+                "openai_injected_errors": openai_stand_in.injected_errors,
+                "graph_queries": graph.queries,
+                "upstream_requests": upstream.requests,
+            }
+        finally:
+            server.should_exit = True
+            await serve_task
+            # Der OpenAI-Client gehört nicht zum Lebenszyklus der App; offene Keep-Alive-Verbindungen schließen
+            if api.llm_agent.openai_client is not None:
+                await api.llm_agent.openai_client.close()
+    return results
+
+
+def flatten(data: dict, prefix: str = "") -> dict:
+    """Verschachteltes Ergebnis -> {"endpoints./entscheidung.latency_ms.p99": Wert, ...} (nur Zahlen)."""
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}.{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(old_path: str, new_path: str):
+    with open(old_path) as f:
+        old = flatten(json.load(f))
+    with open(new_path) as f:
+        new = flatten(json.load(f))
+    print(json.dumps({
+        key: {"old": old[key], "new": new[key], "ratio": round(new[key] / old[key], 3) if old[key] else None}
+        for key in old if key in new and not key.startswith("meta.")
+    }, indent=2, ensure_ascii=False))
+
+
+def main(args):
+    # Die App schreibt pro Anfrage ins Log; das gehört nicht in die Ausgabe des Benchmarks
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        results = asyncio.run(run(args))
+    results["micro"] = microbenchmarks(args.seed)
+    results["meta"] = {
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "parameters": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+    }
+    report = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    print(report)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rps", type=float, default=50)
+    parser.add_argument("--duration", type=float, default=10, help="Sekunden pro Endpunkt")
+    parser.add_argument("--warmup", type=float, default=2, help="Sekunden Last vor der Messung (nicht gewertet)")
+    parser.add_argument("--endpoints", nargs="+", default=list(ENDPOINTS), choices=list(ENDPOINTS))
+    parser.add_argument("--cells", type=int, default=20, help="Gitterzellen, über die sich /entscheidung verteilt")
+    parser.add_argument("--alloc-requests", type=int, default=200)
+    parser.add_argument("--fallback-engine", default="llm", choices=("llm", "optimizer"))
+    parser.add_argument("--openai-latency", type=float, default=0.3, help="Sekunden pro OpenAI-Antwort")
+    parser.add_argument("--openai-error-rate", type=float, default=0.0, help="Anteil der Chat-Anfragen, die mit 500 scheitern")
+    parser.add_argument("--neo4j-latency", type=float, default=0.002, help="Sekunden pro Query im InMemoryGraph")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Ergebnis zusätzlich als JSON-Datei schreiben")
+    parser.add_argument("--compare", nargs=2, metavar=("ALT", "NEU"), help="Zwei Ergebnisdateien vergleichen und beenden")
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+    else:
+        main(args)
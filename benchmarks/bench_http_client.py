@@ -0,0 +1,69 @@
+# Vergleicht die Latenz des alten Pfads (neuer AsyncClient pro Abruf) mit dem
+# gepoolten, langlebigen Client gegen einen lokalen Stellvertreter-Server.
+#
+# Aufruf aus dem Repo-Wurzelverzeichnis:
+#   python -m benchmarks.bench_http_client --requests 500 --concurrency 10
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from benchmarks.stand_ins import StandInServer, forecast_routes, percentiles
+from optimisation_api.services import http_client
+
+
+async def _per_call(url: str):
+    # So hat external_apis bisher jede Prognose abgerufen
+    async with httpx.AsyncClient() as client:
+        response = await client.get(url, timeout=5.0)
+        response.raise_for_status()
+        return response.json()
+
+
+async def _run(fetch, url: str, requests: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    samples = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await fetch(url)
+            samples.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    return {**percentiles(samples, (50, 99)), "throughput_rps": round(requests / elapsed, 1)}
+
+
+async def main(requests: int, concurrency: int, latency: float):
+    async with StandInServer(forecast_routes(), latency=latency) as server:
+        url = f"{server.base_url}/v1/marketdata"
+
+        server.connections = 0
+        per_call = await _run(_per_call, url, requests, concurrency)
+        per_call["connections"] = server.connections
+
+        client = http_client.create_http_client()
+        server.connections = 0
+
+        async def pooled(u):
+            response = await http_client.get_with_retry(u, client)
+            return response.json()
+
+        pooled_result = await _run(pooled, url, requests, concurrency)
+        pooled_result["connections"] = server.connections
+        await client.aclose()
+
+    print(json.dumps({"per_call_client": per_call, "pooled_client": pooled_result}, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulierte Upstream-Latenz in Sekunden")
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency, args.latency))
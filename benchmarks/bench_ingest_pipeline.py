@@ -0,0 +1,51 @@
+# Lasttest der Ingest-Pipeline mit simulierten Geräten: Schafft ein Prozess
+# 50k Geräte innerhalb des 60-s-Fensters? Die Schreib-Stufe nutzt eine
+# Stellvertreter-Senke mit konfigurierbarer Latenz pro Batch.
+#
+# Aufruf aus dem Repo-Wurzelverzeichnis:
+#   python -m benchmarks.bench_ingest_pipeline --devices 50000
+import argparse
+import asyncio
+import json
+
+from connectors.simulated import SimulatedMeter
+from ingest_worker.pipeline import IngestPipeline
+
+
+class SlowSink:
+    """Simuliert eine Datenbank, die pro Batch eine feste Zeit braucht."""
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.rows = 0
+        self.batches = 0
+
+    async def write(self, rows: list[dict]) -> None:
+        await asyncio.sleep(self.latency)
+        self.rows += len(rows)
+        self.batches += 1
+
+
+async def main(devices: int, poll_concurrency: int, failure_rate: float, sink_latency: float, cycles: int):
+    connectors = [SimulatedMeter(f"sim-{i}", f"user-{i // 3}", failure_rate=failure_rate, seed=i) for i in range(devices)]
+    sink = SlowSink(sink_latency)
+    pipeline = IngestPipeline(sinks=[sink], poll_concurrency=poll_concurrency)
+    await pipeline.start()
+    results = [await pipeline.run_cycle(connectors) for _ in range(cycles)]
+    await pipeline.shutdown()
+    print(json.dumps({
+        "cycles": results,
+        "sink_rows": sink.rows,
+        "sink_batches": sink.batches,
+        "within_60s_window": all(r["duration_s"] < 60 for r in results),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=50_000)
+    parser.add_argument("--poll-concurrency", type=int, default=2000)
+    parser.add_argument("--failure-rate", type=float, default=0.01)
+    parser.add_argument("--sink-latency", type=float, default=0.05, help="Sekunden pro geschriebenem Batch")
+    parser.add_argument("--cycles", type=int, default=2)
+    args = parser.parse_args()
+    asyncio.run(main(args.devices, args.poll_concurrency, args.failure_rate, args.sink_latency, args.cycles))
@@ -0,0 +1,96 @@
+# Misst Abfragezeiten des Produktkatalogs bei 1 Mio. SKUs und prüft, dass ein
+# Hot-Reload laufende Abfragen nicht blockiert.
+#
+# Aufruf aus dem Repo-Wurzelverzeichnis:
+#   python -m benchmarks.bench_product_catalog --skus 1000000
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+
+from advisory_services import product_catalog
+from advisory_services.product_catalog import EFFICIENCY_CLASSES, ProductCatalog
+from benchmarks.stand_ins import percentiles
+
+DEVICE_TYPES = ["Waschmaschine", "Kühlschrank", "Geschirrspüler", "Trockner", "Gefriertruhe",
+                "Backofen", "Wärmepumpe", "Fernseher", "Klimagerät", "Umwälzpumpe"]
+
+
+def synthetic_catalog(skus: int, seed: int = 0) -> ProductCatalog:
+    rng = np.random.default_rng(seed)
+    types = np.array(DEVICE_TYPES, dtype=object)[rng.integers(0, len(DEVICE_TYPES), skus)]
+    return ProductCatalog.from_columns(
+        names=np.array([f"SKU-{i}" for i in range(skus)], dtype=object),
+        types=types,
+        prices=rng.uniform(150, 3000, skus).round(2),
+        efficiency_classes=np.array(EFFICIENCY_CLASSES[3:], dtype=object)[rng.integers(0, 7, skus)],
+        consumption=rng.uniform(0.2, 2.5, skus),
+    )
+
+
+def time_queries(catalog: ProductCatalog, queries: int, seed: int = 1) -> dict:
+    rng = np.random.default_rng(seed)
+    results = {}
+    kinds = {
+        "top1_efficiency_price_cap": lambda t, p: catalog.top_k(t, k=1, max_price=p),
+        "top10_price_class_cap": lambda t, p: catalog.top_k(t, k=10, max_price=p, max_efficiency_class="B", sort_by="price"),
+        "top5_consumption": lambda t, p: catalog.top_k(t, k=5, max_price=p, sort_by="consumption"),
+        "best_payback_top5": lambda t, p: catalog.best_payback(t, current_consumption_kwh_per_cycle=1.8, k=5, max_price=p),
+    }
+    for name, query in kinds.items():
+        samples = []
+        for _ in range(queries):
+            device_type = DEVICE_TYPES[rng.integers(len(DEVICE_TYPES))]
+            max_price = float(rng.uniform(300, 3000))
+            start = time.perf_counter()
+            query(device_type, max_price)
+            samples.append(time.perf_counter() - start)
+        results[name] = percentiles(samples, (50, 99))
+    return results
+
+
+async def reload_while_querying(catalog: ProductCatalog, skus: int) -> dict:
+    """Fragt während eines Reloads weiter ab und misst die längste Pause zwischen zwei Abfragen."""
+    product_catalog._catalog = catalog
+    original_load = product_catalog.load_catalog
+    product_catalog.load_catalog = lambda path=None: synthetic_catalog(skus, seed=2)
+    try:
+        reload_task = asyncio.create_task(product_catalog.reload_catalog())
+        worst_gap, last, served = 0.0, time.perf_counter(), 0
+        while not reload_task.done():
+            await product_catalog.find_replacement("Waschmaschine", max_price=800)
+            served += 1
+            now = time.perf_counter()
+            worst_gap, last = max(worst_gap, now - last), now
+            await asyncio.sleep(0)
+        await reload_task
+    finally:
+        product_catalog.load_catalog = original_load
+    return {"queries_during_reload": served, "worst_gap_ms": round(worst_gap * 1000, 3),
+            "swapped": product_catalog.get_catalog() is not catalog}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--skus", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    catalog = synthetic_catalog(args.skus)
+    build_seconds = time.perf_counter() - start
+    report = {"skus": args.skus, "build_s": round(build_seconds, 2), "query_ms": time_queries(catalog, args.queries)}
+    # Die Konsolenausgabe von find_replacement würde die Messung verfälschen
+    import builtins
+    original_print, builtins.print = builtins.print, lambda *a, **k: None
+    try:
+        report["hot_reload"] = asyncio.run(reload_while_querying(catalog, args.skus))
+    finally:
+        builtins.print = original_print
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
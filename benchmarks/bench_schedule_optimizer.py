@@ -0,0 +1,79 @@
+# Vergleicht den DP-Optimierer mit dem heutigen Pfad (fast_rules + LLM-Fallback)
+# über simulierte Tage: Entscheidungslatenz und Stromkosten eines Haushalts.
+#
+# Das LLM wird durch einen Stub ersetzt, der wie beim Timeout DO_NOTHING liefert.
+# Seine Latenz wird nicht abgewartet, sondern mit --llm-latency angesetzt.
+#
+# Aufruf aus dem Repo-Wurzelverzeichnis:
+#   python -m benchmarks.bench_schedule_optimizer --days 30
+import argparse
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from benchmarks.stand_ins import percentiles
+from optimisation_api.logic import rules_engine, schedule_optimizer
+from optimisation_api.models import Action
+
+
+def synthetic_series(days: int, seed: int) -> tuple[np.ndarray, np.ndarray]:
+    """Stündliche Preise (€/kWh) und Einstrahlung (W/m²) mit Tagesprofil und Rauschen."""
+    rng = np.random.default_rng(seed)
+    hours = np.arange(days * 24 + 24)
+    hod = hours % 24
+    prices = 0.18 + 0.12 * np.exp(-((hod - 19) ** 2) / 6) - 0.08 * np.exp(-((hod - 3) ** 2) / 8)
+    prices = np.round(prices + rng.normal(0, 0.03, hours.size), 4)
+    clouds = np.repeat(rng.uniform(0.2, 1.0, hours.size // 24 + 1), 24)[: hours.size]
+    irradiance = np.clip(850 * np.cos((hod - 12) / 7 * np.pi / 2), 0, None) * clouds
+    return prices, irradiance
+
+
+def run(strategy: str, days: int, prices: np.ndarray, irradiance: np.ndarray, llm_latency: float) -> dict:
+    soc, total_cost, latencies, llm_calls = 50.0, 0.0, [], 0
+    for h in range(days * 24):
+        # Die Simulation setzt "jetzt" auf die laufende Stunde, damit rules_engine
+        # (das datetime.now() nutzt) und der Optimierer denselben Horizont sehen
+        base = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        forecast = [{"timestamp_utc": base + timedelta(hours=i), "price_eur_kwh": float(prices[h + i])} for i in range(24)]
+        solar = irradiance[h : h + 6].tolist()
+        current_price = float(prices[h])
+
+        t0 = time.perf_counter()
+        action, _ = rules_engine.fast_rules(soc, current_price, forecast, solar)
+        extra = 0.0
+        if action is None and strategy == "optimizer":
+            action = schedule_optimizer.optimal_schedule(soc, forecast, solar).action
+        elif action is None:
+            # LLM-Stub: Antwort wie beim Timeout, Latenz nur angesetzt
+            action, extra = Action.DO_NOTHING, llm_latency
+            llm_calls += 1
+        if action == Action.CHARGE_FROM_GRID and current_price > 0.15:
+            action = Action.DO_NOTHING
+        latencies.append(time.perf_counter() - t0 + extra)
+
+        new_soc, cost = schedule_optimizer.simulate_hour(soc, schedule_optimizer.action_to_mode(action), current_price, irradiance[h])
+        soc, total_cost = float(new_soc), total_cost + float(cost)
+
+    return {
+        "strategy": strategy,
+        "total_cost_eur": round(total_cost, 2),
+        "llm_calls": llm_calls,
+        **percentiles(latencies),
+    }
+
+
+def main(days: int, seed: int, llm_latency: float):
+    prices, irradiance = synthetic_series(days, seed)
+    results = [run(s, days, prices, irradiance, llm_latency) for s in ("rules+llm", "optimizer")]
+    print(json.dumps({"days": days, "llm_latency_assumed_s": llm_latency, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--llm-latency", type=float, default=1.5, help="Angesetzte LLM-Latenz in Sekunden")
+    args = parser.parse_args()
+    main(args.days, args.seed, args.llm_latency)
@@ -0,0 +1,140 @@
+# Mehrere uvicorn-Worker mit und ohne gemeinsamen Prognose-Speicher
+# (SHARED_FORECAST_STORE): Wie viele Abrufe landen bei aWATTar/Open-Meteo, und
+# wie viel Speicher belegen die Worker zusammen?
+#
+# Die Anfragen verteilen sich über --cells Gitterzellen; uvicorn verteilt sie
+# auf die Worker. Ohne Speicher ruft jeder Worker jede Zelle selbst ab (bis zu
+# N × Zellen Abrufe, und so jede Stunde erneut), mit Speicher etwa einmal pro Zelle.
+#
+# Aufruf aus dem Repo-Wurzelverzeichnis:
+#   python -m benchmarks.bench_shared_forecasts --workers 4 --cells 50 --requests 2000
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.bench_decision_stream import _free_port
+from benchmarks.stand_ins import StandInServer, forecast_routes, percentiles
+
+API_KEY = "bench"
+
+
+def _counting_routes(counts: dict) -> dict:
+    def counted(name, handler):
+        def handle(method, target, body):
+            counts[name] = counts.get(name, 0) + 1
+            return handler(method, target, body)
+        return handle
+    routes = forecast_routes()
+    return {"/v1/marketdata": counted("awattar", routes["/v1/marketdata"]),
+            "/v1/forecast": counted("open-meteo", routes["/v1/forecast"])}
+
+
+def _descendants_rss_mb(pid: int) -> float:
+    """Summe des RSS aller Nachfahren (die Worker) aus /proc."""
+    children: dict[int, list[int]] = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+    total_kb, stack = 0, list(children.get(pid, []))
+    while stack:
+        child = stack.pop()
+        stack.extend(children.get(child, []))
+        try:
+            with open(f"/proc/{child}/status") as f:
+                total_kb += next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+        except (OSError, StopIteration):
+            pass
+    return round(total_kb / 1024, 1)
+
+
+async def run(shared: bool, workers: int, cells: int, requests: int, concurrency: int) -> dict:
+    counts: dict[str, int] = {}
+    port = _free_port()
+    with tempfile.TemporaryDirectory() as store_dir:
+        async with StandInServer(_counting_routes(counts), latency=0.02) as upstream:
+            env = dict(
+                os.environ,
+                INTERNAL_API_KEY=API_KEY, FALLBACK_ENGINE="optimizer",
+                AWATTAR_API_URL=f"{upstream.base_url}/v1/marketdata",
+                OPEN_METEO_API_URL=f"{upstream.base_url}/v1/forecast",
+                SHARED_FORECAST_STORE="1" if shared else "0",
+                SHARED_FORECAST_PATH=os.path.join(store_dir, "forecasts"),
+            )
+            for name in ("OPENAI_API_KEY", "NEO4J_URI", "TIMESERIES_DATABASE_URL"):
+                env.pop(name, None)
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, "-m", "uvicorn", "optimisation_api.main:app", "--workers", str(workers),
+                "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning",
+                env=env, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL,
+            )
+            base = f"http://127.0.0.1:{port}"
+            try:
+                async with httpx.AsyncClient(timeout=30, limits=httpx.Limits(max_keepalive_connections=0)) as client:
+                    deadline = time.perf_counter() + 120
+                    while time.perf_counter() < deadline:
+                        try:
+                            if (await client.get(f"{base}/health")).status_code == 200:
+                                break
+                        except httpx.HTTPError:
+                            pass
+                        await asyncio.sleep(0.1)
+                    # Alle Worker hochfahren lassen (und den Leader die Preise holen)
+                    await asyncio.sleep(3.0)
+                    counts.clear()
+
+                    latencies, errors = [], 0
+                    semaphore = asyncio.Semaphore(concurrency)
+
+                    async def one(i: int):
+                        nonlocal errors
+                        cell = i % cells
+                        params = {"soc": 20 + i % 60, "lat": 47.5 + 0.1 * (cell // 10), "lon": 6.0 + 0.1 * (cell % 10)}
+                        async with semaphore:
+                            start = time.perf_counter()
+                            # Neue Verbindung pro Anfrage, damit sich die Anfragen über die Worker verteilen
+                            response = await client.get(f"{base}/entscheidung", params=params, headers={"X-API-KEY": API_KEY})
+                            latencies.append(time.perf_counter() - start)
+                            errors += response.status_code != 200
+
+                    start = time.perf_counter()
+                    await asyncio.gather(*(one(i) for i in range(requests)))
+                    elapsed = time.perf_counter() - start
+                    return {
+                        "shared_store": shared,
+                        "workers": workers,
+                        "cells": cells,
+                        "upstream_requests": dict(counts),
+                        "errors": errors,
+                        "throughput_rps": round(requests / elapsed, 1),
+                        "latency_ms": percentiles(latencies),
+                        "workers_rss_mb": _descendants_rss_mb(process.pid),
+                    }
+            finally:
+                process.terminate()
+                await process.wait()
+
+
+def main(workers: int, cells: int, requests: int, concurrency: int):
+    results = [asyncio.run(run(shared, workers, cells, requests, concurrency)) for shared in (False, True)]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--cells", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+    main(args.workers, args.cells, args.requests, args.concurrency)
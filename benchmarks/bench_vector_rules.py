@@ -0,0 +1,87 @@
+# Mikrobenchmark: skalares fast_rules (eine Batterie pro Aufruf) gegen den
+# vektorisierten Evaluator über eine ganze Flotte. Prüft vorher, dass beide
+# Varianten exakt dieselben Entscheidungen und Begründungen liefern.
+#
+# Aufruf aus dem Repo-Wurzelverzeichnis:
+#   python -m benchmarks.bench_vector_rules --batteries 100000
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from optimisation_api.logic import rules_engine, vector_rules
+
+
+def _forecast(now: datetime, rng: random.Random) -> list[dict]:
+    start = now.replace(minute=0, second=0, microsecond=0) - timedelta(hours=2)
+    # Preise auf 1 ct gerundet, damit Gleichstände (Tie-Breaking) vorkommen
+    return [
+        {"timestamp_utc": start + timedelta(hours=h), "price_eur_kwh": round(rng.uniform(0.05, 0.35), 2)}
+        for h in range(36)
+    ]
+
+
+def check_equivalence(rounds: int = 200, batteries: int = 500, seed: int = 1):
+    rng = random.Random(seed)
+    for _ in range(rounds):
+        now = datetime.now(timezone.utc)
+        forecast = _forecast(now, rng)
+        # Gelegentlich die aktuelle Stunde günstig machen und dieselbe Uhrzeit morgen zur
+        # günstigsten, damit auch die Laderegel (Vergleich nur über die Stunde) greift
+        if rng.random() < 0.5:
+            forecast[2]["price_eur_kwh"] = 0.01
+            forecast[26]["price_eur_kwh"] = 0.01
+        arrays = vector_rules.PriceArrays.from_forecast(forecast)
+        current_price = arrays.current_price(now)
+        soc = np.array([rng.choice([rng.uniform(0, 100), rules_engine.STRATEGIC_MIN_SOC, rules_engine.STRATEGIC_MAX_SOC]) for _ in range(batteries)])
+        solar = [[rng.uniform(0, 600) for _ in range(6)] for _ in range(batteries)]
+        max_solar = np.array([max(s, default=0) for s in solar])
+
+        codes = vector_rules.fast_rules_vectorized(soc, current_price, arrays, max_solar, now)
+        for i in range(batteries):
+            expected = rules_engine.fast_rules(float(soc[i]), current_price, forecast, solar[i])
+            actual = vector_rules.explain(codes[i], max_solar[i])
+            assert expected == actual, (soc[i], expected, actual)
+        expected_hours = sorted(ts.hour for ts in rules_engine.find_cheapest_hours(forecast, 3))
+        assert expected_hours == sorted(int(h % 24) for h in arrays.cheapest_hours(3, now))
+
+
+def main(batteries: int, seed: int):
+    check_equivalence(seed=seed)
+
+    rng = np.random.default_rng(seed)
+    now = datetime.now(timezone.utc)
+    forecast = _forecast(now, random.Random(seed))
+    soc = rng.uniform(0, 100, batteries)
+    solar = rng.uniform(0, 600, (batteries, 6))
+
+    start = time.perf_counter()
+    current_price = next(i for i in forecast if i['timestamp_utc'].hour == now.hour and i['timestamp_utc'].date() == now.date())['price_eur_kwh']
+    solar_lists = solar.tolist()
+    for i in range(batteries):
+        rules_engine.fast_rules(float(soc[i]), current_price, forecast, solar_lists[i])
+    scalar = time.perf_counter() - start
+
+    start = time.perf_counter()
+    arrays = vector_rules.PriceArrays.from_forecast(forecast)
+    codes = vector_rules.fast_rules_vectorized(soc, arrays.current_price(now), arrays, solar.max(axis=1), now)
+    vectorized = time.perf_counter() - start
+
+    print(json.dumps({
+        "batteries": batteries,
+        "scalar_seconds": round(scalar, 4),
+        "vectorized_seconds": round(vectorized, 4),
+        "speedup": round(scalar / vectorized, 1),
+        "undecided": int(np.count_nonzero(codes == vector_rules.NO_RULE)),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batteries", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    main(args.batteries, args.seed)
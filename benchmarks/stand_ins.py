@@ -0,0 +1,199 @@
+# Lokale Stellvertreter für die externen Dienste, damit Benchmarks ohne
+# Internet und ohne Rate-Limits laufen. Der Server spricht minimales
+# HTTP/1.1 mit Keep-Alive – genug für httpx, ohne zusätzliche Abhängigkeiten.
+# ---------------------------------------------------------------------------
+import asyncio
+import json
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+
+
+def awattar_payload(hours: int = 24) -> dict:
+    """Preiskurve ab der aktuellen Stunde im Format der aWATTar-API (€/MWh, ms-Zeitstempel)."""
+    start = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    data = []
+    for h in range(hours):
+        ts = start + timedelta(hours=h)
+        # Günstig in der Nacht, teuer am Abend
+        price_mwh = 120.0 + 180.0 * (ts.hour in (17, 18, 19, 20)) - 60.0 * (ts.hour in (1, 2, 3, 4))
+        data.append({
+            "start_timestamp": int(ts.timestamp() * 1000),
+            "end_timestamp": int((ts + timedelta(hours=1)).timestamp() * 1000),
+            "marketprice": price_mwh,
+            "unit": "Eur/MWh",
+        })
+    return {"object": "list", "data": data, "url": "/at/v1/marketdata"}
+
+
+def open_meteo_payload() -> dict:
+    """Stündliche Einstrahlung des heutigen Tages (UTC) im Format der Open-Meteo-API."""
+    radiation = [max(0.0, 800.0 - 100.0 * abs(h - 12)) for h in range(24)]
+    return {"hourly": {"time": [f"T{h:02d}:00" for h in range(24)], "shortwave_radiation": radiation}}
+
+
+class StandInServer:
+    """
+    Minimaler HTTP-Server. `routes` bildet einen Pfad-Präfix auf eine Funktion
+    (method, path, body) -> (status, dict) ab. `latency` simuliert die Upstream-Latenz.
+    """
+    def __init__(self, routes: dict, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0):
+        self.routes = routes
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.requests = 0
+        self.connections = 0
+        self._server: asyncio.AbstractServer | None = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = b""
+                if "content-length" in headers:
+                    body = await reader.readexactly(int(headers["content-length"]))
+
+                self.requests += 1
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                status, payload = self._dispatch(method, target, body)
+                raw = json.dumps(payload).encode()
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(
+                    f"HTTP/1.1 {status} OK\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(raw)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode()
+                    + raw
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def _dispatch(self, method: str, target: str, body: bytes) -> tuple[int, dict]:
+        path = target.split("?", 1)[0]
+        for prefix, handler in self.routes.items():
+            if path.startswith(prefix):
+                return handler(method, target, body)
+        return 404, {"error": f"no route for {path}"}
+
+
+def forecast_routes() -> dict:
+    """Routen für aWATTar und Open-Meteo mit festen Antworten."""
+    return {
+        "/v1/marketdata": lambda method, target, body: (200, awattar_payload()),
+        "/v1/forecast": lambda method, target, body: (200, open_meteo_payload()),
+    }
+
+
+class OpenAIStandIn:
+    """
+    Routen für die OpenAI-API (/v1/models und /v1/chat/completions). Mit Wahrscheinlichkeit
+    `error_rate` antwortet der Chat-Endpunkt mit 500 (das SDK wiederholt dann selbst).
+    Die Latenz kommt wie bei den anderen Stand-ins über StandInServer(latency=...).
+    """
+    def __init__(self, error_rate: float = 0.0, seed: int = 0, action: str = "DO_NOTHING"):
+        self.error_rate = error_rate
+        self.action = action
+        self._rng = random.Random(seed)
+        self.chat_requests = 0
+        self.injected_errors = 0
+
+    def routes(self) -> dict:
+        return {
+            "/v1/models": lambda method, target, body: (200, {"object": "list", "data": [{"id": "gpt-4o", "object": "model"}]}),
+            "/v1/chat/completions": self._chat,
+        }
+
+    def _chat(self, method: str, target: str, body: bytes) -> tuple[int, dict]:
+        self.chat_requests += 1
+        if self._rng.random() < self.error_rate:
+            self.injected_errors += 1
+            return 500, {"error": {"message": "injected error", "type": "server_error", "code": None}}
+        content = json.dumps({"action": self.action, "reason": "Stand-in: feste Antwort."})
+        return 200, {
+            "id": "chatcmpl-standin", "object": "chat.completion", "created": 0, "model": "gpt-4o",
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": 400, "completion_tokens": 30, "total_tokens": 430},
+        }
+
+
+class InMemoryGraph:
+    """
+    Stand-in für execute_query/execute_read/execute_write aus database.neo4j_client.
+    Versteht nur die Queries, die die API tatsächlich stellt (Registrierung und
+    Nutzer-Lookup); alles andere liefert eine leere Ergebnisliste.
+    `latency` simuliert den Roundtrip zum Server.
+    """
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.users: dict[str, dict] = {}
+        self.apartments: dict[str, dict] = {}
+        self.queries = 0
+
+    async def execute_query(self, query: str, parameters: dict | None = None, **kwargs) -> list[dict]:
+        self.queries += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        parameters = parameters or {}
+        if "MERGE (u:User" in query and "CREATE (a:Apartment" in query:
+            return self._register(parameters)
+        if "MATCH (u:User {email: $email})" in query:
+            user = self.users.get(parameters.get("email"))
+            return [{"userId": user["userId"]}] if user else []
+        return []
+
+    async def execute_read(self, query: str, parameters: dict | None = None) -> list[dict]:
+        return await self.execute_query(query, parameters)
+
+    async def execute_write(self, query: str, parameters: dict | None = None) -> list[dict]:
+        return await self.execute_query(query, parameters)
+
+    def _register(self, parameters: dict) -> list[dict]:
+        # Wie MERGE ... ON CREATE: bestehender Nutzer bleibt, die Wohnung kommt immer dazu
+        user = self.users.setdefault(parameters["email"], {"userId": str(uuid.uuid4()), "username": parameters.get("username")})
+        apartment_id = str(uuid.uuid4())
+        self.apartments[apartment_id] = {"address": parameters.get("address"), "owner": user["userId"]}
+        return [{"userId": user["userId"], "apartmentId": apartment_id}]
+
+
+def percentiles(samples: list[float], points=(50, 95, 99)) -> dict:
+    """Perzentile in Millisekunden (Nearest-Rank)."""
+    if not samples:
+        return {f"p{p}": None for p in points}
+    ordered = sorted(samples)
+    return {f"p{p}": round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] * 1000, 3) for p in points}
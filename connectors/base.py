@@ -1,7 +1,22 @@
 # connectors/base.py
+import asyncio
 from abc import ABC, abstractmethod
 
+# Modi, die set_charge_mode versteht
+CHARGE_MODES = ("charge", "discharge", "idle")
+
 class BatteryConnector(ABC):
+    device_id: str
+    # Standort für die Solarprognose; None = Standard-Standort des Regelkreises
+    lat: float | None = None
+    lon: float | None = None
+    # Rate-Limits und Batching gelten pro Hersteller-API
+    vendor: str = "generic"
+    # Befehle pro API-Aufruf (1 = Hersteller hat keine Sammel-API)
+    max_batch_size: int = 1
+    # API-Aufrufe pro Sekunde, die der Hersteller erlaubt
+    rate_limit_per_second: float = 10.0
+
     @abstractmethod
     async def get_soc_percent(self) -> float:
         """Gibt den aktuellen Ladestand der Batterie in Prozent zurück."""
@@ -12,4 +27,29 @@ class BatteryConnector(ABC):
         """Setzt den Modus der Batterie, z.B. 'charge', 'discharge', 'idle'."""
         pass
 
-    # ... weitere notwendige Funktionen
\ No newline at end of file
+    @classmethod
+    async def set_charge_modes(cls, commands: list[tuple["BatteryConnector", str]]) -> list[BaseException | None]:
+        """
+        Setzt die Modi mehrerer Batterien desselben Herstellers mit EINEM API-Aufruf.
+        Gibt pro Befehl None (ok) oder die Exception zurück. Ohne Sammel-API des
+        Herstellers werden die Einzelbefehle parallel abgesetzt.
+        """
+        results = await asyncio.gather(*(c.set_charge_mode(mode) for c, mode in commands), return_exceptions=True)
+        return [r if isinstance(r, BaseException) else None for r in results]
+
+    # ... weitere notwendige Funktionen
+
+class MeterConnector(ABC):
+    """Ein Messgerät (z.B. Shelly), das die Energieflüsse eines Haushalts liefert."""
+    device_id: str
+    user_id: str
+    device_type: str = "meter"
+    model_name: str = "unknown"
+
+    @abstractmethod
+    async def get_reading(self) -> dict:
+        """
+        Gibt die Messwerte seit der letzten Abfrage zurück, z.B.
+        {"consumption": 1.5, "from_solar": 1.0, "from_battery": 0.5} (jeweils kWh).
+        """
+        pass
@@ -0,0 +1,155 @@
+# connectors/simulated.py
+# Simulierte Geräte für Lasttests und lokale Entwicklung – ganz ohne Hardware.
+import asyncio
+import math
+import random
+import time
+from datetime import datetime, timezone
+
+from connectors.base import CHARGE_MODES, BatteryConnector, MeterConnector
+
+
+class SimulatedMeter(MeterConnector):
+    """
+    Liefert plausible Stundenwerte mit zufälliger Antwortzeit und Fehlerquote,
+    damit sich Timeouts und Backpressure im Ingest realistisch verhalten.
+    """
+    def __init__(self, device_id: str, user_id: str, latency_range: tuple[float, float] = (0.02, 0.2),
+                 failure_rate: float = 0.0, seed: int | None = None):
+        self.device_id = device_id
+        self.user_id = user_id
+        self.model_name = "SimShelly 3EM"
+        self.latency_range = latency_range
+        self.failure_rate = failure_rate
+        self._rng = random.Random(seed if seed is not None else device_id)
+
+    async def get_reading(self) -> dict:
+        await asyncio.sleep(self._rng.uniform(*self.latency_range))
+        if self._rng.random() < self.failure_rate:
+            raise ConnectionError(f"Gerät {self.device_id} antwortet nicht.")
+        consumption = self._rng.uniform(0.2, 2.0)
+        from_solar = self._rng.uniform(0.0, consumption)
+        from_battery = self._rng.uniform(0.0, consumption - from_solar)
+        return {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "consumption": consumption,
+            "from_solar": from_solar,
+            "from_battery": from_battery,
+        }
+
+
+class SimulatedBattery(BatteryConnector):
+    """
+    Heimspeicher mit einfacher Physik: Kapazität, Lade-/Entladeleistung,
+    Wirkungsgrad, Selbstentladung, Hauslast und PV-Erzeugung. Der Zustand wird
+    bei jedem Zugriff um die vergangene Zeit fortgeschrieben; `time_scale`
+    beschleunigt die simulierte Zeit (60 = eine Minute pro Sekunde).
+    Die Hersteller-API hat eine Sammel-API (`set_charge_modes`) mit einer
+    Antwortzeit pro Aufruf statt pro Batterie.
+    """
+    vendor = "simulated"
+    max_batch_size = 100
+    rate_limit_per_second = 200.0
+    # Aufrufe der (simulierten) Hersteller-API, zum Prüfen von Batching und Rate-Limit
+    api_calls = 0
+
+    SELF_DISCHARGE_PER_HOUR = 0.0005
+
+    def __init__(self, device_id: str, capacity_kwh: float = 10.0, max_charge_kw: float = 5.0,
+                 max_discharge_kw: float = 5.0, efficiency: float = 0.95, pv_peak_kw: float = 6.0,
+                 soc_percent: float | None = None, bms_min_percent: float = 5.0, bms_max_percent: float = 99.0,
+                 lat: float | None = None, lon: float | None = None,
+                 latency_range: tuple[float, float] = (0.02, 0.2), failure_rate: float = 0.0,
+                 time_scale: float = 1.0, clock=time.monotonic, seed: int | None = None):
+        self.device_id = device_id
+        self.lat = lat
+        self.lon = lon
+        self.capacity_kwh = capacity_kwh
+        self.max_charge_kw = max_charge_kw
+        self.max_discharge_kw = max_discharge_kw
+        self.efficiency = efficiency
+        self.pv_peak_kw = pv_peak_kw
+        self.bms_min_kwh = capacity_kwh * bms_min_percent / 100
+        self.bms_max_kwh = capacity_kwh * bms_max_percent / 100
+        self.latency_range = latency_range
+        self.failure_rate = failure_rate
+        self.time_scale = time_scale
+        self._clock = clock
+        self._rng = random.Random(seed if seed is not None else device_id)
+        start_soc = soc_percent if soc_percent is not None else self._rng.uniform(10, 90)
+        self.energy_kwh = min(max(capacity_kwh * start_soc / 100, self.bms_min_kwh), self.bms_max_kwh)
+        self.mode = "idle"
+        self.mode_changes = 0
+        self._updated = clock()
+
+    @property
+    def soc_percent(self) -> float:
+        return 100 * self.energy_kwh / self.capacity_kwh
+
+    def _pv_kw(self) -> float:
+        now = datetime.now(timezone.utc)
+        hour = now.hour + now.minute / 60
+        return self.pv_peak_kw * max(0.0, math.sin(math.pi * (hour - 5) / 14))
+
+    def advance(self):
+        """Schreibt den Energieinhalt bis jetzt fort."""
+        now = self._clock()
+        hours = (now - self._updated) * self.time_scale / 3600
+        self._updated = now
+        if hours <= 0:
+            return
+        load_kw = self._rng.uniform(0.2, 1.5)
+        pv_kw = self._pv_kw()
+        if self.mode == "charge":
+            power_kw = self.max_charge_kw
+        elif self.mode == "discharge":
+            power_kw = -min(self.max_discharge_kw, max(load_kw - pv_kw, 0.0))
+        else:
+            # Eigenverbrauch: nur PV-Überschuss wird eingespeichert
+            power_kw = min(max(pv_kw - load_kw, 0.0), self.max_charge_kw)
+        delta = power_kw * hours * (self.efficiency if power_kw > 0 else 1 / self.efficiency)
+        delta -= self.capacity_kwh * self.SELF_DISCHARGE_PER_HOUR * hours
+        # Das BMS hält die Batterie in ihren Grenzen
+        self.energy_kwh = min(max(self.energy_kwh + delta, self.bms_min_kwh), self.bms_max_kwh)
+
+    async def _respond(self):
+        await asyncio.sleep(self._rng.uniform(*self.latency_range))
+        if self._rng.random() < self.failure_rate:
+            raise ConnectionError(f"Batterie {self.device_id} antwortet nicht.")
+
+    async def get_soc_percent(self) -> float:
+        await self._respond()
+        self.advance()
+        return self.soc_percent
+
+    def _apply(self, mode: str):
+        if mode not in CHARGE_MODES:
+            raise ValueError(f"Unbekannter Modus '{mode}'.")
+        self.advance()
+        if mode != self.mode:
+            self.mode = mode
+            self.mode_changes += 1
+
+    async def set_charge_mode(self, mode: str):
+        SimulatedBattery.api_calls += 1
+        await self._respond()
+        self._apply(mode)
+
+    @classmethod
+    async def set_charge_modes(cls, commands: list[tuple["SimulatedBattery", str]]) -> list[BaseException | None]:
+        # Ein Aufruf für den ganzen Batch; einzelne Geräte können trotzdem fehlschlagen
+        SimulatedBattery.api_calls += 1
+        if not commands:
+            return []
+        first = commands[0][0]
+        await asyncio.sleep(first._rng.uniform(*first.latency_range))
+        results: list[BaseException | None] = []
+        for battery, mode in commands:
+            try:
+                if battery._rng.random() < battery.failure_rate:
+                    raise ConnectionError(f"Batterie {battery.device_id} antwortet nicht.")
+                battery._apply(mode)
+                results.append(None)
+            except Exception as e:
+                results.append(e)
+        return results
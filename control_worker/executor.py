@@ -0,0 +1,247 @@
+# ---------------------------------------------------------------------------
+# control_worker/executor.py
+# ---------------------------------------------------------------------------
+# Geschlossener Regelkreis für Heimspeicher:
+#
+#   Batterien ──> [SoC lesen, parallel] ──> [Regeln, vektorisiert] ──> [Befehle] ──> Hersteller-APIs
+#
+# - SoC-Abfragen laufen parallel (Nebenläufigkeitsgrenze, Timeout, Wiederholung).
+# - Entschieden wird lokal mit den schnellen Regeln (vector_rules), ohne LLM:
+#   Preisprognose einmal pro Zyklus, Solarprognose einmal pro Gitterzelle.
+# - set_charge_mode wird nur abgesetzt, wenn sich der Modus ändert (oder der
+#   letzte bestätigte Befehl älter als CONTROL_RESEND_SECONDS ist).
+# - Befehle werden pro Hersteller gebündelt (max_batch_size des Connectors)
+#   und mit einem Rate-Limit pro Hersteller-API verschickt; fehlgeschlagene
+#   Befehle eines Batches werden mit Backoff wiederholt.
+# ===========================================================================
+import asyncio
+import os
+import time
+from collections import defaultdict
+from typing import Awaitable, Callable
+
+import numpy as np
+
+from connectors.base import CHARGE_MODES, BatteryConnector
+from optimisation_api.logic import rules_engine, vector_rules
+from optimisation_api.models import Action
+from optimisation_api.services import external_apis
+from optimisation_api.services.forecast_cache import grid_cell
+
+CONTROL_READ_CONCURRENCY = int(os.environ.get("CONTROL_READ_CONCURRENCY", "2000"))
+CONTROL_READ_TIMEOUT_SECONDS = float(os.environ.get("CONTROL_READ_TIMEOUT_SECONDS", "10"))
+CONTROL_READ_RETRIES = int(os.environ.get("CONTROL_READ_RETRIES", "1"))
+CONTROL_COMMAND_TIMEOUT_SECONDS = float(os.environ.get("CONTROL_COMMAND_TIMEOUT_SECONDS", "10"))
+CONTROL_COMMAND_RETRIES = int(os.environ.get("CONTROL_COMMAND_RETRIES", "2"))
+CONTROL_RETRY_BACKOFF_SECONDS = float(os.environ.get("CONTROL_RETRY_BACKOFF_SECONDS", "0.5"))
+# Auch ohne Änderung wird der Modus spätestens nach dieser Zeit erneut gesetzt
+# (falls jemand die Batterie am Gerät oder in der Hersteller-App umgestellt hat)
+CONTROL_RESEND_SECONDS = float(os.environ.get("CONTROL_RESEND_SECONDS", "900"))
+# Überschreibt die Rate-Limits der Connectoren, z.B. "tuya=5,simulated=200" (Aufrufe pro Sekunde)
+CONTROL_VENDOR_RATE_LIMITS = {
+    vendor.strip(): float(rate)
+    for vendor, rate in (item.split("=", 1) for item in os.environ.get("CONTROL_VENDOR_RATE_LIMITS", "").split(",") if "=" in item)
+}
+# Standort für Batterien ohne eigene Koordinaten (wie in /entscheidung)
+CONTROL_DEFAULT_LAT = float(os.environ.get("CONTROL_DEFAULT_LAT", "50.1109"))
+CONTROL_DEFAULT_LON = float(os.environ.get("CONTROL_DEFAULT_LON", "8.6821"))
+
+ACTION_MODES = {
+    Action.CHARGE_FROM_GRID: "charge",
+    Action.DISCHARGE_TO_HOUSE: "discharge",
+    Action.WAIT_FOR_SOLAR: "idle",
+    Action.DO_NOTHING: "idle",
+}
+
+# Modus-Index (in CHARGE_MODES) pro Regel-Code; ohne greifende Regel bleibt die Batterie im Eigenverbrauch
+RULE_CODE_MODES = np.full(max(vector_rules.RULE_ACTIONS) + 1, CHARGE_MODES.index("idle"), dtype=np.int8)
+for _code, _action in vector_rules.RULE_ACTIONS.items():
+    RULE_CODE_MODES[_code] = CHARGE_MODES.index(ACTION_MODES[_action])
+
+
+class RateLimiter:
+    """Verteilt API-Aufrufe gleichmäßig: höchstens `rate` pro Sekunde."""
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._next = 0.0
+
+    async def acquire(self):
+        now = time.monotonic()
+        slot = max(now, self._next)
+        self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class ControlLoop:
+    """
+    Nutzung:
+        loop = ControlLoop()
+        stats = await loop.run_cycle(connectors)   # alle 60 s
+    """
+    def __init__(self,
+                 fetch_prices: Callable[[], Awaitable[list[dict] | None]] = external_apis.get_epex_spot_forecast,
+                 fetch_solar: Callable[[float, float], Awaitable[list[float] | None]] = external_apis.get_solar_forecast,
+                 read_concurrency: int = CONTROL_READ_CONCURRENCY,
+                 read_timeout: float = CONTROL_READ_TIMEOUT_SECONDS,
+                 read_retries: int = CONTROL_READ_RETRIES,
+                 command_timeout: float = CONTROL_COMMAND_TIMEOUT_SECONDS,
+                 command_retries: int = CONTROL_COMMAND_RETRIES,
+                 retry_backoff: float = CONTROL_RETRY_BACKOFF_SECONDS,
+                 resend_seconds: float = CONTROL_RESEND_SECONDS):
+        self.fetch_prices = fetch_prices
+        self.fetch_solar = fetch_solar
+        self.read_concurrency = read_concurrency
+        self.read_timeout = read_timeout
+        self.read_retries = read_retries
+        self.command_timeout = command_timeout
+        self.command_retries = command_retries
+        self.retry_backoff = retry_backoff
+        self.resend_seconds = resend_seconds
+        # Zuletzt bestätigter Modus pro Batterie: device_id -> (Modus, Zeitpunkt)
+        self._applied: dict[str, tuple[str, float]] = {}
+        self._limiters: dict[str, RateLimiter] = {}
+        self._reset_counters()
+
+    def _reset_counters(self):
+        self.read_errors = 0
+        self.commands = 0
+        self.unchanged = 0
+        self.api_calls = 0
+        self.command_errors = 0
+
+    def _limiter(self, connector_cls: type[BatteryConnector]) -> RateLimiter:
+        vendor = connector_cls.vendor
+        if vendor not in self._limiters:
+            self._limiters[vendor] = RateLimiter(CONTROL_VENDOR_RATE_LIMITS.get(vendor, connector_cls.rate_limit_per_second))
+        return self._limiters[vendor]
+
+    async def run_cycle(self, connectors: list[BatteryConnector]) -> dict:
+        """Liest alle Batterien, entscheidet und setzt geänderte Modi. Gibt Kennzahlen zurück."""
+        self._reset_counters()
+        start = time.perf_counter()
+        socs = await self._read_all(connectors)
+        read_seconds = time.perf_counter() - start
+        modes = await self._decide(connectors, socs)
+
+        commands: list[tuple[BatteryConnector, str]] = []
+        if modes is not None:
+            now = time.monotonic()
+            for connector, soc, mode_index in zip(connectors, socs, modes):
+                if np.isnan(soc):
+                    continue
+                mode = CHARGE_MODES[mode_index]
+                applied = self._applied.get(connector.device_id)
+                if applied is not None and applied[0] == mode and now - applied[1] < self.resend_seconds:
+                    self.unchanged += 1
+                    continue
+                commands.append((connector, mode))
+        await self._dispatch(commands)
+
+        duration = time.perf_counter() - start
+        stats = {
+            "batteries": len(connectors),
+            "read": len(connectors) - self.read_errors,
+            "read_errors": self.read_errors,
+            "commands": self.commands,
+            "unchanged": self.unchanged,
+            "api_calls": self.api_calls,
+            "command_errors": self.command_errors,
+            "read_s": round(read_seconds, 3),
+            "duration_s": round(duration, 3),
+            "batteries_per_second": round(len(connectors) / duration, 1) if duration else 0.0,
+        }
+        print(f"INFO: Regelzyklus: {stats['read']}/{stats['batteries']} Batterien in {duration:.2f}s, "
+              f"{self.commands} Befehle in {self.api_calls} API-Aufrufen ({self.unchanged} unverändert, "
+              f"{self.read_errors + self.command_errors} Fehler).")
+        return stats
+
+    # --- SoC lesen ---
+    async def _read_all(self, connectors: list[BatteryConnector]) -> np.ndarray:
+        semaphore = asyncio.Semaphore(self.read_concurrency)
+
+        async def read(connector: BatteryConnector) -> float:
+            async with semaphore:
+                for attempt in range(self.read_retries + 1):
+                    try:
+                        return float(await asyncio.wait_for(connector.get_soc_percent(), timeout=self.read_timeout))
+                    except Exception as e:
+                        if attempt == self.read_retries:
+                            self.read_errors += 1
+                            if self.read_errors <= 10:
+                                print(f"FEHLER: SoC von Batterie {connector.device_id} nicht lesbar: {e!r}")
+                return float("nan")
+
+        return np.array(await asyncio.gather(*(read(c) for c in connectors)), dtype=np.float64)
+
+    # --- Entscheiden ---
+    async def _decide(self, connectors: list[BatteryConnector], socs: np.ndarray) -> np.ndarray | None:
+        """Modus-Index pro Batterie; None, wenn ohne Preisprognose nichts entschieden werden kann."""
+        price_forecast = await self.fetch_prices()
+        if price_forecast is None:
+            print("WARNUNG: Keine Preisprognose, Batterien behalten ihren Modus.")
+            return None
+        arrays = vector_rules.price_arrays_for(price_forecast)
+        current_price = arrays.current_price()
+        if current_price is None:
+            print("WARNUNG: Aktueller Strompreis unbekannt, Batterien behalten ihren Modus.")
+            return None
+
+        # Solarprognose nur einmal pro Gitterzelle
+        locations = [(c.lat if c.lat is not None else CONTROL_DEFAULT_LAT, c.lon if c.lon is not None else CONTROL_DEFAULT_LON)
+                     for c in connectors]
+        cells: dict[tuple[float, float], tuple[float, float]] = {}
+        for lat, lon in locations:
+            cells.setdefault(grid_cell(lat, lon), (lat, lon))
+        forecasts = await asyncio.gather(*(self.fetch_solar(lat, lon) for lat, lon in cells.values()))
+        # Ohne Solarprognose greift die Solar-Regel nicht, die übrigen Regeln schon
+        max_solar_by_cell = {cell: max(f or (), default=0.0) for cell, f in zip(cells, forecasts)}
+        max_solar = np.array([max_solar_by_cell[grid_cell(lat, lon)] for lat, lon in locations], dtype=np.float64)
+
+        codes = vector_rules.rule_codes(socs, current_price, vector_rules.cheap_hour_now(arrays), max_solar)
+        modes = RULE_CODE_MODES[codes]
+        if current_price > rules_engine.SAFETY_MAX_CHARGE_PRICE_EUR_KWH:
+            modes[modes == CHARGE_MODES.index("charge")] = CHARGE_MODES.index("idle")
+        return modes
+
+    # --- Befehle absetzen ---
+    async def _dispatch(self, commands: list[tuple[BatteryConnector, str]]):
+        by_class: dict[type, list[tuple[BatteryConnector, str]]] = defaultdict(list)
+        for connector, mode in commands:
+            by_class[type(connector)].append((connector, mode))
+        batches = [
+            (cls, items[i:i + max(cls.max_batch_size, 1)])
+            for cls, items in by_class.items()
+            for i in range(0, len(items), max(cls.max_batch_size, 1))
+        ]
+        await asyncio.gather(*(self._send_batch(cls, batch) for cls, batch in batches))
+
+    async def _send_batch(self, cls: type[BatteryConnector], batch: list[tuple[BatteryConnector, str]]):
+        limiter = self._limiter(cls)
+        pending = batch
+        for attempt in range(self.command_retries + 1):
+            await limiter.acquire()
+            self.api_calls += 1
+            try:
+                results = await asyncio.wait_for(cls.set_charge_modes(pending), timeout=self.command_timeout)
+            except Exception as e:
+                results = [e] * len(pending)
+            now = time.monotonic()
+            failed = []
+            for (connector, mode), error in zip(pending, results):
+                if error is None:
+                    self.commands += 1
+                    self._applied[connector.device_id] = (mode, now)
+                else:
+                    failed.append((connector, mode, error))
+            if not failed:
+                return
+            pending = [(connector, mode) for connector, mode, _ in failed]
+            if attempt < self.command_retries:
+                await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+        for connector, mode, error in failed:
+            self.command_errors += 1
+            # Zustand unbekannt: im nächsten Zyklus auf jeden Fall erneut senden
+            self._applied.pop(connector.device_id, None)
+            if self.command_errors <= 10:
+                print(f"FEHLER: Modus '{mode}' für Batterie {connector.device_id} nicht gesetzt: {error!r}")
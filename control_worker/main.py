@@ -0,0 +1,67 @@
+# ---------------------------------------------------------------------------
+# control_worker/main.py
+# ---------------------------------------------------------------------------
+# Eigener Dienst, der die Entscheidungen auf die Hardware bringt: jede Minute
+# alle Batterien lesen, lokal entscheiden und geänderte Modi setzen
+# (control_worker/executor.py).
+# ---------------------------------------------------------------------------
+import asyncio
+import os
+import signal
+import time
+
+from connectors.simulated import SimulatedBattery
+from control_worker.executor import ControlLoop
+from optimisation_api.services import http_client
+
+CONTROL_INTERVAL_SECONDS = float(os.environ.get("CONTROL_INTERVAL_SECONDS", "60"))
+# Nur für Entwicklung/Lasttests: so viele simulierte Batterien steuern
+CONTROL_SIMULATED_BATTERIES = int(os.environ.get("CONTROL_SIMULATED_BATTERIES", "0"))
+
+
+def load_connectors() -> list:
+    """
+    Liefert die zu steuernden Batterien. Eine Geräte-Registry gibt es noch nicht,
+    daher werden hier (optional) simulierte Batterien erzeugt.
+    """
+    if CONTROL_SIMULATED_BATTERIES:
+        return [SimulatedBattery(f"sim-battery-{i}") for i in range(CONTROL_SIMULATED_BATTERIES)]
+    print("WARNUNG: Keine Batterien konfiguriert (CONTROL_SIMULATED_BATTERIES=0).")
+    return []
+
+
+async def run(stop_event: asyncio.Event):
+    await http_client.start_http_client()
+    control_loop = ControlLoop()
+    # Die Connectoren halten den Zustand der simulierten Batterien, also nur einmal laden
+    connectors = load_connectors()
+    try:
+        while not stop_event.is_set():
+            cycle_start = time.monotonic()
+            await control_loop.run_cycle(connectors)
+            remaining = CONTROL_INTERVAL_SECONDS - (time.monotonic() - cycle_start)
+            if remaining <= 0:
+                print("WARNUNG: Regelzyklus hat länger als das Intervall gedauert.")
+                continue
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        await http_client.close_http_client()
+
+
+def main():
+    print("Starte Regelkreis-Worker...")
+
+    async def _main():
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop_event.set)
+        await run(stop_event)
+
+    asyncio.run(_main())
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,211 @@
 # /app/database/neo4j_client.py
+# ---------------------------------------------------------------------------
+# ÜBERARBEITET: Verbindungs-Pool, Lese-/Schreib-Routing und Query-Messung
+#
+# - Pool-Größe und Wartezeit auf eine freie Verbindung sind konfigurierbar
+#   (NEO4J_MAX_POOL_SIZE, NEO4J_POOL_ACQUISITION_TIMEOUT_SECONDS).
+# - execute_read/execute_write laufen in verwalteten Transaktionen: der Treiber
+#   wiederholt vorübergehende Fehler (Leader-Wechsel, Deadlocks) automatisch.
+#   Lesende Transaktionen gehen bei einem Cluster (URI neo4j://) an Follower
+#   bzw. Read-Replicas, schreibende an den Leader. Ein gemeinsamer Bookmark-
+#   Manager sorgt dafür, dass Lesezugriffe die eigenen Schreibvorgänge sehen.
+# - stream() liefert große Ergebnisse Record für Record statt alles per
+#   result.data() in den Speicher zu holen.
+# - Jede Query wird gemessen: Latenz-Histogramm pro Query-Fingerprint (Query
+#   mit Literalen durch '?' ersetzt) und ein Slow-Query-Log.
+# - Optional ein OpenTelemetry-Span pro Query (OTEL_TRACING_ENABLED=1, wie
+#   in optimisation_api/services/metrics.py).
+# - Das Paket 'neo4j' wird erst in connect() (im Worker-Thread) importiert, damit
+#   der Import der Dienste nicht auf den Treiber wartet.
+# ---------------------------------------------------------------------------
 
+import asyncio
+import hashlib
+import importlib
+import importlib.util
 import os
-from neo4j import AsyncGraphDatabase, AsyncDriver
+import re
+import time
+from collections import deque
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable
+
+if TYPE_CHECKING:
+    from neo4j import AsyncDriver, AsyncManagedTransaction
+
+# Gleiche Werte wie neo4j.READ_ACCESS / neo4j.WRITE_ACCESS
+READ_ACCESS = "READ"
+WRITE_ACCESS = "WRITE"
+
+NEO4J_DATABASE = os.environ.get("NEO4J_DATABASE", "neo4j")
+NEO4J_MAX_POOL_SIZE = int(os.environ.get("NEO4J_MAX_POOL_SIZE", "100"))
+# So lange wartet eine Query auf eine freie Verbindung, bevor sie fehlschlägt
+NEO4J_POOL_ACQUISITION_TIMEOUT_SECONDS = float(os.environ.get("NEO4J_POOL_ACQUISITION_TIMEOUT_SECONDS", "30"))
+# So lange darf der Verbindungstest in connect() dauern
+NEO4J_CONNECT_TIMEOUT_SECONDS = float(os.environ.get("NEO4J_CONNECT_TIMEOUT_SECONDS", "10"))
+# Gesamtzeit, in der verwaltete Transaktionen wiederholt werden
+NEO4J_MAX_RETRY_SECONDS = float(os.environ.get("NEO4J_MAX_RETRY_SECONDS", "15"))
+NEO4J_STREAM_FETCH_SIZE = int(os.environ.get("NEO4J_STREAM_FETCH_SIZE", "1000"))
+NEO4J_SLOW_QUERY_MS = float(os.environ.get("NEO4J_SLOW_QUERY_MS", "500"))
+# Pro Fingerprint höchstens alle so viele Sekunden eine Slow-Query-Warnung im Log
+NEO4J_SLOW_QUERY_LOG_INTERVAL_SECONDS = float(os.environ.get("NEO4J_SLOW_QUERY_LOG_INTERVAL_SECONDS", "60"))
+# Obergrenze für unterschiedliche Fingerprints; alles darüber landet unter "other"
+NEO4J_MAX_FINGERPRINTS = int(os.environ.get("NEO4J_MAX_FINGERPRINTS", "500"))
+
+# Obergrenzen der Histogramm-Buckets in Millisekunden (letzter Bucket: alles darüber)
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+if os.environ.get("OTEL_TRACING_ENABLED", "0") == "1" and importlib.util.find_spec("opentelemetry") is not None:
+    from opentelemetry import trace
+    _tracer = trace.get_tracer("database.neo4j_client")
+else:
+    _tracer = None
+
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER_LITERAL = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def query_fingerprint(query: str) -> tuple[str, str]:
+    """(Fingerprint, normalisierte Query): Literale durch '?' ersetzt, Leerraum zusammengefasst."""
+    normalized = _WHITESPACE.sub(" ", _NUMBER_LITERAL.sub("?", _STRING_LITERAL.sub("?", query))).strip()
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12], normalized
+
+
+class _QueryTiming:
+    __slots__ = ("query", "buckets", "count", "total_ms", "max_ms", "errors", "slow", "last_logged")
+
+    def __init__(self, query: str):
+        self.query = query
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.errors = 0
+        self.slow = 0
+        self.last_logged = 0.0
+
+
+class QueryStats:
+    """Latenz-Histogramme und Slow-Query-Log, beides nach Query-Fingerprint."""
+    def __init__(self, slow_query_ms: float = NEO4J_SLOW_QUERY_MS, max_fingerprints: int = NEO4J_MAX_FINGERPRINTS):
+        self.slow_query_ms = slow_query_ms
+        self.max_fingerprints = max_fingerprints
+        self._timings: dict[str, _QueryTiming] = {}
+        self.slow_log: deque[dict] = deque(maxlen=100)
+
+    def record(self, fingerprint: str, query: str, duration_ms: float, failed: bool = False):
+        timing = self._timings.get(fingerprint)
+        if timing is None:
+            if len(self._timings) >= self.max_fingerprints:
+                fingerprint, query = "other", "other"
+                timing = self._timings.get(fingerprint)
+            if timing is None:
+                timing = self._timings[fingerprint] = _QueryTiming(query[:200])
+        index = next((i for i, bound in enumerate(LATENCY_BUCKETS_MS) if duration_ms <= bound), len(LATENCY_BUCKETS_MS))
+        timing.buckets[index] += 1
+        timing.count += 1
+        timing.total_ms += duration_ms
+        timing.max_ms = max(timing.max_ms, duration_ms)
+        timing.errors += failed
+        if duration_ms >= self.slow_query_ms:
+            timing.slow += 1
+            now = time.time()
+            self.slow_log.append({"fingerprint": fingerprint, "duration_ms": round(duration_ms, 1), "at": now})
+            if now - timing.last_logged >= NEO4J_SLOW_QUERY_LOG_INTERVAL_SECONDS:
+                timing.last_logged = now
+                print(f"WARNUNG: Langsame Neo4j-Query [{fingerprint}] {duration_ms:.0f} ms "
+                      f"({timing.slow}x langsam von {timing.count}): {timing.query[:120]}")
+
+    def histograms(self) -> dict[str, dict]:
+        """Rohdaten pro Fingerprint (Bucket-Zählungen passend zu LATENCY_BUCKETS_MS)."""
+        return {
+            fingerprint: {
+                "query": t.query, "buckets": list(t.buckets), "count": t.count, "sum_ms": t.total_ms,
+                "max_ms": t.max_ms, "errors": t.errors, "slow": t.slow,
+            }
+            for fingerprint, t in self._timings.items()
+        }
+
+    def percentile_ms(self, fingerprint: str, q: float) -> float | None:
+        """Obergrenze des Buckets, in dem das q-Quantil liegt (None ohne Messwerte)."""
+        timing = self._timings.get(fingerprint)
+        if timing is None or not timing.count:
+            return None
+        target, seen = q * timing.count, 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, timing.buckets):
+            seen += count
+            if seen >= target:
+                return float(bound)
+        return timing.max_ms
+
+    def stats(self, top: int = 10) -> dict:
+        slowest = sorted(self._timings.items(), key=lambda item: item[1].total_ms, reverse=True)[:top]
+        return {
+            "queries": sum(t.count for t in self._timings.values()),
+            "slow_queries": sum(t.slow for t in self._timings.values()),
+            "fingerprints": len(self._timings),
+            "top_by_total_time": [
+                {
+                    "fingerprint": fingerprint,
+                    "query": t.query[:120],
+                    "count": t.count,
+                    "avg_ms": round(t.total_ms / t.count, 1) if t.count else 0.0,
+                    "p99_ms": self.percentile_ms(fingerprint, 0.99),
+                    "max_ms": round(t.max_ms, 1),
+                    "slow": t.slow,
+                    "errors": t.errors,
+                }
+                for fingerprint, t in slowest
+            ],
+        }
+
+
+class _Timer:
+    """Misst einen Block und bucht ihn unter dem Fingerprint der Query (optional mit Span)."""
+    __slots__ = ("_stats", "_fingerprint", "_query", "_start", "_span")
+
+    def __init__(self, stats: QueryStats, query: str, label: str | None = None):
+        self._stats = stats
+        if label is None:
+            self._fingerprint, self._query = query_fingerprint(query)
+        else:
+            self._fingerprint, self._query = label, label
+
+    def __enter__(self):
+        self._span = None
+        if _tracer is not None:
+            self._span = _tracer.start_as_current_span("neo4j.query", attributes={
+                "db.system": "neo4j", "db.query.text": self._query, "db.query.fingerprint": self._fingerprint,
+            })
+            self._span.__enter__()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._span is not None:
+            self._span.__exit__(exc_type, exc, tb)
+        # Vorzeitig beendete Streams (GeneratorExit) zählen nicht als Fehler
+        failed = exc_type is not None and not issubclass(exc_type, GeneratorExit)
+        self._stats.record(self._fingerprint, self._query, (time.perf_counter() - self._start) * 1000, failed)
+        return False
+
 
 class Neo4jClient:
     """
     Ein Wrapper für den Neo4j-Treiber, um die Verbindung zu verwalten.
     """
-    def __init__(self):
-        self._driver: AsyncDriver | None = None
+    def __init__(self, database: str = NEO4J_DATABASE):
+        self._driver: "AsyncDriver | None" = None
+        self.database = database
+        self.query_stats = QueryStats()
+        # Kausale Konsistenz über alle Sessions dieses Clients (Lesen nach eigenem Schreiben), in connect() angelegt
+        self._bookmarks = None
+
+    @staticmethod
+    def is_configured() -> bool:
+        return all(os.getenv(name) for name in ("NEO4J_URI", "NEO4J_USERNAME", "NEO4J_PASSWORD"))
 
     async def connect(self):
         """Stellt die Verbindung zur Datenbank her."""
@@ -18,28 +215,101 @@ class Neo4jClient:
         if not all([uri, user, password]):
             print("WARNUNG: Neo4j-Verbindungsdaten nicht vollständig. Neo4j-Client wird nicht initialisiert.")
             return
-        
+
         try:
-            self._driver = AsyncGraphDatabase.driver(uri, auth=(user, password))
-            await self._driver.verify_connectivity()
-            print("INFO: Neo4j-Client erfolgreich verbunden und Konnektivität geprüft.")
+            neo4j = await asyncio.to_thread(importlib.import_module, "neo4j")
+            driver = neo4j.AsyncGraphDatabase.driver(
+                uri, auth=(user, password),
+                max_connection_pool_size=NEO4J_MAX_POOL_SIZE,
+                connection_acquisition_timeout=NEO4J_POOL_ACQUISITION_TIMEOUT_SECONDS,
+                max_transaction_retry_time=NEO4J_MAX_RETRY_SECONDS,
+            )
+            try:
+                await asyncio.wait_for(driver.verify_connectivity(), NEO4J_CONNECT_TIMEOUT_SECONDS)
+            except BaseException:
+                await driver.close()
+                raise
+            # Erst nach erfolgreicher Prüfung sichtbar machen (is_connected)
+            self._bookmarks = self._bookmarks or neo4j.AsyncGraphDatabase.bookmark_manager()
+            self._driver = driver
+            print(f"INFO: Neo4j-Client erfolgreich verbunden und Konnektivität geprüft (Pool: {NEO4J_MAX_POOL_SIZE}).")
         except Exception as e:
-            print(f"FATAL: Neo4j-Verbindung fehlgeschlagen: {e}")
+            print(f"FATAL: Neo4j-Verbindung fehlgeschlagen: {type(e).__name__}: {e}")
             self._driver = None # Sicherstellen, dass der Treiber im Fehlerfall None ist
 
     async def close(self):
         """Schließt die Verbindung zur Datenbank."""
         if self._driver:
-            await self._driver.close()
+            driver, self._driver = self._driver, None
+            await driver.close()
             print("INFO: Neo4j-Verbindung geschlossen.")
 
     @property
-    def driver(self) -> AsyncDriver:
+    def is_connected(self) -> bool:
+        return self._driver is not None
+
+    @property
+    def driver(self) -> "AsyncDriver":
         if not self._driver:
             # Dieser Fehler sollte die App stoppen, da die DB-Verbindung kritisch ist.
             raise Exception("Neo4j-Treiber nicht initialisiert. 'connect' muss zuerst aufgerufen werden oder ist fehlgeschlagen.")
         return self._driver
 
+    def session(self, access_mode: str = WRITE_ACCESS, **kwargs):
+        """Session auf der konfigurierten Datenbank; READ_ACCESS wird im Cluster an Follower geroutet."""
+        kwargs.setdefault("database", self.database)
+        kwargs.setdefault("bookmark_manager", self._bookmarks)
+        return self.driver.session(default_access_mode=access_mode, **kwargs)
+
+    async def read_transaction(self, work: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """Führt `work(tx, *args, **kwargs)` als verwaltete Lese-Transaktion aus (mit Wiederholung)."""
+        with _Timer(self.query_stats, "", label=f"tx:{work.__qualname__}"):
+            async with self.session(READ_ACCESS) as session:
+                return await session.execute_read(work, *args, **kwargs)
+
+    async def write_transaction(self, work: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """Führt `work(tx, *args, **kwargs)` als verwaltete Schreib-Transaktion aus (mit Wiederholung)."""
+        with _Timer(self.query_stats, "", label=f"tx:{work.__qualname__}"):
+            async with self.session(WRITE_ACCESS) as session:
+                return await session.execute_write(work, *args, **kwargs)
+
+    async def execute_read(self, query: str, parameters: dict | None = None) -> list[dict]:
+        """Lesende Query in einer verwalteten Transaktion; Ergebnis als Liste von Dictionaries."""
+        with _Timer(self.query_stats, query):
+            async with self.session(READ_ACCESS) as session:
+                return await session.execute_read(_fetch_all, query, parameters)
+
+    async def execute_write(self, query: str, parameters: dict | None = None) -> list[dict]:
+        """Schreibende Query in einer verwalteten Transaktion; Ergebnis als Liste von Dictionaries."""
+        with _Timer(self.query_stats, query):
+            async with self.session(WRITE_ACCESS) as session:
+                return await session.execute_write(_fetch_all, query, parameters)
+
+    async def stream(self, query: str, parameters: dict | None = None,
+                     fetch_size: int = NEO4J_STREAM_FETCH_SIZE) -> AsyncIterator[dict]:
+        """
+        Liefert die Records einer lesenden Query einzeln, in Paketen von `fetch_size`
+        vom Server geholt. Keine automatische Wiederholung: nach dem ersten Record
+        lässt sich eine Query nicht mehr transparent neu starten. Gemessen wird die
+        Zeit bis zum letzten Record (inkl. der Verarbeitung beim Aufrufer).
+        """
+        with _Timer(self.query_stats, query):
+            async with self.session(READ_ACCESS, fetch_size=fetch_size) as session:
+                result = await session.run(query, parameters)
+                async for record in result:
+                    yield record.data()
+
+    def stats(self) -> dict:
+        pool = {"database": self.database, "max_pool_size": NEO4J_MAX_POOL_SIZE, "connected": self.is_connected}
+        return {**pool, **self.query_stats.stats()}
+
+
+async def _fetch_all(tx: "AsyncManagedTransaction", query: str, parameters: dict | None) -> list[dict]:
+    result = await tx.run(query, parameters)
+    # .data() holt alle Records und gibt sie als Liste von Dictionaries zurück
+    return await result.data()
+
+
 # Globale Instanz, die in der gesamten App wiederverwendet wird.
 neo4j_client = Neo4jClient()
 
@@ -48,9 +318,37 @@ neo4j_client = Neo4jClient()
 async def execute_query(query: str, parameters: dict | None = None, **kwargs):
     """
     Führt eine Cypher-Query sicher aus und gibt die Ergebnisse zurück.
+    Auto-Commit ohne Wiederholung (z.B. für Schema-Befehle); für normale Lese-
+    und Schreibzugriffe execute_read/execute_write verwenden.
+    """
+    with _Timer(neo4j_client.query_stats, query):
+        # Ruft die 'driver' property der globalen Instanz auf
+        async with neo4j_client.session(**kwargs) as session:
+            result = await session.run(query, parameters)
+            return await result.data()
+
+
+async def execute_read(query: str, parameters: dict | None = None) -> list[dict]:
+    return await neo4j_client.execute_read(query, parameters)
+
+
+async def execute_write(query: str, parameters: dict | None = None) -> list[dict]:
+    return await neo4j_client.execute_write(query, parameters)
+
+
+# Eindeutigkeits-Constraints legen automatisch einen Index an. Ohne sie muss jedes
+# MERGE auf Device/User alle Knoten des Labels durchsuchen (Label-Scan).
+SCHEMA_CONSTRAINTS = [
+    "CREATE CONSTRAINT device_id_unique IF NOT EXISTS FOR (d:Device) REQUIRE d.deviceId IS UNIQUE",
+    "CREATE CONSTRAINT user_id_unique IF NOT EXISTS FOR (u:User) REQUIRE u.userId IS UNIQUE",
+]
+
+async def ensure_constraints():
     """
-    # Ruft die 'driver' property der globalen Instanz auf
-    async with neo4j_client.driver.session(database="neo4j", **kwargs) as session:
-        result = await session.run(query, parameters)
-        # .data() holt alle Records und gibt sie als Liste von Dictionaries zurück
-        return await result.data()
\ No newline at end of file
+    Legt die Constraints/Indizes an, falls sie noch fehlen (idempotent, beim Start aufrufen).
+    """
+    for statement in SCHEMA_CONSTRAINTS:
+        try:
+            await execute_query(statement)
+        except Exception as e:
+            print(f"WARNUNG: Constraint konnte nicht angelegt werden ({statement}): {e}")
@@ -0,0 +1,248 @@
+# /app/database/timeseries_store.py
+# ---------------------------------------------------------------------------
+# Zeitreihen-Speicher für Messwerte und Ersparnisse (Postgres, SQLite als Ersatz).
+#
+# - Rohdaten landen spaltenweise per COPY in `meter_readings` (Postgres) bzw.
+#   per executemany (SQLite, z.B. lokal oder für Tests).
+# - Im selben Schreibvorgang werden die Stunden- und Tages-Rollups
+#   (`savings_hourly`, `savings_daily`) per Upsert fortgeschrieben.
+# - "Heutige Ersparnis + Trend" liest nur zwei Zeilen aus dem Tages-Rollup
+#   (Primärschlüssel-Lookup), nie die Rohdaten.
+# ---------------------------------------------------------------------------
+
+import asyncio
+import csv
+import io
+import os
+import time
+from collections import OrderedDict, defaultdict
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import (
+    Column, Date, DateTime, Float, Index, Integer, MetaData, String, Table,
+    create_engine, select,
+)
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import StaticPool
+
+# Zeitzone, in der ein "Tag" für den Nutzer beginnt und endet
+TIMESERIES_TIMEZONE = ZoneInfo(os.environ.get("TIMESERIES_TIMEZONE", "Europe/Berlin"))
+# So lange wird die Ersparnis pro Nutzer im Prozess gehalten (Ingest schreibt ohnehin nur alle 60 s)
+TIMESERIES_SAVINGS_CACHE_SECONDS = float(os.environ.get("TIMESERIES_SAVINGS_CACHE_SECONDS", "30"))
+TIMESERIES_SAVINGS_CACHE_MAX_ENTRIES = int(os.environ.get("TIMESERIES_SAVINGS_CACHE_MAX_ENTRIES", "10000"))
+# Abweichung zum Vortag, ab der der Trend nicht mehr als 'stable' gilt
+TREND_TOLERANCE = 0.05
+
+metadata = MetaData()
+
+meter_readings = Table(
+    "meter_readings", metadata,
+    Column("device_id", String, nullable=False),
+    Column("user_id", String, nullable=False),
+    Column("ts", DateTime(timezone=True), nullable=False),
+    Column("consumption_kwh", Float, nullable=False),
+    Column("from_solar_kwh", Float, nullable=False),
+    Column("from_battery_kwh", Float, nullable=False),
+    Column("savings_eur", Float, nullable=False),
+    Index("ix_meter_readings_user_ts", "user_id", "ts"),
+)
+
+_ROLLUP_VALUES = ("consumption_kwh", "from_solar_kwh", "from_battery_kwh", "savings_eur")
+
+
+def _rollup_table(name: str, bucket: Column) -> Table:
+    return Table(
+        name, metadata,
+        Column("user_id", String, primary_key=True),
+        bucket,
+        *(Column(value, Float, nullable=False, default=0.0) for value in _ROLLUP_VALUES),
+        Column("readings", Integer, nullable=False, default=0),
+    )
+
+
+savings_hourly = _rollup_table("savings_hourly", Column("hour_utc", DateTime(timezone=True), primary_key=True))
+savings_daily = _rollup_table("savings_daily", Column("day", Date, primary_key=True))
+
+_READING_COLUMNS = [column.name for column in meter_readings.columns]
+
+
+def _as_utc(ts: datetime) -> datetime:
+    return ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts.astimezone(timezone.utc)
+
+
+def _rollup_rows(rows: list[dict]) -> tuple[list[dict], list[dict]]:
+    """Fasst einen Batch vorab in Python zusammen: eine Upsert-Zeile pro Nutzer und Stunde/Tag."""
+    hourly: dict[tuple, dict] = defaultdict(lambda: dict.fromkeys(_ROLLUP_VALUES + ("readings",), 0))
+    daily: dict[tuple, dict] = defaultdict(lambda: dict.fromkeys(_ROLLUP_VALUES + ("readings",), 0))
+    for row in rows:
+        ts = row["ts"]
+        for bucket in (hourly[(row["user_id"], ts.replace(minute=0, second=0, microsecond=0))],
+                       daily[(row["user_id"], ts.astimezone(TIMESERIES_TIMEZONE).date())]):
+            for value in _ROLLUP_VALUES:
+                bucket[value] += row[value]
+            bucket["readings"] += 1
+    return (
+        [{"user_id": user_id, "hour_utc": hour, **sums} for (user_id, hour), sums in hourly.items()],
+        [{"user_id": user_id, "day": day, **sums} for (user_id, day), sums in daily.items()],
+    )
+
+
+def savings_trend(today_eur: float, yesterday_eur: float, day_fraction: float) -> str:
+    """
+    'up', 'down' oder 'stable': Vergleich mit dem Vortag, hochgerechnet auf die
+    bisher vergangene Zeit des heutigen Tages.
+    """
+    expected = yesterday_eur * day_fraction
+    if abs(today_eur - expected) <= TREND_TOLERANCE * max(abs(expected), 0.01):
+        return "stable"
+    return "up" if today_eur > expected else "down"
+
+
+class TimeSeriesStore:
+    """
+    Wrapper um eine SQLAlchemy-Engine, analog zum Neo4jClient.
+    Die Datenbankzugriffe laufen synchron in einem Thread (asyncio.to_thread),
+    damit der Event-Loop nicht blockiert.
+    """
+    def __init__(self):
+        self._engine: Engine | None = None
+        # LRU+TTL: user_id -> (Ablaufzeit, Ersparnis)
+        self._savings_cache: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+
+    def connect(self, url: str | None = None):
+        """Erstellt die Engine und legt fehlende Tabellen an."""
+        url = url or os.getenv("TIMESERIES_DATABASE_URL")
+        if not url:
+            print("WARNUNG: TIMESERIES_DATABASE_URL nicht gesetzt. Zeitreihen-Speicher wird nicht initialisiert.")
+            return
+        kwargs = {"pool_pre_ping": True}
+        if url.startswith("sqlite"):
+            # SQLite wird aus Worker-Threads benutzt; In-Memory-DBs brauchen genau eine Verbindung
+            kwargs = {"connect_args": {"check_same_thread": False}}
+            if url in ("sqlite://", "sqlite:///:memory:"):
+                kwargs["poolclass"] = StaticPool
+        try:
+            self._engine = create_engine(url, **kwargs)
+            metadata.create_all(self._engine)
+            print(f"INFO: Zeitreihen-Speicher verbunden ({self._engine.dialect.name}).")
+        except Exception as e:
+            print(f"FATAL: Zeitreihen-Speicher konnte nicht verbunden werden: {e}")
+            self._engine = None
+
+    def close(self):
+        if self._engine:
+            self._engine.dispose()
+            self._engine = None
+            print("INFO: Zeitreihen-Speicher geschlossen.")
+
+    @property
+    def is_connected(self) -> bool:
+        return self._engine is not None
+
+    @property
+    def engine(self) -> Engine:
+        if not self._engine:
+            raise Exception("Zeitreihen-Speicher nicht initialisiert. 'connect' muss zuerst aufgerufen werden oder ist fehlgeschlagen.")
+        return self._engine
+
+    # --- Schreiben ---------------------------------------------------------
+
+    def write_readings(self, readings: list[dict]) -> int:
+        """
+        Schreibt normalisierte Messwerte (siehe ingest_worker.pipeline.normalize)
+        und aktualisiert die Rollups in EINER Transaktion. Gibt die Anzahl Zeilen zurück.
+        """
+        rows = [
+            {
+                "device_id": r["device_id"],
+                "user_id": r["user_id"],
+                "ts": _as_utc(r["timestamp_utc"]),
+                "consumption_kwh": float(r["consumption_kwh"]),
+                "from_solar_kwh": float(r["from_solar_kwh"]),
+                "from_battery_kwh": float(r["from_battery_kwh"]),
+                "savings_eur": float(r.get("savings_eur", 0.0)),
+            }
+            for r in readings
+        ]
+        if not rows:
+            return 0
+        hourly, daily = _rollup_rows(rows)
+        with self.engine.begin() as conn:
+            if conn.dialect.name == "postgresql":
+                self._copy_readings(conn, rows)
+            else:
+                conn.execute(meter_readings.insert(), rows)
+            self._upsert_rollup(conn, savings_hourly, ("user_id", "hour_utc"), hourly)
+            self._upsert_rollup(conn, savings_daily, ("user_id", "day"), daily)
+        return len(rows)
+
+    @staticmethod
+    def _copy_readings(conn, rows: list[dict]):
+        # COPY ist bei großen Batches um ein Vielfaches schneller als INSERT; läuft in der offenen Transaktion
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([row["ts"].isoformat() if name == "ts" else row[name] for name in _READING_COLUMNS])
+        buffer.seek(0)
+        cursor = conn.connection.driver_connection.cursor()
+        try:
+            cursor.copy_expert(f"COPY meter_readings ({', '.join(_READING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def _upsert_rollup(conn, table: Table, keys: tuple[str, ...], rows: list[dict]):
+        if conn.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={name: table.c[name] + stmt.excluded[name] for name in _ROLLUP_VALUES + ("readings",)},
+        )
+        conn.execute(stmt, rows)
+
+    async def write_readings_async(self, readings: list[dict]) -> int:
+        return await asyncio.to_thread(self.write_readings, readings)
+
+    # --- Lesen -------------------------------------------------------------
+
+    def todays_savings(self, user_id: str, now: datetime | None = None) -> dict:
+        """Ersparnis von heute und Trend gegenüber gestern – zwei Zeilen aus dem Tages-Rollup."""
+        local_now = (now or datetime.now(timezone.utc)).astimezone(TIMESERIES_TIMEZONE)
+        today = local_now.date()
+        yesterday = today - timedelta(days=1)
+        with self.engine.connect() as conn:
+            result = conn.execute(
+                select(savings_daily.c.day, savings_daily.c.savings_eur)
+                .where(savings_daily.c.user_id == user_id, savings_daily.c.day.in_([today, yesterday]))
+            )
+            by_day: dict[date, float] = {row.day: row.savings_eur for row in result}
+        today_eur = by_day.get(today, 0.0)
+        midnight = local_now.replace(hour=0, minute=0, second=0, microsecond=0)
+        day_fraction = (local_now - midnight).total_seconds() / 86_400
+        return {
+            "today_eur": round(today_eur, 2),
+            "trend": savings_trend(today_eur, by_day.get(yesterday, 0.0), day_fraction),
+        }
+
+    async def get_todays_savings(self, user_id: str) -> dict:
+        """Wie todays_savings, aber mit kurzem Prozess-Cache und ohne den Event-Loop zu blockieren."""
+        cached = self._savings_cache.get(user_id)
+        if cached is not None:
+            if cached[0] > time.monotonic():
+                self._savings_cache.move_to_end(user_id)
+                return cached[1]
+            del self._savings_cache[user_id]
+        savings = await asyncio.to_thread(self.todays_savings, user_id)
+        self._savings_cache[user_id] = (time.monotonic() + TIMESERIES_SAVINGS_CACHE_SECONDS, savings)
+        self._savings_cache.move_to_end(user_id)
+        while len(self._savings_cache) > TIMESERIES_SAVINGS_CACHE_MAX_ENTRIES:
+            self._savings_cache.popitem(last=False)
+        return savings
+
+
+# Globale Instanz, die in der gesamten App wiederverwendet wird.
+timeseries_store = TimeSeriesStore()
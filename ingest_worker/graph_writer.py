@@ -0,0 +1,145 @@
+# ---------------------------------------------------------------------------
+# ingest_worker/graph_writer.py
+# ---------------------------------------------------------------------------
+# Sammelt Geräte-Upserts in einem Puffer und schreibt sie gebündelt in Neo4j:
+# EIN `UNWIND $rows AS row MERGE ...` pro Batch in einer expliziten
+# Schreib-Transaktion, statt einer Query (und Session) pro Gerät.
+# Geflusht wird, wenn der Puffer voll ist oder das Zeitintervall abläuft.
+# Der Puffer hält pro Gerät nur die neueste Zeile und ist begrenzt: schlägt das
+# Schreiben dauerhaft fehl, werden die ältesten Zeilen verworfen (mit Warnung).
+
+import asyncio
+import itertools
+import os
+import time
+
+from database.neo4j_client import neo4j_client
+
+INGEST_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", "5000"))
+INGEST_FLUSH_INTERVAL_SECONDS = float(os.environ.get("INGEST_FLUSH_INTERVAL_SECONDS", "2.0"))
+# Obergrenze für ungeschriebene Geräte (z.B. während Neo4j nicht erreichbar ist)
+INGEST_GRAPH_MAX_PENDING_ROWS = int(os.environ.get("INGEST_GRAPH_MAX_PENDING_ROWS", "100000"))
+
+# Gleiche Semantik wie create_or_update_device_in_graph, nur für viele Zeilen auf einmal
+DEVICE_UPSERT_QUERY = """
+UNWIND $rows AS row
+MATCH (u:User {userId: row.userId})-[:OWNS]->(a:Apartment)
+MERGE (d:Device {deviceId: row.deviceId})
+ON CREATE SET
+    d.type = row.type,
+    d.model = row.model,
+    d.firstSeen = datetime()
+ON MATCH SET
+    d.lastSeen = datetime()
+MERGE (a)-[:CONTAINS]->(d)
+"""
+
+
+async def _write_rows(tx, rows: list[dict]):
+    result = await tx.run(DEVICE_UPSERT_QUERY, rows=rows)
+    await result.consume()
+
+
+class DeviceBatchWriter:
+    """
+    Puffer für Geräte-Upserts. Nutzung:
+        writer = DeviceBatchWriter()
+        await writer.start()
+        await writer.add(user_id, device_data)   # beliebig oft
+        await writer.close()                     # schreibt den Rest
+    """
+    def __init__(self, batch_size: int = INGEST_BATCH_SIZE, flush_interval: float = INGEST_FLUSH_INTERVAL_SECONDS,
+                 max_pending: int = INGEST_GRAPH_MAX_PENDING_ROWS):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        # deviceId -> Zeile, in der Reihenfolge der letzten Aktualisierung (älteste zuerst)
+        self._buffer: dict[str, dict] = {}
+        self.rows_dropped = 0
+        self._lock = asyncio.Lock()
+        self._timer: asyncio.Task | None = None
+        self.rows_written = 0
+        self.batches_written = 0
+        self.write_seconds = 0.0
+
+    async def start(self):
+        """Startet den Zeit-Trigger, damit auch halbvolle Puffer regelmäßig geschrieben werden."""
+        if self._timer is None:
+            self._timer = asyncio.create_task(self._flush_periodically())
+
+    async def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            try:
+                await self._timer
+            except asyncio.CancelledError:
+                pass
+            self._timer = None
+        await self.flush()
+
+    async def add(self, user_id: str, device_data: dict):
+        # Neuere Zeile desselben Geräts ersetzt die alte und rückt ans Ende
+        self._buffer.pop(device_data['id'], None)
+        self._buffer[device_data['id']] = {
+            "userId": user_id,
+            "deviceId": device_data['id'],
+            "type": device_data['type'],
+            "model": device_data['model_name'],
+        }
+        self._trim()
+        if len(self._buffer) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        """Schreibt den aktuellen Puffer in Batches von `batch_size` Zeilen."""
+        async with self._lock:
+            rows, self._buffer = list(self._buffer.values()), {}
+            for i in range(0, len(rows), self.batch_size):
+                try:
+                    await self._write_batch(rows[i : i + self.batch_size])
+                except Exception:
+                    self._requeue(rows[i:])
+                    raise
+
+    def _requeue(self, rows: list[dict]):
+        """Nicht geschriebene Zeilen zurück in den Puffer; seit dem Flush hinzugekommene Zeilen gewinnen."""
+        newer = self._buffer
+        self._buffer = {row["deviceId"]: row for row in rows if row["deviceId"] not in newer}
+        self._buffer.update(newer)
+        self._trim()
+
+    def _trim(self):
+        excess = len(self._buffer) - self.max_pending
+        if excess <= 0:
+            return
+        for device_id in list(itertools.islice(self._buffer, excess)):
+            del self._buffer[device_id]
+        self.rows_dropped += excess
+        print(f"WARNUNG: Geräte-Puffer voll ({self.max_pending} Zeilen), {excess} älteste Zeilen verworfen.")
+
+    async def _write_batch(self, rows: list[dict]):
+        start = time.perf_counter()
+        # Verwaltete Schreib-Transaktion: vorübergehende Fehler werden automatisch wiederholt
+        await neo4j_client.write_transaction(_write_rows, rows)
+        duration = time.perf_counter() - start
+        self.rows_written += len(rows)
+        self.batches_written += 1
+        self.write_seconds += duration
+        print(f"INFO: {len(rows)} Geräte in {duration:.2f}s geschrieben ({len(rows) / duration:.0f} Zeilen/s).")
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"FEHLER: Periodisches Schreiben der Geräte fehlgeschlagen: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "rows_written": self.rows_written,
+            "batches_written": self.batches_written,
+            "pending_rows": len(self._buffer),
+            "rows_dropped": self.rows_dropped,
+            "rows_per_second": round(self.rows_written / self.write_seconds, 1) if self.write_seconds else 0.0,
+        }
@@ -3,13 +3,20 @@
 # ---------------------------------------------------------------------------
 # Dies wäre ein separater Dienst, der als Cron-Job läuft.
 # Seine einzige Aufgabe: Daten vom Shelly holen und in die Datenbank schreiben.
+# ---------------------------------------------------------------------------
+# NEU: asyncio-Pipeline (ingest_worker/pipeline.py) statt der blockierenden
+#      sleep-60-Schleife; die Ersparnis wird in ingest_worker/savings.py berechnet.
+# NEU: Die Effizienzklassen der Geräte werden periodisch aus dem Knowledge Graph
+#      in die Score-Aggregate übernommen (sync_device_classes).
+# ---------------------------------------------------------------------------
 
-from database.neo4j_client import execute_query
+from database.neo4j_client import execute_write
 
 async def create_or_update_device_in_graph(user_id, device_data):
     """
     Erstellt einen Geräteknoten in Neo4j und verbindet ihn mit dem Nutzer/Apartment.
     MERGE sorgt dafür, dass ein Gerät nicht doppelt angelegt wird.
+    Für viele Geräte pro Zyklus stattdessen graph_writer.DeviceBatchWriter nutzen.
     """
     query = """
     MATCH (u:User {userId: $userId})-[:OWNS]->(a:Apartment)
@@ -22,45 +29,134 @@ async def create_or_update_device_in_graph(user_id, device_data):
         d.lastSeen = datetime()
     MERGE (a)-[:CONTAINS]->(d)
     """
-    await execute_query(query, {
+    await execute_write(query, {
         "userId": user_id,
         "deviceId": device_data['id'],
         "type": device_data['type'],
         "model": device_data['model_name']
     })
 
+import asyncio
+import os
+import signal
 import time
-# from collectors import shelly_collector
-# from database import timescaledb_writer
 
-def main():
-    print("Starte Ingest-Worker...")
-    while True:
-        # house_data = shelly_collector.get_data()
-        # if house_data:
-        #     timescaledb_writer.save(house_data)
-        print("Daten gesammelt. Schlafe für 60 Sekunden.")
-        time.sleep(60)
+from connectors.simulated import SimulatedMeter
+from database.neo4j_client import neo4j_client, ensure_constraints
+from database.timeseries_store import timeseries_store
+from advisory_services.scoring_service import SCORE_SNAPSHOT_PATH, ScoreStore
+from ingest_worker.pipeline import IngestPipeline, GraphDeviceSink, TimeSeriesSink, ScoreSink
 
-if __name__ == "__main__":
-    main()
+INGEST_INTERVAL_SECONDS = float(os.environ.get("INGEST_INTERVAL_SECONDS", "60"))
+# Nur für Entwicklung/Lasttests: so viele simulierte Shellys abfragen
+INGEST_SIMULATED_DEVICES = int(os.environ.get("INGEST_SIMULATED_DEVICES", "0"))
+STOP_SIGNALS = (signal.SIGINT, signal.SIGTERM)
+SCORE_DEVICE_SYNC_INTERVAL_SECONDS = float(os.environ.get("SCORE_DEVICE_SYNC_INTERVAL_SECONDS", "3600"))
+
+# Alle Geräte mit Effizienzklasse (Teil-Score Geräte-Effizienz)
+DEVICE_CLASSES_QUERY = """
+MATCH (u:User)-[:OWNS]->(:Apartment)-[:CONTAINS]->(d:Device)
+WHERE d.efficiency_class IS NOT NULL
+RETURN u.userId AS user_id, d.deviceId AS device_id, d.efficiency_class AS efficiency_class
+"""
+
+
+def load_connectors() -> list:
+    """
+    Liefert die abzufragenden Geräte. Eine Geräte-Registry gibt es noch nicht,
+    daher werden hier (optional) simulierte Geräte erzeugt.
+    """
+    if INGEST_SIMULATED_DEVICES:
+        return [SimulatedMeter(f"sim-{i}", f"user-{i // 3}") for i in range(INGEST_SIMULATED_DEVICES)]
+    print("WARNUNG: Keine Geräte konfiguriert (INGEST_SIMULATED_DEVICES=0).")
+    return []
+
+
+async def sync_device_classes(score_store: ScoreStore):
+    """Übernimmt den Gerätebestand samt Effizienzklassen aus dem Knowledge Graph in die Score-Aggregate."""
+    user_ids, device_ids, classes = [], [], []
+    async for row in neo4j_client.stream(DEVICE_CLASSES_QUERY):
+        user_ids.append(row["user_id"])
+        device_ids.append(row["device_id"])
+        classes.append(row["efficiency_class"])
+    score_store.backfill_devices(user_ids, device_ids, classes)
+    print(f"INFO: {len(device_ids)} Geräteklassen für {len(set(user_ids))} Nutzer in den Score übernommen.")
+
+
+async def run(stop_event: asyncio.Event):
+    await neo4j_client.connect()
+    sinks = []
+    if neo4j_client.is_connected:
+        await ensure_constraints()
+        sinks.append(GraphDeviceSink())
+    timeseries_store.connect()
+    if timeseries_store.is_connected:
+        sinks.append(TimeSeriesSink(timeseries_store))
+    # Score-Aggregate werden im Worker gepflegt und als Snapshot für den Advisory-Dienst abgelegt
+    score_store = None
+    if SCORE_SNAPSHOT_PATH:
+        score_store = ScoreStore.load(SCORE_SNAPSHOT_PATH) if os.path.exists(SCORE_SNAPSHOT_PATH) else ScoreStore()
+        sinks.append(ScoreSink(score_store))
 
+    pipeline = IngestPipeline(sinks=sinks)
+    await pipeline.start()
 
+    def request_stop():
+        # Auch einen laufenden Zyklus stoppen: keine weiteren Geräte einreihen, nur noch drainen
+        stop_event.set()
+        pipeline.stop_accepting()
 
-    # Fester Vergleichspreis aus der Umgebung holen
-FIXED_PRICE = float(os.environ.get("DEFAULT_GRID_PRICE_EUR_KWH", "0.32"))
+    loop = asyncio.get_running_loop()
+    for sig in STOP_SIGNALS:
+        loop.add_signal_handler(sig, request_stop)
+    if stop_event.is_set():
+        request_stop()
+    devices_synced_at: float | None = None
+    try:
+        while not stop_event.is_set():
+            cycle_start = time.monotonic()
+            if (score_store is not None and neo4j_client.is_connected
+                    and (devices_synced_at is None or cycle_start - devices_synced_at >= SCORE_DEVICE_SYNC_INTERVAL_SECONDS)):
+                try:
+                    await sync_device_classes(score_store)
+                    devices_synced_at = cycle_start
+                except Exception as e:
+                    print(f"FEHLER: Geräteklassen konnten nicht aus dem Graph geladen werden: {e}")
+            if stop_event.is_set():
+                break
+            await pipeline.run_cycle(load_connectors())
+            if score_store is not None:
+                await asyncio.to_thread(score_store.save, SCORE_SNAPSHOT_PATH)
+            if stop_event.is_set():
+                break
+            remaining = INGEST_INTERVAL_SECONDS - (time.monotonic() - cycle_start)
+            if remaining <= 0:
+                print("WARNUNG: Ingest-Zyklus hat länger als das Intervall gedauert.")
+                continue
+            print(f"Daten gesammelt. Schlafe für {remaining:.0f} Sekunden.")
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        # Sauber herunterfahren: bereits abgeholte Messwerte werden noch geschrieben
+        await pipeline.shutdown()
+        await neo4j_client.close()
+        timeseries_store.close()
 
-def calculate_and_save_savings():
-    # 1. Tatsächliche Verbrauchsdaten der letzten Stunde vom Shelly holen
-    last_hour_data = shelly.get_data() # z.B. { consumption: 1.5, from_solar: 1.0, from_battery: 0.5 }
 
-    # 2. Kosten OHNE System berechnen
-    cost_without_system = last_hour_data.consumption * FIXED_PRICE # 1.5 kWh * 0.32€
+def main():
+    print("Starte Ingest-Worker...")
+
+    async def _main():
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        # Bis die Pipeline läuft, nur das Event setzen; run() übernimmt danach die Handler
+        for sig in STOP_SIGNALS:
+            loop.add_signal_handler(sig, stop_event.set)
+        await run(stop_event)
 
-    # 3. Kosten MIT System berechnen
-    # (Annahme: Solar ist gratis, Batterie wurde für 0.12€ geladen)
-    cost_with_system = (0 * last_hour_data.from_solar) + (0.12 * last_hour_data.from_battery)
+    asyncio.run(_main())
 
-    # 4. Ersparnis dieser Stunde berechnen und zur Tagesersparnis addieren
-    hourly_saving = cost_without_system - cost_with_system
-    database.add_to_todays_savings(hourly_saving)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+# ---------------------------------------------------------------------------
+# ingest_worker/pipeline.py
+# ---------------------------------------------------------------------------
+# Asynchrone Ingest-Pipeline aus Stufen, die über begrenzte Queues verbunden sind:
+#
+#   Geräte ──> [poll] ──> [normalize + savings] ──> [write (Batches)] ──> Sinks
+#
+# - Jede Stufe hat ihre eigene Anzahl Worker (Nebenläufigkeitsgrenze).
+# - Die Queues sind begrenzt: ist eine spätere Stufe langsam, blockieren die
+#   früheren Stufen beim put() – das ist die Backpressure.
+# - Beim Herunterfahren werden keine neuen Geräte mehr angenommen, alles bereits
+#   Abgeholte wird aber noch verarbeitet und geschrieben (Drain).
+
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+from typing import Protocol
+
+from advisory_services.scoring_service import ScoreStore
+from connectors.base import MeterConnector
+from database.timeseries_store import TimeSeriesStore
+from ingest_worker.graph_writer import DeviceBatchWriter
+from ingest_worker.savings import calculate_savings
+
+INGEST_POLL_CONCURRENCY = int(os.environ.get("INGEST_POLL_CONCURRENCY", "2000"))
+INGEST_NORMALIZE_CONCURRENCY = int(os.environ.get("INGEST_NORMALIZE_CONCURRENCY", "4"))
+INGEST_QUEUE_SIZE = int(os.environ.get("INGEST_QUEUE_SIZE", "10000"))
+INGEST_WRITE_BATCH_SIZE = int(os.environ.get("INGEST_WRITE_BATCH_SIZE", "5000"))
+INGEST_POLL_TIMEOUT_SECONDS = float(os.environ.get("INGEST_POLL_TIMEOUT_SECONDS", "10"))
+INGEST_FLUSH_INTERVAL_SECONDS = float(os.environ.get("INGEST_FLUSH_INTERVAL_SECONDS", "2.0"))
+
+_STOP = object()
+
+
+class Sink(Protocol):
+    """Ziel der Schreib-Stufe, bekommt normalisierte Messwerte in Batches."""
+    async def write(self, rows: list[dict]) -> None: ...
+
+
+class GraphDeviceSink:
+    """Aktualisiert die Geräteknoten im Knowledge Graph (gebündelte UNWIND-Upserts)."""
+    def __init__(self, writer: DeviceBatchWriter | None = None):
+        self.writer = writer or DeviceBatchWriter()
+
+    async def write(self, rows: list[dict]) -> None:
+        for row in rows:
+            await self.writer.add(row["user_id"], row["device"])
+        await self.writer.flush()
+
+
+class TimeSeriesSink:
+    """Schreibt die Messwerte samt Ersparnis in den Zeitreihen-Speicher (Rohdaten + Rollups)."""
+    def __init__(self, store: TimeSeriesStore):
+        self.store = store
+
+    async def write(self, rows: list[dict]) -> None:
+        await self.store.write_readings_async(rows)
+
+
+class ScoreSink:
+    """Schreibt jeden Messwert mit O(1) in die laufenden Aggregate des Energie-Scores."""
+    def __init__(self, store: ScoreStore):
+        self.store = store
+
+    async def write(self, rows: list[dict]) -> None:
+        for row in rows:
+            self.store.record_reading(row["user_id"], row["timestamp_utc"], row["consumption_kwh"],
+                                      row["savings_eur"], row.get("price_eur_kwh"))
+
+
+def normalize(connector: MeterConnector, raw: dict) -> dict:
+    """Bringt die herstellerspezifischen Messwerte in ein einheitliches Format."""
+    timestamp = raw.get("timestamp")
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    return {
+        "device_id": connector.device_id,
+        "user_id": connector.user_id,
+        "timestamp_utc": timestamp or datetime.now(timezone.utc),
+        "consumption_kwh": float(raw.get("consumption_kwh", raw.get("consumption", 0.0))),
+        "from_solar_kwh": float(raw.get("from_solar_kwh", raw.get("from_solar", 0.0))),
+        "from_battery_kwh": float(raw.get("from_battery_kwh", raw.get("from_battery", 0.0))),
+        "price_eur_kwh": raw.get("price_eur_kwh"),
+        "device": {"id": connector.device_id, "type": connector.device_type, "model_name": connector.model_name},
+    }
+
+
+class IngestPipeline:
+    """
+    Nutzung:
+        pipeline = IngestPipeline(sinks=[...])
+        await pipeline.start()
+        stats = await pipeline.run_cycle(connectors)   # alle 60 s
+        await pipeline.shutdown()
+    """
+    def __init__(self, sinks: list[Sink],
+                 poll_concurrency: int = INGEST_POLL_CONCURRENCY,
+                 normalize_concurrency: int = INGEST_NORMALIZE_CONCURRENCY,
+                 queue_size: int = INGEST_QUEUE_SIZE,
+                 write_batch_size: int = INGEST_WRITE_BATCH_SIZE,
+                 poll_timeout: float = INGEST_POLL_TIMEOUT_SECONDS,
+                 flush_interval: float = INGEST_FLUSH_INTERVAL_SECONDS):
+        self.sinks = sinks
+        self.poll_concurrency = poll_concurrency
+        self.normalize_concurrency = normalize_concurrency
+        self.write_batch_size = write_batch_size
+        self.poll_timeout = poll_timeout
+        self.flush_interval = flush_interval
+        self._poll_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._normalize_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._write_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._poll_workers: list[asyncio.Task] = []
+        self._normalize_workers: list[asyncio.Task] = []
+        self._write_worker: asyncio.Task | None = None
+        self._accepting = False
+        self._reset_counters()
+
+    def _reset_counters(self):
+        self.polled = 0
+        self.poll_errors = 0
+        self.normalize_errors = 0
+        self.written = 0
+        self.write_errors = 0
+
+    async def start(self):
+        self._poll_workers = [asyncio.create_task(self._poll_worker()) for _ in range(self.poll_concurrency)]
+        self._normalize_workers = [asyncio.create_task(self._normalize_worker()) for _ in range(self.normalize_concurrency)]
+        self._write_worker = asyncio.create_task(self._write_worker_loop())
+        self._accepting = True
+
+    async def run_cycle(self, connectors: list[MeterConnector]) -> dict:
+        """Fragt alle Geräte einmal ab und wartet, bis alles geschrieben ist."""
+        if not self._accepting:
+            raise RuntimeError("Pipeline ist nicht gestartet oder wird heruntergefahren.")
+        self._reset_counters()
+        start = time.perf_counter()
+        for index, connector in enumerate(connectors):
+            if not self._accepting:
+                print(f"INFO: Herunterfahren angefordert, {len(connectors) - index} Geräte in diesem Zyklus nicht mehr abgefragt.")
+                break
+            await self._poll_queue.put(connector)  # blockiert bei voller Queue (Backpressure)
+        await self._drain()
+        duration = time.perf_counter() - start
+        stats = {
+            "devices": len(connectors),
+            "polled": self.polled,
+            "poll_errors": self.poll_errors,
+            "normalize_errors": self.normalize_errors,
+            "written": self.written,
+            "write_errors": self.write_errors,
+            "duration_s": round(duration, 3),
+            "devices_per_second": round(self.polled / duration, 1) if duration else 0.0,
+        }
+        print(f"INFO: Ingest-Zyklus: {stats['polled']}/{stats['devices']} Geräte in {duration:.2f}s "
+              f"({stats['devices_per_second']:.0f}/s, {stats['poll_errors']} Fehler).")
+        return stats
+
+    async def _drain(self):
+        # Stufe für Stufe leeren: erst wenn alle Abfragen fertig sind, kann die nächste Stufe leer laufen
+        await self._poll_queue.join()
+        await self._normalize_queue.join()
+        await self._write_queue.join()
+
+    def stop_accepting(self):
+        """
+        Ab sofort keine weiteren Geräte einreihen (z.B. aus dem SIGTERM-Handler).
+        Ein laufender Zyklus bricht nach dem aktuellen put() ab; Eingereihtes wird noch verarbeitet.
+        """
+        self._accepting = False
+
+    async def shutdown(self):
+        """Nimmt nichts Neues mehr an, verarbeitet den Rest und beendet alle Worker."""
+        self.stop_accepting()
+        await self._drain()
+        for queue, workers in ((self._poll_queue, self._poll_workers), (self._normalize_queue, self._normalize_workers)):
+            for _ in workers:
+                await queue.put(_STOP)
+            await asyncio.gather(*workers)
+        if self._write_worker is not None:
+            await self._write_queue.put(_STOP)
+            await self._write_worker
+        print("INFO: Ingest-Pipeline sauber heruntergefahren.")
+
+    async def _poll_worker(self):
+        while True:
+            connector = await self._poll_queue.get()
+            try:
+                if connector is _STOP:
+                    return
+                raw = await asyncio.wait_for(connector.get_reading(), timeout=self.poll_timeout)
+                self.polled += 1
+                await self._normalize_queue.put((connector, raw))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.poll_errors += 1
+                if self.poll_errors <= 10:
+                    print(f"FEHLER: Abfrage von Gerät {getattr(connector, 'device_id', '?')} fehlgeschlagen: {e!r}")
+            finally:
+                self._poll_queue.task_done()
+
+    async def _normalize_worker(self):
+        while True:
+            item = await self._normalize_queue.get()
+            try:
+                if item is _STOP:
+                    return
+                connector, raw = item
+                reading = normalize(connector, raw)
+                reading["savings_eur"] = calculate_savings(reading)
+                await self._write_queue.put(reading)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.normalize_errors += 1
+                print(f"FEHLER: Messwert konnte nicht verarbeitet werden: {e!r}")
+            finally:
+                self._normalize_queue.task_done()
+
+    async def _write_worker_loop(self):
+        batch: list[dict] = []
+        stop = False
+        while not stop:
+            try:
+                item = await asyncio.wait_for(self._write_queue.get(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                item = None
+            if item is _STOP:
+                stop = True
+            elif item is not None:
+                batch.append(item)
+            # Schreiben, wenn der Batch voll ist, die Queue gerade leer ist oder wir stoppen
+            if batch and (stop or len(batch) >= self.write_batch_size or self._write_queue.empty()):
+                await self._write_batch(batch)
+                # task_done erst nach dem Schreiben, damit join() wirklich "geschrieben" bedeutet
+                for _ in batch:
+                    self._write_queue.task_done()
+                batch = []
+            if stop:
+                self._write_queue.task_done()
+
+    async def _write_batch(self, batch: list[dict]):
+        ok = True
+        for sink in self.sinks:
+            try:
+                await sink.write(batch)
+            except Exception as e:
+                ok = False
+                print(f"FEHLER: Schreiben in {type(sink).__name__} fehlgeschlagen: {e}")
+        if ok:
+            self.written += len(batch)
+        else:
+            self.write_errors += len(batch)
@@ -0,0 +1,26 @@
+# ---------------------------------------------------------------------------
+# ingest_worker/savings.py
+# ---------------------------------------------------------------------------
+# Berechnet die Ersparnis einer Messperiode gegenüber dem festen Netzpreis.
+
+import os
+
+# Fester Vergleichspreis aus der Umgebung holen
+FIXED_PRICE = float(os.environ.get("DEFAULT_GRID_PRICE_EUR_KWH", "0.32"))
+# Annahme: Die Batterie wurde im Schnitt zu diesem Preis geladen
+BATTERY_CHARGE_PRICE = float(os.environ.get("BATTERY_CHARGE_PRICE_EUR_KWH", "0.12"))
+
+
+def calculate_savings(reading: dict) -> float:
+    """
+    Ersparnis einer Periode in €. `reading` ist ein normalisierter Messwert
+    mit consumption_kwh, from_solar_kwh und from_battery_kwh.
+    """
+    # Kosten OHNE System: alles aus dem Netz zum Festpreis
+    cost_without_system = reading["consumption_kwh"] * FIXED_PRICE
+
+    # Kosten MIT System: Solar ist gratis, Batterie wurde günstig geladen, der Rest kommt aus dem Netz
+    from_grid = max(reading["consumption_kwh"] - reading["from_solar_kwh"] - reading["from_battery_kwh"], 0.0)
+    cost_with_system = (0 * reading["from_solar_kwh"]) + (BATTERY_CHARGE_PRICE * reading["from_battery_kwh"]) + from_grid * FIXED_PRICE
+
+    return cost_without_system - cost_with_system
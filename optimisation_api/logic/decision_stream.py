@@ -0,0 +1,153 @@
+# ---------------------------------------------------------------------------
+# optimisation_api/logic/decision_stream.py
+# ---------------------------------------------------------------------------
+# Push statt Polling: Steuergeräte abonnieren einmal (WebSocket
+# /entscheidung/stream) und melden nur noch ihren SoC. Der Server schickt eine
+# neue Entscheidung nur, wenn sie sich tatsächlich ändert – also wenn
+# - der SoC eine Regel-Schwelle oder einen Bucket der Entscheidungstabelle kreuzt,
+# - die Entscheidungstabelle einer Zelle neu gebaut wurde und sich deren
+#   Entscheidungen dabei geändert haben (neue Solar- oder Preisprognose).
+# Die Neubewertung nach einem Aufbau stößt selbst keinen Aufbau an
+# (rebuild=False), sonst baut eine Zelle mit dauerhaftem Miss (z.B. LLM
+# nicht erreichbar) sich über den Listener endlos neu.
+#
+# Fan-out: pro Abo gibt es genau einen Slot mit der neuesten Entscheidung und
+# ein Event. Ein langsamer Client bekommt nur den letzten Stand, es stauen sich
+# keine Nachrichten – der Speicher pro Verbindung bleibt konstant.
+# ===========================================================================
+import asyncio
+from collections import defaultdict
+from typing import Awaitable, Callable
+
+from optimisation_api.logic.decision_table import DecisionTable
+from optimisation_api.models import Action
+from optimisation_api.services.forecast_cache import grid_cell
+
+# (SoC, lat, lon, rebuild=True) -> (Aktion, Begründung); in main.py ist das compute_decision
+Decide = Callable[..., Awaitable[tuple[Action, str]]]
+
+# Nach so vielen Neuberechnungen gibt refresh_cells die Event-Loop kurz frei
+REFRESH_YIELD_EVERY = 500
+
+
+class Subscription:
+    """Ein abonniertes Steuergerät: Standort, letzter SoC und zuletzt gesendete Entscheidung."""
+    __slots__ = ("lat", "lon", "cell", "soc", "last", "pending", "wakeup", "closed")
+
+    def __init__(self, lat: float, lon: float, soc: float):
+        self.lat = lat
+        self.lon = lon
+        self.cell = grid_cell(lat, lon)
+        self.soc = soc
+        self.last: tuple[Action, str] | None = None
+        self.pending: tuple[Action, str] | None = None
+        self.wakeup = asyncio.Event()
+        self.closed = False
+
+
+class DecisionHub:
+    """Verwaltet alle Abos und verteilt geänderte Entscheidungen."""
+    def __init__(self, decide: Decide | None = None):
+        self.decide = decide
+        self._by_cell: dict[tuple[float, float], set[Subscription]] = defaultdict(set)
+        self._refreshing: set[tuple[float, float]] = set()
+        # Zellen, die während einer laufenden Neubewertung erneut gebaut wurden
+        self._dirty: set[tuple[float, float]] = set()
+        self.reports = 0
+        self.pushes = 0
+        self.unchanged = 0
+        self.errors = 0
+
+    def attach(self, table: DecisionTable):
+        """Nach jedem Neuaufbau einer Zelle werden deren Abonnenten neu bewertet."""
+        table.add_listener(self.schedule_refresh)
+
+    @property
+    def subscribers(self) -> int:
+        return sum(len(subs) for subs in self._by_cell.values())
+
+    def subscribe(self, lat: float, lon: float, soc: float) -> Subscription:
+        sub = Subscription(lat, lon, soc)
+        self._by_cell[sub.cell].add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        sub.closed = True
+        sub.wakeup.set()
+        subs = self._by_cell.get(sub.cell)
+        if subs is not None:
+            subs.discard(sub)
+            if not subs:
+                del self._by_cell[sub.cell]
+
+    def _offer(self, sub: Subscription, decision: tuple[Action, str]):
+        if decision == sub.last:
+            self.unchanged += 1
+            return
+        sub.last = decision
+        sub.pending = decision
+        sub.wakeup.set()
+        self.pushes += 1
+
+    async def report_soc(self, sub: Subscription, soc: float):
+        """Neuer SoC vom Steuergerät; Fehler (z.B. fehlende Prognosen) gehen an den Aufrufer."""
+        self.reports += 1
+        sub.soc = soc
+        self._offer(sub, await self.decide(soc, sub.lat, sub.lon))
+
+    async def next_decision(self, sub: Subscription) -> tuple[Action, str] | None:
+        """Wartet auf die nächste geänderte Entscheidung; None, sobald das Abo beendet ist."""
+        await sub.wakeup.wait()
+        sub.wakeup.clear()
+        if sub.closed:
+            return None
+        decision, sub.pending = sub.pending, None
+        return decision
+
+    async def refresh_cells(self, cells):
+        """Bewertet alle Abonnenten der Zellen mit ihrem letzten SoC neu."""
+        done = 0
+        for cell in cells:
+            for sub in list(self._by_cell.get(cell, ())):
+                try:
+                    self._offer(sub, await self.decide(sub.soc, sub.lat, sub.lon, rebuild=False))
+                except Exception as e:
+                    self.errors += 1
+                    print(f"WARNUNG: Entscheidung für Abo in Zelle {cell} nicht neu berechnet: {e}")
+                done += 1
+                if done % REFRESH_YIELD_EVERY == 0:
+                    await asyncio.sleep(0)
+
+    def schedule_refresh(self, cell: tuple[float, float]):
+        """Listener für die Entscheidungstabelle; pro Zelle läuft höchstens eine Neubewertung."""
+        if cell not in self._by_cell:
+            return
+        if cell in self._refreshing:
+            self._dirty.add(cell)
+            return
+
+        async def refresh():
+            try:
+                await self.refresh_cells([cell])
+                while cell in self._dirty:
+                    self._dirty.discard(cell)
+                    await self.refresh_cells([cell])
+            finally:
+                self._refreshing.discard(cell)
+
+        self._refreshing.add(cell)
+        asyncio.ensure_future(refresh())
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": self.subscribers,
+            "cells": len(self._by_cell),
+            "reports": self.reports,
+            "pushes": self.pushes,
+            "unchanged": self.unchanged,
+            "errors": self.errors,
+        }
+
+
+# Globale Instanz für /entscheidung/stream
+decision_hub = DecisionHub()
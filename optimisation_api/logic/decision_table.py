@@ -0,0 +1,303 @@
+# ---------------------------------------------------------------------------
+# optimisation_api/logic/decision_table.py
+# ---------------------------------------------------------------------------
+# Vorberechnete Entscheidungen pro (Gitterzelle, Stunde, SoC-Bucket).
+# Die Preisprognose steht für den Tag fest und die Solarprognose ändert sich
+# höchstens stündlich pro Zelle – alle Batterien einer Zelle und eines
+# SoC-Buckets bekommen also dieselbe Fallback-Entscheidung.
+#
+# - Ein Hintergrund-Job baut zu jeder vollen Stunde die Tabelle für alle
+#   aktiven Zellen neu (Zellen, die in den letzten 24 h angefragt wurden).
+# - Die schnellen Regeln hängen vom SoC nur über STRATEGIC_MIN_SOC und
+#   STRATEGIC_MAX_SOC ab: pro Zelle werden sie für die vier SoC-Bereiche
+#   vorab ausgewertet, der Lookup ist damit exakt und braucht nur Vergleiche.
+#   Nur das Fallback (LLM/Optimierer) wird pro SoC-Bucket gespeichert. Die
+#   Bucket-Grenzen enthalten beide Schwellen, so liegt jeder Bucket ganz in
+#   einem Bereich und sein Vertreter löst dieselbe Regel aus wie jeder SoC darin.
+# - Kein Eintrag (neue Zelle, neue Stunde, neue Preiskurve) -> der Aufrufer
+#   rechnet live, die Zelle wird im Hintergrund nachgebaut (höchstens einmal
+#   pro DECISION_TABLE_REBUILD_BACKOFF_SECONDS).
+# - Gespeichert werden nur verbindliche Fallback-Antworten. Liefert `decide`
+#   None (LLM noch nicht bereit, Deadline verpasst, Breaker offen), bleibt der
+#   Bucket offen und wird live gerechnet; wiederholt wird erst beim nächsten
+#   stündlichen Aufbau, nicht bei jedem Lookup.
+# ===========================================================================
+import asyncio
+import bisect
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable
+
+import numpy as np
+
+from optimisation_api.logic import rules_engine, vector_rules
+from optimisation_api.models import Action
+from optimisation_api.services import metrics
+from optimisation_api.services.forecast_cache import grid_cell
+
+DECISION_TABLE_SOC_BIN_PERCENT = float(os.environ.get("DECISION_TABLE_SOC_BIN_PERCENT", "5"))
+DECISION_TABLE_CELL_TTL_SECONDS = float(os.environ.get("DECISION_TABLE_CELL_TTL_SECONDS", str(24 * 3600)))
+DECISION_TABLE_BUILD_CONCURRENCY = int(os.environ.get("DECISION_TABLE_BUILD_CONCURRENCY", "8"))
+# Kurz nach der vollen Stunde bauen, damit die Prognose-Caches schon umgeschaltet haben
+DECISION_TABLE_BUILD_DELAY_SECONDS = float(os.environ.get("DECISION_TABLE_BUILD_DELAY_SECONDS", "5"))
+# Mindestabstand zwischen zwei Nachbauten derselben Zelle nach einem Miss
+DECISION_TABLE_REBUILD_BACKOFF_SECONDS = float(os.environ.get("DECISION_TABLE_REBUILD_BACKOFF_SECONDS", "60"))
+
+_ACTIONS = list(Action)
+_NOT_COMPUTED = -1
+
+# (Aktion, Begründung) für eine SoC/Preis/Solar-Situation oder None, wenn es keine
+# verbindliche Antwort gibt – in main.py ist das engine_decision
+Decide = Callable[[float, list[dict], list[float]], Awaitable[tuple[Action, str] | None]]
+
+
+def _soc_region(soc: float) -> int:
+    """Bereich des SoC relativ zu den Regel-Schwellen (innerhalb eines Bereichs gilt dieselbe Regel)."""
+    if soc < rules_engine.STRATEGIC_MIN_SOC:
+        return 0
+    if soc == rules_engine.STRATEGIC_MIN_SOC:
+        return 1
+    return 2 if soc < rules_engine.STRATEGIC_MAX_SOC else 3
+
+
+# Ein Vertreter pro Bereich aus _soc_region
+_REGION_SOCS = np.array([
+    rules_engine.STRATEGIC_MIN_SOC - 1, rules_engine.STRATEGIC_MIN_SOC,
+    (rules_engine.STRATEGIC_MIN_SOC + rules_engine.STRATEGIC_MAX_SOC) / 2, rules_engine.STRATEGIC_MAX_SOC,
+], dtype=np.float64)
+
+
+def soc_buckets(bin_percent: float = DECISION_TABLE_SOC_BIN_PERCENT) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Untergrenzen und Vertreter-SoC der Buckets (0-100 %). Die Grenzen enthalten
+    STRATEGIC_MIN_SOC und STRATEGIC_MAX_SOC; der letzte Vertreter steht für
+    genau STRATEGIC_MIN_SOC (Bereich 1 aus _soc_region ist ein einzelner Punkt).
+    """
+    thresholds = [rules_engine.STRATEGIC_MIN_SOC, rules_engine.STRATEGIC_MAX_SOC]
+    edges = np.unique(np.concatenate([np.arange(0, 100, bin_percent), thresholds]).astype(np.float64))
+    upper = np.append(edges[1:], 100.0)
+    return edges, np.append((edges + upper) / 2, rules_engine.STRATEGIC_MIN_SOC)
+
+
+class _CellEntry:
+    __slots__ = ("hour", "fingerprint", "rule_decisions", "actions", "reasons")
+
+    def __init__(self, hour: int, fingerprint: str, rule_decisions: tuple, actions: np.ndarray, reasons: list[str | None]):
+        self.hour = hour
+        self.fingerprint = fingerprint
+        self.rule_decisions = rule_decisions  # pro SoC-Bereich (Aktion, Begründung) oder None
+        self.actions = actions      # int8: Index in Action, -1 = nicht vorberechnet
+        # Begründung pro Bucket; lebt und stirbt mit dem Eintrag (LLM-Begründungen sind Freitext)
+        self.reasons = reasons
+
+    def same_decisions(self, other: "_CellEntry") -> bool:
+        return self.rule_decisions == other.rule_decisions and np.array_equal(self.actions, other.actions)
+
+    @property
+    def nbytes(self) -> int:
+        return self.actions.nbytes + sum(len(reason) for reason in set(self.reasons) if reason)
+
+
+class DecisionTable:
+    """Kompakte Lookup-Tabelle der Fallback-Entscheidungen pro Zelle für die laufende Stunde."""
+    def __init__(self, soc_bin_percent: float = DECISION_TABLE_SOC_BIN_PERCENT,
+                 clock: Callable[[], float] = time.monotonic):
+        self.soc_bin_percent = soc_bin_percent
+        edges, self._socs = soc_buckets(soc_bin_percent)
+        self._edges = edges.tolist()
+        self._clock = clock
+        self._entries: dict[tuple[float, float], _CellEntry] = {}
+        self._active: dict[tuple[float, float], tuple[float, float, float]] = {}
+        self._building: set[tuple[float, float]] = set()
+        self._last_rebuild: dict[tuple[float, float], float] = {}
+        self._listeners: list[Callable[[tuple[float, float]], None]] = []
+        self.hits = 0
+        self.misses = 0
+        self.last_build_seconds = 0.0
+        self.last_build_cells = 0
+        self.builds = 0
+
+    def add_listener(self, listener: Callable[[tuple[float, float]], None]):
+        """`listener(cell)` wird aufgerufen, wenn ein Neuaufbau die Entscheidungen einer Zelle geändert hat."""
+        self._listeners.append(listener)
+
+    def _bucket(self, soc: float) -> int:
+        if soc == rules_engine.STRATEGIC_MIN_SOC:
+            return len(self._socs) - 1
+        return max(bisect.bisect_right(self._edges, soc) - 1, 0)
+
+    def touch(self, lat: float, lon: float) -> tuple[float, float]:
+        """Merkt sich eine angefragte Zelle, damit sie beim nächsten Stundenjob vorberechnet wird."""
+        cell = grid_cell(lat, lon)
+        self._active[cell] = (lat, lon, self._clock())
+        return cell
+
+    def active_cells(self) -> dict[tuple[float, float], tuple[float, float]]:
+        cutoff = self._clock() - DECISION_TABLE_CELL_TTL_SECONDS
+        for cell in [c for c, (_, _, seen) in self._active.items() if seen < cutoff]:
+            del self._active[cell]
+            self._entries.pop(cell, None)
+            self._last_rebuild.pop(cell, None)
+        return {cell: (lat, lon) for cell, (lat, lon, _) in self._active.items()}
+
+    def _current_entry(self, cell: tuple[float, float], price_forecast: list[dict], now: datetime | None) -> _CellEntry | None:
+        now = now or datetime.now(timezone.utc)
+        entry = self._entries.get(cell)
+        if (entry is None or entry.hour != int(now.timestamp()) // 3600
+                or entry.fingerprint != vector_rules.price_arrays_for(price_forecast).fingerprint()):
+            return None
+        return entry
+
+    def is_current(self, lat: float, lon: float, price_forecast: list[dict], now: datetime | None = None) -> bool:
+        """Gibt es für die Zelle einen Eintrag zur laufenden Stunde und Preiskurve (-> kein Nachbau nötig)?"""
+        return self._current_entry(grid_cell(lat, lon), price_forecast, now) is not None
+
+    def lookup(self, lat: float, lon: float, soc: float, price_forecast: list[dict],
+               now: datetime | None = None) -> tuple[Action, str] | None:
+        """(Aktion, Begründung) aus der Tabelle oder None (-> live rechnen)."""
+        entry = self._current_entry(self.touch(lat, lon), price_forecast, now)
+        if entry is None:
+            self.misses += 1
+            return None
+        rule_decision = entry.rule_decisions[_soc_region(soc)]
+        if rule_decision is not None:
+            self.hits += 1
+            return rule_decision
+        bucket = self._bucket(soc)
+        action = int(entry.actions[bucket])
+        if action == _NOT_COMPUTED:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return _ACTIONS[action], entry.reasons[bucket]
+
+    async def build_cell(self, cell: tuple[float, float], price_forecast: list[dict], solar: list[float],
+                         decide: Decide, now: datetime | None = None, semaphore: asyncio.Semaphore | None = None):
+        """Berechnet die Fallback-Entscheidungen aller SoC-Buckets einer Zelle für die laufende Stunde."""
+        now = now or datetime.now(timezone.utc)
+        arrays = vector_rules.price_arrays_for(price_forecast)
+        current_price = arrays.current_price(now)
+        if current_price is None:
+            return
+        is_cheap_hour = vector_rules.cheap_hour_now(arrays, now)
+        max_solar = float(max(solar, default=0))
+        codes = vector_rules.rule_codes(self._socs, current_price, is_cheap_hour, max_solar)
+        rule_decisions = tuple(
+            vector_rules.explain(int(code), max_solar) if code != vector_rules.NO_RULE else None
+            for code in vector_rules.rule_codes(_REGION_SOCS, current_price, is_cheap_hour, max_solar)
+        )
+
+        actions = np.full(len(self._socs), _NOT_COMPUTED, dtype=np.int8)
+        reasons: list[str | None] = [None] * len(self._socs)
+        semaphore = semaphore or asyncio.Semaphore(DECISION_TABLE_BUILD_CONCURRENCY)
+
+        async def fill(bucket: int):
+            async with semaphore:
+                decision = await decide(float(self._socs[bucket]), price_forecast, solar)
+            if decision is None:
+                return
+            actions[bucket] = _ACTIONS.index(decision[0])
+            reasons[bucket] = decision[1]
+
+        # Nur Buckets, in denen keine schnelle Regel greift, brauchen das Fallback
+        await asyncio.gather(*(fill(b) for b in np.flatnonzero(codes == vector_rules.NO_RULE)))
+        entry = _CellEntry(int(now.timestamp()) // 3600, arrays.fingerprint(), rule_decisions, actions, reasons)
+        previous = self._entries.get(cell)
+        self._entries[cell] = entry
+        # Unveränderte Zelle (z.B. nur neue Stunde): Abonnenten nicht erneut bewerten
+        if previous is not None and previous.same_decisions(entry):
+            return
+        for listener in self._listeners:
+            listener(cell)
+
+    async def build_all(self, fetch_prices: Callable[[], Awaitable[list[dict] | None]],
+                        fetch_solar: Callable[[float, float], Awaitable[list[float] | None]], decide: Decide):
+        """Baut die Tabelle für alle aktiven Zellen neu (der stündliche Job)."""
+        start = time.perf_counter()
+        price_forecast = await fetch_prices()
+        if price_forecast is None:
+            print("WARNUNG: Entscheidungstabelle nicht gebaut, Preisprognose nicht verfügbar.")
+            return
+        cells = self.active_cells()
+        semaphore = asyncio.Semaphore(DECISION_TABLE_BUILD_CONCURRENCY)
+
+        async def build(cell, lat, lon):
+            solar = await fetch_solar(lat, lon)
+            if solar is not None:
+                await self.build_cell(cell, price_forecast, solar, decide, semaphore=semaphore)
+
+        results = await asyncio.gather(*(build(cell, lat, lon) for cell, (lat, lon) in cells.items()), return_exceptions=True)
+        for error in (r for r in results if isinstance(r, Exception)):
+            print(f"FEHLER: Zelle der Entscheidungstabelle konnte nicht gebaut werden: {error}")
+        self.last_build_seconds = time.perf_counter() - start
+        metrics.DECISION_TABLE_BUILD_SECONDS.observe(self.last_build_seconds, "all")
+        self.last_build_cells = len(cells)
+        self.builds += 1
+        print(f"INFO: Entscheidungstabelle gebaut: {len(cells)} Zellen in {self.last_build_seconds:.2f}s ({self.nbytes} Bytes).")
+
+    def build_in_background(self, lat: float, lon: float, fetch_prices, fetch_solar, decide):
+        """Nach einem Miss: die Zelle einmal nachbauen, statt bis zur nächsten Stunde zu warten."""
+        cell = grid_cell(lat, lon)
+        started = self._clock()
+        if cell in self._building or started - self._last_rebuild.get(cell, -np.inf) < DECISION_TABLE_REBUILD_BACKOFF_SECONDS:
+            return
+        self._last_rebuild[cell] = started
+
+        async def build():
+            try:
+                with metrics.DECISION_TABLE_BUILD_SECONDS.time("cell"):
+                    price_forecast, solar = await fetch_prices(), await fetch_solar(lat, lon)
+                    if price_forecast is not None and solar is not None:
+                        await self.build_cell(cell, price_forecast, solar, decide)
+            except Exception as e:
+                print(f"FEHLER: Zelle der Entscheidungstabelle konnte nicht gebaut werden: {e}")
+            finally:
+                self._building.discard(cell)
+
+        self._building.add(cell)
+        asyncio.ensure_future(build())
+
+    async def run_hourly(self, fetch_prices, fetch_solar, decide):
+        """Hintergrund-Task: baut die Tabelle kurz nach jeder vollen Stunde neu."""
+        while True:
+            now = datetime.now(timezone.utc)
+            next_hour = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+            await asyncio.sleep((next_hour - now).total_seconds() + DECISION_TABLE_BUILD_DELAY_SECONDS)
+            try:
+                await self.build_all(fetch_prices, fetch_solar, decide)
+            except Exception as e:
+                print(f"FEHLER: Stündlicher Aufbau der Entscheidungstabelle fehlgeschlagen: {e}")
+
+    @property
+    def nbytes(self) -> int:
+        return sum(entry.nbytes for entry in self._entries.values())
+
+    @property
+    def cells(self) -> int:
+        return len(self._entries)
+
+    @property
+    def computed_entries(self) -> int:
+        """Vorberechnete Fallback-Entscheidungen über alle Zellen."""
+        return sum(int(np.count_nonzero(entry.actions != _NOT_COMPUTED)) for entry in self._entries.values())
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "cells": self.cells,
+            "active_cells": len(self._active),
+            "entries": self.computed_entries,
+            "size_bytes": self.nbytes,
+            "distinct_reasons": len({reason for entry in self._entries.values() for reason in entry.reasons if reason}),
+            "builds": self.builds,
+            "last_build_seconds": round(self.last_build_seconds, 4),
+            "last_build_cells": self.last_build_cells,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+# Globale Instanz für /entscheidung
+decision_table = DecisionTable()
@@ -1,10 +1,31 @@
+# NEU: 'openai' (rund 1 s Importzeit) wird erst bei der Initialisierung und dort
+#      in einem Worker-Thread importiert. Die Initialisierung läuft einmal im
+#      Hintergrund; bis sie fertig ist, bekommen Anfragen sofort den Fallback.
+# ---------------------------------------------------------------------------
+# NEU: Zwei Stufen. Knappe Fälle (eine schnelle Regel hat fast gegriffen) und
+#      Fälle mit kleiner Preisspanne gehen an ein kleines, schnelles Modell; das
+#      große Modell nur, wenn die Preisspanne wirtschaftlich ins Gewicht fällt.
+#      Der Nutzer-Prompt ist kompaktes JSON statt Fließtext, der System-Prompt
+#      bleibt Byte für Byte gleich (Prompt-Caching beim Anbieter). Tokens und
+#      Latenz werden pro Stufe erfasst (/metrics, /health), um die Schwellen
+#      einzustellen.
+# ---------------------------------------------------------------------------
 import os
 import time
 import json
+import asyncio
+import importlib
 from datetime import datetime, timezone
-import openai
+from typing import TYPE_CHECKING
 from pydantic import ValidationError
 from optimisation_api.models import Decision, Action
+from optimisation_api.logic import rules_engine
+from optimisation_api.logic.llm_cache import decision_key, llm_decision_cache
+from optimisation_api.logic.llm_dispatcher import llm_dispatcher
+from optimisation_api.services import metrics
+
+if TYPE_CHECKING:
+    import openai
 
 # Lese die gleichen Umgebungsvariablen wie in der rules_engine
 BMS_MIN_SOC = float(os.environ.get("BMS_MIN_SOC_PERCENT", "5"))
@@ -13,7 +34,9 @@ STRATEGIC_MIN_SOC = BMS_MIN_SOC + 10
 BMS_MAX_SOC = float(os.environ.get("BMS_MAX_SOC_PERCENT", "99"))
 STRATEGIC_MAX_SOC = BMS_MAX_SOC - 5
 
-# Füge die Regeln dem System-Prompt hinzu, damit die KI sie kennt
+# Füge die Regeln dem System-Prompt hinzu, damit die KI sie kennt.
+# WICHTIG: Der System-Prompt hängt nur von der Konfiguration ab (keine Uhrzeit, keine
+# Messwerte) und ist für beide Stufen identisch – nur dann greift das Prompt-Caching.
 SYSTEM_PROMPT = f"""
 Du bist ein Experte für Energie-Management von Heimbatterien. Deine Ziele sind:
 - Stromkosten durch intelligentes Laden und Entladen minimieren.
@@ -31,32 +54,101 @@ Du kannst aus den folgenden Aktionen wählen:
 - "WAIT_FOR_SOLAR": Tue nichts und warte auf die erwartete Sonneneinstrahlung.
 - "DO_NOTHING": Die Batterie weder laden noch entladen.
 
-Deine Antwort MUSS IMMER ein valides JSON-Objekt sein, das genau diesem Schema folgt:
+Die Situation kommt als JSON-Objekt:
+- "soc": Batteriestand in %
+- "hour_utc": aktuelle Stunde (UTC)
+- "price_now": aktueller Netzpreis in €/kWh (null, wenn unbekannt)
+- "prices": kommende Stunden als [Stunde UTC, €/kWh]
+- "solar": Einstrahlung der kommenden Stunden in W/m², beginnend mit der aktuellen
+
+Entscheide, welche Aktion **jetzt sofort** wirtschaftlich und technisch am sinnvollsten ist.
+Deine Antwort MUSS IMMER ein valides JSON-Objekt sein, das genau diesem Schema folgt
+(Begründung in höchstens 20 Wörtern):
 {{"action": "AKTION", "reason": "Eine kurze, klare Begründung für deine Entscheidung."}}
 """
 
+# --- Stufen-Routing ---
+LLM_SMALL_MODEL = os.environ.get("LLM_SMALL_MODEL", "gpt-4o-mini")
+LLM_LARGE_MODEL = os.environ.get("LLM_LARGE_MODEL", "gpt-4o")
+LLM_SMALL_TIMEOUT_SECONDS = float(os.environ.get("LLM_SMALL_TIMEOUT_SECONDS", "1.5"))
+# Das große Modell nur, wenn Preisspanne × Batteriekapazität mindestens so viel wert ist
+LLM_LARGE_MODEL_MIN_VALUE_EUR = float(os.environ.get("LLM_LARGE_MODEL_MIN_VALUE_EUR", "1.0"))
+BATTERY_CAPACITY_KWH = float(os.environ.get("BATTERY_CAPACITY_KWH", "10"))
+# Stunden, über die die Preisspanne bestimmt wird
+LLM_PRICE_SPREAD_HORIZON_HOURS = int(os.environ.get("LLM_PRICE_SPREAD_HORIZON_HOURS", "24"))
+# "Knapp" (beidseitig): SoC so viele Prozentpunkte an einer Puffergrenze bzw. Preis/Solar so
+# viele Prozent an der Schwelle einer schnellen Regel
+LLM_NEAR_BOUNDARY_SOC_POINTS = float(os.environ.get("LLM_NEAR_BOUNDARY_SOC_POINTS", "5"))
+LLM_NEAR_BOUNDARY_FRACTION = float(os.environ.get("LLM_NEAR_BOUNDARY_FRACTION", "0.15"))
+
+
+class LLMTier:
+    """Modell, Timeout und Prompt-Umfang einer Stufe."""
+    __slots__ = ("name", "model", "timeout", "price_hours", "max_tokens")
+
+    def __init__(self, name: str, model: str, timeout: float, price_hours: int, max_tokens: int):
+        self.name = name
+        self.model = model
+        self.timeout = timeout
+        self.price_hours = price_hours
+        self.max_tokens = max_tokens
+
+
 # --- Globale Variablen für den "Lazy Load" des asynchronen OpenAI-Clients ---
-openai_client: openai.AsyncOpenAI | None = None
+openai_client: "openai.AsyncOpenAI | None" = None
 openai_initialized = False
+_init_task: asyncio.Task | None = None
 
 MAX_LLM_RUNTIME = 3.0
 
-async def initialize_openai():
+TIERS = {
+    "small": LLMTier("small", LLM_SMALL_MODEL, LLM_SMALL_TIMEOUT_SECONDS, price_hours=8, max_tokens=80),
+    "large": LLMTier("large", LLM_LARGE_MODEL, MAX_LLM_RUNTIME, price_hours=24, max_tokens=150),
+}
+# Pro Stufe: Aufrufe, Fehler, Tokens und Gesamtdauer (für /health; Histogramme in /metrics)
+tier_usage = {
+    name: {"calls": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "seconds": 0.0}
+    for name in TIERS
+}
+# Obergrenze für den Verbindungstest beim Start (ohne Wiederholungen des SDKs)
+OPENAI_INIT_TIMEOUT_SECONDS = float(os.environ.get("OPENAI_INIT_TIMEOUT_SECONDS", "5"))
+
+def start_openai_initialization(retry: bool = False) -> asyncio.Task | None:
     """
-    Initialisiert den asynchronen OpenAI-Client sicher.
+    Startet die Initialisierung im Hintergrund (höchstens eine gleichzeitig) und gibt den Task zurück.
+    Mit `retry=True` wird ein fehlgeschlagener Versuch wiederholt.
     """
-    global openai_client, openai_initialized
+    global _init_task, openai_initialized
+    if retry and openai_initialized and openai_client is None:
+        openai_initialized = False
+        _init_task = None
     if openai_initialized:
-        return
+        return None
+    if _init_task is None or _init_task.done():
+        _init_task = asyncio.ensure_future(_initialize_openai())
+    return _init_task
+
+async def initialize_openai(retry: bool = False):
+    """
+    Initialisiert den asynchronen OpenAI-Client sicher; gleichzeitige Aufrufer teilen sich einen Versuch.
+    """
+    task = start_openai_initialization(retry)
+    if task is not None:
+        await asyncio.shield(task)
 
+async def _initialize_openai():
+    global openai_client, openai_initialized
     print("--- INFO: Initialisiere Async-OpenAI-Client... ---")
     try:
         api_key = os.environ.get("OPENAI_API_KEY")
         if not api_key:
             raise ValueError("FATAL: OPENAI_API_KEY Umgebungsvariable nicht gefunden oder leer.")
-        
-        openai_client = openai.AsyncOpenAI(api_key=api_key)
-        await openai_client.models.list()
+
+        # Import im Thread, damit der Event-Loop währenddessen weiter Anfragen bedient
+        openai = await asyncio.to_thread(importlib.import_module, "openai")
+        client = openai.AsyncOpenAI(api_key=api_key)
+        await client.with_options(timeout=OPENAI_INIT_TIMEOUT_SECONDS, max_retries=0).models.list()
+        openai_client = client
         print(f"--- ERFOLG: Async-OpenAI-Client erfolgreich initialisiert und verbunden. ---")
 
     except Exception as e:
@@ -68,54 +160,170 @@ async def initialize_openai():
         openai_initialized = True
 
 
-async def llm_decision(soc: float, price_forecast: list[dict], solar: list[float]) -> Decision | None:
+async def llm_decision(soc: float, price_forecast: list[dict], solar: list[float], now: datetime | None = None) -> Decision | None:
     """
-    Trifft eine Entscheidung mithilfe des asynchronen OpenAI-Modells.
+    Trifft eine Entscheidung mithilfe des asynchronen OpenAI-Modells. `now` ist der
+    Entscheidungszeitpunkt (Standard: jetzt; der Backtest übergibt die historische Stunde).
+    Gleiche Situationen (Preiskurve, Stunde, SoC-/Solar-Bucket) werden aus dem
+    llm_decision_cache beantwortet; gleichzeitige identische Anfragen teilen sich einen Aufruf.
+    Der llm_dispatcher begrenzt Nebenläufigkeit und Rate und überspringt das LLM bei offenem Breaker.
     """
-    await initialize_openai()
+    if not openai_initialized:
+        # Nicht auf den Verbindungsaufbau warten: bis er fertig ist, gilt der Fallback
+        start_openai_initialization()
+        llm_dispatcher.fallbacks["client_initializing"] += 1
+        return None
 
     if not openai_client:
+        llm_dispatcher.fallbacks["client_unavailable"] += 1
         print("WARNUNG: LLM-Entscheidung übersprungen, da OpenAI-Client nicht verfügbar ist.")
         return None
 
-    future_prices = [item for item in price_forecast if item['timestamp_utc'] > datetime.now(timezone.utc)]
-    price_str = "\\n".join([f"- {item['timestamp_utc'].strftime('%H:%M')}: {item['price_eur_kwh']:.4f} €" for item in future_prices[:8]])
-    now = datetime.now(timezone.utc)
-    current_price_item = next((item for item in price_forecast if item['timestamp_utc'].hour == now.hour and item['timestamp_utc'].date() == now.date()), None)
-    current_price = current_price_item['price_eur_kwh'] if current_price_item else "N/A"
-    user_prompt = (
-        f"AKTUELLE SITUATION:\n- Batteriestand (SoC): {soc:.1f}%\n- Aktueller Netzpreis: {current_price:.4f} €/kWh\n\n"
-        f"PROGNOSEN:\n- Preisprognose (kommende Stunden):\n{price_str}\n- Solarprognose (kommende 6h in Watt pro m²): {solar}\n\n"
-        f"AUFGABE: Analysiere die Daten und entscheide, welche Aktion **jetzt sofort** die wirtschaftlich und technisch sinnvollste ist. Beachte dabei strikt die Betriebsrenzen. Gib deine Antwort ausschließlich im geforderten JSON-Format zurück."
-    )
-    
+    key = decision_key(soc, price_forecast, solar, now=now)
+    compute = lambda: llm_dispatcher.run(lambda: _request_llm_decision(soc, price_forecast, solar, now))
+    try:
+        # Nach der Deadline antworten wir mit dem Fallback; der LLM-Aufruf läuft im
+        # Hintergrund weiter und schreibt sein Ergebnis für die nächste Anfrage in den Cache.
+        return await asyncio.wait_for(llm_decision_cache.get_or_compute(key, compute), timeout=llm_dispatcher.deadline_seconds)
+    except asyncio.TimeoutError:
+        llm_dispatcher.fallbacks["deadline"] += 1
+        print(f"WARNUNG: LLM-Deadline von {llm_dispatcher.deadline_seconds * 1000:.0f} ms überschritten, nutze Fallback.")
+        return None
+
+
+def _current_price(price_forecast: list[dict], now: datetime) -> float | None:
+    item = next((item for item in price_forecast if item['timestamp_utc'].hour == now.hour and item['timestamp_utc'].date() == now.date()), None)
+    return item['price_eur_kwh'] if item else None
+
+
+def price_spread(price_forecast: list[dict], now: datetime, hours: int = LLM_PRICE_SPREAD_HORIZON_HOURS) -> float:
+    """Spanne (max - min) der Preise von der laufenden Stunde an über `hours` Stunden in €/kWh."""
+    current_hour = now.replace(minute=0, second=0, microsecond=0)
+    prices = [item['price_eur_kwh'] for item in price_forecast if item['timestamp_utc'] >= current_hour][:hours]
+    return max(prices) - min(prices) if prices else 0.0
+
+
+def near_boundary(soc: float, current_price: float | None, solar: list[float]) -> bool:
+    """
+    Ob die Situation knapp an einer Schwelle der schnellen Regeln liegt – beidseitig,
+    d.h. knapp darunter oder knapp darüber (SoC, Solar oder Preis).
+    """
+    if (abs(soc - rules_engine.STRATEGIC_MIN_SOC) <= LLM_NEAR_BOUNDARY_SOC_POINTS
+            or abs(soc - rules_engine.STRATEGIC_MAX_SOC) <= LLM_NEAR_BOUNDARY_SOC_POINTS):
+        return True
+    solar_threshold = rules_engine.SOLAR_WAIT_THRESHOLD_W_M2
+    if abs(max(solar, default=0) - solar_threshold) <= LLM_NEAR_BOUNDARY_FRACTION * solar_threshold:
+        return True
+    if current_price is not None:
+        high, cheap = rules_engine.HIGH_PRICE_EUR_KWH, rules_engine.CHEAP_PRICE_EUR_KWH
+        if (abs(current_price - high) <= LLM_NEAR_BOUNDARY_FRACTION * high
+                or abs(current_price - cheap) <= LLM_NEAR_BOUNDARY_FRACTION * cheap):
+            return True
+    return False
+
+
+def route_tier(soc: float, price_forecast: list[dict], solar: list[float], now: datetime | None = None) -> tuple[LLMTier, str]:
+    """
+    Wählt die Stufe und nennt den Grund (für die Metriken):
+    knapp an einer Regel -> klein; große Preisspanne -> groß; sonst klein.
+    """
+    now = now or datetime.now(timezone.utc)
+    if near_boundary(soc, _current_price(price_forecast, now), solar):
+        return TIERS["small"], "near_boundary"
+    if price_spread(price_forecast, now) * BATTERY_CAPACITY_KWH >= LLM_LARGE_MODEL_MIN_VALUE_EUR:
+        return TIERS["large"], "large_spread"
+    return TIERS["small"], "small_spread"
+
+
+def compact_prompt(soc: float, price_forecast: list[dict], solar: list[float], tier: LLMTier, now: datetime | None = None) -> str:
+    """Die Situation als kompaktes JSON (Format im SYSTEM_PROMPT beschrieben)."""
+    now = now or datetime.now(timezone.utc)
+    current_price = _current_price(price_forecast, now)
+    future = [item for item in price_forecast if item['timestamp_utc'] > now][:tier.price_hours]
+    return json.dumps({
+        "soc": round(soc, 1),
+        "hour_utc": now.hour,
+        "price_now": round(current_price, 4) if current_price is not None else None,
+        "prices": [[item['timestamp_utc'].hour, round(item['price_eur_kwh'], 4)] for item in future],
+        "solar": [round(value) for value in solar],
+    }, separators=(",", ":"))
+
+
+def _record_usage(tier: LLMTier, response, seconds: float):
+    usage = tier_usage[tier.name]
+    usage["calls"] += 1
+    usage["seconds"] += seconds
+    metrics.LLM_REQUEST_SECONDS.observe(seconds, tier.name)
+    if response is None:
+        usage["errors"] += 1
+        return
+    usage_info = getattr(response, "usage", None)
+    if usage_info is None:
+        return
+    cached = getattr(getattr(usage_info, "prompt_tokens_details", None), "cached_tokens", None) or 0
+    for kind, count in (("prompt", usage_info.prompt_tokens or 0), ("completion", usage_info.completion_tokens or 0), ("cached", cached)):
+        usage[f"{kind}_tokens"] += count
+        metrics.LLM_TOKENS_TOTAL.inc(tier.name, kind, amount=count)
+
+
+def tier_stats() -> dict:
+    """Verbrauch pro Stufe inkl. mittlerer Latenz."""
+    return {
+        name: {**usage, "seconds": round(usage["seconds"], 3),
+               "mean_latency_ms": round(usage["seconds"] / usage["calls"] * 1000, 1) if usage["calls"] else None}
+        for name, usage in tier_usage.items()
+    }
+
+
+async def _request_llm_decision(soc: float, price_forecast: list[dict], solar: list[float],
+                                now: datetime | None = None) -> tuple[Decision | None, int]:
+    """Der eigentliche OpenAI-Aufruf. Gibt (Entscheidung, verbrauchte Tokens) zurück."""
+    import openai  # bereits geladen, sobald es einen Client gibt
+    now = now or datetime.now(timezone.utc)
+    tier, route_reason = route_tier(soc, price_forecast, solar, now)
+    metrics.LLM_ROUTED_TOTAL.inc(tier.name, route_reason)
+    user_prompt = compact_prompt(soc, price_forecast, solar, tier, now)
+
+    tokens = 0
+    response = None
+    start_time = time.monotonic()
     try:
-        print("INFO: Sende Anfrage an OpenAI API (async)...")
-        start_time = time.monotonic()
-
-        response = await openai_client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": user_prompt}
-            ],
-            response_format={"type": "json_object"},
-            temperature=0.2,
-            timeout=MAX_LLM_RUNTIME,
-        )
+        print(f"INFO: Sende Anfrage an OpenAI API (async, Stufe {tier.name}: {tier.model})...")
+
+        with metrics.EXTERNAL_API_SECONDS.time("openai"), metrics.span("openai.chat.completions", {"gen_ai.request.model": tier.model, "llm.tier": tier.name}):
+            response = await openai_client.chat.completions.create(
+                model=tier.model,
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": user_prompt}
+                ],
+                response_format={"type": "json_object"},
+                temperature=0.2,
+                max_tokens=tier.max_tokens,
+                timeout=tier.timeout,
+            )
+        metrics.EXTERNAL_API_REQUESTS_TOTAL.inc("openai", "ok")
         
         duration = time.monotonic() - start_time
         print(f"INFO: Antwort von OpenAI in {duration:.2f}s erhalten.")
+        if getattr(response, "usage", None):
+            tokens = response.usage.total_tokens or 0
         
         response_json = json.loads(response.choices[0].message.content)
         decision = Decision.parse_obj(response_json)
         print(f"INFO: Valide LLM-Entscheidung erhalten: {decision.action} -> {decision.reason}")
-        return decision
+        return decision, tokens
 
     except openai.APITimeoutError:
-        print(f"FEHLER: OpenAI API-Anfrage hat das Timeout von {MAX_LLM_RUNTIME}s überschritten.")
-        return None
+        metrics.EXTERNAL_API_REQUESTS_TOTAL.inc("openai", "timeout")
+        print(f"FEHLER: OpenAI API-Anfrage hat das Timeout von {tier.timeout}s überschritten (Stufe {tier.name}).")
+        return None, tokens
+    except openai.APIError as e:
+        metrics.EXTERNAL_API_REQUESTS_TOTAL.inc("openai", "error")
+        print(f"FEHLER: OpenAI API-Anfrage fehlgeschlagen: {e}")
+        return None, tokens
     except Exception as e:
         print(f"FEHLER: Ein unerwarteter Fehler im LLM-Agent ist aufgetreten: {e}")
-        return None
-
+        return None, tokens
+    finally:
+        _record_usage(tier, response, time.monotonic() - start_time)
@@ -0,0 +1,144 @@
+# ---------------------------------------------------------------------------
+# optimisation_api/logic/llm_cache.py
+# ---------------------------------------------------------------------------
+# Viele Batterien in derselben Preiszone fragen innerhalb einer Stunde mit fast
+# identischen Eingaben an: gleiche Preiskurve, ähnlicher SoC, ähnliche Sonne.
+# Dieser Cache sorgt dafür, dass eine solche Situation nur EINEN LLM-Aufruf
+# pro Stunde kostet statt einen pro Batterie.
+#
+# - Schlüssel: Hash der Preisprognose + Stunde + SoC-Bucket + Solar-Buckets
+# - Eviction: LRU mit maximaler Größe plus TTL
+# - Identische Anfragen, die gleichzeitig laufen, teilen sich einen Aufruf
+# ===========================================================================
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Awaitable, Callable
+
+from optimisation_api.logic.vector_rules import price_arrays_for
+from optimisation_api.models import Decision
+
+LLM_CACHE_SOC_BIN_PERCENT = float(os.environ.get("LLM_CACHE_SOC_BIN_PERCENT", "5"))
+LLM_CACHE_SOLAR_BIN_W_M2 = float(os.environ.get("LLM_CACHE_SOLAR_BIN_W_M2", "50"))
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "10000"))
+LLM_CACHE_TTL_SECONDS = float(os.environ.get("LLM_CACHE_TTL_SECONDS", "3600"))
+
+
+def decision_key(soc: float, price_forecast: list[dict], solar: list[float], now: datetime | None = None) -> tuple:
+    """Kanonischer Schlüssel: gleiche Situation (im Rahmen der Buckets) -> gleicher Schlüssel."""
+    now = now or datetime.now(timezone.utc)
+    return (
+        price_arrays_for(price_forecast).fingerprint(),
+        int(now.timestamp()) // 3600,
+        int(soc // LLM_CACHE_SOC_BIN_PERCENT),
+        tuple(int(value // LLM_CACHE_SOLAR_BIN_W_M2) for value in solar),
+    )
+
+
+class _Entry:
+    __slots__ = ("decision", "tokens", "expires_at")
+
+    def __init__(self, decision: Decision, tokens: int, expires_at: float):
+        self.decision = decision
+        self.tokens = tokens
+        self.expires_at = expires_at
+
+
+class LLMDecisionCache:
+    """
+    LRU+TTL-Cache für LLM-Entscheidungen mit Single-Flight.
+    `compute` liefert (Decision | None, verbrauchte Tokens); None wird nicht gecacht.
+    """
+    def __init__(self, max_entries: int = LLM_CACHE_MAX_ENTRIES, ttl_seconds: float = LLM_CACHE_TTL_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: OrderedDict[tuple, _Entry] = OrderedDict()
+        self._in_flight: dict[tuple, asyncio.Task] = {}
+        self.lookups = 0
+        self.hits = 0
+        self.coalesced = 0
+        self.llm_calls = 0
+        self.evictions = 0
+        self.tokens_used = 0
+        self.tokens_saved = 0
+
+    def get(self, key: tuple) -> Decision | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self._clock() >= entry.expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry.decision
+
+    def put(self, key: tuple, decision: Decision, tokens: int = 0):
+        self._entries[key] = _Entry(decision, tokens, self._clock() + self.ttl_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def in_flight(self, key: tuple) -> asyncio.Task | None:
+        return self._in_flight.get(key)
+
+    async def get_or_compute(self, key: tuple,
+                             compute: Callable[[], Awaitable[tuple[Decision | None, int]]]) -> Decision | None:
+        self.lookups += 1
+        decision = self.get(key)
+        if decision is not None:
+            self.hits += 1
+            self.tokens_saved += self._entries[key].tokens
+            return decision
+        coalesced = key in self._in_flight
+        decision = await asyncio.shield(self.start(key, compute))
+        if coalesced and decision is not None and key in self._entries:
+            self.tokens_saved += self._entries[key].tokens
+        return decision
+
+    def start(self, key: tuple, compute: Callable[[], Awaitable[tuple[Decision | None, int]]]) -> asyncio.Task:
+        """Startet den Aufruf (oder hängt sich an einen laufenden an) und gibt den Task zurück."""
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return task
+        task = asyncio.ensure_future(self._compute_and_store(key, compute))
+        self._in_flight[key] = task
+        return task
+
+    async def _compute_and_store(self, key: tuple,
+                                 compute: Callable[[], Awaitable[tuple[Decision | None, int]]]) -> Decision | None:
+        try:
+            decision, tokens = await compute()
+            # Nur echte LLM-Aufrufe zählen: vom Dispatcher übersprungene (Breaker offen,
+            # Warteschlange voll) und fehlgeschlagene kommen mit 0 Tokens zurück
+            if tokens > 0:
+                self.llm_calls += 1
+            self.tokens_used += tokens
+            if decision is not None:
+                self.put(key, decision, tokens)
+            return decision
+        finally:
+            self._in_flight.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "in_flight": len(self._in_flight),
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "coalesced": self.coalesced,
+            "llm_calls": self.llm_calls,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.coalesced) / self.lookups, 4) if self.lookups else 0.0,
+            "tokens_used": self.tokens_used,
+            "tokens_saved": self.tokens_saved,
+        }
+
+
+# Globale Instanz für llm_agent.llm_decision
+llm_decision_cache = LLMDecisionCache()
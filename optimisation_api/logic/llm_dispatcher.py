@@ -0,0 +1,182 @@
+# ---------------------------------------------------------------------------
+# optimisation_api/logic/llm_dispatcher.py
+# ---------------------------------------------------------------------------
+# Türsteher vor dem OpenAI-Client. Ohne ihn laufen unter Last beliebig viele
+# Anfragen gleichzeitig in die Rate-Limits von OpenAI, und jede wartet dann
+# das volle Timeout ab, bevor DO_NOTHING zurückkommt.
+#
+# - Semaphore: maximale Anzahl gleichzeitiger LLM-Aufrufe
+# - Token-Bucket: maximale Aufrufe pro Sekunde (mit Burst)
+# - Circuit-Breaker: nach wiederholten Fehlern/Timeouts wird das LLM eine
+#   Zeit lang komplett übersprungen
+# - Warteschlange begrenzt: wer nicht mehr hineinpasst, bekommt sofort den Fallback
+# ===========================================================================
+import asyncio
+import os
+import time
+from collections import Counter
+from typing import Awaitable, Callable
+
+from optimisation_api.models import Decision
+
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "16"))
+LLM_RATE_LIMIT_PER_SECOND = float(os.environ.get("LLM_RATE_LIMIT_PER_SECOND", "20"))
+LLM_RATE_LIMIT_BURST = int(os.environ.get("LLM_RATE_LIMIT_BURST", "40"))
+LLM_MAX_QUEUE = int(os.environ.get("LLM_MAX_QUEUE", "200"))
+LLM_BREAKER_FAILURE_THRESHOLD = int(os.environ.get("LLM_BREAKER_FAILURE_THRESHOLD", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.environ.get("LLM_BREAKER_RESET_SECONDS", "30"))
+# Spätestens nach dieser Zeit bekommt der Aufrufer eine Antwort; das LLM-Ergebnis
+# landet trotzdem im Cache und hilft der nächsten Anfrage.
+LLM_DEADLINE_MS = float(os.environ.get("LLM_DEADLINE_MS", "1500"))
+
+
+class TokenBucket:
+    """Einfacher Token-Bucket: `rate` Tokens pro Sekunde, höchstens `capacity` auf Vorrat."""
+    def __init__(self, rate: float, capacity: int, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._tokens = float(capacity)
+        self._updated = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> bool:
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    async def acquire(self):
+        """Wartet, bis ein Token frei ist."""
+        while not self.try_acquire():
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class CircuitBreaker:
+    """
+    closed -> (N Fehler in Folge) -> open -> (Reset-Zeit) -> half_open -> (Erfolg) -> closed
+    Im Zustand half_open wird genau ein Probeaufruf durchgelassen.
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int, reset_seconds: float, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._clock = clock
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_running = False
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_seconds:
+            self._state = self.HALF_OPEN
+        return self._state
+
+    def allow_request(self) -> bool:
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._probe_running:
+            self._probe_running = True
+            return True
+        return False
+
+    def record_success(self):
+        self._failures = 0
+        self._probe_running = False
+        self._state = self.CLOSED
+
+    def release_probe(self):
+        """Abgebrochener Aufruf: der Probeplatz wird frei, ohne Erfolg oder Fehler zu zählen."""
+        self._probe_running = False
+
+    def record_failure(self):
+        self._probe_running = False
+        self._failures += 1
+        if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            if self._state != self.OPEN:
+                self.times_opened += 1
+                print(f"WARNUNG: LLM-Circuit-Breaker geöffnet nach {self._failures} Fehlern.")
+            self._state = self.OPEN
+            self._opened_at = self._clock()
+
+
+class LLMDispatcher:
+    """Führt LLM-Aufrufe mit Nebenläufigkeits-, Raten- und Fehlergrenzen aus."""
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 rate_per_second: float = LLM_RATE_LIMIT_PER_SECOND, burst: int = LLM_RATE_LIMIT_BURST,
+                 max_queue: int = LLM_MAX_QUEUE, deadline_ms: float = LLM_DEADLINE_MS,
+                 breaker: CircuitBreaker | None = None):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.deadline_seconds = deadline_ms / 1000
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._bucket = TokenBucket(rate_per_second, burst)
+        self.breaker = breaker or CircuitBreaker(LLM_BREAKER_FAILURE_THRESHOLD, LLM_BREAKER_RESET_SECONDS)
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.fallbacks: Counter[str] = Counter()
+
+    async def run(self, call: Callable[[], Awaitable[tuple[Decision | None, int]]]) -> tuple[Decision | None, int]:
+        """
+        Führt `call` aus, sofern Breaker und Warteschlange es zulassen.
+        Gibt (None, 0) zurück, wenn das LLM übersprungen wird.
+        """
+        if self.queued >= self.max_queue:
+            self.fallbacks["queue_full"] += 1
+            return None, 0
+        if not self.breaker.allow_request():
+            self.fallbacks["circuit_open"] += 1
+            return None, 0
+
+        try:
+            self.queued += 1
+            try:
+                await self._bucket.acquire()
+                await self._semaphore.acquire()
+            finally:
+                self.queued -= 1
+            self.running += 1
+            try:
+                decision, tokens = await call()
+            except Exception as e:
+                print(f"FEHLER: LLM-Aufruf im Dispatcher fehlgeschlagen: {e}")
+                decision, tokens = None, 0
+            finally:
+                self.running -= 1
+                self._semaphore.release()
+        except BaseException:
+            # Abgebrochen (CancelledError): sonst bliebe der Breaker für immer half_open
+            self.breaker.release_probe()
+            raise
+        self.completed += 1
+        if decision is None:
+            self.fallbacks["llm_error"] += 1
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return decision, tokens
+
+    def stats(self) -> dict:
+        return {
+            "breaker_state": self.breaker.state,
+            "breaker_opened": self.breaker.times_opened,
+            "queue_depth": self.queued,
+            "in_flight": self.running,
+            "max_concurrency": self.max_concurrency,
+            "completed": self.completed,
+            "fallbacks": dict(self.fallbacks),
+        }
+
+
+# Globale Instanz für llm_agent.llm_decision
+llm_dispatcher = LLMDispatcher()
@@ -19,31 +19,52 @@ BMS_MAX_SOC = float(os.environ.get("BMS_MAX_SOC_PERCENT", "99"))
 STRATEGIC_MIN_SOC = BMS_MIN_SOC + 10  # Ergibt z.B. 15%
 STRATEGIC_MAX_SOC = BMS_MAX_SOC - 5   # Ergibt z.B. 94%
 
-def fast_rules(soc: float, current_price: float, price_forecast: list[dict], solar: list[float]) -> tuple[Action | None, str | None]:
-    """Smartere Heuristiken, die jetzt die strategischen Puffer nutzen."""
+# Schwellen der Heuristiken (auch von vector_rules genutzt)
+SOLAR_WAIT_THRESHOLD_W_M2 = 300
+HIGH_PRICE_EUR_KWH = 0.28
+CHEAP_PRICE_EUR_KWH = 0.15
+CHEAPEST_HOURS_COUNT = 3
+# Über diesem Preis wird nie aus dem Netz geladen (Sicherheits-Fallback)
+SAFETY_MAX_CHARGE_PRICE_EUR_KWH = 0.15
+
+def fast_rules(soc: float, current_price: float, price_forecast: list[dict], solar: list[float],
+               cheapest_hours: list[datetime] | None = None) -> tuple[Action | None, str | None]:
+    """
+    Smartere Heuristiken, die jetzt die strategischen Puffer nutzen.
+    `cheapest_hours` kann vorberechnet übergeben werden (z.B. einmal pro Batch).
+    """
+    _, action, reason = evaluate_rules(soc, current_price, price_forecast, solar, cheapest_hours)
+    return action, reason
+
+def evaluate_rules(soc: float, current_price: float, price_forecast: list[dict], solar: list[float],
+                   cheapest_hours: list[datetime] | None = None) -> tuple[str, Action | None, str | None]:
+    """
+    Wie fast_rules, nennt zusätzlich die Regel, die gegriffen hat ("none", wenn keine).
+    Reine Logik ohne Seiteneffekte; gezählt wird beim Aufrufer (main.py, /metrics).
+    """
     
     # 3. NEUE Top-Priorität-Sicherheitsregel
     if soc < STRATEGIC_MIN_SOC:
-        return Action.CHARGE_FROM_GRID, f"Regel: Strategischer Puffer ({STRATEGIC_MIN_SOC}%) unterschritten. Sicherheitsladung wird eingeleitet."
+        return "safety_charge", Action.CHARGE_FROM_GRID, f"Regel: Strategischer Puffer ({STRATEGIC_MIN_SOC}%) unterschritten. Sicherheitsladung wird eingeleitet."
 
     # 4. Bestehende Regeln anpassen, um die oberen Puffer zu respektieren
     # Regel zum Warten auf Solar: Gilt nur, wenn wir unter dem strategischen Maximum sind.
     max_solar_forecast = max(solar, default=0)
-    if max_solar_forecast > 300 and soc < STRATEGIC_MAX_SOC:
+    if max_solar_forecast > SOLAR_WAIT_THRESHOLD_W_M2 and soc < STRATEGIC_MAX_SOC:
         # VERBESSERTE BEGRÜNDUNG: Zeigt jetzt den konkreten Wert der Solarprognose an.
-        return Action.WAIT_FOR_SOLAR, f"Regel: Solarprognose ({max_solar_forecast:.0f} W/m²) ist hoch & die Batterie noch nicht voll <{STRATEGIC_MAX_SOC}%."
+        return "wait_for_solar", Action.WAIT_FOR_SOLAR, f"Regel: Solarprognose ({max_solar_forecast:.0f} W/m²) ist hoch & die Batterie noch nicht voll <{STRATEGIC_MAX_SOC}%."
 
     # Regel zum Entladen bei hohen Preisen: Gilt nur, wenn wir über dem strategischen Minimum sind.
-    if soc > STRATEGIC_MIN_SOC and current_price > 0.28:
-        return Action.DISCHARGE_TO_HOUSE, f"Regel: Hoher Preis (>28 ct) & SoC >{STRATEGIC_MIN_SOC}%."
+    if soc > STRATEGIC_MIN_SOC and current_price > HIGH_PRICE_EUR_KWH:
+        return "high_price_discharge", Action.DISCHARGE_TO_HOUSE, f"Regel: Hoher Preis (>28 ct) & SoC >{STRATEGIC_MIN_SOC}%."
         
     # Regel zum Laden bei günstigen Preisen: Respektiert ebenfalls die Obergrenze.
-    cheapest_night_hours = find_cheapest_hours(price_forecast, 3)
+    cheapest_night_hours = cheapest_hours if cheapest_hours is not None else find_cheapest_hours(price_forecast, CHEAPEST_HOURS_COUNT)
     if cheapest_night_hours and datetime.now(timezone.utc).hour in [ts.hour for ts in cheapest_night_hours]:
-        if soc < STRATEGIC_MAX_SOC and current_price < 0.15:
-            return Action.CHARGE_FROM_GRID, f"Regel: Günstigste Stunde wird zum Laden bis {STRATEGIC_MAX_SOC}% genutzt."
+        if soc < STRATEGIC_MAX_SOC and current_price < CHEAP_PRICE_EUR_KWH:
+            return "cheap_hour_charge", Action.CHARGE_FROM_GRID, f"Regel: Günstigste Stunde wird zum Laden bis {STRATEGIC_MAX_SOC}% genutzt."
 
-    return None, None
+    return "none", None, None
 
 def find_cheapest_hours(price_forecast: list[dict], num_hours: int) -> list[datetime]:
     """Findet die 'num_hours' günstigsten Stunden in der Zukunft."""
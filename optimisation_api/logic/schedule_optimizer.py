@@ -0,0 +1,200 @@
+# ---------------------------------------------------------------------------
+# optimisation_api/logic/schedule_optimizer.py
+# ---------------------------------------------------------------------------
+# "Brain v2": exakter Fahrplan per dynamischer Programmierung.
+# Statt bei unklaren Fällen das LLM zu fragen, rechnen wir über ein diskretes
+# SoC-Gitter und den stündlichen Preis-/Solar-Horizont den kostenminimalen
+# Fahrplan aus. Das ist deterministisch und dauert wenige Millisekunden.
+#
+# Modell pro Stunde:
+# - Der Hausverbrauch wird zuerst aus PV gedeckt, PV-Überschuss lädt die Batterie.
+# - IDLE:      Batterie nimmt nur PV-Überschuss auf, Defizit kommt aus dem Netz.
+# - CHARGE:    Batterie lädt mit voller Leistung (PV + Netz).
+# - DISCHARGE: Batterie deckt das Defizit des Hauses (keine Einspeisung aus der Batterie).
+# - Verluste: Wurzel des Round-Trip-Wirkungsgrads beim Laden und beim Entladen.
+# ===========================================================================
+import math
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+
+from optimisation_api.logic import rules_engine
+from optimisation_api.logic.vector_rules import price_arrays_for
+from optimisation_api.models import Action, Schedule, ScheduleStep
+
+IDLE, CHARGE, DISCHARGE = 0, 1, 2
+_MODES = (IDLE, CHARGE, DISCHARGE)
+
+
+class BatteryParams:
+    """Technische Eckdaten eines Haushalts; Standardwerte aus den Umgebungsvariablen."""
+    def __init__(self,
+                 capacity_kwh: float = float(os.environ.get("BATTERY_CAPACITY_KWH", "10")),
+                 max_charge_kw: float = float(os.environ.get("BATTERY_MAX_CHARGE_KW", "3")),
+                 max_discharge_kw: float = float(os.environ.get("BATTERY_MAX_DISCHARGE_KW", "3")),
+                 round_trip_efficiency: float = float(os.environ.get("BATTERY_ROUND_TRIP_EFFICIENCY", "0.9")),
+                 house_load_kw: float = float(os.environ.get("HOUSE_LOAD_KW", "0.5")),
+                 pv_peak_kw: float = float(os.environ.get("PV_PEAK_KW", "5")),
+                 feed_in_tariff_eur_kwh: float = float(os.environ.get("FEED_IN_TARIFF_EUR_KWH", "0.08")),
+                 min_soc: float = rules_engine.STRATEGIC_MIN_SOC,
+                 max_soc: float = rules_engine.STRATEGIC_MAX_SOC):
+        self.capacity_kwh = capacity_kwh
+        self.max_charge_kw = max_charge_kw
+        self.max_discharge_kw = max_discharge_kw
+        self.charge_efficiency = math.sqrt(round_trip_efficiency)
+        self.discharge_efficiency = math.sqrt(round_trip_efficiency)
+        self.house_load_kw = house_load_kw
+        self.pv_peak_kw = pv_peak_kw
+        self.feed_in_tariff_eur_kwh = feed_in_tariff_eur_kwh
+        self.min_soc = min_soc
+        self.max_soc = max_soc
+
+    def pv_kwh(self, irradiance_w_m2):
+        """Grobe PV-Erzeugung einer Stunde aus der Einstrahlung (1000 W/m² = Peak-Leistung)."""
+        return self.pv_peak_kw * np.asarray(irradiance_w_m2, dtype=np.float64) / 1000.0
+
+
+DEFAULT_PARAMS = BatteryParams()
+# Auflösung des SoC-Gitters (100 Schritte = 1 %)
+SOC_STEPS = int(os.environ.get("OPTIMIZER_SOC_STEPS", "100"))
+
+
+def step_flows(soc_kwh, mode: int, pv_kwh, params: BatteryParams = DEFAULT_PARAMS):
+    """
+    Energieflüsse einer Stunde für einen Modus (vektorisierbar über soc_kwh/pv_kwh).
+    Gibt (gewünschte Änderung des Speicherinhalts in kWh, Netzbezug in kWh ohne Batterie) zurück.
+    Positive Änderung = Laden, negative = Entladen. Grenzen werden hier bereits eingehalten.
+    """
+    soc_kwh = np.asarray(soc_kwh, dtype=np.float64)
+    load = params.house_load_kw
+    surplus = np.maximum(pv_kwh - load, 0.0)
+    deficit = np.maximum(load - pv_kwh, 0.0)
+    headroom = np.maximum(params.max_soc / 100 * params.capacity_kwh - soc_kwh, 0.0)
+    available = np.maximum(soc_kwh - params.min_soc / 100 * params.capacity_kwh, 0.0)
+
+    if mode == CHARGE:
+        delta = np.minimum(params.max_charge_kw * params.charge_efficiency, headroom)
+    elif mode == DISCHARGE:
+        delta = -np.minimum(np.minimum(deficit, params.max_discharge_kw) / params.discharge_efficiency, available)
+        # Bei PV-Überschuss gibt es nichts zu entladen – dann wie IDLE
+        delta = np.where(deficit > 0, delta, np.minimum(np.minimum(surplus, params.max_charge_kw) * params.charge_efficiency, headroom))
+    else:
+        delta = np.minimum(np.minimum(surplus, params.max_charge_kw) * params.charge_efficiency, headroom)
+    return delta, load - pv_kwh
+
+
+def hour_cost(delta_kwh, net_load_kwh, price: float, params: BatteryParams = DEFAULT_PARAMS):
+    """Kosten einer Stunde in € für eine (bereits begrenzte) Änderung des Speicherinhalts."""
+    ac = np.where(delta_kwh >= 0, delta_kwh / params.charge_efficiency, delta_kwh * params.discharge_efficiency)
+    grid = net_load_kwh + ac
+    return np.where(grid >= 0, grid * price, grid * params.feed_in_tariff_eur_kwh)
+
+
+def simulate_hour(soc_percent, mode: int, price: float, irradiance_w_m2, params: BatteryParams = DEFAULT_PARAMS):
+    """Wendet einen Modus für eine Stunde an. Gibt (neuer SoC in %, Kosten in €) zurück."""
+    soc_kwh = np.asarray(soc_percent, dtype=np.float64) / 100 * params.capacity_kwh
+    delta, net_load = step_flows(soc_kwh, mode, params.pv_kwh(irradiance_w_m2), params)
+    return (soc_kwh + delta) / params.capacity_kwh * 100, hour_cost(delta, net_load, price, params)
+
+
+def action_to_mode(action: Action) -> int:
+    if action == Action.CHARGE_FROM_GRID:
+        return CHARGE
+    if action == Action.DISCHARGE_TO_HOUSE:
+        return DISCHARGE
+    return IDLE
+
+
+def optimize(soc: float, prices: np.ndarray, irradiance: np.ndarray,
+             params: BatteryParams = DEFAULT_PARAMS, soc_steps: int = SOC_STEPS) -> tuple[np.ndarray, np.ndarray, float]:
+    """
+    Rückwärts-DP über das SoC-Gitter. `prices` und `irradiance` gelten für die Stunden
+    ab JETZT. Gibt (Modi je Stunde, SoC-Verlauf in % nach jeder Stunde, Kosten des Fahrplans in €) zurück.
+    """
+    horizon = len(prices)
+    step_kwh = params.capacity_kwh / soc_steps
+    grid_kwh = np.arange(soc_steps + 1) * step_kwh
+    pv = params.pv_kwh(irradiance)[:, None]
+    prices = np.asarray(prices, dtype=np.float64)[:, None]
+
+    # Übergänge und Sofortkosten für alle Stunden und Modi auf einmal: Form (Modus, Stunde, SoC)
+    transitions = np.empty((len(_MODES), horizon, soc_steps + 1), dtype=np.int64)
+    immediate = np.empty((len(_MODES), horizon, soc_steps + 1), dtype=np.float64)
+    for mode in _MODES:
+        delta, net_load = step_flows(grid_kwh[None, :], mode, pv, params)
+        # Auf das Gitter runden (zur Null hin, damit Grenzen nie überschritten werden)
+        steps = np.trunc(delta / step_kwh + np.copysign(1e-6, delta)).astype(np.int64)
+        transitions[mode] = np.clip(np.arange(soc_steps + 1) + steps, 0, soc_steps)
+        immediate[mode] = hour_cost(steps * step_kwh, net_load, prices, params)
+
+    # Gespeicherte Energie am Horizontende wird mit dem mittleren Preis bewertet,
+    # sonst würde die DP die Batterie zum Schluss einfach leer fahren.
+    value = -grid_kwh * params.discharge_efficiency * float(np.mean(prices))
+    policy = np.empty((horizon, soc_steps + 1), dtype=np.int8)
+    for t in range(horizon - 1, -1, -1):
+        total = immediate[:, t] + value[transitions[:, t]]
+        # argmin nimmt bei Gleichstand den ersten Modus – IDLE vor CHARGE vor DISCHARGE
+        policy[t] = np.argmin(total, axis=0)
+        value = np.take_along_axis(total, policy[t][None, :].astype(np.int64), axis=0)[0]
+
+    # Vorwärts: Fahrplan ab dem aktuellen SoC ablesen und die echten Kosten aufsummieren
+    idx = int(np.clip(round(soc / 100 * soc_steps), 0, soc_steps))
+    modes = np.empty(horizon, dtype=np.int8)
+    socs = np.empty(horizon, dtype=np.float64)
+    cost = 0.0
+    for t in range(horizon):
+        modes[t] = policy[t, idx]
+        nxt = int(transitions[modes[t], t, idx])
+        cost += float(immediate[modes[t], t, idx])
+        idx = nxt
+        socs[t] = idx * 100 / soc_steps
+    return modes, socs, cost
+
+
+def optimal_schedule(soc: float, price_forecast: list[dict], solar: list[float],
+                     params: BatteryParams = DEFAULT_PARAMS, now: datetime | None = None) -> Schedule | None:
+    """
+    Kostenminimaler Fahrplan ab der laufenden Stunde. `solar` beginnt mit der laufenden
+    Stunde (wie get_solar_forecast); jenseits der Solarprognose wird keine PV angenommen.
+    """
+    now = now or datetime.now(timezone.utc)
+    arrays = price_arrays_for(price_forecast)
+    now_hour = int(now.timestamp()) // 3600
+    order = np.argsort(arrays.hours, kind="stable")
+    hours, prices = arrays.hours[order], arrays.prices[order]
+    upcoming = hours >= now_hour
+    hours, prices = hours[upcoming], prices[upcoming]
+    if hours.size == 0 or hours[0] != now_hour:
+        return None
+
+    irradiance = np.zeros(hours.size)
+    solar_values = np.asarray(solar[: hours.size], dtype=np.float64)
+    irradiance[: solar_values.size] = solar_values
+
+    modes, socs, cost = optimize(soc, prices, irradiance, params)
+    first = int(modes[0])
+    if first == CHARGE:
+        action = Action.CHARGE_FROM_GRID
+        reason = f"Optimierer: Laden zu {prices[0]:.4f} €/kWh ist günstiger als der spätere Bezug."
+    elif first == DISCHARGE:
+        action = Action.DISCHARGE_TO_HOUSE
+        reason = f"Optimierer: Entladen vermeidet jetzt Netzbezug zu {prices[0]:.4f} €/kWh, der Speicher wird später günstiger gefüllt."
+    elif np.any(params.pv_kwh(solar_values) > params.house_load_kw) and socs[0] < params.max_soc:
+        action = Action.WAIT_FOR_SOLAR
+        reason = "Optimierer: Speicher für den erwarteten Solarertrag freihalten."
+    else:
+        action = Action.DO_NOTHING
+        reason = "Optimierer: Weder Laden noch Entladen lohnt sich in dieser Stunde."
+
+    mode_actions = {IDLE: Action.DO_NOTHING, CHARGE: Action.CHARGE_FROM_GRID, DISCHARGE: Action.DISCHARGE_TO_HOUSE}
+    steps = [
+        ScheduleStep(
+            timestamp_utc=datetime.fromtimestamp(int(h) * 3600, tz=timezone.utc),
+            action=action if t == 0 else mode_actions[int(m)],
+            soc_percent=float(s),
+            price_eur_kwh=float(p),
+        )
+        for t, (h, m, s, p) in enumerate(zip(hours, modes, socs, prices))
+    ]
+    return Schedule(action=action, reason=reason, expected_cost_eur=round(cost, 4), steps=steps)
@@ -0,0 +1,194 @@
+# ---------------------------------------------------------------------------
+# optimisation_api/logic/vector_rules.py
+# ---------------------------------------------------------------------------
+# Vektorisierte Variante von rules_engine.fast_rules für ganze Flotten.
+# Die Preisprognose wird EINMAL pro Abruf in Arrays umgewandelt (Epoch-Stunden
+# als int64, Preise als float64). Danach entscheidet ein einziger NumPy-Durchlauf
+# für beliebig viele SoC-Werte gleichzeitig.
+#
+# WICHTIG: Das Ergebnis muss exakt dem skalaren fast_rules entsprechen –
+# inklusive Begründungstexten und Tie-Breaking bei gleichen Preisen.
+# ===========================================================================
+import hashlib
+from datetime import datetime, timezone
+
+import numpy as np
+
+from optimisation_api.logic import rules_engine
+from optimisation_api.models import Action
+
+# Regel-Codes des vektorisierten Evaluators
+NO_RULE = 0
+RULE_SAFETY_CHARGE = 1
+RULE_WAIT_FOR_SOLAR = 2
+RULE_HIGH_PRICE_DISCHARGE = 3
+RULE_CHEAP_HOUR_CHARGE = 4
+
+# Namen für Metriken und Logs
+RULE_NAMES = {
+    NO_RULE: "none",
+    RULE_SAFETY_CHARGE: "safety_charge",
+    RULE_WAIT_FOR_SOLAR: "wait_for_solar",
+    RULE_HIGH_PRICE_DISCHARGE: "high_price_discharge",
+    RULE_CHEAP_HOUR_CHARGE: "cheap_hour_charge",
+}
+
+RULE_ACTIONS = {
+    RULE_SAFETY_CHARGE: Action.CHARGE_FROM_GRID,
+    RULE_WAIT_FOR_SOLAR: Action.WAIT_FOR_SOLAR,
+    RULE_HIGH_PRICE_DISCHARGE: Action.DISCHARGE_TO_HOUSE,
+    RULE_CHEAP_HOUR_CHARGE: Action.CHARGE_FROM_GRID,
+}
+
+_US_PER_HOUR = 3_600_000_000
+
+
+def _epoch_us(ts: datetime) -> int:
+    # Ganzzahlig rechnen, damit der Vergleich mit `now` exakt ist (kein Float-Rundungsfehler)
+    delta = ts - datetime(1970, 1, 1, tzinfo=timezone.utc)
+    return (delta.days * 86_400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+class PriceArrays:
+    """
+    Array-Darstellung einer Preisprognose.
+    `starts_us`: Startzeitpunkte in µs seit Epoch, `hours`: Epoch-Stunden, `prices`: €/kWh.
+    Die Reihenfolge entspricht der ursprünglichen Liste (wichtig für das Tie-Breaking).
+    """
+    __slots__ = ("starts_us", "hours", "prices", "_hour_order", "_sorted_hours", "_fingerprint")
+
+    def __init__(self, starts_us: np.ndarray, prices: np.ndarray):
+        self._fingerprint: str | None = None
+        self.starts_us = starts_us
+        self.hours = starts_us // _US_PER_HOUR
+        self.prices = prices
+        # aWATTar liefert sortiert; für unsortierte Eingaben halten wir eine stabile Permutation vor
+        if self.hours.size and np.any(np.diff(self.hours) < 0):
+            self._hour_order = np.argsort(self.hours, kind="stable")
+            self._sorted_hours = self.hours[self._hour_order]
+        else:
+            self._hour_order = None
+            self._sorted_hours = self.hours
+
+    @classmethod
+    def from_forecast(cls, price_forecast: list[dict]) -> "PriceArrays":
+        starts = np.fromiter((_epoch_us(item['timestamp_utc']) for item in price_forecast), dtype=np.int64, count=len(price_forecast))
+        prices = np.fromiter((item['price_eur_kwh'] for item in price_forecast), dtype=np.float64, count=len(price_forecast))
+        return cls(starts, prices)
+
+    def fingerprint(self) -> str:
+        """Kurzer, stabiler Hash der Preiskurve (z.B. als Cache-Schlüssel)."""
+        if self._fingerprint is None:
+            digest = hashlib.blake2b(self.starts_us.tobytes() + self.prices.tobytes(), digest_size=8)
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def current_price(self, now: datetime | None = None) -> float | None:
+        """Preis der laufenden Stunde per Binärsuche (statt linearem Scan)."""
+        now = now or datetime.now(timezone.utc)
+        now_hour = _epoch_us(now) // _US_PER_HOUR
+        idx = int(np.searchsorted(self._sorted_hours, now_hour, side="left"))
+        if idx >= self._sorted_hours.size or self._sorted_hours[idx] != now_hour:
+            return None
+        if self._hour_order is not None:
+            idx = int(self._hour_order[idx])
+        return float(self.prices[idx])
+
+    def cheapest_hours(self, num_hours: int, now: datetime | None = None) -> np.ndarray:
+        """
+        Epoch-Stunden der `num_hours` günstigsten zukünftigen Einträge.
+        Entspricht find_cheapest_hours: bei Preisgleichheit gewinnt der frühere Listeneintrag.
+        """
+        now = now or datetime.now(timezone.utc)
+        future = np.flatnonzero(self.starts_us > _epoch_us(now))
+        if future.size == 0 or num_hours <= 0:
+            return np.empty(0, dtype=np.int64)
+        prices = self.prices[future]
+        if future.size <= num_hours:
+            return self.hours[future]
+        # Top-k per argpartition (O(n)), danach Gleichstände an der Grenze stabil auflösen
+        kth_price = prices[np.argpartition(prices, num_hours - 1)[num_hours - 1]]
+        below = np.flatnonzero(prices < kth_price)
+        at_kth = np.flatnonzero(prices == kth_price)[: num_hours - below.size]
+        chosen = np.concatenate((below, at_kth))
+        return self.hours[future[chosen]]
+
+
+# Memo für die zuletzt umgewandelte Prognose. Der forecast_cache liefert bis zum
+# nächsten Abruf dieselbe Liste, daher reicht ein Vergleich per Identität.
+_last_forecast: list[dict] | None = None
+_last_arrays: PriceArrays | None = None
+
+
+def price_arrays_for(price_forecast: list[dict]) -> PriceArrays:
+    """Liefert die Array-Darstellung; wird nur einmal pro Prognose-Abruf berechnet."""
+    global _last_forecast, _last_arrays
+    if price_forecast is not _last_forecast or _last_arrays is None:
+        _last_arrays = PriceArrays.from_forecast(price_forecast)
+        _last_forecast = price_forecast
+    return _last_arrays
+
+
+def rule_thresholds() -> dict:
+    """Aktuelle Schwellen der schnellen Regeln (aus rules_engine, zur Laufzeit gelesen)."""
+    return {
+        "min_soc": rules_engine.STRATEGIC_MIN_SOC,
+        "max_soc": rules_engine.STRATEGIC_MAX_SOC,
+        "solar_wait_w_m2": rules_engine.SOLAR_WAIT_THRESHOLD_W_M2,
+        "high_price_eur_kwh": rules_engine.HIGH_PRICE_EUR_KWH,
+        "cheap_price_eur_kwh": rules_engine.CHEAP_PRICE_EUR_KWH,
+    }
+
+
+def cheap_hour_now(arrays: PriceArrays, now: datetime | None = None) -> bool:
+    """Ob die laufende Stunde zu den günstigsten kommenden Stunden gehört (hängt nicht vom SoC ab)."""
+    now = now or datetime.now(timezone.utc)
+    cheapest = arrays.cheapest_hours(rules_engine.CHEAPEST_HOURS_COUNT, now)
+    return bool(cheapest.size) and bool(np.any(cheapest % 24 == now.hour))
+
+
+def rule_codes(soc: np.ndarray, current_price: float, is_cheap_hour: bool, max_solar: np.ndarray | float,
+               thresholds: dict | None = None) -> np.ndarray:
+    """
+    Regel-Codes für SoC-Werte, wenn der Günstigste-Stunden-Check schon feststeht.
+    `thresholds` überschreibt einzelne Schwellen (Schlüssel wie in rule_thresholds()), z.B. im Backtest.
+    """
+    t = rule_thresholds() if thresholds is None else {**rule_thresholds(), **thresholds}
+    soc = np.asarray(soc, dtype=np.float64)
+    max_solar = np.broadcast_to(np.asarray(max_solar, dtype=np.float64), soc.shape)
+
+    below_min = soc < t["min_soc"]
+    below_max = soc < t["max_soc"]
+    wait_for_solar = (max_solar > t["solar_wait_w_m2"]) & below_max
+    high_price = (soc > t["min_soc"]) & (current_price > t["high_price_eur_kwh"])
+    cheap_charge = below_max & (is_cheap_hour and current_price < t["cheap_price_eur_kwh"])
+
+    return np.select(
+        [below_min, wait_for_solar, high_price, cheap_charge],
+        [RULE_SAFETY_CHARGE, RULE_WAIT_FOR_SOLAR, RULE_HIGH_PRICE_DISCHARGE, RULE_CHEAP_HOUR_CHARGE],
+        default=NO_RULE,
+    ).astype(np.int8)
+
+
+def fast_rules_vectorized(soc: np.ndarray, current_price: float, arrays: PriceArrays,
+                          max_solar: np.ndarray | float, now: datetime | None = None) -> np.ndarray:
+    """
+    Wertet fast_rules für ein ganzes Array von SoC-Werten aus.
+    `max_solar` ist das Maximum der Solarprognose je Batterie (oder ein Skalar für alle).
+    Gibt pro Batterie einen Regel-Code zurück (NO_RULE = keine Regel hat gegriffen).
+    """
+    # Die Günstigste-Stunden-Regel hängt nicht vom SoC ab, nur einmal auswerten
+    return rule_codes(soc, current_price, cheap_hour_now(arrays, now), max_solar)
+
+
+def explain(code: int, max_solar: float) -> tuple[Action | None, str | None]:
+    """Übersetzt einen Regel-Code in (Action, Begründung) – wortgleich mit fast_rules."""
+    if code == RULE_SAFETY_CHARGE:
+        return Action.CHARGE_FROM_GRID, f"Regel: Strategischer Puffer ({rules_engine.STRATEGIC_MIN_SOC}%) unterschritten. Sicherheitsladung wird eingeleitet."
+    if code == RULE_WAIT_FOR_SOLAR:
+        return Action.WAIT_FOR_SOLAR, f"Regel: Solarprognose ({max_solar:.0f} W/m²) ist hoch & die Batterie noch nicht voll <{rules_engine.STRATEGIC_MAX_SOC}%."
+    if code == RULE_HIGH_PRICE_DISCHARGE:
+        return Action.DISCHARGE_TO_HOUSE, f"Regel: Hoher Preis (>28 ct) & SoC >{rules_engine.STRATEGIC_MIN_SOC}%."
+    if code == RULE_CHEAP_HOUR_CHARGE:
+        return Action.CHARGE_FROM_GRID, f"Regel: Günstigste Stunde wird zum Laden bis {rules_engine.STRATEGIC_MAX_SOC}% genutzt."
+    return None, None
@@ -9,17 +9,48 @@
 # ---------------------------------------------------------------------------
 # ÜBERARBEITET: Gibt jetzt das neue ApiResponse-Modell zurück
 # ---------------------------------------------------------------------------
-from fastapi import FastAPI, HTTPException, Security, Depends
+# NEU: Batch-Endpunkt POST /entscheidungen für ganze Flotten (NDJSON-Stream)
+# ---------------------------------------------------------------------------
+# NEU: DP-Optimierer als Alternative zum LLM (FALLBACK_ENGINE) und GET /fahrplan
+# ---------------------------------------------------------------------------
+# NEU: Echte Ersparnis aus dem Zeitreihen-Speicher (database/timeseries_store.py)
+# ---------------------------------------------------------------------------
+# NEU: Solardaten werden pro Stunde anhand der Tageslicht-Tabelle bereinigt
+# ---------------------------------------------------------------------------
+# NEU: /entscheidung liest zuerst aus der stündlich vorberechneten Entscheidungstabelle
+# ---------------------------------------------------------------------------
+# NEU: WebSocket /entscheidung/stream – Entscheidungen werden nur bei Änderung gepusht
+# ---------------------------------------------------------------------------
+# NEU: GET /metrics (Prometheus) mit Dauer pro Stufe des Entscheidungspfads
+# ---------------------------------------------------------------------------
+# NEU: Start wartet nicht mehr auf OpenAI/Neo4j (services/readiness.py), GET /ready
+# ---------------------------------------------------------------------------
+# NEU: Gemeinsamer Prognose-Speicher für mehrere Worker (SHARED_FORECAST_STORE=1)
+# ---------------------------------------------------------------------------
+from fastapi import FastAPI, HTTPException, Security, Depends, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.security.api_key import APIKeyHeader
-from optimisation_api.models import ApiResponse, Decision, Savings, Action # Modelle importieren
+from optimisation_api.models import ApiResponse, Decision, Savings, Action, BatteryState, BatchDecisionItem, Schedule # Modelle importieren
 from optimisation_api.services import external_apis, daylight_checker
-from optimisation_api.logic import rules_engine, llm_agent
-from datetime import datetime, timezone
+from optimisation_api.services.forecast_cache import forecast_cache, grid_cell
+from optimisation_api.services import http_client, metrics
+from optimisation_api.services.readiness import readiness
+from optimisation_api.services.shared_forecasts import SHARED_FORECAST_STORE, shared_forecast_store
+from optimisation_api.logic import rules_engine, llm_agent, vector_rules, schedule_optimizer
+from optimisation_api.logic.llm_cache import llm_decision_cache
+from optimisation_api.logic.llm_dispatcher import llm_dispatcher
+from optimisation_api.logic.decision_table import decision_table
+from optimisation_api.logic.decision_stream import decision_hub
+from datetime import datetime
 from pydantic import BaseModel
-from database.neo4j_client import neo4j_client, execute_query
+from database.neo4j_client import LATENCY_BUCKETS_MS, neo4j_client, execute_read, execute_write, ensure_constraints
+from database.timeseries_store import timeseries_store
 
+import asyncio
 import os
 
+import numpy as np
+
 
 
 app = FastAPI()
@@ -33,66 +64,363 @@ async def get_api_key(api_key_header: str = Security(api_key_header)):
     if not INTERNAL_API_KEY: raise HTTPException(status_code=500, detail="Server nicht korrekt konfiguriert.")
     if api_key_header != INTERNAL_API_KEY: raise HTTPException(status_code=403, detail="Ungültiger API-Schlüssel")
 
+async def _init_neo4j():
+    await neo4j_client.connect()
+    if neo4j_client.is_connected:
+        await ensure_constraints()
+
+# Alle Netzwerk-Roundtrips laufen gleichzeitig im Hintergrund (Zustand: GET /ready)
+readiness.register("openai", lambda: llm_agent.initialize_openai(retry=True),
+                   lambda: llm_agent.openai_client is not None, lambda: bool(os.environ.get("OPENAI_API_KEY")))
+readiness.register("neo4j", _init_neo4j, lambda: neo4j_client.is_connected, neo4j_client.is_configured)
+readiness.register("timeseries", lambda: asyncio.to_thread(timeseries_store.connect),
+                   lambda: timeseries_store.is_connected, lambda: bool(os.environ.get("TIMESERIES_DATABASE_URL")))
+
 @app.on_event("startup")
 async def startup_event():
-    await llm_agent.initialize_openai()
-    await neo4j_client.connect() 
+    # Abgewartet wird nur, was der Regelpfad braucht (der HTTP-Client, ohne Netzwerk)
+    await http_client.start_http_client()
+    readiness.start()
+    global decision_table_task, shared_forecast_task
+    # Mit --workers N: ein Worker ruft die Prognosen ab, alle lesen sie aus dem gemeinsamen Speicher
+    if SHARED_FORECAST_STORE and shared_forecast_store.open():
+        shared_forecast_task = asyncio.ensure_future(external_apis.run_shared_refresher())
+    decision_table_task = asyncio.ensure_future(
+        decision_table.run_hourly(external_apis.get_epex_spot_forecast, get_prepared_solar, engine_decision)
+    )
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    await readiness.stop()
+    if decision_table_task is not None:
+        decision_table_task.cancel()
+    if shared_forecast_task is not None:
+        shared_forecast_task.cancel()
+    shared_forecast_store.close()
     await neo4j_client.close() # <-- HINZUFÜGEN
+    timeseries_store.close()
+    await http_client.close_http_client()
+
+# Stündlicher Neuaufbau der Entscheidungstabelle (läuft, solange die App läuft)
+decision_table_task: asyncio.Task | None = None
+# Leader-Wahl und Erneuerung des gemeinsamen Prognose-Speichers (nur mit SHARED_FORECAST_STORE=1)
+shared_forecast_task: asyncio.Task | None = None
+
+# --- Gemeinsame Bausteine für Einzel- und Batch-Entscheidungen ---
+def find_current_price(price_forecast: list[dict]) -> float | None:
+    # Binärsuche über die einmal pro Prognose-Abruf erzeugten Arrays
+    return vector_rules.price_arrays_for(price_forecast).current_price()
+
+def prepare_solar(solar_forecast_raw: list[float], lat: float, lon: float) -> list[float]:
+    # Pro Stunde statt alles-oder-nichts: nur Stunden ganz ohne Tageslicht werden auf 0 gesetzt
+    fractions = daylight_checker.daylight_fractions(lat, lon, len(solar_forecast_raw))
+    return [value if fraction > 0 else 0.0 for value, fraction in zip(solar_forecast_raw, fractions)]
+
+async def get_prepared_solar(lat: float, lon: float) -> list[float] | None:
+    solar_forecast_raw = await external_apis.get_solar_forecast(lat, lon)
+    return prepare_solar(solar_forecast_raw, lat, lon) if solar_forecast_raw is not None else None
+
+# Was entscheidet, wenn keine schnelle Regel greift: "llm" (GPT-4o) oder "optimizer" (DP-Fahrplan)
+FALLBACK_ENGINE = os.environ.get("FALLBACK_ENGINE", "llm").lower()
+
+async def engine_decision(soc: float, price_forecast: list[dict], solar_forecast: list[float],
+                          now: datetime | None = None) -> tuple[Action, str] | None:
+    """
+    Antwort von Optimierer bzw. LLM oder None, wenn es keine verbindliche gibt
+    (LLM noch nicht bereit, Deadline verpasst, Breaker offen). Die
+    Entscheidungstabelle speichert nur solche verbindlichen Antworten.
+    `now` ist der Entscheidungszeitpunkt (Standard: jetzt, im Backtest die historische Stunde).
+    """
+    if FALLBACK_ENGINE == "optimizer":
+        schedule = schedule_optimizer.optimal_schedule(soc, price_forecast, solar_forecast, now=now)
+        if schedule:
+            metrics.FALLBACK_DECISIONS_TOTAL.inc("optimizer")
+            return schedule.action, schedule.reason
+    llm_dec = await llm_agent.llm_decision(soc, price_forecast, solar_forecast, now=now)
+    if llm_dec:
+        metrics.FALLBACK_DECISIONS_TOTAL.inc("llm")
+        return llm_dec.action, llm_dec.reason
+    return None
+
+async def fallback_decision(soc: float, price_forecast: list[dict], solar_forecast: list[float],
+                            now: datetime | None = None) -> tuple[Action, str]:
+    """Wird aufgerufen, wenn keine schnelle Regel gegriffen hat."""
+    decision = await engine_decision(soc, price_forecast, solar_forecast, now=now)
+    if decision is not None:
+        return decision
+    metrics.FALLBACK_DECISIONS_TOTAL.inc("default")
+    return Action.DO_NOTHING, "Fallback: Keine valide LLM-Antwort erhalten."
+
+def apply_safety_override(action: Action, reason: str, current_price: float) -> tuple[Action, str]:
+    if action == Action.CHARGE_FROM_GRID and current_price > rules_engine.SAFETY_MAX_CHARGE_PRICE_EUR_KWH:
+        metrics.SAFETY_OVERRIDES_TOTAL.inc()
+        return Action.DO_NOTHING, f"Sicherheits-Fallback: Laden bei hohem Preis ({current_price:.2f} €) blockiert."
+    return action, reason
+
+# Nutzer, dessen Ersparnis /entscheidung ohne expliziten user_id-Parameter anzeigt
+DEFAULT_SAVINGS_USER_ID = os.environ.get("DEFAULT_SAVINGS_USER_ID", "default")
+
+async def get_todays_savings(user_id: str) -> Savings:
+    if not timeseries_store.is_connected:
+        return Savings(today_eur=0.0, trend="stable")
+    try:
+        return Savings(**await timeseries_store.get_todays_savings(user_id))
+    except Exception as e:
+        print(f"FEHLER: Ersparnis konnte nicht gelesen werden: {e}")
+        return Savings(today_eur=0.0, trend="stable")
+
+async def compute_decision(soc: float, lat: float, lon: float, rebuild: bool = True) -> tuple[Action, str]:
+    """
+    Entscheidung für eine Batterie (gemeinsam für GET /entscheidung und den Stream).
+    Mit rebuild=False (Neubewertung nach einem Tabellenaufbau) wird bei einem
+    Miss nur live gerechnet und die Zelle nicht erneut gebaut.
+    """
+    with metrics.span("entscheidung", {"soc": soc, "lat": lat, "lon": lon}):
+        # 1. Preisprognose abrufen (aus dem Prognose-Cache) und aktuellen Preis bestimmen
+        with metrics.stage("price_fetch"):
+            price_forecast = await external_apis.get_epex_spot_forecast()
+        if price_forecast is None:
+            raise HTTPException(status_code=503, detail="Externe Prognosedaten nicht verfügbar.")
+        current_price = find_current_price(price_forecast)
+        if current_price is None:
+            raise HTTPException(status_code=503, detail="Aktueller Strompreis konnte nicht ermittelt werden.")
+
+        # 2. Vorberechnete Entscheidung für (Gitterzelle, Stunde, SoC-Bucket)
+        with metrics.stage("table_lookup"):
+            decision = decision_table.lookup(lat, lon, soc, price_forecast)
+        source = "table"
+
+        # 3. Miss: live entscheiden (Solardaten, Regeln, LLM) und die Zelle im Hintergrund nachbauen
+        if decision is None:
+            with metrics.stage("solar_fetch"):
+                solar_forecast_raw = await external_apis.get_solar_forecast(lat, lon)
+            if solar_forecast_raw is None:
+                raise HTTPException(status_code=503, detail="Externe Prognosedaten nicht verfügbar.")
+            with metrics.stage("daylight"):
+                solar_forecast = prepare_solar(solar_forecast_raw, lat, lon)
+            with metrics.stage("rules"):
+                rule, rule_action, rule_reason = rules_engine.evaluate_rules(soc, current_price, price_forecast, solar_forecast)
+                decision = (rule_action, rule_reason)
+            metrics.RULES_FIRED_TOTAL.inc(rule)
+            source = "rules"
+            if decision[0] is None:
+                with metrics.stage("llm" if FALLBACK_ENGINE == "llm" else "optimizer"):
+                    decision = await fallback_decision(soc, price_forecast, solar_forecast)
+                source = "fallback"
+            if rebuild and not decision_table.is_current(lat, lon, price_forecast):
+                decision_table.build_in_background(lat, lon, external_apis.get_epex_spot_forecast, get_prepared_solar, engine_decision)
+        action, reason = decision
+
+        # 4. Finale Sicherheitsüberprüfung
+        with metrics.stage("safety_override"):
+            action, reason = apply_safety_override(action, reason, current_price)
+        metrics.DECISIONS_TOTAL.inc(source, action.value)
+        return action, reason
+
+decision_hub.decide = compute_decision
+decision_hub.attach(decision_table)
 
 # Der Endpunkt gibt jetzt das übergeordnete `ApiResponse`-Modell zurück
 @app.get("/entscheidung", response_model=ApiResponse, dependencies=[Depends(get_api_key)])
-async def get_decision(soc: float, lat: float = 50.1109, lon: float = 8.6821):
+async def get_decision(soc: float, lat: float = 50.1109, lon: float = 8.6821, user_id: str | None = None):
     if not (0.0 <= soc <= 100.0):
         raise HTTPException(status_code=400, detail="SoC muss zwischen 0 und 100 liegen.")
 
-    # 1. Daten asynchron abrufen
+    # Ersparnis parallel zur Entscheidung lesen, damit sie keine zusätzliche Latenz kostet
+    savings_task = asyncio.ensure_future(get_todays_savings(user_id or DEFAULT_SAVINGS_USER_ID))
+    try:
+        action, reason = await compute_decision(soc, lat, lon)
+    except HTTPException:
+        savings_task.cancel()
+        raise
+
+    # 5. Ersparnis aus dem Tages-Rollup des Zeitreihen-Speichers
+    todays_savings = await savings_task
+
+    # 6. Komplette Antwort zurückgeben
+    return ApiResponse(
+        decision=Decision(action=action, reason=reason),
+        savings=todays_savings
+    )
+
+# Push-Stream für Steuergeräte: einmal verbinden, danach nur noch den SoC melden
+# ({"soc": 42.5}). Der Server sendet eine Decision als JSON, sobald sich die
+# Entscheidung ändert (SoC kreuzt eine Schwelle, Stundenwechsel, neue Prognose).
+@app.websocket("/entscheidung/stream")
+async def decision_stream(websocket: WebSocket, soc: float, lat: float = 50.1109, lon: float = 8.6821):
+    if not INTERNAL_API_KEY or websocket.headers.get(API_KEY_NAME) != INTERNAL_API_KEY:
+        await websocket.close(code=1008)
+        return
+    if not (0.0 <= soc <= 100.0):
+        await websocket.close(code=1008, reason="SoC muss zwischen 0 und 100 liegen.")
+        return
+    await websocket.accept()
+    sub = decision_hub.subscribe(lat, lon, soc)
+
+    async def receive_reports():
+        try:
+            while True:
+                message = await websocket.receive_json()
+                reported = float(message["soc"])
+                if not (0.0 <= reported <= 100.0):
+                    continue
+                try:
+                    await decision_hub.report_soc(sub, reported)
+                except HTTPException as e:
+                    # Letzte Entscheidung bleibt gültig, bis wieder Prognosen da sind
+                    print(f"WARNUNG: Stream-Entscheidung nicht berechnet: {e.detail}")
+        except (WebSocketDisconnect, KeyError, TypeError, ValueError):
+            pass
+        finally:
+            decision_hub.unsubscribe(sub)
+
+    receiver = None
+    try:
+        try:
+            await decision_hub.report_soc(sub, soc)
+        except HTTPException as e:
+            await websocket.send_json({"error": e.detail})
+        receiver = asyncio.ensure_future(receive_reports())
+        while (decision := await decision_hub.next_decision(sub)) is not None:
+            await websocket.send_text(Decision(action=decision[0], reason=decision[1]).json())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if receiver is not None:
+            receiver.cancel()
+        decision_hub.unsubscribe(sub)
+
+# Kompletter kostenminimaler Fahrplan des Optimierers (zur Anzeige und zur Kontrolle)
+@app.get("/fahrplan", response_model=Schedule, dependencies=[Depends(get_api_key)])
+async def get_schedule(soc: float, lat: float = 50.1109, lon: float = 8.6821):
+    if not (0.0 <= soc <= 100.0):
+        raise HTTPException(status_code=400, detail="SoC muss zwischen 0 und 100 liegen.")
     price_forecast = await external_apis.get_epex_spot_forecast()
     solar_forecast_raw = await external_apis.get_solar_forecast(lat, lon)
-    
     if price_forecast is None or solar_forecast_raw is None:
         raise HTTPException(status_code=503, detail="Externe Prognosedaten nicht verfügbar.")
+    schedule = schedule_optimizer.optimal_schedule(soc, price_forecast, prepare_solar(solar_forecast_raw, lat, lon))
+    if schedule is None:
+        raise HTTPException(status_code=503, detail="Aktueller Strompreis konnte nicht ermittelt werden.")
+    return schedule
 
-    # 2. Aktuelle Daten extrahieren
-    now = datetime.now(timezone.utc)
-    current_price_item = next((item for item in price_forecast if item['timestamp_utc'].hour == now.hour and item['timestamp_utc'].date() == now.date()), None)
-    if not current_price_item:
+# Maximale Anzahl gleichzeitiger LLM-Anfragen pro Batch
+BATCH_LLM_CONCURRENCY = int(os.environ.get("BATCH_LLM_CONCURRENCY", "8"))
+
+# Batch-Endpunkt für ganze Flotten: eine Anfrage pro Regelzyklus statt N.
+# Die Antwort ist NDJSON (eine Zeile pro Batterie) und wird gestreamt, sobald
+# eine Entscheidung feststeht – eine langsame LLM-Antwort hält den Rest nicht auf.
+@app.post("/entscheidungen", dependencies=[Depends(get_api_key)])
+async def get_decisions(batteries: list[BatteryState]):
+    # 1. Preisprognose nur EINMAL für den ganzen Batch
+    price_forecast = await external_apis.get_epex_spot_forecast()
+    if price_forecast is None:
+        raise HTTPException(status_code=503, detail="Externe Prognosedaten nicht verfügbar.")
+    current_price = find_current_price(price_forecast)
+    if current_price is None:
         raise HTTPException(status_code=503, detail="Aktueller Strompreis konnte nicht ermittelt werden.")
-    current_price = current_price_item['price_eur_kwh']
 
-    # 3. Solardaten aufbereiten
-    solar_forecast = solar_forecast_raw if daylight_checker.is_daylight(lat, lon) else [0.0] * len(solar_forecast_raw)
+    # 2. Solarprognose und Tageslicht nur einmal pro Gitterzelle
+    cells: dict[tuple[float, float], tuple[float, float]] = {}
+    for battery in batteries:
+        cells.setdefault(grid_cell(battery.lat, battery.lon), (battery.lat, battery.lon))
+    solar_raw = await asyncio.gather(*(external_apis.get_solar_forecast(lat, lon) for lat, lon in cells.values()))
+    solar_by_cell = {
+        cell: prepare_solar(raw, lat, lon) if raw is not None else None
+        for (cell, (lat, lon)), raw in zip(cells.items(), solar_raw)
+    }
+
+    def line(battery_id: str, action: Action | None = None, reason: str | None = None, error: str | None = None) -> str:
+        decision = None
+        if action is not None:
+            action, reason = apply_safety_override(action, reason, current_price)
+            decision = Decision(action=action, reason=reason)
+        return BatchDecisionItem(battery_id=battery_id, decision=decision, error=error).json() + "\n"
 
-    # 4. Entscheidung treffen (Regeln oder LLM)
-    action, reason = rules_engine.fast_rules(soc, current_price, price_forecast, solar_forecast)
-    if action is None:
-        llm_dec = await llm_agent.llm_decision(soc, price_forecast, solar_forecast)
-        if llm_dec:
-            action, reason = llm_dec.action, llm_dec.reason
+    # 3. Schnelle Regeln für alle in einem vektorisierten Durchlauf,
+    #    nur die offenen Fälle gehen an das LLM
+    ready: list[str] = []
+    undecided: list[tuple[BatteryState, list[float]]] = []
+    solar_per_battery = [solar_by_cell[grid_cell(b.lat, b.lon)] for b in batteries]
+    max_solar = np.array([max(solar, default=0) if solar is not None else 0.0 for solar in solar_per_battery], dtype=np.float64)
+    codes = vector_rules.fast_rules_vectorized(
+        np.array([b.soc for b in batteries], dtype=np.float64),
+        current_price, vector_rules.price_arrays_for(price_forecast), max_solar,
+    )
+    for code, count in zip(*np.unique(codes, return_counts=True)):
+        metrics.RULES_FIRED_TOTAL.inc(vector_rules.RULE_NAMES[int(code)], amount=int(count))
+    for battery, solar_forecast, code, battery_max_solar in zip(batteries, solar_per_battery, codes, max_solar):
+        if solar_forecast is None:
+            ready.append(line(battery.battery_id, error="Solarprognose nicht verfügbar."))
+        elif code == vector_rules.NO_RULE:
+            undecided.append((battery, solar_forecast))
         else:
-            action, reason = Action.DO_NOTHING, "Fallback: Keine valide LLM-Antwort erhalten."
+            ready.append(line(battery.battery_id, *vector_rules.explain(code, battery_max_solar)))
 
-    # 5. Finale Sicherheitsüberprüfung
-    if action == Action.CHARGE_FROM_GRID and current_price > 0.15:
-        action = Action.DO_NOTHING
-        reason = f"Sicherheits-Fallback: Laden bei hohem Preis ({current_price:.2f} €) blockiert."
+    semaphore = asyncio.Semaphore(BATCH_LLM_CONCURRENCY)
 
-    # 6. NEU: Ersparnis-Daten abrufen (momentan simuliert)
-    # In der Zukunft würde hier ein Datenbank-Aufruf stehen:
-    # todays_savings = await database.get_todays_savings()
-    todays_savings = Savings(today_eur=0.95, trend="up") # Simulierter Wert
+    async def decide_with_fallback(battery: BatteryState, solar_forecast: list[float]) -> str:
+        async with semaphore:
+            action, reason = await fallback_decision(battery.soc, price_forecast, solar_forecast)
+        return line(battery.battery_id, action, reason)
 
-    # 7. Komplette Antwort zurückgeben
-    return ApiResponse(
-        decision=Decision(action=action, reason=reason),
-        savings=todays_savings
-    )
+    async def stream():
+        tasks = [asyncio.ensure_future(decide_with_fallback(b, solar)) for b, solar in undecided]
+        try:
+            for item in ready:
+                yield item
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Bricht der Client ab, laufen keine verwaisten LLM-Anfragen weiter
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
 
 @app.get("/health")
 async def health_check():
-    return {"status": "ok"}
+    return {"status": "ok", "forecast_cache": forecast_cache.stats(), "llm_cache": llm_decision_cache.stats(), "llm_dispatcher": llm_dispatcher.stats(), "llm_tiers": llm_agent.tier_stats(), "decision_table": decision_table.stats(), "decision_stream": decision_hub.stats(), "neo4j": neo4j_client.stats(), "shared_forecasts": shared_forecast_store.stats()}
+
+# Readiness-Probe: 200, sobald alle READY_REQUIRED_DEPENDENCIES bereit sind, sonst 503.
+# Der Zustand jeder Abhängigkeit steht in beiden Fällen im Body.
+@app.get("/ready")
+async def readiness_check():
+    report = readiness.stats()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+# Werte, die die Module ohnehin zählen, werden erst beim Abruf von /metrics gelesen
+def _collect_runtime_metrics():
+    yield from metrics.sample_lines("llm_fallbacks_total", "Übersprungene LLM-Aufrufe nach Grund.", "counter",
+                                    (({"reason": reason}, count) for reason, count in llm_dispatcher.fallbacks.items()))
+    yield from metrics.sample_lines("llm_calls_total", "Abgeschlossene LLM-Aufrufe.", "counter", [({}, llm_dispatcher.completed)])
+    yield from metrics.sample_lines("decision_table_lookups_total", "Lookups der Entscheidungstabelle nach Ergebnis.", "counter",
+                                    [({"result": "hit"}, decision_table.hits), ({"result": "miss"}, decision_table.misses)])
+    yield from metrics.sample_lines("decision_table_cells", "Gebaute Zellen der Entscheidungstabelle.", "gauge",
+                                    [({}, decision_table.cells)])
+    yield from metrics.sample_lines("decision_table_entries", "Vorberechnete Fallback-Entscheidungen über alle Zellen.", "gauge",
+                                    [({}, decision_table.computed_entries)])
+    yield from metrics.sample_lines("decision_stream_subscribers", "Verbundene Stream-Abonnenten.", "gauge",
+                                    [({}, decision_hub.subscribers)])
+    yield from metrics.sample_lines("shared_forecast_reads_total", "Lesezugriffe auf den gemeinsamen Prognose-Speicher nach Quelle und Ergebnis.", "counter",
+                                    (({"source": source, "result": result}, count) for (source, result), count in shared_forecast_store.reads.items()))
+    yield from metrics.sample_lines("shared_forecast_refreshes_total", "Erneuerungen durch diesen Worker als Leader nach Ergebnis.", "counter",
+                                    [({"result": "ok"}, shared_forecast_store.refreshes), ({"result": "error"}, shared_forecast_store.refresh_errors)])
+    histograms = neo4j_client.query_stats.histograms()
+    buckets = tuple(bound / 1000 for bound in LATENCY_BUCKETS_MS)
+    yield "# HELP neo4j_query_seconds Dauer der Neo4j-Queries nach Query-Fingerprint."
+    yield "# TYPE neo4j_query_seconds histogram"
+    for fingerprint, h in histograms.items():
+        yield from metrics.histogram_lines("neo4j_query_seconds", ("fingerprint",), (fingerprint,), buckets, h["buckets"], h["sum_ms"] / 1000)
+    yield from metrics.sample_lines("neo4j_query_errors_total", "Fehlgeschlagene Neo4j-Queries nach Query-Fingerprint.", "counter",
+                                    (({"fingerprint": fingerprint}, h["errors"]) for fingerprint, h in histograms.items()))
+
+metrics.registry.add_collector(_collect_runtime_metrics)
+
+# Prometheus-Scrape-Endpunkt (wie /health ohne API-Schlüssel)
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
 
 # Pydantic-Modell, das die Daten für eine Registrierung definiert.
 class UserRegistrationPayload(BaseModel):
@@ -125,12 +453,12 @@ async def register_user(payload: UserRegistrationPayload):
     """
     
     try:
-        result = await execute_query(query, payload.dict())
+        result = await execute_write(query, payload.dict())
         if not result:
              # Dieser Fall kann eintreten, wenn der Nutzer bereits existierte
              # und MERGE nur gematcht, aber nichts erstellt hat. Wir müssen das abfangen.
              existing_user_query = "MATCH (u:User {email: $email}) RETURN u.userId as userId"
-             existing_user = await execute_query(existing_user_query, {"email": payload.email})
+             existing_user = await execute_read(existing_user_query, {"email": payload.email})
              raise HTTPException(
                  status_code=409, # 409 Conflict ist passender als 500
                  detail=f"User with this email already exists with ID: {existing_user[0]['userId']}"
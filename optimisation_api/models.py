@@ -5,7 +5,8 @@
 # die alle unsere Dienste sprechen werden.
 
 from enum import Enum
-from pydantic import BaseModel
+from datetime import datetime
+from pydantic import BaseModel, Field
 
 class Action(str, Enum):
     CHARGE_FROM_GRID = "CHARGE_FROM_GRID"
@@ -27,4 +28,31 @@ class ApiResponse(BaseModel):
     decision: Decision
     savings: Savings
     # Hier könnten später weitere Daten hinzukommen, z.B. Batteriestatus
-    # battery_soc: float
\ No newline at end of file
+    # battery_soc: float
+
+# Ein Eintrag einer Batch-Anfrage an /entscheidungen
+class BatteryState(BaseModel):
+    battery_id: str
+    soc: float = Field(..., ge=0.0, le=100.0)
+    lat: float = 50.1109
+    lon: float = 8.6821
+
+# Eine Zeile der NDJSON-Antwort von /entscheidungen
+class BatchDecisionItem(BaseModel):
+    battery_id: str
+    decision: Decision | None = None
+    error: str | None = None
+
+# Eine Stunde im Fahrplan des Optimierers
+class ScheduleStep(BaseModel):
+    timestamp_utc: datetime
+    action: Action
+    soc_percent: float
+    price_eur_kwh: float
+
+# Kostenminimaler Fahrplan: Aktion für JETZT plus der komplette Verlauf
+class Schedule(BaseModel):
+    action: Action
+    reason: str
+    expected_cost_eur: float
+    steps: list[ScheduleStep]
@@ -1,26 +1,127 @@
 # Diese Datei enthält die Logik zur Berechnung von Sonnenauf- und -untergang.
+# ---------------------------------------------------------------------------
+# ÜBERARBEITET: Statt pro Anfrage ein LocationInfo-Objekt zu bauen und das
+# komplette sun()-Dict zu berechnen, werden Sonnenauf- und -untergang pro
+# Gitterzelle für die kommenden Tage EINMAL berechnet und als kompakte
+# Intervall-Tabelle (Epoch-Sekunden) gehalten. Beim Datumswechsel wird die
+# Tabelle einer Zelle beim nächsten Zugriff neu aufgebaut.
+# 'astral' wird erst beim ersten Aufbau einer Zelle importiert (schnellerer Start).
+# ---------------------------------------------------------------------------
+
+import os
+from datetime import date, datetime, timedelta, timezone
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from astral import Observer
+
+from optimisation_api.services.forecast_cache import grid_cell
+
+# Für so viele Tage ab heute (UTC) werden die Tageslicht-Intervalle vorberechnet
+DAYLIGHT_TABLE_DAYS = int(os.environ.get("DAYLIGHT_TABLE_DAYS", "3"))
+
+_SECONDS_PER_DAY = 86_400
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _day_intervals(observer: "Observer", day: date) -> list[tuple[int, int]]:
+    """Tageslicht-Intervalle eines UTC-Tages als (Start, Ende) in Epoch-Sekunden."""
+    from astral.sun import elevation, sunrise, sunset
+    day_start = int((datetime(day.year, day.month, day.day, tzinfo=timezone.utc) - _EPOCH).total_seconds())
+    day_end = day_start + _SECONDS_PER_DAY
+    try:
+        rise = int(sunrise(observer, date=day, tzinfo=timezone.utc).timestamp())
+        set_ = int(sunset(observer, date=day, tzinfo=timezone.utc).timestamp())
+    except ValueError:
+        # Polartag oder Polarnacht: die Sonne geht an diesem Tag nicht auf bzw. nicht unter
+        noon = datetime(day.year, day.month, day.day, 12, tzinfo=timezone.utc) - timedelta(hours=observer.longitude / 15)
+        return [(day_start, day_end)] if elevation(observer, noon) > 0 else []
+    if rise < set_:
+        return [(rise, set_)]
+    # Westlich/östlich weit von UTC liegt der Untergang im UTC-Tag VOR dem Aufgang
+    return [(day_start, set_), (rise, day_end)]
+
+
+class DaylightTable:
+    """
+    Vorberechnete Tageslicht-Intervalle pro Gitterzelle.
+    Pro Zelle ein Array der Form (n, 2) mit [Start, Ende) in Epoch-Sekunden.
+    """
+    def __init__(self, days: int = DAYLIGHT_TABLE_DAYS):
+        self.days = max(days, 1)
+        self._intervals: dict[tuple[float, float], np.ndarray] = {}
+        self._first_day: dict[tuple[float, float], date] = {}
+        self.builds = 0
+
+    def intervals(self, lat: float, lon: float, today: date) -> np.ndarray:
+        cell = grid_cell(lat, lon)
+        first = self._first_day.get(cell)
+        if first is None or not (first <= today < first + timedelta(days=self.days)):
+            # Vom Vortag bis einen Tag über das Ende hinaus: so decken auch Stunden kurz nach
+            # Mitternacht UTC und der Prognose-Horizont am letzten gültigen Tag die Tabelle ab
+            from astral import Observer
+            observer = Observer(latitude=cell[0], longitude=cell[1])
+            start = today - timedelta(days=1)
+            rows = [iv for offset in range(self.days + 2) for iv in _day_intervals(observer, start + timedelta(days=offset))]
+            self._intervals[cell] = np.array(rows, dtype=np.int64).reshape(-1, 2)
+            self._first_day[cell] = today
+            self.builds += 1
+        return self._intervals[cell]
+
+    def daylight_fractions(self, lat: float, lon: float, hour_starts: np.ndarray, now: datetime | None = None) -> np.ndarray:
+        """Anteil Tageslicht (0..1) jeder Stunde, `hour_starts` in Epoch-Sekunden."""
+        now = now or datetime.now(timezone.utc)
+        table = self.intervals(lat, lon, now.date())
+        starts = np.asarray(hour_starts, dtype=np.int64)[:, None]
+        overlap = np.minimum(starts + 3600, table[:, 1]) - np.maximum(starts, table[:, 0])
+        return np.clip(overlap, 0, None).sum(axis=1) / 3600
+
+    def is_daylight(self, lat: float, lon: float, now: datetime | None = None) -> bool:
+        now = now or datetime.now(timezone.utc)
+        table = self.intervals(lat, lon, now.date())
+        ts = int(now.timestamp())
+        return bool(np.any((table[:, 0] <= ts) & (ts < table[:, 1])))
+
+    def is_daylight_many(self, lats, lons, now: datetime | None = None) -> np.ndarray:
+        """Vektorisierte Variante für ganze Flotten (ein Tabellen-Lookup pro Gitterzelle)."""
+        now = now or datetime.now(timezone.utc)
+        by_cell: dict[tuple[float, float], bool] = {}
+        result = np.empty(len(lats), dtype=bool)
+        for i, (lat, lon) in enumerate(zip(lats, lons)):
+            cell = grid_cell(lat, lon)
+            if cell not in by_cell:
+                by_cell[cell] = self.is_daylight(lat, lon, now)
+            result[i] = by_cell[cell]
+        return result
+
+
+# Globale Instanz für die API
+daylight_table = DaylightTable()
 
-from datetime import datetime, timezone
-from astral import LocationInfo
-from astral.sun import sun
 
 def is_daylight(latitude: float, longitude: float) -> bool:
     """
     Überprüft, ob am gegebenen Ort aktuell Tageslicht herrscht.
     """
     try:
-        # Erstelle ein LocationInfo-Objekt
-        city = LocationInfo("CustomCity", "CustomRegion", "UTC", latitude, longitude)
-        
-        # Berechne die Sonnenzeiten für heute
-        s = sun(city.observer, date=datetime.now(timezone.utc), tzinfo=timezone.utc)
-        
-        # Aktuelle Zeit in UTC
-        now_utc = datetime.now(timezone.utc)
-        
-        # Überprüfe, ob die aktuelle Zeit zwischen Sonnenaufgang und Sonnenuntergang liegt
-        return s['sunrise'] < now_utc < s['sunset']
+        return daylight_table.is_daylight(latitude, longitude)
     except Exception as e:
         print(f"Fehler bei der Tageslicht-Berechnung: {e}")
         # Im Fehlerfall gehen wir sicherheitshalber von Nacht aus
-        return False
\ No newline at end of file
+        return False
+
+
+def daylight_fractions(latitude: float, longitude: float, hours: int, now: datetime | None = None) -> np.ndarray:
+    """
+    Tageslicht-Anteil der kommenden `hours` Stunden ab der laufenden Stunde (UTC),
+    passend zur Solarprognose aus get_solar_forecast.
+    """
+    now = now or datetime.now(timezone.utc)
+    first_hour = int(now.timestamp()) // 3600 * 3600
+    try:
+        return daylight_table.daylight_fractions(latitude, longitude, first_hour + 3600 * np.arange(hours), now)
+    except Exception as e:
+        print(f"Fehler bei der Tageslicht-Berechnung: {e}")
+        return np.zeros(hours)
@@ -12,32 +12,103 @@
 # ---------------------------------------------------------------------------
 # KORRIGIERT: Funktion get_solar_forecast akzeptiert jetzt lat und lon und ist auf münchen eingestellt.
 # ---------------------------------------------------------------------------
+# NEU: Prognosen werden über den forecast_cache zwischengespeichert.
+# ---------------------------------------------------------------------------
+# NEU: Nutzt den gepoolten HTTP-Client aus http_client (Keep-Alive, HTTP/2, Retry).
+#      Tests können über `client=` einen eigenen Client (z.B. mit MockTransport) übergeben.
+# ---------------------------------------------------------------------------
+# NEU: Dauer und Fehlerquote jedes echten Abrufs landen in /metrics (services/metrics.py).
+# ---------------------------------------------------------------------------
+# NEU: Mit mehreren Workern wird zuerst der gemeinsame Prognose-Speicher gelesen
+#      (services/shared_forecasts.py); eigene Abrufe landen ebenfalls dort.
+# ---------------------------------------------------------------------------
 import httpx
+import time
 from datetime import datetime, timezone
 import os
+from optimisation_api.services import metrics
+from optimisation_api.services.forecast_cache import forecast_cache, grid_cell, next_hour_boundary, next_price_publication
+from optimisation_api.services.http_client import get_with_retry
+from optimisation_api.services.shared_forecasts import shared_forecast_store
+
+AWATTAR_API_URL = os.environ.get("AWATTAR_API_URL", "https://api.awattar.de/v1/marketdata")
+OPEN_METEO_API_URL = os.environ.get("OPEN_METEO_API_URL", "https://api.open-meteo.com/v1/forecast")
+
+async def get_epex_spot_forecast(client: httpx.AsyncClient | None = None) -> list[dict] | None:
+    """Preisprognose; ändert sich nur bei Veröffentlichung durch aWATTar bzw. am Tageswechsel."""
+    shared = shared_forecast_store.read_prices()
+    if shared is not None and shared_forecast_store.is_servable(shared[1]):
+        return shared[0]
+    forecast = await forecast_cache.get_or_fetch(("awattar",), lambda: _fetch_and_share_prices(client), next_price_publication)
+    return forecast if forecast is not None else _stale_shared(shared)
+
+async def get_solar_forecast(lat: float, lon: float, hours: int = 6, client: httpx.AsyncClient | None = None) -> list[float] | None:
+    """Solarprognose der kommenden Stunden; gecacht pro Gitterzelle bis zur nächsten vollen Stunde."""
+    cell_lat, cell_lon = grid_cell(lat, lon)
+    now_hour = datetime.now(timezone.utc).hour
+    shared = shared_forecast_store.read_solar(cell_lat, cell_lon, now_hour, hours)
+    if shared is not None and shared_forecast_store.is_servable(shared[1]):
+        return shared[0]
+    hourly = await forecast_cache.get_or_fetch(
+        ("open-meteo", cell_lat, cell_lon),
+        lambda: _fetch_and_share_solar(cell_lat, cell_lon, client),
+        next_hour_boundary,
+    )
+    if hourly is None:
+        return _stale_shared(shared)
+    return hourly[now_hour : now_hour + hours]
 
-async def get_epex_spot_forecast() -> list[dict] | None:
-    url = "https://api.awattar.de/v1/marketdata"
+def _stale_shared(shared: tuple | None):
+    """Quelle gestört: ältere Daten aus dem gemeinsamen Speicher, solange der forecast_cache sie auch liefern würde."""
+    if shared is not None and time.time() - shared[1] <= forecast_cache.max_stale_seconds:
+        return shared[0]
+    return None
+
+async def _fetch_and_share_prices(client: httpx.AsyncClient | None = None) -> list[dict] | None:
+    forecast = await _fetch_epex_spot_forecast(client)
+    if forecast is not None:
+        shared_forecast_store.publish_prices(forecast)
+    return forecast
+
+async def _fetch_and_share_solar(lat: float, lon: float, client: httpx.AsyncClient | None = None) -> list[float] | None:
+    hourly = await _fetch_solar_forecast(lat, lon, client)
+    if hourly is not None:
+        shared_forecast_store.publish_solar(lat, lon, hourly)
+    return hourly
+
+def run_shared_refresher():
+    """Hintergrund-Task für den gemeinsamen Prognose-Speicher (abgerufen wird nur im Leader-Worker)."""
+    return shared_forecast_store.run_refresher(_fetch_epex_spot_forecast, _fetch_solar_forecast)
+
+def _record_fetch(api: str, result):
+    metrics.EXTERNAL_API_REQUESTS_TOTAL.inc(api, "ok" if result is not None else "error")
+    return result
+
+async def _fetch_epex_spot_forecast(client: httpx.AsyncClient | None = None) -> list[dict] | None:
+    with metrics.EXTERNAL_API_SECONDS.time("awattar"), metrics.span("awattar.marketdata"):
+        return _record_fetch("awattar", await _request_epex_spot_forecast(client))
+
+async def _request_epex_spot_forecast(client: httpx.AsyncClient | None = None) -> list[dict] | None:
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, timeout=5.0)
-            response.raise_for_status()
-            market_data = response.json()["data"]
+        response = await get_with_retry(AWATTAR_API_URL, client)
+        market_data = response.json()["data"]
         return [{"timestamp_utc": datetime.fromtimestamp(i["start_timestamp"] / 1000, tz=timezone.utc), "price_eur_kwh": i["marketprice"] / 1000} for i in market_data if "start_timestamp" in i and "marketprice" in i]
     except Exception as e:
         print(f"FEHLER: aWATTar API (async) fehlgeschlagen: {e}")
         return None
 
-async def get_solar_forecast(lat: float, lon: float, hours: int = 6) -> list[float] | None:
-    url = f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&hourly=shortwave_radiation&forecast_days=1&timezone=UTC"
+async def _fetch_solar_forecast(lat: float, lon: float, client: httpx.AsyncClient | None = None) -> list[float] | None:
+    with metrics.EXTERNAL_API_SECONDS.time("open-meteo"), metrics.span("open-meteo.forecast", {"lat": lat, "lon": lon}):
+        return _record_fetch("open-meteo", await _request_solar_forecast(lat, lon, client))
+
+async def _request_solar_forecast(lat: float, lon: float, client: httpx.AsyncClient | None = None) -> list[float] | None:
+    """Holt die komplette stündliche Einstrahlung des heutigen Tages (UTC)."""
+    url = f"{OPEN_METEO_API_URL}?latitude={lat}&longitude={lon}&hourly=shortwave_radiation&forecast_days=1&timezone=UTC"
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, timeout=5.0)
-            response.raise_for_status()
-            data = response.json()
-        now_hour = datetime.now(timezone.utc).hour
+        response = await get_with_retry(url, client)
+        data = response.json()
         if "hourly" in data and "shortwave_radiation" in data["hourly"]:
-             return data["hourly"]["shortwave_radiation"][now_hour : now_hour + hours]
+             return data["hourly"]["shortwave_radiation"]
         else: return None
     except Exception as e:
         print(f"FEHLER: Open-Meteo API (async) fehlgeschlagen: {e}")
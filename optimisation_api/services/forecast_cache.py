@@ -0,0 +1,150 @@
+# Dieses Modul hält die Prognosen der externen APIs im Speicher.
+# aWATTar veröffentlicht die Preise einmal am Tag, Open-Meteo aktualisiert die
+# Einstrahlung stündlich. Es gibt also keinen Grund, bei jeder Entscheidung
+# erneut eine HTTPS-Anfrage zu stellen.
+# ---------------------------------------------------------------------------
+# - Schlüssel: Quelle + (gerundete) Gitterzelle aus lat/lon
+# - Ablauf: an der Stunden- bzw. Tagesgrenze, wenn die Quelle neue Daten hat
+# - Gleichzeitige Misses teilen sich EINEN laufenden Abruf (Single-Flight)
+# - Fällt die Quelle aus, liefern wir für begrenzte Zeit die alten Daten weiter
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable
+
+# Kantenlänge einer Gitterzelle in Grad (0.1° entspricht ca. 11 km)
+GRID_CELL_DEGREES = float(os.environ.get("FORECAST_GRID_CELL_DEGREES", "0.1"))
+# Wie lange nach Ablauf alte Daten noch ausgeliefert werden dürfen, wenn die Quelle ausfällt
+MAX_STALE_SECONDS = float(os.environ.get("FORECAST_MAX_STALE_SECONDS", "3600"))
+# Nach einem fehlgeschlagenen Abruf erst nach dieser Pause erneut versuchen
+RETRY_AFTER_ERROR_SECONDS = float(os.environ.get("FORECAST_RETRY_AFTER_ERROR_SECONDS", "30"))
+# Stunde (UTC), zu der aWATTar die Preise für den Folgetag veröffentlicht
+AWATTAR_PUBLISH_HOUR_UTC = int(os.environ.get("AWATTAR_PUBLISH_HOUR_UTC", "13"))
+
+
+def grid_cell(lat: float, lon: float, cell_degrees: float = GRID_CELL_DEGREES) -> tuple[float, float]:
+    """Rundet eine Koordinate auf den Mittelpunkt ihrer Gitterzelle."""
+    return (
+        round(round(lat / cell_degrees) * cell_degrees, 6),
+        round(round(lon / cell_degrees) * cell_degrees, 6),
+    )
+
+
+def next_hour_boundary(now: datetime) -> datetime:
+    """Nächste volle Stunde – dann hat Open-Meteo eine neue Prognose."""
+    return now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+
+
+def next_price_publication(now: datetime) -> datetime:
+    """Nächster Zeitpunkt, an dem sich die aWATTar-Daten ändern: Veröffentlichung oder Tageswechsel."""
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    publication = now.replace(hour=AWATTAR_PUBLISH_HOUR_UTC, minute=0, second=0, microsecond=0)
+    return publication if now < publication else midnight
+
+
+class _CacheEntry:
+    __slots__ = ("value", "expires_at", "retry_at")
+
+    def __init__(self, value: Any, expires_at: float):
+        self.value = value
+        self.expires_at = expires_at
+        self.retry_at = 0.0
+
+
+class ForecastCache:
+    """
+    TTL-Cache für Prognosedaten mit Single-Flight und Stale-Fallback.
+    """
+    def __init__(self, max_stale_seconds: float = MAX_STALE_SECONDS,
+                 retry_after_error_seconds: float = RETRY_AFTER_ERROR_SECONDS,
+                 clock: Callable[[], float] = time.time):
+        self.max_stale_seconds = max_stale_seconds
+        self.retry_after_error_seconds = retry_after_error_seconds
+        self._clock = clock
+        self._entries: dict[tuple, _CacheEntry] = {}
+        self._in_flight: dict[tuple, asyncio.Task] = {}
+        self.lookups = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    async def get_or_fetch(self, key: tuple, fetch: Callable[[], Awaitable[Any]],
+                           expires_at: Callable[[datetime], datetime]) -> Any:
+        """
+        Liefert den Wert aus dem Cache oder ruft ihn über `fetch` ab.
+        `fetch` gibt im Fehlerfall None zurück (wie die Funktionen in external_apis).
+        """
+        self.lookups += 1
+        now = self._clock()
+        entry = self._entries.get(key)
+        if entry is not None and now < entry.expires_at:
+            self.hits += 1
+            return entry.value
+
+        # Quelle ist gerade gestört: alte Daten weiterreichen, statt sie erneut zu belasten
+        if entry is not None and now < entry.retry_at and self._is_servable_stale(entry, now):
+            self.stale_hits += 1
+            return entry.value
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            # Der Abruf läuft als eigener Task, damit ein abgebrochener Aufrufer
+            # die anderen Wartenden nicht mit in den Abbruch zieht.
+            task = asyncio.ensure_future(self._fetch_and_store(key, fetch, expires_at))
+            self._in_flight[key] = task
+        return await asyncio.shield(task)
+
+    async def _fetch_and_store(self, key: tuple, fetch: Callable[[], Awaitable[Any]],
+                               expires_at: Callable[[datetime], datetime]) -> Any:
+        try:
+            try:
+                value = await fetch()
+            except Exception as e:
+                print(f"FEHLER: Prognose-Abruf für {key} fehlgeschlagen: {e}")
+                value = None
+
+            now = self._clock()
+            if value is not None:
+                now_dt = datetime.fromtimestamp(now, tz=timezone.utc)
+                self._entries[key] = _CacheEntry(value, expires_at(now_dt).timestamp())
+                return value
+
+            self.errors += 1
+            entry = self._entries.get(key)
+            if entry is not None and self._is_servable_stale(entry, now):
+                entry.retry_at = now + self.retry_after_error_seconds
+                self.stale_hits += 1
+                print(f"WARNUNG: Liefere veraltete Prognose für {key} aus dem Cache.")
+                return entry.value
+            return None
+        finally:
+            self._in_flight.pop(key, None)
+
+    def _is_servable_stale(self, entry: _CacheEntry, now: float) -> bool:
+        return now - entry.expires_at <= self.max_stale_seconds
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_hits": self.stale_hits,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            # Anteil der Anfragen, die keinen eigenen Upstream-Abruf ausgelöst haben
+            "hit_rate": round(1 - self.misses / self.lookups, 4) if self.lookups else 0.0,
+        }
+
+
+# Globale Instanz, die von external_apis verwendet wird.
+forecast_cache = ForecastCache()
@@ -0,0 +1,147 @@
+# Dieses Modul verwaltet EINEN langlebigen HTTP-Client für alle externen APIs.
+# Statt pro Anfrage eine neue TCP- und TLS-Verbindung aufzubauen, werden die
+# Verbindungen im Pool gehalten (Keep-Alive, HTTP/2) und wiederverwendet.
+# ---------------------------------------------------------------------------
+# Lebenszyklus: start_http_client() im FastAPI-Startup, close_http_client() im Shutdown.
+import asyncio
+import importlib.util
+import os
+import random
+from collections import defaultdict
+
+import httpx
+
+from optimisation_api.services import metrics
+
+HTTP_TIMEOUT_SECONDS = float(os.environ.get("HTTP_TIMEOUT_SECONDS", "5.0"))
+HTTP_MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.environ.get("HTTP_KEEPALIVE_EXPIRY_SECONDS", "30"))
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.environ.get("HTTP_MAX_CONNECTIONS_PER_HOST", "10"))
+HTTP_RETRIES = int(os.environ.get("HTTP_RETRIES", "2"))
+HTTP_BACKOFF_BASE_SECONDS = float(os.environ.get("HTTP_BACKOFF_BASE_SECONDS", "0.2"))
+HTTP_BACKOFF_MAX_SECONDS = float(os.environ.get("HTTP_BACKOFF_MAX_SECONDS", "2.0"))
+# HTTP/2 braucht das optionale Paket 'h2' (httpx[http2])
+HTTP2_ENABLED = os.environ.get("HTTP2_ENABLED", "1") == "1" and importlib.util.find_spec("h2") is not None
+
+# Diese Statuscodes sind vorübergehend und werden erneut versucht
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_client: httpx.AsyncClient | None = None
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Gibt den Host-Slot erst frei, wenn der Antwort-Body gelesen oder geschlossen wurde."""
+    def __init__(self, stream: httpx.AsyncByteStream, semaphore: asyncio.Semaphore):
+        self._stream = stream
+        self._semaphore = semaphore
+        self._released = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._released:
+                self._released = True
+                self._semaphore.release()
+
+
+class PerHostLimitTransport(httpx.AsyncBaseTransport):
+    """
+    Begrenzt die gleichzeitigen Anfragen pro Host, damit ein einzelner
+    Upstream nicht den ganzen Pool belegt.
+    """
+    def __init__(self, transport: httpx.AsyncBaseTransport, max_per_host: int):
+        self._transport = transport
+        self._max_per_host = max_per_host
+        self._semaphores: dict[str, asyncio.Semaphore] = defaultdict(lambda: asyncio.Semaphore(self._max_per_host))
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        semaphore = self._semaphores[request.url.host]
+        await semaphore.acquire()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            semaphore.release()
+            raise
+        response.stream = _ReleasingStream(response.stream, semaphore)
+        return response
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+def create_http_client(transport: httpx.AsyncBaseTransport | None = None) -> httpx.AsyncClient:
+    """Baut einen Client mit den konfigurierten Pool-Grenzen."""
+    if transport is None:
+        limits = httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        )
+        transport = PerHostLimitTransport(
+            httpx.AsyncHTTPTransport(http2=HTTP2_ENABLED, limits=limits),
+            HTTP_MAX_CONNECTIONS_PER_HOST,
+        )
+    return httpx.AsyncClient(transport=transport, timeout=HTTP_TIMEOUT_SECONDS)
+
+
+async def start_http_client():
+    """Erstellt den app-weiten Client (FastAPI-Startup)."""
+    global _client
+    if _client is None:
+        _client = create_http_client()
+        print(f"INFO: HTTP-Client gestartet (HTTP/2: {HTTP2_ENABLED}, max. {HTTP_MAX_CONNECTIONS} Verbindungen).")
+
+
+async def close_http_client():
+    """Schließt den app-weiten Client und alle offenen Verbindungen (FastAPI-Shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        print("INFO: HTTP-Client geschlossen.")
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Liefert den app-weiten Client; außerhalb der App wird er bei Bedarf angelegt."""
+    global _client
+    if _client is None:
+        _client = create_http_client()
+    return _client
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Exponentielles Backoff mit 'Full Jitter', damit nicht alle Worker gleichzeitig wiederholen."""
+    return random.uniform(0, min(HTTP_BACKOFF_MAX_SECONDS, HTTP_BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+async def get_with_retry(url: str, client: httpx.AsyncClient | None = None,
+                         retries: int = HTTP_RETRIES, **kwargs) -> httpx.Response:
+    """
+    GET mit Wiederholung bei Netzwerkfehlern und vorübergehenden Statuscodes.
+    Wirft nach dem letzten Versuch die ursprüngliche Ausnahme weiter.
+    """
+    client = client or get_http_client()
+    host = httpx.URL(url).host
+    for attempt in range(retries + 1):
+        try:
+            with metrics.span("HTTP GET", {"http.method": "GET", "server.address": host, "retry.attempt": attempt}):
+                response = await client.get(url, **kwargs)
+            if response.status_code in RETRY_STATUS_CODES and attempt < retries:
+                metrics.HTTP_RETRIES_TOTAL.inc(host, str(response.status_code))
+                print(f"WARNUNG: {url} antwortete mit {response.status_code}, Versuch {attempt + 1}/{retries + 1}.")
+            else:
+                response.raise_for_status()
+                return response
+        except httpx.TransportError as e:
+            if attempt >= retries:
+                raise
+            metrics.HTTP_RETRIES_TOTAL.inc(host, type(e).__name__)
+            print(f"WARNUNG: {url} nicht erreichbar ({type(e).__name__}), Versuch {attempt + 1}/{retries + 1}.")
+        await asyncio.sleep(_backoff_delay(attempt))
+    raise RuntimeError("unreachable")
@@ -0,0 +1,203 @@
+# ---------------------------------------------------------------------------
+# optimisation_api/services/metrics.py
+# ---------------------------------------------------------------------------
+# Metriken im Prometheus-Textformat (GET /metrics) und optionale
+# OpenTelemetry-Spans für den Entscheidungspfad.
+#
+# - Histogramme pro Stufe von /entscheidung (Preis, Solar, Tageslicht, Regeln,
+#   LLM, Sicherheits-Check), damit sichtbar wird, wo das p99 entsteht
+# - Zähler: welche Regel gegriffen hat, woher die Entscheidung kam, warum das
+#   LLM übersprungen wurde, Fehler externer APIs
+# - Spans nur, wenn OTEL_TRACING_ENABLED=1 und das Paket 'opentelemetry-api'
+#   installiert ist. Exporter/SDK richtet das Deployment ein (z.B. per
+#   opentelemetry-instrument); ohne SDK sind die Spans wirkungslos.
+#
+# Bewusst ohne prometheus_client: ein Prozess, wenige Metriken, keine
+# zusätzliche Abhängigkeit. Alles läuft im Event-Loop, daher ohne Locks.
+# ---------------------------------------------------------------------------
+import importlib.util
+import os
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Iterable
+
+OTEL_TRACING_ENABLED = os.environ.get("OTEL_TRACING_ENABLED", "0") == "1" and importlib.util.find_spec("opentelemetry") is not None
+
+# Sekunden; fein im Bereich der Cache-Treffer, grob im Bereich der LLM-Aufrufe
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+if OTEL_TRACING_ENABLED:
+    from opentelemetry import trace
+    _tracer = trace.get_tracer("optimisation_api")
+else:
+    _tracer = None
+
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return "+Inf" if value == float("inf") else repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monoton steigender Zähler, optional mit Labels."""
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def expose(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Histogram:
+    """Histogramm mit festen Bucket-Grenzen (kumulativ exportiert, wie Prometheus es erwartet)."""
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = STAGE_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # labels -> [Zählungen pro Bucket (+Inf zuletzt), Summe]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        counts = series[0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+        series[1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def count(self, *labels) -> int:
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def expose(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, (counts, total) in self._series.items():
+            yield from histogram_lines(self.name, self.labelnames, labels, self.buckets, counts, total)
+
+
+def histogram_lines(name: str, labelnames: tuple[str, ...], labels: tuple, buckets: tuple[float, ...],
+                    counts: list[int], total: float) -> Iterable[str]:
+    """Exportzeilen einer Histogramm-Serie aus nicht-kumulativen Bucket-Zählungen (+Inf zuletzt)."""
+    cumulative = 0
+    for bound, count in zip(buckets + (float("inf"),), counts):
+        cumulative += count
+        le = 'le="' + _format_value(float(bound)) + '"'
+        yield f"{name}_bucket{_format_labels(labelnames, labels, le)} {cumulative}"
+    yield f"{name}_sum{_format_labels(labelnames, labels)} {_format_value(float(total))}"
+    yield f"{name}_count{_format_labels(labelnames, labels)} {cumulative}"
+
+
+def sample_lines(name: str, documentation: str, kind: str, samples: Iterable[tuple[dict, float]]) -> Iterable[str]:
+    """Exportzeilen für Werte, die ein anderes Modul ohnehin zählt (z.B. in stats()); kind: counter/gauge."""
+    yield f"# HELP {name} {documentation}"
+    yield f"# TYPE {name} {kind}"
+    for labels, value in samples:
+        yield f"{name}{_format_labels(tuple(labels), tuple(labels.values()))} {_format_value(value)}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list[Counter | Histogram] = []
+        self._collectors: list[Callable[[], Iterable[str]]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[str]]):
+        """`collector()` liefert beim Export zusätzliche Zeilen (Werte, die anderswo gezählt werden)."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.expose())
+        for collector in self._collectors:
+            try:
+                lines.extend(collector())
+            except Exception as e:
+                print(f"WARNUNG: Metrik-Collector {getattr(collector, '__name__', collector)} fehlgeschlagen: {e}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+DECISION_STAGE_SECONDS = registry.register(Histogram(
+    "decision_stage_seconds", "Dauer der einzelnen Stufen einer Entscheidung.", ("stage",)))
+DECISIONS_TOTAL = registry.register(Counter(
+    "decisions_total", "Beantwortete Entscheidungen nach Quelle (table, rules, fallback) und Aktion.", ("source", "action")))
+FALLBACK_DECISIONS_TOTAL = registry.register(Counter(
+    "fallback_decisions_total", "Fallback-Entscheidungen (auch für die Tabelle) nach Engine (optimizer, llm, default).", ("engine",)))
+RULES_FIRED_TOTAL = registry.register(Counter(
+    "rules_fired_total", "Live ausgewertete schnelle Regeln nach Regel (none = keine Regel hat gegriffen).", ("rule",)))
+SAFETY_OVERRIDES_TOTAL = registry.register(Counter(
+    "safety_overrides_total", "Vom Sicherheits-Check blockierte Netzladungen."))
+EXTERNAL_API_REQUESTS_TOTAL = registry.register(Counter(
+    "external_api_requests_total", "Abrufe externer APIs nach API und Ergebnis (ok, error, timeout).", ("api", "outcome")))
+EXTERNAL_API_SECONDS = registry.register(Histogram(
+    "external_api_request_seconds", "Dauer der Abrufe externer APIs (inkl. Wiederholungen).", ("api",)))
+LLM_ROUTED_TOTAL = registry.register(Counter(
+    "llm_routed_total", "LLM-Aufrufe nach Stufe (small, large) und Routing-Grund.", ("tier", "reason")))
+LLM_TOKENS_TOTAL = registry.register(Counter(
+    "llm_tokens_total", "Verbrauchte Tokens nach Stufe und Art (prompt, completion, cached).", ("tier", "kind")))
+LLM_REQUEST_SECONDS = registry.register(Histogram(
+    "llm_request_seconds", "Dauer der LLM-Aufrufe nach Stufe (inkl. Fehlern).", ("tier",)))
+DECISION_TABLE_BUILD_SECONDS = registry.register(Histogram(
+    "decision_table_build_seconds", "Dauer der Aufbauten der Entscheidungstabelle (all = stündlicher Job, cell = Nachbau nach Miss).",
+    ("kind",), buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)))
+HTTP_RETRIES_TOTAL = registry.register(Counter(
+    "http_retries_total", "Wiederholte HTTP-Anfragen nach Host und Grund.", ("host", "reason")))
+
+
+def span(name: str, attributes: dict | None = None):
+    """OpenTelemetry-Span (aktueller Kontext als Elternteil) oder ein leerer Kontext."""
+    if _tracer is None:
+        return nullcontext()
+    return _tracer.start_as_current_span(name, attributes=attributes)
+
+
+@contextmanager
+def stage(name: str):
+    """Misst eine Stufe des Entscheidungspfads (Histogramm + Span)."""
+    start = time.perf_counter()
+    try:
+        with span(f"entscheidung.{name}"):
+            yield
+    finally:
+        DECISION_STAGE_SECONDS.observe(time.perf_counter() - start, name)
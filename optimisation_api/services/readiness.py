@@ -0,0 +1,134 @@
+# ---------------------------------------------------------------------------
+# optimisation_api/services/readiness.py
+# ---------------------------------------------------------------------------
+# Abhängigkeiten (OpenAI, Neo4j, Zeitreihen-Speicher) werden beim Start NICHT
+# mehr nacheinander abgewartet, sondern gleichzeitig im Hintergrund
+# initialisiert. Die App nimmt sofort Anfragen an: der Regelpfad braucht
+# keine dieser Verbindungen, das LLM-Fallback antwortet bis dahin mit
+# DO_NOTHING, die Ersparnis mit 0.
+#
+# - Pro Abhängigkeit ein Zustand: pending, initializing, ready, failed, disabled
+#   (disabled = nicht konfiguriert, wird nicht wiederholt)
+# - Fehlgeschlagene Abhängigkeiten werden mit wachsendem Abstand erneut versucht
+# - GET /ready meldet den Zustand jeder Abhängigkeit; "bereit" ist die App,
+#   sobald alle Abhängigkeiten aus READY_REQUIRED_DEPENDENCIES bereit sind
+#   (Standard: keine – der Regelpfad funktioniert ohne sie)
+# ---------------------------------------------------------------------------
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable
+
+READY_REQUIRED_DEPENDENCIES = frozenset(
+    name.strip() for name in os.environ.get("READY_REQUIRED_DEPENDENCIES", "").split(",") if name.strip()
+)
+# Obergrenze pro Initialisierungsversuch, falls eine Abhängigkeit hängt
+STARTUP_DEPENDENCY_TIMEOUT_SECONDS = float(os.environ.get("STARTUP_DEPENDENCY_TIMEOUT_SECONDS", "15"))
+STARTUP_RETRY_SECONDS = float(os.environ.get("STARTUP_RETRY_SECONDS", "30"))
+STARTUP_RETRY_MAX_SECONDS = float(os.environ.get("STARTUP_RETRY_MAX_SECONDS", "300"))
+
+
+class Dependency:
+    """Eine Abhängigkeit mit Initialisierung und Zustandsprüfung."""
+    __slots__ = ("name", "init", "is_ready", "is_configured", "state", "error", "attempts", "init_seconds", "ready_at")
+
+    def __init__(self, name: str, init: Callable[[], Awaitable[None]], is_ready: Callable[[], bool],
+                 is_configured: Callable[[], bool]):
+        self.name = name
+        self.init = init
+        self.is_ready = is_ready
+        self.is_configured = is_configured
+        self.state = "pending"
+        self.error: str | None = None
+        self.attempts = 0
+        self.init_seconds: float | None = None
+        self.ready_at: float | None = None
+
+
+class Readiness:
+    def __init__(self, required: frozenset[str] = READY_REQUIRED_DEPENDENCIES,
+                 timeout: float = STARTUP_DEPENDENCY_TIMEOUT_SECONDS, retry_seconds: float = STARTUP_RETRY_SECONDS):
+        self.required = required
+        self.timeout = timeout
+        self.retry_seconds = retry_seconds
+        self._dependencies: dict[str, Dependency] = {}
+        self._task: asyncio.Task | None = None
+        self._started_at: float | None = None
+
+    def register(self, name: str, init: Callable[[], Awaitable[None]], is_ready: Callable[[], bool],
+                 is_configured: Callable[[], bool] = lambda: True):
+        """`init()` baut die Verbindung auf (Fehler darf sie selbst behandeln), `is_ready()` prüft das Ergebnis."""
+        self._dependencies[name] = Dependency(name, init, is_ready, is_configured)
+
+    def start(self):
+        """Startet die Initialisierung aller Abhängigkeiten im Hintergrund und kehrt sofort zurück."""
+        if self._task is None:
+            self._started_at = time.monotonic()
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _initialize(self, dep: Dependency):
+        if not dep.is_configured():
+            dep.state = "disabled"
+            return
+        dep.state = "initializing"
+        dep.attempts += 1
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(dep.init(), self.timeout)
+            dep.error = None if dep.is_ready() else "Initialisierung ohne Verbindung beendet (siehe Log)."
+        except asyncio.TimeoutError:
+            dep.error = f"Timeout nach {self.timeout:.0f}s"
+        except Exception as e:
+            dep.error = f"{type(e).__name__}: {e}"
+        dep.init_seconds = round(time.perf_counter() - start, 3)
+        dep.state = "ready" if dep.error is None else "failed"
+        if dep.state == "ready":
+            dep.ready_at = round(time.monotonic() - self._started_at, 3)
+            print(f"INFO: Abhängigkeit '{dep.name}' bereit nach {dep.init_seconds:.2f}s.")
+        else:
+            print(f"WARNUNG: Abhängigkeit '{dep.name}' nicht verfügbar: {dep.error}")
+
+    async def _run(self):
+        await asyncio.gather(*(self._initialize(dep) for dep in self._dependencies.values()))
+        delay = self.retry_seconds
+        while failed := [dep for dep in self._dependencies.values() if dep.state == "failed"]:
+            await asyncio.sleep(delay)
+            await asyncio.gather(*(self._initialize(dep) for dep in failed))
+            delay = min(delay * 2, STARTUP_RETRY_MAX_SECONDS)
+
+    def is_ready(self) -> bool:
+        return all(
+            dep.state == "ready" and dep.is_ready()
+            for name, dep in self._dependencies.items() if name in self.required
+        )
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.is_ready(),
+            "uptime_s": round(time.monotonic() - self._started_at, 3) if self._started_at is not None else None,
+            "dependencies": {
+                name: {
+                    # Eine bereite Verbindung kann später wieder wegfallen (z.B. close())
+                    "state": dep.state if dep.state != "ready" or dep.is_ready() else "failed",
+                    "required": name in self.required,
+                    "attempts": dep.attempts,
+                    "init_seconds": dep.init_seconds,
+                    "ready_after_s": dep.ready_at,
+                    "error": dep.error,
+                }
+                for name, dep in self._dependencies.items()
+            },
+        }
+
+
+# Globale Instanz für die API
+readiness = Readiness()
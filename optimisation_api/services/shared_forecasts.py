@@ -0,0 +1,433 @@
+# ---------------------------------------------------------------------------
+# optimisation_api/services/shared_forecasts.py
+# ---------------------------------------------------------------------------
+# Knotenlokaler Prognose-Speicher für uvicorn mit mehreren Workern
+# (--workers N). Ohne ihn hat jeder Worker-Prozess seinen eigenen
+# forecast_cache: N-mal dieselben Abrufe bei aWATTar/Open-Meteo und N Kopien
+# der Solarprognosen im Speicher.
+#
+# - Eine Datei (Standard: /dev/shm, also RAM), per mmap in jeden Worker
+#   eingeblendet. Der Kopf enthält Magic und Layout-Version; passt die Datei
+#   nicht zum Layout, wird sie atomar ersetzt.
+# - Preise und Solar-Zellen liegen als NumPy-Arrays fester Größe darin und
+#   werden direkt aus dem Mapping gelesen – ohne JSON, ohne Deserialisierung.
+#   Kopiert werden nur die Werte, die eine Anfrage braucht (z.B. 6 Stunden).
+# - Seqlock: Schreiber zählen `seq` vor und nach dem Schreiben hoch (ungerade =
+#   Schreiben läuft); Leser wiederholen, wenn sich `seq` währenddessen geändert
+#   hat. Schreiber untereinander sperren per flock auf `<pfad>.lock`.
+# - Genau ein Worker hält den flock auf `<pfad>.leader` und erneuert abgelaufene
+#   Einträge (Preise zur Veröffentlichung, Zellen zur vollen Stunde). Stirbt er,
+#   gibt das Betriebssystem die Sperre frei und ein anderer Worker übernimmt.
+# - Die übrigen Worker rufen nur selbst ab, wenn eine Zelle noch fehlt (erste
+#   Anfrage dafür) oder der Leader länger als SHARED_FORECAST_STALE_SECONDS
+#   hinterherhängt; das Ergebnis landet dann ebenfalls im Speicher.
+#
+# Aktivieren mit SHARED_FORECAST_STORE=1. Ohne fcntl (Windows) bleibt er aus.
+# ---------------------------------------------------------------------------
+import asyncio
+import mmap
+import os
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable
+
+import numpy as np
+
+from optimisation_api.services.forecast_cache import RETRY_AFTER_ERROR_SECONDS, next_hour_boundary, next_price_publication
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+SHARED_FORECAST_STORE = os.environ.get("SHARED_FORECAST_STORE", "0") == "1"
+SHARED_FORECAST_PATH = os.environ.get(
+    "SHARED_FORECAST_PATH",
+    os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "optimisation_api_forecasts"),
+)
+# Anzahl der Gitterzellen (wird auf eine Zweierpotenz aufgerundet; 224 Bytes pro Zelle)
+SHARED_FORECAST_MAX_CELLS = int(os.environ.get("SHARED_FORECAST_MAX_CELLS", "16384"))
+# So lange nach Ablauf dürfen Worker noch lesen, während der Leader erneuert
+SHARED_FORECAST_STALE_SECONDS = float(os.environ.get("SHARED_FORECAST_STALE_SECONDS", "300"))
+# Wie oft jeder Worker prüft, ob er Leader werden kann, und der Leader, was abgelaufen ist
+SHARED_FORECAST_POLL_SECONDS = float(os.environ.get("SHARED_FORECAST_POLL_SECONDS", "5"))
+SHARED_FORECAST_REFRESH_CONCURRENCY = int(os.environ.get("SHARED_FORECAST_REFRESH_CONCURRENCY", "16"))
+# Zellen, die so viele Stunden niemand gelesen hat, erneuert der Leader nicht mehr
+SHARED_FORECAST_IDLE_HOURS = int(os.environ.get("SHARED_FORECAST_IDLE_HOURS", "1"))
+
+STORE_MAGIC = b"FCST"
+LAYOUT_VERSION = 1
+# Bis 48 Stunden in Viertelstunden
+MAX_PRICE_SLOTS = 192
+SOLAR_HOURS = 24
+# Höchstens so viele Zellen belegen, damit die lineare Sondierung kurz bleibt
+MAX_LOAD_FACTOR = 0.75
+_SEQLOCK_ATTEMPTS = 1000
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+_HEADER = np.dtype([
+    ("magic", "S4"), ("layout", "<u4"), ("seq", "<u8"),
+    ("cell_capacity", "<u4"), ("cells_used", "<u4"), ("price_count", "<u4"), ("leader_pid", "<u4"),
+    ("price_version", "<u8"), ("price_expires", "<f8"), ("refreshed_at", "<f8"), ("reserved", "<u8"),
+])
+_CELL = np.dtype([
+    ("lat", "<f8"), ("lon", "<f8"), ("expires", "<f8"), ("read_hour", "<i4"), ("used", "<u4"),
+    ("hourly", "<f8", (SOLAR_HOURS,)),
+])
+_PRICE_OFFSET = _HEADER.itemsize
+_CELL_OFFSET = _PRICE_OFFSET + MAX_PRICE_SLOTS * 16
+
+
+class SharedForecastStore:
+    """Prognosen im gemeinsamen Speicher aller Worker eines Knotens."""
+    def __init__(self, path: str = SHARED_FORECAST_PATH, max_cells: int = SHARED_FORECAST_MAX_CELLS,
+                 stale_seconds: float = SHARED_FORECAST_STALE_SECONDS, clock: Callable[[], float] = time.time):
+        # Die Layout-Version im Namen trennt alte und neue Deployments beim Rolling Update
+        self.path = f"{path}.v{LAYOUT_VERSION}"
+        self.capacity = 1 << max(0, (max_cells - 1).bit_length())
+        self.size = _CELL_OFFSET + self.capacity * _CELL.itemsize
+        self.stale_seconds = stale_seconds
+        self._clock = clock
+        self._mm: mmap.mmap | None = None
+        self._lock_fd: int | None = None
+        self._leader_fd: int | None = None
+        self.is_leader = False
+        # (price_version, Prognose als list[dict], Ablauf) – pro Worker einmal je Version erzeugt
+        self._price_memo: tuple[int, list[dict], float] | None = None
+        self._retry_at: dict[tuple, float] = {}
+        self._full_warned = False
+        self.reads: dict[tuple[str, str], int] = defaultdict(int)
+        self.publishes = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.busy = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self._mm is not None
+
+    def open(self) -> bool:
+        """Blendet die Datei ein (legt sie bei Bedarf an). False, wenn das nicht möglich ist."""
+        if self._mm is not None:
+            return True
+        if fcntl is None:
+            print("WARNUNG: Kein fcntl auf dieser Plattform, gemeinsamer Prognose-Speicher deaktiviert.")
+            return False
+        try:
+            self._lock_fd = os.open(self.path + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+            with self._write_lock():
+                fd = self._open_data_file()
+                try:
+                    self._mm = mmap.mmap(fd, self.size)
+                finally:
+                    os.close(fd)
+        except OSError as e:
+            print(f"WARNUNG: Gemeinsamer Prognose-Speicher {self.path} nicht verfügbar: {e}")
+            self.close()
+            return False
+
+        # Sichten auf das Mapping (keine Kopien)
+        self._header = np.ndarray((), _HEADER, buffer=self._mm)
+        self._price_starts = np.ndarray((MAX_PRICE_SLOTS,), "<i8", buffer=self._mm, offset=_PRICE_OFFSET)
+        self._price_values = np.ndarray((MAX_PRICE_SLOTS,), "<f8", buffer=self._mm, offset=_PRICE_OFFSET + MAX_PRICE_SLOTS * 8)
+        cells = np.ndarray((self.capacity,), _CELL, buffer=self._mm, offset=_CELL_OFFSET)
+        self._lat, self._lon, self._expires = cells["lat"], cells["lon"], cells["expires"]
+        self._read_hour, self._used, self._hourly = cells["read_hour"], cells["used"], cells["hourly"]
+        print(f"INFO: Gemeinsamer Prognose-Speicher {self.path} eingebunden "
+              f"({self.size / 1e6:.1f} MB, {self.capacity} Zellen, Worker {os.getpid()}).")
+        return True
+
+    def _open_data_file(self) -> int:
+        """Öffnet die Datei; fehlt sie oder passt sie nicht zum Layout, wird sie ersetzt."""
+        try:
+            fd = os.open(self.path, os.O_RDWR)
+            if os.fstat(fd).st_size == self.size:
+                header = np.frombuffer(os.pread(fd, _HEADER.itemsize, 0), dtype=_HEADER)[0]
+                if header["magic"] == STORE_MAGIC and header["layout"] == LAYOUT_VERSION and header["cell_capacity"] == self.capacity:
+                    return fd
+            os.close(fd)
+        except FileNotFoundError:
+            pass
+        # Neue Datei daneben anlegen und per rename austauschen: wer die alte noch
+        # eingeblendet hat, liest dort weiter, statt auf abgeschnittene Seiten zu greifen.
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            os.ftruncate(fd, self.size)
+            header = np.zeros((), _HEADER)
+            header["magic"], header["layout"], header["cell_capacity"] = STORE_MAGIC, LAYOUT_VERSION, self.capacity
+            os.pwrite(fd, header.tobytes(), 0)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.close(fd)
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return fd
+
+    def close(self):
+        """Gibt das Mapping und die Sperren frei; ein Leader gibt damit die Führung ab."""
+        for name in ("_header", "_price_starts", "_price_values", "_lat", "_lon", "_expires", "_read_hour", "_used", "_hourly"):
+            self.__dict__.pop(name, None)
+        if self._mm is not None:
+            try:
+                self._mm.close()
+            except BufferError:
+                print("WARNUNG: Gemeinsamer Prognose-Speicher wird noch referenziert, Mapping bleibt bis zum Prozessende.")
+            self._mm = None
+        for fd in (self._leader_fd, self._lock_fd):
+            if fd is not None:
+                os.close(fd)
+        self._leader_fd = self._lock_fd = None
+        self.is_leader = False
+        self._price_memo = None
+
+    # --- Synchronisation ---------------------------------------------------
+
+    @contextmanager
+    def _write_lock(self):
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _writing(self):
+        """Exklusiver Schreibzugriff; `seq` ist währenddessen ungerade."""
+        with self._write_lock():
+            seq = int(self._header["seq"])
+            # Ein abgestürzter Schreiber hinterlässt eine ungerade Zahl – dann einfach weiterzählen
+            seq += 1 - seq % 2
+            self._header["seq"] = seq
+            try:
+                yield
+            finally:
+                self._header["seq"] = seq + 1
+
+    def _read(self, read: Callable[[], object]):
+        """Führt `read()` aus, bis kein Schreiber dazwischengekommen ist. None, wenn der Speicher dauerhaft belegt ist."""
+        for _ in range(_SEQLOCK_ATTEMPTS):
+            seq = int(self._header["seq"])
+            if seq % 2 == 0:
+                result = read()
+                if int(self._header["seq"]) == seq:
+                    return result
+        self.busy += 1
+        return None
+
+    def _find(self, lat: float, lon: float, insert: bool = False) -> int | None:
+        """Slot der Zelle (lineare Sondierung); mit `insert` der freie Slot, an dem sie eingefügt würde."""
+        mask = self.capacity - 1
+        slot = hash((lat, lon)) & mask
+        for _ in range(self.capacity):
+            if not self._used[slot]:
+                return slot if insert else None
+            if self._lat[slot] == lat and self._lon[slot] == lon:
+                return slot
+            slot = (slot + 1) & mask
+        return None
+
+    def _count_read(self, source: str, expires_at: float | None, now: float):
+        if expires_at is None:
+            self.reads[source, "miss"] += 1
+        elif now < expires_at:
+            self.reads[source, "hit"] += 1
+        else:
+            self.reads[source, "stale" if self.is_servable(expires_at, now) else "expired"] += 1
+
+    def is_servable(self, expires_at: float, now: float | None = None) -> bool:
+        """Ob ein (ggf. abgelaufener) Eintrag noch ausgeliefert werden darf, während der Leader erneuert."""
+        return (now if now is not None else self._clock()) < expires_at + self.stale_seconds
+
+    # --- Preise ------------------------------------------------------------
+
+    def read_prices(self) -> tuple[list[dict], float] | None:
+        """(Preisprognose, Ablaufzeitpunkt) oder None, wenn der Speicher keine Preise hat."""
+        if self._mm is None:
+            return None
+        memo = self._price_memo
+
+        def read():
+            version = int(self._header["price_version"])
+            if memo is not None and memo[0] == version:
+                return memo
+            count = min(int(self._header["price_count"]), MAX_PRICE_SLOTS)
+            if count == 0:
+                return None
+            forecast = [
+                {"timestamp_utc": _EPOCH + timedelta(microseconds=start), "price_eur_kwh": price}
+                for start, price in zip(self._price_starts[:count].tolist(), self._price_values[:count].tolist())
+            ]
+            return version, forecast, float(self._header["price_expires"])
+
+        result = self._read(read)
+        # Dieselbe Liste bis zur nächsten Version: price_arrays_for & Co. erkennen sie per Identität wieder
+        self._price_memo = result or memo
+        self._count_read("prices", result[2] if result else None, self._clock())
+        return (result[1], result[2]) if result else None
+
+    def publish_prices(self, forecast: list[dict], expires_at: float | None = None) -> bool:
+        if self._mm is None:
+            return False
+        if len(forecast) > MAX_PRICE_SLOTS:
+            print(f"WARNUNG: Preisprognose mit {len(forecast)} Einträgen passt nicht in den gemeinsamen Speicher.")
+            return False
+        now = self._clock()
+        if expires_at is None:
+            expires_at = next_price_publication(datetime.fromtimestamp(now, tz=timezone.utc)).timestamp()
+        starts = [(item["timestamp_utc"] - _EPOCH) // timedelta(microseconds=1) for item in forecast]
+        prices = [item["price_eur_kwh"] for item in forecast]
+        with self._writing():
+            self._price_starts[:len(forecast)] = starts
+            self._price_values[:len(forecast)] = prices
+            self._header["price_count"] = len(forecast)
+            self._header["price_expires"] = expires_at
+            self._header["price_version"] = int(self._header["price_version"]) + 1
+            self._header["refreshed_at"] = now
+        self.publishes += 1
+        return True
+
+    # --- Solar-Zellen ------------------------------------------------------
+
+    def read_solar(self, lat: float, lon: float, start: int, hours: int) -> tuple[list[float], float] | None:
+        """(Einstrahlung der Stunden start..start+hours, Ablaufzeitpunkt) der Zelle oder None."""
+        if self._mm is None:
+            return None
+
+        def read():
+            slot = self._find(lat, lon)
+            if slot is None:
+                return None
+            return slot, self._hourly[slot, start:start + hours].tolist(), float(self._expires[slot])
+
+        result = self._read(read)
+        now = self._clock()
+        self._count_read("solar", result[2] if result else None, now)
+        if result is None:
+            return None
+        # Markiert die Zelle als benutzt, damit der Leader sie weiter erneuert (einzelner int32, ohne Sperre)
+        hour = int(now // 3600)
+        if self._read_hour[result[0]] != hour:
+            self._read_hour[result[0]] = hour
+        return result[1], result[2]
+
+    def publish_solar(self, lat: float, lon: float, hourly: list[float], expires_at: float | None = None) -> bool:
+        if self._mm is None or len(hourly) != SOLAR_HOURS or any(value is None for value in hourly):
+            return False
+        now = self._clock()
+        if expires_at is None:
+            expires_at = next_hour_boundary(datetime.fromtimestamp(now, tz=timezone.utc)).timestamp()
+        with self._writing():
+            slot = self._find(lat, lon, insert=True)
+            is_new = slot is not None and not self._used[slot]
+            if slot is None or (is_new and int(self._header["cells_used"]) >= self.capacity * MAX_LOAD_FACTOR):
+                if not self._full_warned:
+                    self._full_warned = True
+                    print(f"WARNUNG: Gemeinsamer Prognose-Speicher voll ({self.capacity} Zellen), "
+                          f"weitere Zellen nur im lokalen Cache. SHARED_FORECAST_MAX_CELLS erhöhen.")
+                return False
+            self._hourly[slot] = hourly
+            self._expires[slot] = expires_at
+            if is_new:
+                self._lat[slot], self._lon[slot] = lat, lon
+                self._read_hour[slot] = int(now // 3600)
+                self._used[slot] = 1
+                self._header["cells_used"] = int(self._header["cells_used"]) + 1
+            self._header["refreshed_at"] = now
+        self.publishes += 1
+        return True
+
+    # --- Leader ------------------------------------------------------------
+
+    def _try_lead(self) -> bool:
+        """Versucht, die Leader-Sperre zu bekommen (nicht blockierend)."""
+        if self.is_leader:
+            return True
+        if self._leader_fd is None:
+            self._leader_fd = os.open(self.path + ".leader", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(self._leader_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        self.is_leader = True
+        self._header["leader_pid"] = os.getpid()
+        print(f"INFO: Worker {os.getpid()} erneuert jetzt den gemeinsamen Prognose-Speicher.")
+        return True
+
+    async def run_refresher(self, fetch_prices: Callable[[], Awaitable[list[dict] | None]],
+                            fetch_solar: Callable[[float, float], Awaitable[list[float] | None]]):
+        """Hintergrund-Task in jedem Worker; abgerufen wird nur im Leader."""
+        while self._mm is not None:
+            try:
+                if self._try_lead():
+                    await self.refresh_due(fetch_prices, fetch_solar)
+            except Exception as e:
+                print(f"FEHLER: Erneuern des gemeinsamen Prognose-Speichers fehlgeschlagen: {e}")
+            await asyncio.sleep(SHARED_FORECAST_POLL_SECONDS)
+
+    async def refresh_due(self, fetch_prices: Callable[[], Awaitable[list[dict] | None]],
+                          fetch_solar: Callable[[float, float], Awaitable[list[float] | None]]):
+        """Ruft alle abgelaufenen Einträge neu ab (fehlende Preise zählen als abgelaufen)."""
+        now = self._clock()
+        price_expires = self._read(lambda: float(self._header["price_expires"]))
+        if price_expires is not None and self._is_due(("awattar",), price_expires, now):
+            forecast = await fetch_prices()
+            self._after_refresh(("awattar",), forecast is not None and self.publish_prices(forecast), now)
+
+        semaphore = asyncio.Semaphore(SHARED_FORECAST_REFRESH_CONCURRENCY)
+
+        async def refresh_cell(lat: float, lon: float):
+            async with semaphore:
+                hourly = await fetch_solar(lat, lon)
+            self._after_refresh(("open-meteo", lat, lon), hourly is not None and self.publish_solar(lat, lon, hourly), now)
+
+        await asyncio.gather(*(refresh_cell(lat, lon) for lat, lon in self._due_cells(now)))
+
+    def _due_cells(self, now: float) -> list[tuple[float, float]]:
+        min_hour = int(now // 3600) - SHARED_FORECAST_IDLE_HOURS
+
+        def read():
+            index = np.flatnonzero((self._used == 1) & (self._expires <= now) & (self._read_hour >= min_hour))
+            return list(zip(self._lat[index].tolist(), self._lon[index].tolist()))
+
+        cells = self._read(read) or []
+        return [(lat, lon) for lat, lon in cells if self._is_due(("open-meteo", lat, lon), 0.0, now)]
+
+    def _is_due(self, key: tuple, expires_at: float, now: float) -> bool:
+        # Nach einem Fehler nicht bei jedem Durchlauf erneut, sondern erst nach der Pause
+        return now >= expires_at and now >= self._retry_at.get(key, 0.0)
+
+    def _after_refresh(self, key: tuple, ok: bool, now: float):
+        if ok:
+            self.refreshes += 1
+            self._retry_at.pop(key, None)
+        else:
+            self.refresh_errors += 1
+            self._retry_at[key] = now + RETRY_AFTER_ERROR_SECONDS
+
+    def stats(self) -> dict:
+        if self._mm is None:
+            return {"enabled": False}
+        return {
+            "enabled": True,
+            "path": self.path,
+            "size_bytes": self.size,
+            "leader": self.is_leader,
+            "leader_pid": int(self._header["leader_pid"]),
+            "cells": int(self._header["cells_used"]),
+            "capacity": self.capacity,
+            "price_version": int(self._header["price_version"]),
+            "reads": {f"{source}_{result}": count for (source, result), count in self.reads.items()},
+            "publishes": self.publishes,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "busy": self.busy,
+        }
+
+
+# Globale Instanz; geöffnet wird sie im FastAPI-Startup (nur mit SHARED_FORECAST_STORE=1)
+shared_forecast_store = SharedForecastStore()
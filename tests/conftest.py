@@ -0,0 +1,26 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+# Fester Zeitpunkt für alle Tests, die nicht die echte Uhr brauchen
+NOW = datetime(2026, 3, 10, 12, 15, tzinfo=timezone.utc)
+
+
+class FakeClock:
+    """Monotone Uhr zum Vorstellen: `clock.now = 10.0`."""
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def hourly_forecast(prices, start: datetime = NOW) -> list[dict]:
+    """Preisprognose im Format von get_epex_spot_forecast, ab der vollen Stunde von `start`."""
+    first = start.replace(minute=0, second=0, microsecond=0)
+    return [{"timestamp_utc": first + timedelta(hours=h), "price_eur_kwh": p} for h, p in enumerate(prices)]
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
@@ -0,0 +1,110 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from backtesting import engine
+from backtesting.agents import RecordedAgent, StubAgent, record_decisions
+from connectors.base import CHARGE_MODES
+from ingest_worker.savings import FIXED_PRICE
+from optimisation_api import main
+from optimisation_api.logic import llm_agent
+
+# Historischer Zeitraum: die Aufnahme darf nicht von der heutigen Uhrzeit abhängen
+FIRST_HOUR = int(datetime(2025, 1, 15, tzinfo=timezone.utc).timestamp()) // 3600
+HOURS = np.arange(FIRST_HOUR, FIRST_HOUR + 4)
+PRICES = np.array([0.30, 0.10, 0.25, 0.20])
+SOLAR = np.zeros(len(HOURS))
+
+
+def test_recorded_llm_prompts_see_the_historical_price_window(tmp_path, monkeypatch):
+    prompts = []
+
+    async def prompt_only(soc, price_forecast, solar, now=None):
+        tier, _ = llm_agent.route_tier(soc, price_forecast, solar, now)
+        prompts.append((now, json.loads(llm_agent.compact_prompt(soc, price_forecast, solar, tier, now))))
+        return None
+
+    monkeypatch.setattr(main, "FALLBACK_ENGINE", "llm")
+    monkeypatch.setattr(llm_agent, "llm_decision", prompt_only)
+    path = tmp_path / "decisions.jsonl"
+    written = asyncio.run(record_decisions(main.fallback_decision, HOURS, PRICES, SOLAR, str(path), engine.known_price_end))
+
+    assert written == len(prompts) == len(HOURS) * 21
+    for now, prompt in prompts:
+        i = int(now.timestamp()) // 3600 - FIRST_HOUR
+        assert prompt["price_now"] == PRICES[i]
+        assert [price for _, price in prompt["prices"]] == PRICES[i + 1:].tolist()
+    assert prompts[0][1]["prices"]
+
+
+def test_recorded_optimizer_decisions_are_not_the_default(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "FALLBACK_ENGINE", "optimizer")
+    path = tmp_path / "decisions.jsonl"
+    asyncio.run(record_decisions(main.fallback_decision, HOURS, PRICES, SOLAR, str(path), engine.known_price_end))
+
+    lines = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert all(line["reason"].startswith("Optimierer") for line in lines)
+    agent = RecordedAgent(str(path))
+    agent.decide(int(HOURS[0]), np.array([50.0]), {})
+    assert agent.misses == 0
+
+
+class FixedStrategy:
+    """Immer derselbe Modus für alle Haushalte."""
+    def __init__(self, mode: str):
+        self.name = f"fixed:{mode}"
+        self._mode = CHARGE_MODES.index(mode)
+
+    def modes(self, hour, price, is_cheap_hour, soc, max_solar):
+        return np.full(len(soc), self._mode, dtype=np.int8)
+
+
+def _simulate(strategy, solar_w_m2: float = 0.0, price: float = 0.2, hours: int = 48, start_soc: float = 50.0, seed: int = 0) -> dict:
+    households = engine.make_households(200, locations=1, seed=seed)
+    households["start_soc"] = np.full(200, start_soc)
+    span = np.arange(FIRST_HOUR, FIRST_HOUR + hours)
+    return engine.simulate(span, np.full(hours, price), np.full((hours, 1), solar_w_m2), households, strategy, seed=seed)
+
+
+def test_simulation_is_deterministic_for_a_seed():
+    first = _simulate(engine.RulesStrategy(agent=StubAgent()), 400.0)
+    second = _simulate(engine.RulesStrategy(agent=StubAgent()), 400.0)
+    first.pop("duration_s"), second.pop("duration_s")
+    assert first == second
+
+
+def test_idle_battery_without_pv_costs_the_same_as_pv_only():
+    result = _simulate(FixedStrategy("idle"))
+    assert result["cost_strategy_eur"] == result["cost_pv_only_eur"]
+    assert result["battery_savings_eur"] == 0.0
+    assert result["grid_export_kwh"] == 0.0
+    # Ohne PV ist "nur PV" der volle Bezug zum dynamischen Tarif
+    tariff = 0.2 + engine.BACKTEST_GRID_SURCHARGE_EUR_KWH
+    assert result["cost_pv_only_eur"] == pytest.approx(result["cost_baseline_eur"] / FIXED_PRICE * tariff, abs=0.02)
+
+
+def test_full_idle_battery_feeds_pv_surplus_into_the_grid_like_pv_only():
+    result = _simulate(FixedStrategy("idle"), solar_w_m2=1000.0, start_soc=100.0, hours=6)
+    assert result["grid_export_kwh"] > 0
+    assert result["cost_strategy_eur"] == result["cost_pv_only_eur"]
+
+
+def test_discharged_energy_is_saved_at_the_tariff():
+    tariff = 0.2 + engine.BACKTEST_GRID_SURCHARGE_EUR_KWH
+    idle, discharge = _simulate(FixedStrategy("idle")), _simulate(FixedStrategy("discharge"))
+    saved_kwh = idle["grid_import_kwh"] - discharge["grid_import_kwh"]
+    assert saved_kwh > 0
+    assert discharge["battery_savings_eur"] == pytest.approx(saved_kwh * tariff, abs=0.05)
+    assert discharge["mode_share"]["discharge"] == 1.0
+
+
+def test_grid_charging_adds_the_charged_energy_to_the_bill():
+    charge = _simulate(FixedStrategy("charge"), hours=4, start_soc=20.0)
+    idle = _simulate(FixedStrategy("idle"), hours=4, start_soc=20.0)
+    tariff = 0.2 + engine.BACKTEST_GRID_SURCHARGE_EUR_KWH
+    extra_kwh = charge["grid_import_kwh"] - idle["grid_import_kwh"]
+    assert extra_kwh > 0
+    assert charge["cost_strategy_eur"] - idle["cost_strategy_eur"] == pytest.approx(extra_kwh * tariff, abs=0.05)
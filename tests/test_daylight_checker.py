@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+from astral import Observer
+from astral.sun import elevation
+
+from optimisation_api.services.daylight_checker import DaylightTable
+from optimisation_api.services.forecast_cache import grid_cell
+
+# Sonnenauf-/-untergang gelten bei -0,833° (Refraktion und Sonnenradius)
+HORIZON_DEG = -0.833
+SAMPLES = 3000
+
+
+@pytest.mark.parametrize("days", [1, 3])
+def test_table_matches_astral_on_random_samples(days):
+    rng = np.random.default_rng(days)
+    table = DaylightTable(days=days)
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    # Sortiert, damit die Tabellen wie im Betrieb über Tageswechsel hinweg weiterleben
+    offsets = np.sort(rng.uniform(0, 365 * 86_400, SAMPLES))
+    checked = 0
+    for offset, lat, lon in zip(offsets, rng.uniform(-65, 65, SAMPLES), rng.uniform(-180, 180, SAMPLES)):
+        now = start + timedelta(seconds=float(offset))
+        cell = grid_cell(lat, lon)
+        sun = elevation(Observer(latitude=cell[0], longitude=cell[1]), now, with_refraction=False)
+        if abs(sun - HORIZON_DEG) < 0.5:
+            continue  # Sekunden-Rundung direkt am Horizont
+        assert table.is_daylight(lat, lon, now) == (sun > HORIZON_DEG), (now, lat, lon, sun)
+        checked += 1
+    assert checked > SAMPLES * 0.9
+
+
+def test_one_day_table_is_built_once_per_day():
+    table = DaylightTable(days=1)
+    now = datetime(2026, 6, 21, 0, 30, tzinfo=timezone.utc)
+    for hour in range(24):
+        table.is_daylight(50.1, 8.7, now + timedelta(hours=hour))
+    assert table.builds == 1
+    table.is_daylight(50.1, 8.7, now + timedelta(days=1))
+    assert table.builds == 2
+
+
+def test_forecast_hours_after_midnight_are_covered_on_the_last_table_day():
+    # Westküste der USA: Mitternacht UTC ist dort Nachmittag
+    table = DaylightTable(days=1)
+    now = datetime(2026, 6, 21, 22, 30, tzinfo=timezone.utc)
+    first_hour = int(now.timestamp()) // 3600 * 3600
+    fractions = table.daylight_fractions(37.8, -122.4, first_hour + 3600 * np.arange(4), now)
+    assert fractions.tolist() == [1.0, 1.0, 1.0, 1.0]
+    assert table.builds == 1
@@ -0,0 +1,122 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from optimisation_api import main
+from optimisation_api.logic import llm_agent, rules_engine
+from optimisation_api.logic.decision_stream import DecisionHub
+from optimisation_api.logic.decision_table import DecisionTable
+from optimisation_api.models import Action
+from optimisation_api.services import external_apis
+from tests.conftest import hourly_forecast
+
+LAT, LON = 50.1, 8.7
+MID_SOC = (rules_engine.STRATEGIC_MIN_SOC + rules_engine.STRATEGIC_MAX_SOC) / 2
+MID_PRICE = (rules_engine.HIGH_PRICE_EUR_KWH + rules_engine.CHEAP_PRICE_EUR_KWH) / 2
+
+
+async def _settle(rounds: int = 50):
+    for _ in range(rounds):
+        await asyncio.sleep(0)
+
+
+@pytest.fixture
+def table(monkeypatch):
+    """Frische Entscheidungstabelle hinter main.compute_decision, LLM liefert nie eine Antwort."""
+    forecast = hourly_forecast([MID_PRICE] * 24, start=datetime.now(timezone.utc))
+
+    async def prices():
+        return forecast
+
+    async def solar(lat, lon):
+        return [0.0] * 6
+
+    async def no_answer(soc, price_forecast, solar_forecast, now=None):
+        return None
+
+    table = DecisionTable()
+    table.build_calls = 0
+    build_cell = table.build_cell
+
+    async def counting_build_cell(*args, **kwargs):
+        table.build_calls += 1
+        await build_cell(*args, **kwargs)
+
+    table.build_cell = counting_build_cell
+    monkeypatch.setattr(external_apis, "get_epex_spot_forecast", prices)
+    monkeypatch.setattr(external_apis, "get_solar_forecast", solar)
+    monkeypatch.setattr(llm_agent, "llm_decision", no_answer)
+    monkeypatch.setattr(main, "FALLBACK_ENGINE", "llm")
+    monkeypatch.setattr(main, "decision_table", table)
+    return table
+
+
+def test_failing_fallback_does_not_rebuild_in_a_loop(table):
+    async def run():
+        hub = DecisionHub(main.compute_decision)
+        hub.attach(table)
+        sub = hub.subscribe(LAT, LON, MID_SOC)
+        await hub.report_soc(sub, MID_SOC)
+        await _settle()
+        return hub, sub
+
+    hub, sub = asyncio.run(run())
+    assert table.build_calls == 1
+    assert sub.last == (Action.DO_NOTHING, "Fallback: Keine valide LLM-Antwort erhalten.")
+    assert hub.errors == 0
+
+
+def test_only_changed_decisions_are_pushed():
+    answers = iter([(Action.DO_NOTHING, "a"), (Action.DO_NOTHING, "a"), (Action.WAIT_FOR_SOLAR, "b")])
+
+    async def decide(soc, lat, lon, rebuild=True):
+        return next(answers)
+
+    async def run():
+        hub = DecisionHub(decide)
+        sub = hub.subscribe(LAT, LON, MID_SOC)
+        for soc in (50.0, 51.0, 52.0):
+            await hub.report_soc(sub, soc)
+        return hub, sub
+
+    hub, sub = asyncio.run(run())
+    assert (hub.reports, hub.pushes, hub.unchanged) == (3, 2, 1)
+    assert sub.pending == (Action.WAIT_FOR_SOLAR, "b")
+
+
+def test_unchanged_rebuild_does_not_notify_listeners():
+    forecast = hourly_forecast([MID_PRICE] * 24, start=datetime.now(timezone.utc))
+    calls = []
+
+    async def decide(soc, price_forecast, solar):
+        return Action.DO_NOTHING, "Fallback"
+
+    async def run():
+        table = DecisionTable()
+        table.add_listener(calls.append)
+        cell = table.touch(LAT, LON)
+        await table.build_cell(cell, forecast, [0.0] * 6, decide)
+        await table.build_cell(cell, forecast, [0.0] * 6, decide)
+        await table.build_cell(cell, forecast, [500.0] * 6, decide)
+        return cell
+
+    cell = asyncio.run(run())
+    assert calls == [cell, cell]
+
+
+def test_refresh_is_lookup_only():
+    seen = []
+
+    async def decide(soc, lat, lon, rebuild=True):
+        seen.append(rebuild)
+        return Action.DO_NOTHING, "x"
+
+    async def run():
+        hub = DecisionHub(decide)
+        sub = hub.subscribe(LAT, LON, MID_SOC)
+        hub.schedule_refresh(sub.cell)
+        await _settle()
+
+    asyncio.run(run())
+    assert seen == [False]
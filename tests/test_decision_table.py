@@ -0,0 +1,149 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from optimisation_api.logic import rules_engine
+from optimisation_api.logic.decision_table import DECISION_TABLE_REBUILD_BACKOFF_SECONDS, DecisionTable
+from optimisation_api.models import Action
+from optimisation_api.services import metrics
+from tests.conftest import NOW, hourly_forecast
+
+LAT, LON = 50.1, 8.7
+MID_SOC = (rules_engine.STRATEGIC_MIN_SOC + rules_engine.STRATEGIC_MAX_SOC) / 2
+MID_PRICE = (rules_engine.HIGH_PRICE_EUR_KWH + rules_engine.CHEAP_PRICE_EUR_KWH) / 2
+NO_SUN = [0.0] * 6
+
+
+def _forecast(price: float = MID_PRICE) -> list[dict]:
+    return hourly_forecast([price] * 24)
+
+
+async def _fallback(soc, price_forecast, solar):
+    return Action.DO_NOTHING, f"Fallback {soc:.1f}"
+
+
+async def _no_answer(soc, price_forecast, solar):
+    return None
+
+
+def _built(decide=_fallback, forecast=None, solar=NO_SUN) -> tuple[DecisionTable, list[dict]]:
+    table = DecisionTable(soc_bin_percent=5)
+    forecast = forecast or _forecast()
+    asyncio.run(table.build_cell(table.touch(LAT, LON), forecast, solar, decide, now=NOW))
+    return table, forecast
+
+
+def test_unknown_cell_is_a_miss():
+    table = DecisionTable()
+    assert table.lookup(LAT, LON, MID_SOC, _forecast(), now=NOW) is None
+    assert (table.hits, table.misses) == (0, 1)
+
+
+def test_fallback_bucket_hits_after_build():
+    table, forecast = _built()
+    action, reason = table.lookup(LAT, LON, MID_SOC, forecast, now=NOW)
+    assert action == Action.DO_NOTHING
+    assert reason.startswith("Fallback")
+    assert (table.hits, table.misses) == (1, 0)
+
+
+def test_rule_regions_are_answered_exactly():
+    table, forecast = _built()
+    for soc in (rules_engine.STRATEGIC_MIN_SOC - 0.5, rules_engine.STRATEGIC_MIN_SOC, MID_SOC, rules_engine.STRATEGIC_MAX_SOC):
+        expected = rules_engine.fast_rules(soc, MID_PRICE, forecast, NO_SUN)
+        if expected[0] is not None:
+            assert table.lookup(LAT, LON, soc, forecast, now=NOW) == expected
+    assert table.lookup(LAT, LON, rules_engine.STRATEGIC_MIN_SOC - 0.5, forecast, now=NOW)[0] == Action.CHARGE_FROM_GRID
+
+
+def test_non_authoritative_fallback_is_not_stored():
+    table, forecast = _built(decide=_no_answer)
+    assert table.lookup(LAT, LON, MID_SOC, forecast, now=NOW) is None
+    assert table.misses == 1
+
+
+def test_new_price_curve_or_hour_is_a_miss():
+    table, forecast = _built()
+    assert table.lookup(LAT, LON, MID_SOC, _forecast(MID_PRICE + 0.01), now=NOW) is None
+    assert table.lookup(LAT, LON, MID_SOC, forecast, now=NOW + timedelta(hours=1)) is None
+    assert table.misses == 2
+
+
+def test_other_cell_is_a_miss():
+    table, forecast = _built()
+    assert table.lookup(LAT + 1, LON, MID_SOC, forecast, now=NOW) is None
+
+
+def test_lookups_just_below_max_soc_with_sun_hit_the_fallback():
+    sun = [rules_engine.SOLAR_WAIT_THRESHOLD_W_M2 + 200.0] * 6
+    table, forecast = _built(solar=sun)
+    for soc in (rules_engine.STRATEGIC_MAX_SOC, rules_engine.STRATEGIC_MAX_SOC + 0.5, rules_engine.STRATEGIC_MAX_SOC + 0.99):
+        action, reason = table.lookup(LAT, LON, soc, forecast, now=NOW)
+        assert action == Action.DO_NOTHING and reason.startswith("Fallback")
+    assert table.lookup(LAT, LON, rules_engine.STRATEGIC_MAX_SOC - 0.01, forecast, now=NOW)[0] == Action.WAIT_FOR_SOLAR
+    assert table.misses == 0
+
+
+def test_every_soc_is_answered_consistently_with_the_rules():
+    for price in (rules_engine.CHEAP_PRICE_EUR_KWH - 0.05, MID_PRICE, rules_engine.HIGH_PRICE_EUR_KWH + 0.05):
+        for solar in (NO_SUN, [rules_engine.SOLAR_WAIT_THRESHOLD_W_M2 + 200.0] * 6):
+            table, forecast = _built(forecast=_forecast(price), solar=solar)
+            socs = np.append(np.linspace(0, 100, 1001), [rules_engine.STRATEGIC_MIN_SOC, rules_engine.STRATEGIC_MAX_SOC])
+            for soc in socs:
+                decision = table.lookup(LAT, LON, float(soc), forecast, now=NOW)
+                expected = rules_engine.fast_rules(float(soc), price, forecast, solar)
+                assert decision is not None, soc
+                if expected[0] is not None:
+                    assert decision == expected, soc
+                else:
+                    assert decision[1].startswith("Fallback"), soc
+
+
+def test_uncomputed_bucket_does_not_trigger_rebuilds():
+    table, forecast = _built(decide=_no_answer)
+    assert table.lookup(LAT, LON, MID_SOC, forecast, now=NOW) is None
+    assert table.is_current(LAT, LON, forecast, now=NOW)
+    assert not table.is_current(LAT, LON, forecast, now=NOW + timedelta(hours=1))
+
+
+def test_background_rebuilds_are_backed_off(clock):
+    builds = []
+
+    async def prices():
+        builds.append(1)
+        return None
+
+    async def solar(lat, lon):
+        return NO_SUN
+
+    async def run():
+        table = DecisionTable(clock=clock)
+        for _ in range(3):
+            table.build_in_background(LAT, LON, prices, solar, _fallback)
+            await asyncio.sleep(0)
+        clock.now += DECISION_TABLE_REBUILD_BACKOFF_SECONDS
+        table.build_in_background(LAT, LON, prices, solar, _fallback)
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    assert len(builds) == 2
+
+
+def test_build_time_and_size_are_exported():
+    before = metrics.DECISION_TABLE_BUILD_SECONDS.count("all")
+
+    forecast = hourly_forecast([MID_PRICE] * 24, start=datetime.now(timezone.utc))
+
+    async def prices():
+        return forecast
+
+    async def solar(lat, lon):
+        return NO_SUN
+
+    table = DecisionTable()
+    table.touch(LAT, LON)
+    asyncio.run(table.build_all(prices, solar, _fallback))
+    assert metrics.DECISION_TABLE_BUILD_SECONDS.count("all") == before + 1
+    assert table.cells == 1
+    assert 0 < table.computed_entries < len(table._socs)
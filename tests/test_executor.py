@@ -0,0 +1,88 @@
+import asyncio
+from datetime import datetime, timezone
+
+from connectors.base import BatteryConnector
+from control_worker.executor import ControlLoop
+from optimisation_api.logic import rules_engine
+from tests.conftest import hourly_forecast
+
+LOW_SOC = rules_engine.STRATEGIC_MIN_SOC - 5
+MID_SOC = (rules_engine.STRATEGIC_MIN_SOC + rules_engine.STRATEGIC_MAX_SOC) / 2
+MID_PRICE = (rules_engine.HIGH_PRICE_EUR_KWH + rules_engine.CHEAP_PRICE_EUR_KWH) / 2
+
+
+class FakeBattery(BatteryConnector):
+    vendor = "fake"
+    rate_limit_per_second = 1e6
+
+    def __init__(self, device_id: str, soc: float, fail_commands: int = 0):
+        self.device_id = device_id
+        self.soc = soc
+        self.fail_commands = fail_commands
+        self.modes: list[str] = []
+
+    async def get_soc_percent(self) -> float:
+        return self.soc
+
+    async def set_charge_mode(self, mode: str):
+        if self.fail_commands:
+            self.fail_commands -= 1
+            raise ConnectionError("Hersteller-API nicht erreichbar")
+        self.modes.append(mode)
+
+
+def _loop(price: float, solar: float = 0.0) -> ControlLoop:
+    forecast = hourly_forecast([price] * 24, start=datetime.now(timezone.utc))
+
+    async def prices():
+        return forecast
+
+    async def fetch_solar(lat, lon):
+        return [solar] * 6
+
+    return ControlLoop(fetch_prices=prices, fetch_solar=fetch_solar, retry_backoff=0.0)
+
+
+def _cycle(loop: ControlLoop, batteries: list[FakeBattery]) -> dict:
+    return asyncio.run(loop.run_cycle(batteries))
+
+
+def test_no_rule_keeps_the_battery_idle():
+    battery = FakeBattery("b1", MID_SOC)
+    _cycle(_loop(MID_PRICE), [battery])
+    assert battery.modes == ["idle"]
+
+
+def test_safety_charge_is_blocked_above_the_safety_price():
+    expensive = rules_engine.SAFETY_MAX_CHARGE_PRICE_EUR_KWH + 0.2
+    low, mid = FakeBattery("low", LOW_SOC), FakeBattery("mid", MID_SOC)
+    _cycle(_loop(expensive), [low, mid])
+    # Sicherheitsladung bei hohem Preis -> idle; die Entlade-Regel bleibt unberührt
+    assert low.modes == ["idle"]
+    assert mid.modes == ["discharge"]
+
+
+def test_safety_charge_runs_at_a_cheap_price():
+    battery = FakeBattery("low", LOW_SOC)
+    _cycle(_loop(rules_engine.SAFETY_MAX_CHARGE_PRICE_EUR_KWH - 0.05), [battery])
+    assert battery.modes == ["charge"]
+
+
+def test_unchanged_modes_are_not_resent():
+    loop = _loop(MID_PRICE)
+    battery = FakeBattery("b1", MID_SOC)
+    _cycle(loop, [battery])
+    stats = _cycle(loop, [battery])
+    assert battery.modes == ["idle"]
+    assert (stats["commands"], stats["unchanged"]) == (0, 1)
+
+
+def test_failed_commands_are_retried_then_counted():
+    loop = _loop(MID_PRICE)
+    flaky, broken = FakeBattery("flaky", MID_SOC, fail_commands=1), FakeBattery("broken", MID_SOC, fail_commands=99)
+    stats = _cycle(loop, [flaky, broken])
+    assert flaky.modes == ["idle"] and broken.modes == []
+    assert (stats["commands"], stats["command_errors"]) == (1, 1)
+    # Zustand von "broken" unbekannt: im nächsten Zyklus wird erneut gesendet
+    broken.fail_commands = 0
+    assert _cycle(loop, [flaky, broken])["commands"] == 1
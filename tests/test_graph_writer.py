@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from ingest_worker.graph_writer import DeviceBatchWriter
+
+
+class FlakyWriter(DeviceBatchWriter):
+    """Schreibt in eine Liste statt nach Neo4j; `fail` simuliert einen Ausfall."""
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.fail = False
+        self.written: list[dict] = []
+
+    async def _write_batch(self, rows):
+        if self.fail:
+            raise ConnectionError("Neo4j nicht erreichbar")
+        self.written.extend(rows)
+
+
+def _device(i: int, model: str = "v1") -> dict:
+    return {"id": f"d{i}", "type": "meter", "model_name": model}
+
+
+def test_latest_row_per_device_wins():
+    async def run():
+        writer = FlakyWriter(batch_size=100)
+        await writer.add("u1", _device(1, "v1"))
+        await writer.add("u1", _device(2))
+        await writer.add("u1", _device(1, "v2"))
+        await writer.flush()
+        return writer.written
+
+    written = asyncio.run(run())
+    assert [(row["deviceId"], row["model"]) for row in written] == [("d2", "v1"), ("d1", "v2")]
+
+
+def test_failed_flush_requeues_without_overwriting_newer_rows():
+    async def run():
+        writer = FlakyWriter(batch_size=100)
+        await writer.add("u1", _device(1, "old"))
+        writer.fail = True
+        with pytest.raises(ConnectionError):
+            await writer.flush()
+        await writer.add("u1", _device(1, "new"))
+        writer.fail = False
+        await writer.flush()
+        return writer
+
+    writer = asyncio.run(run())
+    assert [row["model"] for row in writer.written] == ["new"]
+    assert writer.stats()["pending_rows"] == 0
+
+
+def test_buffer_is_capped_dropping_oldest_rows():
+    async def run():
+        writer = FlakyWriter(batch_size=1000, max_pending=5)
+        writer.fail = True
+        for i in range(8):
+            await writer.add("u1", _device(i))
+        with pytest.raises(ConnectionError):
+            await writer.flush()
+        writer.fail = False
+        await writer.flush()
+        return writer
+
+    writer = asyncio.run(run())
+    assert [row["deviceId"] for row in writer.written] == ["d3", "d4", "d5", "d6", "d7"]
+    assert writer.rows_dropped == 3
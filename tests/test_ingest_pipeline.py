@@ -0,0 +1,53 @@
+import asyncio
+
+from connectors.simulated import SimulatedMeter
+from ingest_worker.pipeline import IngestPipeline
+
+
+class CollectingSink:
+    def __init__(self):
+        self.rows = []
+
+    async def write(self, rows):
+        self.rows.extend(rows)
+
+
+def _pipeline(sink) -> IngestPipeline:
+    return IngestPipeline(sinks=[sink], poll_concurrency=2, normalize_concurrency=1, queue_size=2,
+                          write_batch_size=10, poll_timeout=1.0, flush_interval=0.05)
+
+
+def test_cycle_writes_every_device():
+    sink = CollectingSink()
+    meters = [SimulatedMeter(f"m{i}", "u1", latency_range=(0.001, 0.002)) for i in range(20)]
+
+    async def run():
+        pipeline = _pipeline(sink)
+        await pipeline.start()
+        stats = await pipeline.run_cycle(meters)
+        await pipeline.shutdown()
+        return stats
+
+    stats = asyncio.run(run())
+    assert stats["written"] == 20
+    assert sorted(row["device_id"] for row in sink.rows) == sorted(m.device_id for m in meters)
+
+
+def test_stop_accepting_ends_running_cycle_and_drains():
+    sink = CollectingSink()
+    meters = [SimulatedMeter(f"m{i}", "u1", latency_range=(0.02, 0.02)) for i in range(200)]
+
+    async def run():
+        pipeline = _pipeline(sink)
+        await pipeline.start()
+        cycle = asyncio.create_task(pipeline.run_cycle(meters))
+        await asyncio.sleep(0.1)
+        pipeline.stop_accepting()
+        stats = await asyncio.wait_for(cycle, timeout=5)
+        await pipeline.shutdown()
+        return stats
+
+    stats = asyncio.run(run())
+    assert 0 < stats["polled"] < len(meters)
+    # Alles Eingereihte wurde noch geschrieben
+    assert stats["written"] == stats["polled"] == len(sink.rows)
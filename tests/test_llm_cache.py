@@ -0,0 +1,73 @@
+import asyncio
+from datetime import timedelta
+
+from optimisation_api.logic.llm_cache import LLMDecisionCache, decision_key
+from optimisation_api.models import Action, Decision
+from tests.conftest import NOW, FakeClock, hourly_forecast
+
+DECISION = Decision(action=Action.DO_NOTHING, reason="LLM")
+
+
+def _forecast(price: float = 0.2) -> list[dict]:
+    return hourly_forecast([price] * 24)
+
+
+def test_key_buckets_similar_situations_together():
+    forecast = _forecast()
+    assert decision_key(51.0, forecast, [120.0], now=NOW) == decision_key(54.9, forecast, [149.0], now=NOW)
+    assert decision_key(51.0, forecast, [120.0], now=NOW) != decision_key(55.0, forecast, [120.0], now=NOW)
+    assert decision_key(51.0, forecast, [120.0], now=NOW) != decision_key(51.0, _forecast(0.3), [120.0], now=NOW)
+    assert decision_key(51.0, forecast, [120.0], now=NOW) != decision_key(51.0, forecast, [120.0], now=NOW + timedelta(hours=1))
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = LLMDecisionCache(max_entries=10, ttl_seconds=60, clock=clock)
+    cache.put(("k",), DECISION)
+    clock.now = 59.9
+    assert cache.get(("k",)) == DECISION
+    clock.now = 60.0
+    assert cache.get(("k",)) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = LLMDecisionCache(max_entries=2, ttl_seconds=60, clock=FakeClock())
+    cache.put(("a",), DECISION)
+    cache.put(("b",), DECISION)
+    cache.get(("a",))
+    cache.put(("c",), DECISION)
+    assert cache.get(("b",)) is None
+    assert cache.get(("a",)) == DECISION
+    assert cache.evictions == 1
+
+
+def test_concurrent_identical_requests_share_one_call():
+    cache = LLMDecisionCache(max_entries=10, ttl_seconds=60, clock=FakeClock())
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return DECISION, 100
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_compute(("k",), compute) for _ in range(5)))
+
+    assert asyncio.run(run()) == [DECISION] * 5
+    assert calls == 1
+    assert cache.stats()["coalesced"] == 4
+    assert cache.stats()["llm_calls"] == 1
+    assert cache.tokens_used == 100
+
+
+def test_failed_compute_is_not_cached():
+    cache = LLMDecisionCache(max_entries=10, ttl_seconds=60, clock=FakeClock())
+
+    async def compute():
+        return None, 0
+
+    assert asyncio.run(cache.get_or_compute(("k",), compute)) is None
+    assert cache.stats()["entries"] == 0
+    # Vom Dispatcher übersprungen bzw. fehlgeschlagen: kein LLM-Aufruf
+    assert cache.stats()["llm_calls"] == 0
@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from optimisation_api.logic.llm_dispatcher import CircuitBreaker, LLMDispatcher, TokenBucket
+from tests.conftest import FakeClock
+
+
+def _open_breaker(clock: FakeClock) -> CircuitBreaker:
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=10, clock=clock)
+    for _ in range(3):
+        assert breaker.allow_request()
+        breaker.record_failure()
+    return breaker
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=10, clock=clock)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+    assert breaker.times_opened == 1
+
+
+def test_success_resets_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=10, clock=FakeClock())
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_lets_exactly_one_probe_through(clock):
+    breaker = _open_breaker(clock)
+    clock.now = 9.9
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now = 10.0
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+
+def test_successful_probe_closes_breaker(clock):
+    breaker = _open_breaker(clock)
+    clock.now = 10.0
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+
+def test_failed_probe_reopens_breaker_for_another_reset_period(clock):
+    breaker = _open_breaker(clock)
+    clock.now = 10.0
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.times_opened == 2
+    clock.now = 19.9
+    assert not breaker.allow_request()
+    clock.now = 20.0
+    assert breaker.allow_request()
+
+
+def test_token_bucket_refills_at_rate(clock):
+    bucket = TokenBucket(rate=2, capacity=2, clock=clock)
+    assert bucket.try_acquire() and bucket.try_acquire()
+    assert not bucket.try_acquire()
+    clock.now = 0.5
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+
+
+def test_cancelled_probe_releases_half_open_without_counting_a_failure(clock):
+    breaker = _open_breaker(clock)
+    clock.now += 10
+    dispatcher = LLMDispatcher(breaker=breaker)
+    started = asyncio.Event()
+
+    async def hanging_call():
+        started.set()
+        await asyncio.sleep(3600)
+
+    async def run():
+        probe = asyncio.ensure_future(dispatcher.run(hanging_call))
+        await started.wait()
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+    asyncio.run(run())
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.times_opened == 1
+    assert dispatcher.running == 0 and dispatcher.queued == 0
+    assert breaker.allow_request()
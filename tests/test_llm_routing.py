@@ -0,0 +1,38 @@
+from optimisation_api.logic import llm_agent, rules_engine
+from tests.conftest import NOW, hourly_forecast as _forecast
+
+MID_SOC = (rules_engine.STRATEGIC_MIN_SOC + rules_engine.STRATEGIC_MAX_SOC) / 2
+MID_PRICE = (rules_engine.HIGH_PRICE_EUR_KWH + rules_engine.CHEAP_PRICE_EUR_KWH) / 2
+LOW_SOLAR = [rules_engine.SOLAR_WAIT_THRESHOLD_W_M2 * 0.3] * 6
+
+
+def test_mid_band_with_large_spread_routes_to_large_model():
+    forecast = _forecast([MID_PRICE, 0.05, 0.45] + [MID_PRICE] * 21)
+    tier, reason = llm_agent.route_tier(MID_SOC, forecast, LOW_SOLAR, now=NOW)
+    assert (tier.name, reason) == ("large", "large_spread")
+
+
+def test_mid_band_with_small_spread_routes_to_small_model():
+    forecast = _forecast([MID_PRICE] * 24)
+    tier, reason = llm_agent.route_tier(MID_SOC, forecast, LOW_SOLAR, now=NOW)
+    assert (tier.name, reason) == ("small", "small_spread")
+
+
+def test_near_boundary_is_two_sided_for_prices():
+    high, cheap = rules_engine.HIGH_PRICE_EUR_KWH, rules_engine.CHEAP_PRICE_EUR_KWH
+    assert llm_agent.near_boundary(MID_SOC, high * 0.95, LOW_SOLAR)
+    assert llm_agent.near_boundary(MID_SOC, high * 1.05, LOW_SOLAR)
+    assert llm_agent.near_boundary(MID_SOC, cheap * 0.95, LOW_SOLAR)
+    assert llm_agent.near_boundary(MID_SOC, cheap * 1.05, LOW_SOLAR)
+    # Weit über HIGH bzw. weit unter CHEAP ist eindeutig, nicht "knapp"
+    assert not llm_agent.near_boundary(MID_SOC, high * 2, LOW_SOLAR)
+    assert not llm_agent.near_boundary(MID_SOC, cheap * 0.3, LOW_SOLAR)
+
+
+def test_near_boundary_is_two_sided_for_solar_and_soc():
+    threshold = rules_engine.SOLAR_WAIT_THRESHOLD_W_M2
+    assert llm_agent.near_boundary(MID_SOC, MID_PRICE, [threshold * 1.1])
+    assert not llm_agent.near_boundary(MID_SOC, MID_PRICE, [threshold * 3])
+    assert llm_agent.near_boundary(rules_engine.STRATEGIC_MIN_SOC - 2, MID_PRICE, LOW_SOLAR)
+    assert llm_agent.near_boundary(rules_engine.STRATEGIC_MAX_SOC + 2, MID_PRICE, LOW_SOLAR)
+    assert not llm_agent.near_boundary(rules_engine.STRATEGIC_MIN_SOC + 20, MID_PRICE, LOW_SOLAR)
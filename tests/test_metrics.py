@@ -0,0 +1,82 @@
+from optimisation_api.services.metrics import Counter, Histogram, Registry, histogram_lines, sample_lines
+
+
+def test_counter_exposes_help_type_and_one_line_per_label_set():
+    counter = Counter("decisions_total", "Entscheidungen.", ("source", "action"))
+    counter.inc("table", "charge")
+    counter.inc("table", "charge")
+    counter.inc("rules", "idle", amount=0.5)
+    assert list(counter.expose()) == [
+        "# HELP decisions_total Entscheidungen.",
+        "# TYPE decisions_total counter",
+        'decisions_total{source="table",action="charge"} 2',
+        'decisions_total{source="rules",action="idle"} 0.5',
+    ]
+    assert counter.value("table", "charge") == 2
+    assert counter.value("table", "idle") == 0
+
+
+def test_counter_without_labels_and_escaped_label_values():
+    plain = Counter("safety_overrides_total", "Overrides.")
+    plain.inc()
+    assert list(plain.expose())[-1] == "safety_overrides_total 1"
+
+    labelled = Counter("x_total", "X.", ("reason",))
+    labelled.inc('a "b"\\c\nd')
+    assert list(labelled.expose())[-1] == 'x_total{reason="a \\"b\\"\\\\c\\nd"} 1'
+
+
+def test_histogram_buckets_are_cumulative_with_inf_sum_and_count():
+    histogram = Histogram("stage_seconds", "Dauer.", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, "llm")
+    assert list(histogram.expose()) == [
+        "# HELP stage_seconds Dauer.",
+        "# TYPE stage_seconds histogram",
+        'stage_seconds_bucket{stage="llm",le="0.1"} 2',
+        'stage_seconds_bucket{stage="llm",le="1.0"} 3',
+        'stage_seconds_bucket{stage="llm",le="+Inf"} 4',
+        'stage_seconds_sum{stage="llm"} 3.65',
+        'stage_seconds_count{stage="llm"} 4',
+    ]
+    assert histogram.count("llm") == 4
+    assert histogram.count("rules") == 0
+
+
+def test_histogram_time_observes_even_when_the_block_raises():
+    histogram = Histogram("t_seconds", "T.")
+    try:
+        with histogram.time():
+            raise ValueError
+    except ValueError:
+        pass
+    assert histogram.count() == 1
+
+
+def test_histogram_lines_accumulate_external_counts():
+    lines = list(histogram_lines("h", (), (), (1.0, 2.0), [1, 0, 2], 7.5))
+    assert lines == ['h_bucket{le="1.0"} 1', 'h_bucket{le="2.0"} 1', 'h_bucket{le="+Inf"} 3', "h_sum 7.5", "h_count 3"]
+
+
+def test_sample_lines_for_values_counted_elsewhere():
+    lines = list(sample_lines("cache_entries", "Einträge.", "gauge", [({"cache": "llm"}, 3), ({}, 1.5)]))
+    assert lines == [
+        "# HELP cache_entries Einträge.",
+        "# TYPE cache_entries gauge",
+        'cache_entries{cache="llm"} 3',
+        "cache_entries 1.5",
+    ]
+
+
+def test_registry_renders_metrics_then_collectors_and_skips_failing_collectors():
+    registry = Registry()
+    registry.register(Counter("a_total", "A.")).inc()
+
+    def broken():
+        raise RuntimeError("kaputt")
+        yield
+
+    registry.add_collector(broken)
+    registry.add_collector(lambda: ["b 1"])
+    text = registry.render()
+    assert text == "# HELP a_total A.\n# TYPE a_total counter\na_total 1\nb 1\n"
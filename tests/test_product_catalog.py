@@ -0,0 +1,75 @@
+import asyncio
+import json
+
+import numpy as np
+
+from advisory_services import product_catalog
+from advisory_services.product_catalog import ProductCatalog
+
+PRODUCTS = [
+    {"name": "W1", "type": "Waschmaschine", "price_eur": 700, "efficiency_class": "B", "avg_consumption_kwh_per_cycle": 0.6},
+    {"name": "W2", "type": "waschmaschine ", "price_eur": 900, "efficiency_class": "A", "avg_consumption_kwh_per_cycle": 0.5},
+    {"name": "W3", "type": "Waschmaschine", "price_eur": 650, "efficiency_class": "A", "avg_consumption_kwh_per_cycle": 0.55},
+    {"name": "K1", "type": "Kühlschrank", "price_eur": 500, "efficiency_class": "C", "avg_consumption_kwh_per_cycle": 0.4},
+]
+
+
+def test_top_k_sorts_by_class_then_price_with_price_cap():
+    catalog = ProductCatalog(PRODUCTS)
+    assert [p["name"] for p in catalog.top_k("Waschmaschine", k=3)] == ["W3", "W2", "W1"]
+    assert [p["name"] for p in catalog.top_k("WASCHMASCHINE", k=3, max_price=800)] == ["W3", "W1"]
+    assert [p["name"] for p in catalog.top_k("Waschmaschine", k=2, sort_by="price")] == ["W3", "W1"]
+    assert catalog.top_k("Trockner") == []
+
+
+def test_best_payback_ranks_by_payback_against_measured_consumption():
+    catalog = ProductCatalog(PRODUCTS)
+    euro_per_kwh_year = product_catalog.DEFAULT_CYCLES_PER_YEAR * product_catalog.DEFAULT_GRID_PRICE_EUR_KWH
+    best = catalog.best_payback("Waschmaschine", current_consumption_kwh_per_cycle=1.0, k=3)
+    expected = sorted((p["price_eur"] / ((1.0 - p["avg_consumption_kwh_per_cycle"]) * euro_per_kwh_year), p["name"])
+                      for p in PRODUCTS if p["type"].strip().lower() == "waschmaschine")
+    assert [p["name"] for p in best] == [name for _, name in expected]
+    assert best[0]["payback_years"] == round(expected[0][0], 2)
+    assert best[0]["annual_savings_eur"] == round(0.45 * euro_per_kwh_year, 2)
+    assert [p["name"] for p in catalog.best_payback("Waschmaschine", 1.0, k=3, max_price=680)] == ["W3"]
+    # Das alte Gerät ist schon sparsamer als alles im Katalog -> kein Vorschlag
+    assert catalog.best_payback("Waschmaschine", 0.5) == []
+    assert catalog.best_payback("Trockner", 1.0) == []
+
+
+def test_best_payback_matches_brute_force_on_a_large_catalog():
+    rng = np.random.default_rng(3)
+    n = 5000
+    catalog = ProductCatalog.from_columns(
+        [f"P{i}" for i in range(n)], ["Trockner"] * n, rng.uniform(200, 2000, n),
+        rng.choice(product_catalog.EFFICIENCY_CLASSES, n), rng.uniform(0.2, 2.0, n))
+    savings = (1.5 - catalog.consumption) * product_catalog.DEFAULT_CYCLES_PER_YEAR * product_catalog.DEFAULT_GRID_PRICE_EUR_KWH
+    payback = np.where(savings > 0, catalog.prices / np.where(savings > 0, savings, 1), np.inf)
+    expected = np.sort(payback)[:10]
+    got = [p["payback_years"] for p in catalog.best_payback("Trockner", 1.5, k=10)]
+    assert got == [round(float(v), 2) for v in expected]
+
+
+def test_bad_rows_are_skipped():
+    bad = [
+        {"name": "X1", "type": "Waschmaschine", "price_eur": 100, "efficiency_class": "Z", "avg_consumption_kwh_per_cycle": 0.1},
+        {"name": "X2", "type": "Waschmaschine", "price_eur": "", "efficiency_class": "A", "avg_consumption_kwh_per_cycle": 0.1},
+        {"name": "X3", "price_eur": 100, "efficiency_class": "A", "avg_consumption_kwh_per_cycle": 0.1},
+    ]
+    catalog = ProductCatalog(PRODUCTS + bad)
+    assert len(catalog) == len(PRODUCTS)
+    assert "X1" not in [p["name"] for p in catalog.top_k("Waschmaschine", k=10)]
+
+
+def test_catalog_is_loaded_lazily_and_falls_back_on_errors(tmp_path, monkeypatch):
+    broken = tmp_path / "catalog.json"
+    broken.write_text("{not json")
+    monkeypatch.setattr(product_catalog, "PRODUCT_CATALOG_PATH", str(broken))
+    monkeypatch.setattr(product_catalog, "_catalog", None)
+    assert product_catalog.get_catalog().top_k("Waschmaschine")[0]["name"] == "Bosch Serie 8 WAX32M42"
+
+    good = tmp_path / "good.json"
+    good.write_text(json.dumps(PRODUCTS))
+    monkeypatch.setattr(product_catalog, "PRODUCT_CATALOG_PATH", str(good))
+    monkeypatch.setattr(product_catalog, "_catalog", None)
+    assert asyncio.run(product_catalog.find_replacement("Waschmaschine"))["name"] == "W3"
@@ -0,0 +1,148 @@
+import asyncio
+import json
+
+from optimisation_api import main
+from optimisation_api.services.readiness import Readiness
+
+
+class FakeConnection:
+    """Initialisierung, die die ersten `failures` Versuche scheitert."""
+    def __init__(self, failures: int = 0, hang: bool = False):
+        self.failures = failures
+        self.hang = hang
+        self.connected = False
+
+    async def init(self):
+        if self.hang:
+            await asyncio.sleep(10)
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("nicht erreichbar")
+        self.connected = True
+
+    def is_ready(self) -> bool:
+        return self.connected
+
+
+def _readiness(required=frozenset({"db"}), timeout: float = 1.0, retry_seconds: float = 0.01) -> Readiness:
+    return Readiness(required=required, timeout=timeout, retry_seconds=retry_seconds)
+
+
+def test_dependency_goes_from_pending_to_ready():
+    async def run():
+        readiness = _readiness()
+        db = FakeConnection()
+        readiness.register("db", db.init, db.is_ready)
+        assert readiness.stats()["dependencies"]["db"]["state"] == "pending"
+        assert not readiness.is_ready()
+        readiness.start()
+        await asyncio.sleep(0.05)
+        report = readiness.stats()
+        await readiness.stop()
+        return report
+
+    report = asyncio.run(run())
+    assert report["ready"]
+    assert report["dependencies"]["db"]["state"] == "ready"
+    assert report["dependencies"]["db"]["attempts"] == 1
+    assert report["dependencies"]["db"]["error"] is None
+
+
+def test_failed_dependency_is_retried_until_ready():
+    async def run():
+        readiness = _readiness(retry_seconds=0.05)
+        db = FakeConnection(failures=2)
+        readiness.register("db", db.init, db.is_ready)
+        readiness.start()
+        await asyncio.sleep(0.02)
+        failed = readiness.stats()
+        # Wiederholungen nach 0.05s und 0.1s (wachsender Abstand)
+        await asyncio.sleep(0.3)
+        report = readiness.stats()
+        await readiness.stop()
+        return failed, report
+
+    failed, report = asyncio.run(run())
+    assert not failed["ready"]
+    assert failed["dependencies"]["db"]["state"] == "failed"
+    assert "ConnectionError" in failed["dependencies"]["db"]["error"]
+    assert report["ready"]
+    assert report["dependencies"]["db"]["attempts"] == 3
+
+
+def test_hanging_dependency_times_out_and_others_are_not_blocked():
+    async def run():
+        readiness = _readiness(required=frozenset({"fast"}), timeout=0.05, retry_seconds=10)
+        slow, fast = FakeConnection(hang=True), FakeConnection()
+        readiness.register("slow", slow.init, slow.is_ready)
+        readiness.register("fast", fast.init, fast.is_ready)
+        readiness.start()
+        await asyncio.sleep(0.01)
+        during = readiness.stats()
+        await asyncio.sleep(0.1)
+        after = readiness.stats()
+        await readiness.stop()
+        return during, after
+
+    during, after = asyncio.run(run())
+    # Die schnelle Abhängigkeit wartet nicht auf die hängende
+    assert during["dependencies"]["fast"]["state"] == "ready"
+    assert during["dependencies"]["slow"]["state"] == "initializing"
+    assert during["ready"]
+    assert after["dependencies"]["slow"]["state"] == "failed"
+    assert after["dependencies"]["slow"]["error"].startswith("Timeout")
+
+
+def test_unconfigured_dependency_is_disabled_and_not_retried():
+    async def run():
+        readiness = _readiness(required=frozenset())
+        db = FakeConnection()
+        readiness.register("db", db.init, db.is_ready, is_configured=lambda: False)
+        readiness.start()
+        await asyncio.sleep(0.05)
+        report = readiness.stats()
+        await readiness.stop()
+        return report
+
+    report = asyncio.run(run())
+    assert report["ready"]
+    assert report["dependencies"]["db"]["state"] == "disabled"
+    assert report["dependencies"]["db"]["attempts"] == 0
+
+
+def test_lost_connection_is_reported_as_failed():
+    async def run():
+        readiness = _readiness()
+        db = FakeConnection()
+        readiness.register("db", db.init, db.is_ready)
+        readiness.start()
+        await asyncio.sleep(0.05)
+        db.connected = False
+        report = readiness.stats()
+        await readiness.stop()
+        return report
+
+    report = asyncio.run(run())
+    assert not report["ready"]
+    assert report["dependencies"]["db"]["state"] == "failed"
+
+
+def test_ready_endpoint_answers_503_until_required_dependencies_are_ready(monkeypatch):
+    readiness = _readiness()
+    db = FakeConnection()
+    readiness.register("db", db.init, db.is_ready)
+    monkeypatch.setattr(main, "readiness", readiness)
+
+    response = asyncio.run(main.readiness_check())
+    assert response.status_code == 503
+    assert json.loads(response.body)["dependencies"]["db"]["state"] == "pending"
+
+    async def start():
+        readiness.start()
+        await asyncio.sleep(0.05)
+        await readiness.stop()
+
+    asyncio.run(start())
+    response = asyncio.run(main.readiness_check())
+    assert response.status_code == 200
+    assert json.loads(response.body)["ready"]
@@ -0,0 +1,78 @@
+import asyncio
+
+from advisory_services import product_catalog, subsidy_engine
+from advisory_services.recommendation_service import _build_recommendations, _Lookups
+
+PRODUCT = {"name": "W3", "price_eur": 650.0}
+
+
+def _rows(*device_types: str) -> list[dict]:
+    return [{
+        "user_id": "u1",
+        "profile": {"zip_code": "10115"},
+        "devices": [{"device_type": t, "device_model": "alt", "device_id": f"d{i}", "avg_consumption_kwh": None}
+                    for i, t in enumerate(device_types)],
+    }]
+
+
+def test_failed_product_lookup_is_retried_by_the_next_shard(monkeypatch):
+    calls = {"Waschmaschine": 0}
+
+    async def find_replacement(device_type, max_price=None, current_consumption_kwh_per_cycle=None):
+        calls[device_type] += 1
+        if calls[device_type] == 1:
+            raise ConnectionError("Katalog nicht erreichbar")
+        return PRODUCT
+
+    async def get_subsidies(product, profile):
+        return {"amount_eur": 50}
+
+    monkeypatch.setattr(product_catalog, "find_replacement", find_replacement)
+    monkeypatch.setattr(subsidy_engine, "get_subsidies", get_subsidies)
+
+    async def run():
+        lookups = _Lookups()
+        first = await _build_recommendations(_rows("Waschmaschine"), lookups)
+        second = await _build_recommendations(_rows("Waschmaschine"), lookups)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == {"u1": []}
+    assert [rec["subsidy"] for rec in second["u1"]] == [{"amount_eur": 50}]
+    assert calls["Waschmaschine"] == 2
+
+
+def test_failed_subsidy_lookup_degrades_to_no_subsidy(monkeypatch):
+    async def find_replacement(device_type, max_price=None, current_consumption_kwh_per_cycle=None):
+        return PRODUCT
+
+    async def get_subsidies(product, profile):
+        raise TimeoutError("LLM antwortet nicht")
+
+    monkeypatch.setattr(product_catalog, "find_replacement", find_replacement)
+    monkeypatch.setattr(subsidy_engine, "get_subsidies", get_subsidies)
+
+    result = asyncio.run(_build_recommendations(_rows("Waschmaschine", "Trockner"), _Lookups()))
+    assert [(rec["device_type"], rec["subsidy"]) for rec in result["u1"]] == [("Waschmaschine", {}), ("Trockner", {})]
+
+
+def test_replacement_pays_back_against_the_measured_consumption(monkeypatch):
+    catalog = product_catalog.ProductCatalog([
+        {"name": "Sparsam", "type": "Waschmaschine", "price_eur": 1500, "efficiency_class": "A", "avg_consumption_kwh_per_cycle": 0.4},
+        {"name": "Solide", "type": "Waschmaschine", "price_eur": 500, "efficiency_class": "B", "avg_consumption_kwh_per_cycle": 0.6},
+    ])
+
+    async def get_subsidies(product, profile):
+        return {"amount_eur": 0}
+
+    monkeypatch.setattr(product_catalog, "_catalog", catalog)
+    monkeypatch.setattr(subsidy_engine, "get_subsidies", get_subsidies)
+    rows = _rows("Waschmaschine", "Waschmaschine", "Waschmaschine")
+    for device, consumption in zip(rows[0]["devices"], (1.2, 1.2, None)):
+        device["avg_consumption_kwh"] = consumption
+
+    lookups = _Lookups()
+    result = asyncio.run(_build_recommendations(rows, lookups))
+    assert [rec["product"]["name"] for rec in result["u1"]] == ["Solide", "Solide", "Sparsam"]
+    assert result["u1"][0]["product"]["payback_years"] > 0
+    assert len(lookups._products) == 2
@@ -0,0 +1,78 @@
+import itertools
+from datetime import timedelta
+
+import numpy as np
+import pytest
+
+from optimisation_api.logic import schedule_optimizer
+from optimisation_api.logic.schedule_optimizer import BatteryParams, optimal_schedule, optimize
+from optimisation_api.models import Action
+from tests.conftest import NOW, hourly_forecast as _forecast
+
+PARAMS = BatteryParams(capacity_kwh=10, max_charge_kw=3, max_discharge_kw=3, round_trip_efficiency=0.9,
+                       house_load_kw=0.5, pv_peak_kw=5, feed_in_tariff_eur_kwh=0.08, min_soc=15, max_soc=94)
+
+
+def test_charges_when_now_is_much_cheaper_than_later():
+    schedule = optimal_schedule(30, _forecast([0.05] + [0.40] * 11), [0.0] * 12, PARAMS, now=NOW)
+    assert schedule.action == Action.CHARGE_FROM_GRID
+
+
+def test_discharges_when_now_is_expensive_and_later_cheap():
+    schedule = optimal_schedule(80, _forecast([0.45] + [0.05] * 11), [0.0] * 12, PARAMS, now=NOW)
+    assert schedule.action == Action.DISCHARGE_TO_HOUSE
+
+
+def test_flat_prices_without_sun_do_nothing():
+    schedule = optimal_schedule(50, _forecast([0.25] * 12), [0.0] * 12, PARAMS, now=NOW)
+    assert schedule.action == Action.DO_NOTHING
+
+
+def test_soc_stays_within_strategic_buffers():
+    rng = np.random.default_rng(7)
+    prices = rng.uniform(0.02, 0.5, 24)
+    irradiance = rng.uniform(0, 900, 24)
+    _, socs, _ = optimize(50, prices, irradiance, PARAMS)
+    assert socs.min() >= PARAMS.min_soc - 1e-9
+    assert socs.max() <= PARAMS.max_soc + 1e-9
+
+
+def _run_plan(soc, modes, prices, irradiance, soc_steps) -> tuple[float, float]:
+    """Fahrplan auf dem SoC-Gitter der DP: (Kosten in €, Wert der Restenergie am Horizontende in €)."""
+    step_kwh = PARAMS.capacity_kwh / soc_steps
+    idx = round(soc / 100 * soc_steps)
+    cost = 0.0
+    for mode, price, irr in zip(modes, prices, irradiance):
+        delta, net_load = schedule_optimizer.step_flows(idx * step_kwh, int(mode), PARAMS.pv_kwh(irr), PARAMS)
+        steps = int(np.trunc(delta / step_kwh + np.copysign(1e-6, delta)))
+        idx = int(np.clip(idx + steps, 0, soc_steps))
+        cost += float(schedule_optimizer.hour_cost(steps * step_kwh, net_load, price, PARAMS))
+    return cost, idx * step_kwh * PARAMS.discharge_efficiency * float(np.mean(prices))
+
+
+def _objective(*args) -> float:
+    cost, remaining = _run_plan(*args)
+    return cost - remaining
+
+
+def test_plan_is_optimal_on_a_small_horizon():
+    # Alle 3^5 Fahrpläne auf einem groben Gitter durchprobieren, inklusive Restwert am Ende
+    rng = np.random.default_rng(11)
+    horizon, soc_steps = 5, 20
+    for _ in range(20):
+        soc = float(rng.uniform(PARAMS.min_soc, PARAMS.max_soc))
+        prices = rng.uniform(0.02, 0.5, horizon)
+        irradiance = rng.choice([0.0, 300.0, 800.0], horizon)
+        modes, _, cost = optimize(soc, prices, irradiance, PARAMS, soc_steps=soc_steps)
+        plan = _objective(soc, modes, prices, irradiance, soc_steps)
+        best = min(_objective(soc, candidate, prices, irradiance, soc_steps)
+                   for candidate in itertools.product(schedule_optimizer._MODES, repeat=horizon))
+        idle = _objective(soc, [schedule_optimizer.IDLE] * horizon, prices, irradiance, soc_steps)
+        assert plan == pytest.approx(best, abs=1e-9)
+        assert plan <= idle + 1e-9
+        # Die zurückgegebenen Kosten sind die des Fahrplans ohne Restwert
+        assert cost == pytest.approx(_run_plan(soc, modes, prices, irradiance, soc_steps)[0], abs=1e-9)
+
+
+def test_missing_current_hour_gives_no_schedule():
+    assert optimal_schedule(50, _forecast([0.2] * 12), [0.0] * 12, PARAMS, now=NOW - timedelta(hours=2)) is None
@@ -0,0 +1,95 @@
+from datetime import timedelta
+
+import numpy as np
+
+from advisory_services import scoring_service
+from advisory_services.scoring_service import ScoreStore
+from tests.conftest import NOW
+
+
+def _readings(count: int = 200, seed: int = 3) -> list[tuple]:
+    rng = np.random.default_rng(seed)
+    rows = []
+    for _ in range(count):
+        user = f"user-{rng.integers(4)}"
+        ts = NOW - timedelta(hours=int(rng.integers(0, 40 * 24)), minutes=int(rng.integers(60)))
+        price = float(rng.uniform(0.05, 0.4)) if rng.random() < 0.8 else None
+        rows.append((user, ts, float(rng.uniform(0.1, 2.0)), float(rng.uniform(0, 1.0)), price))
+    return rows
+
+
+def _backfilled(rows) -> ScoreStore:
+    store = ScoreStore(capacity=2)
+    users, ts, kwh, savings, prices = zip(*rows)
+    store.backfill(users, ts, kwh, savings, [np.nan if p is None else p for p in prices], now=NOW)
+    return store
+
+
+def _scores(store: ScoreStore) -> dict:
+    return {user: store.score(user, NOW) for user in sorted(store._slots)}
+
+
+def test_incremental_matches_backfill_for_ordered_readings():
+    rows = sorted(_readings(), key=lambda r: r[1])
+    store = ScoreStore(capacity=2)
+    for row in rows:
+        store.record_reading(*row)
+    assert _scores(store) == _scores(_backfilled(rows))
+
+
+def test_late_readings_within_window_are_counted_once():
+    rows = sorted(_readings(), key=lambda r: r[1])
+    # Innerhalb jedes Zwei-Tages-Blocks umgekehrt einsortiert: verspätet, aber im Fenster
+    window = timedelta(hours=scoring_service.SCORE_LATE_READING_HOURS - 2)
+    shuffled = sorted(rows, key=lambda r: (int((r[1] - rows[0][1]) / window), -r[1].timestamp()))
+    # Dazu Duplikate aus den letzten 24 h
+    duplicates = [r for r in rows if rows[-1][1] - r[1] < timedelta(hours=24)]
+    store = ScoreStore(capacity=2)
+    for row in shuffled + duplicates:
+        store.record_reading(row[0], row[1], 0.0, 0.0)
+    reference = _backfilled([(r[0], r[1], 0.0, 0.0, None) for r in rows])
+    for user in store._slots:
+        slot, ref_slot = store._slots[user], reference._slots[user]
+        for column in ("active_hours", "first_hour", "last_hour"):
+            assert store._arrays[column][slot] == reference._arrays[column][ref_slot]
+    assert store.late_readings_dropped == 0
+
+
+def test_reading_after_backfill_continues_seamlessly():
+    rows = _readings()
+    store = _backfilled(rows)
+    user, ts = rows[0][0], rows[0][1]
+    before = int(store._arrays["active_hours"][store._slots[user]])
+    store.record_reading(user, ts, 0.0, 0.0)
+    store.record_reading(user, NOW + timedelta(hours=1), 0.0, 0.0)
+    assert int(store._arrays["active_hours"][store._slots[user]]) == before + 1
+
+
+def test_device_backfill_feeds_efficiency_factor():
+    store = ScoreStore()
+    store.record_reading("u1", NOW, 1.0, 0.0, 0.3)
+    assert store.factor_scores(NOW)["efficiency"][0] == 0.0
+    store.backfill_devices(["u1", "u1"], ["fridge", "washer"], ["A+++", "A+++"])
+    assert store.factor_scores(NOW)["efficiency"][0] == 100.0
+    # Erneuter Abgleich ersetzt den Bestand, statt Geräte doppelt zu zählen
+    store.backfill_devices(["u1"], ["fridge"], ["G"])
+    assert store._arrays["device_count"][0] == 1
+    assert store.factor_scores(NOW)["efficiency"][0] == 0.0
+
+
+def test_snapshot_round_trip(tmp_path):
+    store = _backfilled(_readings())
+    store.backfill_devices(["user-0"], ["fridge"], ["B"])
+    path = str(tmp_path / "scores.npz")
+    store.save(path)
+    loaded = ScoreStore.load(path)
+    assert _scores(loaded) == _scores(store)
+    assert np.array_equal(loaded._arrays["recent_hours"][: len(store)], store._arrays["recent_hours"][: len(store)])
+
+
+def test_readings_older_than_window_are_dropped_and_counted():
+    store = ScoreStore()
+    store.record_reading("u1", NOW, 0.0, 0.0)
+    store.record_reading("u1", NOW - timedelta(hours=scoring_service.SCORE_LATE_READING_HOURS), 0.0, 0.0)
+    assert store._arrays["active_hours"][0] == 1
+    assert store.late_readings_dropped == 1
@@ -0,0 +1,129 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+
+from optimisation_api.services import shared_forecasts
+from optimisation_api.services.shared_forecasts import SOLAR_HOURS, SharedForecastStore
+from tests.conftest import NOW, FakeClock
+
+pytestmark = pytest.mark.skipif(shared_forecasts.fcntl is None, reason="gemeinsamer Speicher braucht fcntl")
+
+HOURLY = [float(h * 10) for h in range(SOLAR_HOURS)]
+
+
+def _forecast(hours: int = 48) -> list[dict]:
+    start = NOW.replace(minute=0)
+    return [{"timestamp_utc": start + timedelta(hours=h), "price_eur_kwh": 0.1 + h / 1000} for h in range(hours)]
+
+
+@pytest.fixture
+def stores(tmp_path):
+    """Zwei Worker auf derselben Datei."""
+    clock = FakeClock(NOW.timestamp())
+    opened = [SharedForecastStore(str(tmp_path / "forecasts"), max_cells=100, clock=clock) for _ in range(2)]
+    assert all(store.open() for store in opened)
+    yield opened
+    for store in opened:
+        store.close()
+
+
+def test_prices_published_by_one_worker_are_read_by_another(stores):
+    writer, reader = stores
+    assert reader.read_prices() is None
+    forecast = _forecast()
+    assert writer.publish_prices(forecast, expires_at=NOW.timestamp() + 3600)
+
+    read, expires_at = reader.read_prices()
+    assert read == forecast
+    assert expires_at == NOW.timestamp() + 3600
+    # Bis zur nächsten Version dieselbe Liste (Identität für nachgelagerte Caches)
+    assert reader.read_prices()[0] is read
+    writer.publish_prices(forecast[:24])
+    assert len(reader.read_prices()[0]) == 24
+    assert reader.stats()["reads"] == {"prices_miss": 1, "prices_hit": 3}
+
+
+def test_solar_cells_round_trip_and_unknown_cells_miss(stores):
+    writer, reader = stores
+    assert writer.publish_solar(50.1, 8.7, HOURLY)
+    assert reader.read_solar(50.1, 8.7, 5, 6)[0] == HOURLY[5:11]
+    assert reader.read_solar(50.2, 8.7, 0, 6) is None
+    # Unvollständige Prognosen werden nicht geteilt
+    assert not writer.publish_solar(50.2, 8.7, HOURLY[:-1])
+    assert not writer.publish_solar(50.2, 8.7, HOURLY[:-1] + [None])
+    assert reader.stats()["cells"] == 1
+
+
+def test_reader_retries_while_a_writer_is_active(stores):
+    store = stores[0]
+    attempts = []
+
+    def read():
+        attempts.append(int(store._header["seq"]))
+        if len(attempts) == 1:
+            # Ein Schreiber kommt während des ersten Lesens dazwischen
+            store._header["seq"] = int(store._header["seq"]) + 2
+        return "wert"
+
+    assert store._read(read) == "wert"
+    assert len(attempts) == 2
+
+
+def test_reader_gives_up_while_seq_stays_odd_and_a_writer_recovers(stores):
+    writer, reader = stores
+    writer.publish_solar(50.1, 8.7, HOURLY)
+    # Abgestürzter Schreiber: seq bleibt ungerade
+    writer._header["seq"] = int(writer._header["seq"]) + 1
+    assert reader.read_solar(50.1, 8.7, 0, 6) is None
+    assert reader.stats()["busy"] == 1
+
+    assert writer.publish_solar(50.1, 8.7, HOURLY)
+    assert int(writer._header["seq"]) % 2 == 0
+    assert reader.read_solar(50.1, 8.7, 0, 6)[0] == HOURLY[:6]
+
+
+def test_only_one_worker_leads_and_another_takes_over_after_close(stores):
+    first, second = stores
+    assert first._try_lead()
+    assert not second._try_lead()
+    assert second.stats()["leader_pid"] == first.stats()["leader_pid"]
+    first.close()
+    assert second._try_lead()
+    assert second.stats()["leader"]
+
+
+def test_store_stops_accepting_new_cells_at_the_load_factor(tmp_path):
+    store = SharedForecastStore(str(tmp_path / "forecasts"), max_cells=4, clock=FakeClock(NOW.timestamp()))
+    assert store.open()
+    try:
+        # 4 Zellen, davon höchstens 3 belegt
+        assert [store.publish_solar(50.0 + i, 8.0, HOURLY) for i in range(4)] == [True, True, True, False]
+        assert store.stats()["cells"] == 3
+        assert store.read_solar(53.0, 8.0, 0, 1) is None
+        # Bestehende Zellen werden weiter erneuert
+        assert store.publish_solar(50.0, 8.0, [1.0] * SOLAR_HOURS)
+        assert store.read_solar(50.0, 8.0, 0, 2)[0] == [1.0, 1.0]
+    finally:
+        store.close()
+
+
+def test_leader_refreshes_only_expired_entries(stores):
+    leader = stores[0]
+    leader.publish_prices(_forecast(), expires_at=NOW.timestamp() + 60)
+    leader.publish_solar(50.1, 8.7, HOURLY, expires_at=NOW.timestamp() + 60)
+    leader.publish_solar(50.2, 8.7, HOURLY, expires_at=NOW.timestamp() + 7200)
+    calls = []
+
+    async def fetch_prices():
+        calls.append("prices")
+        return _forecast()
+
+    async def fetch_solar(lat, lon):
+        calls.append((lat, lon))
+        return HOURLY
+
+    leader._clock.now += 120
+    asyncio.run(leader.refresh_due(fetch_prices, fetch_solar))
+    assert calls == ["prices", (50.1, 8.7)]
+    assert leader.stats()["refreshes"] == 2
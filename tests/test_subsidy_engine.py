@@ -0,0 +1,85 @@
+import asyncio
+from collections import OrderedDict
+
+import pytest
+
+from advisory_services import subsidy_engine
+
+
+def test_openai_client_is_created_once_and_closed(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(subsidy_engine, "_openai_client", None)
+
+    async def run():
+        first, second = await asyncio.gather(subsidy_engine._get_openai_client(), subsidy_engine._get_openai_client())
+        assert first is second is subsidy_engine._openai_client
+        await subsidy_engine.close_openai_client()
+        assert subsidy_engine._openai_client is None
+        return first
+
+    client = asyncio.run(run())
+    assert client.is_closed()
+
+
+def test_no_client_without_api_key(monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.setattr(subsidy_engine, "_openai_client", None)
+    assert asyncio.run(subsidy_engine._get_openai_client()) is None
+
+
+@pytest.mark.parametrize("text, amount", [
+    ("Zuschuss von 12750 Euro", 12750.0),
+    ("bis zu 2500 EUR", 2500.0),
+    ("pauschal 1000€", 1000.0),
+    ("maximal 12.750 € je Wohneinheit", 12750.0),
+    ("1.234,50 Euro", 1234.5),
+    ("keine Beträge", None),
+])
+def test_amounts_are_parsed_completely(text, amount):
+    assert subsidy_engine._parse_amount(text) == amount
+
+
+def test_extract_prefers_chunks_naming_the_device_type():
+    context = [
+        {"source": "fenster.txt", "text": "Fenster: KfW 261 mit 5000 Euro Tilgungszuschuss."},
+        {"source": "wp.txt", "text": "Allgemeines. Für eine Wärmepumpe gibt es über BEG EM bis zu 12750 Euro. Weitere Hinweise."},
+    ]
+    result = subsidy_engine.extract_subsidy(context, {"type": "Wärmepumpe"})
+    assert result == {"amount_eur": 12750.0, "program_name": "BEG EM",
+                      "conditions": "Für eine Wärmepumpe gibt es über BEG EM bis zu 12750 Euro."}
+
+
+def test_percentages_are_applied_to_the_product_price():
+    context = [{"source": "bafa.txt", "text": "Die BAFA erstattet 30 Prozent der Kosten."}]
+    result = subsidy_engine.extract_subsidy(context, {"type": "Solarthermie"})
+    assert result["rate_percent"] == 30.0
+    assert subsidy_engine._for_product(result, {"price_eur": 8000})["amount_eur"] == 2400.0
+    assert subsidy_engine.extract_subsidy([{"source": "x", "text": "Nichts."}], {})["amount_eur"] == 0.0
+
+
+def test_cache_is_keyed_by_type_and_region_and_expires_with_the_document_version(tmp_path, monkeypatch):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "wp.txt").write_text("Für eine Wärmepumpe gibt es bis zu 12750 Euro.", encoding="utf-8")
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.setattr(subsidy_engine, "_openai_client", None)
+    monkeypatch.setattr(subsidy_engine, "SUBSIDY_DOCS_DIR", str(docs))
+    monkeypatch.setattr(subsidy_engine, "SUBSIDY_INDEX_DIR", str(tmp_path / "index"))
+    monkeypatch.setattr(subsidy_engine, "SUBSIDY_INDEX_CHECK_SECONDS", 0.0)
+    monkeypatch.setattr(subsidy_engine, "_index", None)
+    monkeypatch.setattr(subsidy_engine, "_cache", OrderedDict())
+    monkeypatch.setattr(subsidy_engine, "cache_stats", {"hits": 0, "misses": 0, "coalesced": 0, "rebuilds": 0})
+    product = {"type": "Wärmepumpe", "name": "WP 1"}
+
+    async def run():
+        first = await subsidy_engine.get_subsidies(product, {"zip_code": "60311"})
+        # Andere Hausnummer/PLZ derselben Region und anderes Produkt desselben Typs: Treffer
+        await subsidy_engine.get_subsidies({**product, "name": "WP 2"}, {"zip_code": "60599"})
+        await subsidy_engine.get_subsidies(product, {"zip_code": "10115"})
+        (docs / "wp.txt").write_text("Für eine Wärmepumpe gibt es bis zu 9000 Euro.", encoding="utf-8")
+        changed = await subsidy_engine.get_subsidies(product, {"zip_code": "60311"})
+        return first, changed
+
+    first, changed = asyncio.run(run())
+    assert (first["amount_eur"], changed["amount_eur"]) == (12750.0, 9000.0)
+    assert subsidy_engine.cache_stats == {"hits": 1, "misses": 3, "coalesced": 0, "rebuilds": 2}
@@ -0,0 +1,86 @@
+import numpy as np
+
+from advisory_services import subsidy_index
+from advisory_services.subsidy_index import SubsidyIndex, build_index, chunk_text, hash_embedding
+
+HEAT_PUMP = "Die BEG EM fördert den Einbau einer Wärmepumpe mit einem Zuschuss von bis zu 12750 Euro."
+WINDOWS = "Für den Austausch von Fenstern gibt es über KfW 261 einen Kredit mit Tilgungszuschuss."
+
+
+def _docs(tmp_path, **files) -> str:
+    docs = tmp_path / "docs"
+    docs.mkdir(exist_ok=True)
+    for name, text in files.items():
+        (docs / f"{name}.txt").write_text(text, encoding="utf-8")
+    return str(docs)
+
+
+def test_chunks_overlap_and_cover_every_word():
+    words = [f"w{i}" for i in range(25)]
+    chunks = chunk_text(" ".join(words), words=10, overlap=3)
+    assert chunks[0].split() == words[:10]
+    assert chunks[1].split()[:3] == words[7:10]
+    assert {w for chunk in chunks for w in chunk.split()} == set(words)
+    assert chunk_text("   ") == []
+    assert chunk_text("kurz", words=10, overlap=3) == ["kurz"]
+
+
+def test_hash_embedding_is_deterministic_and_normalised():
+    first, second = hash_embedding([HEAT_PUMP, ""]), hash_embedding([HEAT_PUMP, ""])
+    assert np.array_equal(first, second)
+    assert np.isclose(np.linalg.norm(first[0]), 1.0)
+    assert not first[1].any()
+
+
+def test_build_is_skipped_while_documents_are_unchanged(tmp_path):
+    docs = _docs(tmp_path, waermepumpe=HEAT_PUMP)
+    index_dir = str(tmp_path / "index")
+    assert build_index(docs, index_dir)
+    assert not build_index(docs, index_dir)
+    version = SubsidyIndex(index_dir).version
+
+    (tmp_path / "docs" / "fenster.txt").write_text(WINDOWS, encoding="utf-8")
+    assert build_index(docs, index_dir)
+    assert SubsidyIndex(index_dir).version != version
+
+
+def test_search_ranks_the_matching_document_first(tmp_path):
+    docs = _docs(tmp_path, waermepumpe=HEAT_PUMP, fenster=WINDOWS)
+    index_dir = str(tmp_path / "index")
+    build_index(docs, index_dir)
+    index = SubsidyIndex(index_dir)
+    assert len(index) == 2
+    results = index.search("Zuschuss für eine Wärmepumpe", k=1)
+    assert [chunk["source"] for _, chunk in results] == ["waermepumpe.txt"]
+    assert index.search("Wärmepumpe", k=0) == []
+
+
+def test_ivf_search_finds_the_exact_neighbour(tmp_path, monkeypatch):
+    monkeypatch.setattr(subsidy_index, "IVF_MIN_CHUNKS", 16)
+    texts = {f"doc{i}": f"Programm {i} fördert Maßnahme {i} mit Betrag {i * 100} Euro" for i in range(40)}
+    docs = _docs(tmp_path, **texts)
+    index_dir = str(tmp_path / "index")
+    build_index(docs, index_dir)
+    index = SubsidyIndex(index_dir, nprobe=64)
+    assert len(index.centroids) > 0
+    score, chunk = index.search(texts["doc7"], k=1)[0]
+    assert chunk["source"] == "doc7.txt"
+    assert np.isclose(score, 1.0, atol=1e-5)
+
+
+def test_rebuild_switches_versions_through_one_pointer(tmp_path):
+    docs = _docs(tmp_path, waermepumpe=HEAT_PUMP)
+    index_dir = tmp_path / "index"
+    build_index(docs, str(index_dir))
+    old = SubsidyIndex(str(index_dir))
+    old_dir = subsidy_index.current_dir(str(index_dir))
+
+    for text in ("Neue Fassung.", "Dritte Fassung."):
+        (tmp_path / "docs" / "fenster.txt").write_text(text, encoding="utf-8")
+        build_index(docs, str(index_dir))
+    # Ein bereits geöffneter Index liest weiter seine eigenen Dateien
+    assert old.search("Wärmepumpe", k=1)[0][1]["source"] == "waermepumpe.txt"
+    assert not (index_dir / "manifest.json").exists()
+    assert len([p for p in index_dir.iterdir() if p.name.startswith("v-")]) == 2
+    assert subsidy_index.current_dir(str(index_dir)) != old_dir
+    assert len(SubsidyIndex(str(index_dir))) == 2
@@ -0,0 +1,42 @@
+import asyncio
+
+from database import timeseries_store as ts_module
+from database.timeseries_store import TimeSeriesStore
+
+
+def _store(monkeypatch, max_entries: int = 3) -> tuple[TimeSeriesStore, list[str]]:
+    monkeypatch.setattr(ts_module, "TIMESERIES_SAVINGS_CACHE_MAX_ENTRIES", max_entries)
+    store, queried = TimeSeriesStore(), []
+
+    def todays_savings(user_id):
+        queried.append(user_id)
+        return {"today_eur": 1.0, "trend": "stable"}
+
+    store.todays_savings = todays_savings
+    return store, queried
+
+
+def test_savings_cache_is_bounded_lru(monkeypatch):
+    store, queried = _store(monkeypatch)
+
+    async def run():
+        for user_id in ("a", "b", "c", "a", "d", "a", "b"):
+            await store.get_todays_savings(user_id)
+
+    asyncio.run(run())
+    # "b" wurde beim Eintreffen von "d" als ältester Eintrag verdrängt, "a" blieb dank Zugriff
+    assert queried == ["a", "b", "c", "d", "b"]
+    assert len(store._savings_cache) == 3
+
+
+def test_expired_entries_are_refreshed(monkeypatch):
+    store, queried = _store(monkeypatch)
+    monkeypatch.setattr(ts_module, "TIMESERIES_SAVINGS_CACHE_SECONDS", -1)
+
+    async def run():
+        await store.get_todays_savings("a")
+        await store.get_todays_savings("a")
+
+    asyncio.run(run())
+    assert queried == ["a", "a"]
+    assert len(store._savings_cache) == 1
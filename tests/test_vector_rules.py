@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from optimisation_api.logic import rules_engine, vector_rules
+from tests.conftest import hourly_forecast
+
+MIN_SOC, MAX_SOC = rules_engine.STRATEGIC_MIN_SOC, rules_engine.STRATEGIC_MAX_SOC
+HIGH, CHEAP = rules_engine.HIGH_PRICE_EUR_KWH, rules_engine.CHEAP_PRICE_EUR_KWH
+SOLAR = rules_engine.SOLAR_WAIT_THRESHOLD_W_M2
+
+# Genau auf den Schwellen und knapp daneben
+EDGE_SOCS = [0.0, MIN_SOC - 1e-9, MIN_SOC, MIN_SOC + 1e-9, (MIN_SOC + MAX_SOC) / 2, MAX_SOC - 1e-9, MAX_SOC, MAX_SOC + 1e-9, 100.0]
+EDGE_PRICES = [CHEAP - 1e-9, CHEAP, CHEAP + 1e-9, (CHEAP + HIGH) / 2, HIGH - 1e-9, HIGH, HIGH + 1e-9]
+EDGE_SOLAR = [0.0, SOLAR - 1e-6, SOLAR, SOLAR + 1e-6]
+
+
+def _forecast(now: datetime, current_price: float, cheap_now: bool) -> list[dict]:
+    """48 h ab der laufenden Stunde; mit `cheap_now` ist dieselbe Stunde morgen die günstigste."""
+    forecast = hourly_forecast([0.5] * 48, start=now)
+    forecast[0]["price_eur_kwh"] = current_price
+    forecast[24]["price_eur_kwh"] = 0.01 if cheap_now else 0.9
+    return forecast
+
+
+@pytest.mark.parametrize("cheap_now", [False, True])
+@pytest.mark.parametrize("current_price", EDGE_PRICES)
+@pytest.mark.parametrize("max_solar", EDGE_SOLAR)
+def test_vectorized_matches_scalar_at_threshold_edges(cheap_now, current_price, max_solar):
+    now = datetime.now(timezone.utc)
+    forecast = _forecast(now, current_price, cheap_now)
+    solar = [max_solar, 0.0, 0.0]
+    arrays = vector_rules.PriceArrays.from_forecast(forecast)
+    assert arrays.current_price(now) == current_price
+
+    codes = vector_rules.fast_rules_vectorized(np.array(EDGE_SOCS), current_price, arrays, max_solar, now=now)
+    for soc, code in zip(EDGE_SOCS, codes):
+        rule, action, reason = rules_engine.evaluate_rules(soc, current_price, forecast, solar)
+        assert vector_rules.RULE_NAMES[int(code)] == rule, f"soc={soc}"
+        assert vector_rules.explain(int(code), max_solar) == (action, reason)
+        assert rules_engine.fast_rules(soc, current_price, forecast, solar) == (action, reason)
+
+
+def test_cheapest_hours_ties_prefer_earlier_entries():
+    now = datetime(2026, 3, 10, 12, 30, tzinfo=timezone.utc)
+    forecast = hourly_forecast([0.2] * 9, start=now + timedelta(hours=1))
+    arrays = vector_rules.PriceArrays.from_forecast(forecast)
+    expected = [int(item["timestamp_utc"].timestamp()) // 3600 for item in forecast[:3]]
+    assert arrays.cheapest_hours(3, now).tolist() == expected